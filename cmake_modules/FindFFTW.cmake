@@ -4,6 +4,8 @@
 #  FFTW_INCLUDES        - where to find fftw3.h
 #  FFTW_LIBRARY         - the main FFTW library.
 #  FFTW_THREADS_LIBRARY - the FFTW multithreading support library.
+#  FFTW_DOUBLE_LIBRARY  - the double precision FFTW library, if available.
+#  FFTW_DOUBLE_THREADS_LIBRARY - the double precision FFTW multithreading support library, if available.
 #  FFTW_FOUND           - True if FFTW found.
 
 if (FFTW_INCLUDES)
@@ -15,10 +17,12 @@ find_path (FFTW_INCLUDES fftw3.h)
 
 find_library (FFTW_LIBRARY NAMES fftw3f)
 find_library (FFTW_THREADS_LIBRARY NAMES fftw3f_threads)
+find_library (FFTW_DOUBLE_LIBRARY NAMES fftw3)
+find_library (FFTW_DOUBLE_THREADS_LIBRARY NAMES fftw3_threads)
 
 # handle the QUIETLY and REQUIRED arguments and set FFTW_FOUND to TRUE if
 # all listed variables are TRUE
 include (FindPackageHandleStandardArgs)
 find_package_handle_standard_args (FFTW DEFAULT_MSG FFTW_LIBRARY FFTW_INCLUDES)
 
-mark_as_advanced (FFTW_LIBRARY FFTW_THREADS_LIBRARY FFTW_INCLUDES)
+mark_as_advanced (FFTW_LIBRARY FFTW_THREADS_LIBRARY FFTW_DOUBLE_LIBRARY FFTW_DOUBLE_THREADS_LIBRARY FFTW_INCLUDES)
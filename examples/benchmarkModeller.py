@@ -0,0 +1,59 @@
+from __future__ import print_function
+import simtk.openmm.app as app
+import simtk.openmm as mm
+import simtk.unit as unit
+from datetime import datetime
+from optparse import OptionParser
+
+def buildWaterBox(numWaters, asNumpy):
+    """Create a Topology and positions for a box containing a single ion and the specified number of waters."""
+    topology = app.Topology()
+    chain = topology.addChain()
+    residue = topology.addResidue('NA', chain)
+    topology.addAtom('NA', app.element.sodium, residue)
+    positions = [mm.Vec3(0, 0, 0)]
+    chain = topology.addChain()
+    side = int(numWaters**(1.0/3.0))+1
+    for i in range(numWaters):
+        residue = topology.addResidue('HOH', chain)
+        o = topology.addAtom('O', app.element.oxygen, residue)
+        h1 = topology.addAtom('H1', app.element.hydrogen, residue)
+        h2 = topology.addAtom('H2', app.element.hydrogen, residue)
+        topology.addBond(o, h1)
+        topology.addBond(o, h2)
+        pos = mm.Vec3(i%side, (i//side)%side, i//(side*side))*0.31
+        positions += [pos, pos+mm.Vec3(0.09572, 0, 0), pos+mm.Vec3(-0.024, 0.09267, 0)]
+    if asNumpy:
+        import numpy
+        positions = numpy.array(positions)
+    return topology, positions*unit.nanometers
+
+def timeOperation(topology, positions, operation):
+    """Apply an operation to a new Modeller, then return how many seconds it took."""
+    modeller = app.Modeller(topology, positions)
+    start = datetime.now()
+    operation(modeller)
+    end = datetime.now()
+    elapsed = end-start
+    return elapsed.seconds + elapsed.microseconds*1e-6
+
+# Parse the command line options.
+
+parser = OptionParser()
+parser.add_option('--atoms', default='1000000', dest='atoms', type='int', help='approximate number of atoms in the test system [default: 1000000]')
+parser.add_option('--numpy', action='store_true', default=False, dest='numpy', help='store the positions as a numpy array')
+(options, args) = parser.parse_args()
+if len(args) > 0:
+    parser.error('Unknown argument: '+args[0])
+
+# Run the benchmarks.
+
+topology, positions = buildWaterBox(options.atoms//3, options.numpy)
+print('Atoms:', topology.getNumAtoms())
+tests = [('deleteWater', lambda m: m.deleteWater()),
+         ('delete every other water', lambda m: m.delete(list(m.topology.residues())[1::2])),
+         ('delete bonds', lambda m: m.delete(list(m.topology.bonds())[::2])),
+         ('convertWater', lambda m: m.convertWater('tip4pew')),
+         ('add', lambda m: m.add(topology, positions))]
+for name, operation in tests:
+    print('%s: %g seconds' % (name, timeOperation(topology, positions, operation)))
@@ -0,0 +1,62 @@
+from __future__ import print_function
+import simtk.openmm.app as app
+import simtk.openmm as mm
+import simtk.unit as unit
+from datetime import datetime
+from optparse import OptionParser
+
+def elapsedSeconds(start):
+    """Return how many seconds have elapsed since a specified time."""
+    elapsed = datetime.now()-start
+    return elapsed.seconds + elapsed.microseconds*1e-6
+
+# Parse the command line options.
+
+parser = OptionParser()
+parser.add_option('--replicas', default='16', dest='replicas', type='int', help='number of replicas to simulate [default: 16]')
+parser.add_option('--steps', default='500', dest='steps', type='int', help='number of steps to take for each replica [default: 500]')
+parser.add_option('--threads', default=None, dest='threads', type='int', help='number of threads for running replicas [default: one per replica]')
+parser.add_option('--platform', default='CPU', dest='platform', help='name of the platform to benchmark [default: CPU]')
+(options, args) = parser.parse_args()
+if len(args) > 0:
+    parser.error('Unknown argument: '+args[0])
+
+# Create the replicas.  When using the CPU platform, each Context uses a single thread.
+
+pdb = app.PDBFile('5dfr_minimized.pdb')
+ff = app.ForceField('amber99sb.xml', 'amber99_obc.xml')
+system = ff.createSystem(pdb.topology, nonbondedMethod=app.CutoffNonPeriodic, nonbondedCutoff=2*unit.nanometers, constraints=app.HBonds)
+platform = mm.Platform.getPlatformByName(options.platform)
+properties = ({'CpuThreads': '1'} if options.platform == 'CPU' else None)
+temperatures = [300+10*i for i in range(options.replicas)]
+integrators = [mm.LangevinIntegrator(t*unit.kelvin, 1/unit.picosecond, 0.002*unit.picoseconds) for t in temperatures]
+replicas = app.ReplicaManager(pdb.topology, system, integrators, platform, properties, options.threads)
+replicas.setPositions(pdb.positions)
+replicas.setVelocitiesToTemperature([t*unit.kelvin for t in temperatures])
+replicas.step(10) # Make sure everything is fully initialized
+print('Replicas:', len(replicas))
+
+# Advance the replicas one at a time, as a simple Python loop would.
+
+start = datetime.now()
+for simulation in replicas.simulations:
+    simulation.step(options.steps)
+serialTime = elapsedSeconds(start)
+print('serial: %g seconds' % serialTime)
+
+# Advance them concurrently.
+
+start = datetime.now()
+replicas.step(options.steps)
+concurrentTime = elapsedSeconds(start)
+print('concurrent: %g seconds (%.2fx speedup)' % (concurrentTime, serialTime/concurrentTime))
+throughput = replicas.getThroughput()
+print('steps/second per replica: min %g, max %g' % (min(throughput), max(throughput)))
+
+# Exchange configurations between neighboring replicas.
+
+start = datetime.now()
+for i in range(0, len(replicas)-1, 2):
+    replicas.exchangeConfigurations(i, i+1, rescaleVelocities=True)
+print('exchanges: %g seconds' % elapsedSeconds(start))
+replicas.close()
@@ -110,6 +110,16 @@ public:
      * energy directly, <i>or</i> add it to an internal buffer so that it will be included here.
      */
     virtual double finishComputation(ContextImpl& context, bool includeForce, bool includeEnergy, int groups, bool& valid) = 0;
+    /**
+     * Get whether every force kernel on this platform returns its contribution to the energy directly from
+     * calcForcesAndEnergy(), rather than adding it to an internal buffer that is included in the value returned
+     * by finishComputation().  If this is true, the energy of every force group can be found with a single
+     * force/energy computation, and finishComputation() must return 0 when the energy is computed.  The default
+     * implementation returns false.
+     */
+    virtual bool returnsEnergiesByForce() const {
+        return false;
+    }
 };
 
 /**
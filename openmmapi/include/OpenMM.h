@@ -74,5 +74,6 @@
 #include "openmm/VirtualSite.h"
 #include "openmm/Platform.h"
 #include "openmm/serialization/XmlSerializer.h"
+#include "openmm/serialization/BinarySerializer.h"
 
 #endif /*OPENMM_H_*/
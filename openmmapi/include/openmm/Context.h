@@ -125,6 +125,17 @@ public:
      * and energies.  Group i will be included if (groups&(1<<i)) != 0.  The default value includes all groups.
      */
     State getState(int types, bool enforcePeriodicBox=false, int groups=0xFFFFFFFF) const;
+    /**
+     * Compute the potential energy of each force group.  This is equivalent to calling getState() once for
+     * every group, but on platforms that support it, the energies of all groups are computed together in a
+     * single evaluation of the forces.
+     *
+     * @param energies on exit, this contains 32 elements.  Element i is the potential energy of force group i
+     * (in kJ/mol), or 0 if that group is not included or contains no forces.
+     * @param groups a set of bit flags for which force groups to include.  Group i will be included
+     * if (groups&(1<<i)) != 0.  The default value includes all groups.
+     */
+    void getEnergiesByGroup(std::vector<double>& energies, int groups=0xFFFFFFFF) const;
     /**
      * Copy information from a State object into this Context.  This restores the Context to
      * approximately the same state it was in when the State was created.  If the State does not include
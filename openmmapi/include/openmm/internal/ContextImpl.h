@@ -191,6 +191,17 @@ public:
      * @return the potential energy of the system, or 0 if includeEnergy is false
      */
     double calcForcesAndEnergy(bool includeForces, bool includeEnergy, int groups=0xFFFFFFFF);
+    /**
+     * Calculate the potential energy of each force group (in kJ/mol).  When the Platform returns the energy
+     * of every force directly, this requires only a single evaluation of the forces.  Otherwise the energy
+     * of each group is computed with a separate call to calcForcesAndEnergy().
+     *
+     * @param energies       on exit, this contains 32 elements.  Element i is the energy of group i, or 0
+     *                       if that group is not included.
+     * @param groups         a set of bit flags for which force groups to include.  Group i will be included
+     *                       if (groups&(1<<i)) != 0.  The default value includes all groups.
+     */
+    void calcEnergiesByGroup(std::vector<double>& energies, int groups=0xFFFFFFFF);
     /**
      * Get the set of force group flags that were passed to the most recent call to calcForcesAndEnergy().
      */
@@ -136,6 +136,10 @@ State Context::getState(int types, bool enforcePeriodicBox, int groups) const {
     return builder.getState();
 }
 
+void Context::getEnergiesByGroup(vector<double>& energies, int groups) const {
+    impl->calcEnergiesByGroup(energies, groups);
+}
+
 void Context::setState(const State& state) {
     setTime(state.getTime());
     Vec3 a, b, c;
@@ -31,6 +31,7 @@
 
 #include "openmm/Force.h"
 #include "openmm/Integrator.h"
+#include "openmm/NonbondedForce.h"
 #include "openmm/OpenMMException.h"
 #include "openmm/System.h"
 #include "openmm/kernels.h"
@@ -278,6 +279,54 @@ double ContextImpl::calcForcesAndEnergy(bool includeForces, bool includeEnergy,
     }
 }
 
+/**
+ * Get the set of force group flags a Force contributes energy to.
+ */
+static int getForceGroupFlags(const Force& force) {
+    int flags = 1<<force.getForceGroup();
+    const NonbondedForce* nonbonded = dynamic_cast<const NonbondedForce*>(&force);
+    if (nonbonded != NULL && nonbonded->getReciprocalSpaceForceGroup() >= 0)
+        flags |= 1<<nonbonded->getReciprocalSpaceForceGroup();
+    return flags;
+}
+
+void ContextImpl::calcEnergiesByGroup(vector<double>& energies, int groups) {
+    if (!hasSetPositions)
+        throw OpenMMException("Particle positions have not been set");
+    energies.assign(32, 0.0);
+    vector<int> forceGroups(forceImpls.size());
+    int usedGroups = 0;
+    for (int i = 0; i < (int) forceImpls.size(); ++i) {
+        forceGroups[i] = getForceGroupFlags(forceImpls[i]->getOwner())&groups;
+        usedGroups |= forceGroups[i];
+    }
+    CalcForcesAndEnergyKernel& kernel = initializeForcesKernel.getAs<CalcForcesAndEnergyKernel>();
+    if (!kernel.returnsEnergiesByForce()) {
+        // The Platform only reports the total energy, so evaluate each group separately.
+
+        for (int group = 0; group < 32; group++)
+            if ((usedGroups&(1<<group)) != 0)
+                energies[group] = calcForcesAndEnergy(true, true, 1<<group);
+        return;
+    }
+
+    // Evaluate all the groups at once, asking each Force for the energy of one group at a time.
+
+    lastForceGroups = groups;
+    while (true) {
+        energies.assign(32, 0.0);
+        kernel.beginComputation(*this, true, true, groups);
+        for (int i = 0; i < (int) forceImpls.size(); ++i)
+            for (int group = 0; group < 32; group++)
+                if ((forceGroups[i]&(1<<group)) != 0)
+                    energies[group] += forceImpls[i]->calcForcesAndEnergy(*this, true, true, 1<<group);
+        bool valid = true;
+        kernel.finishComputation(*this, true, true, groups, valid);
+        if (valid)
+            return;
+    }
+}
+
 int ContextImpl::getLastForceGroups() const {
     return lastForceGroups;
 }
@@ -87,6 +87,13 @@ public:
      * energy directly, <i>or</i> add it to an internal buffer so that it will be included here.
      */
     double finishComputation(ContextImpl& context, bool includeForce, bool includeEnergy, int groups, bool& valid);
+    /**
+     * Get whether every force kernel returns its contribution to the energy directly.  This is always true
+     * for this platform.
+     */
+    bool returnsEnergiesByForce() const {
+        return true;
+    }
 private:
     CpuPlatform::PlatformData& data;
     Kernel referenceKernel;
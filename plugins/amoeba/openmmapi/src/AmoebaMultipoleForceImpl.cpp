@@ -61,6 +61,16 @@ void AmoebaMultipoleForceImpl::initialize(ContextImpl& context) {
         double cutoff = owner.getCutoffDistance();
         if (cutoff > 0.5*boxVectors[0][0] || cutoff > 0.5*boxVectors[1][1] || cutoff > 0.5*boxVectors[2][2])
             throw OpenMMException("AmoebaMultipoleForce: The cutoff distance cannot be greater than half the periodic box size.");
+
+        // A grid specified by the user must be at least as large as the PME interpolation order in each dimension.
+
+        std::vector<int> gridDimension;
+        owner.getPmeGridDimensions(gridDimension);
+        if (owner.getAEwald() != 0.0 && gridDimension[0] != 0) {
+            for (int i = 0; i < 3; i++)
+                if (gridDimension[i] < 5)
+                    throw OpenMMException("AmoebaMultipoleForce: Each dimension of the PME grid must be at least 5.");
+        }
     }   
 
     double quadrupoleValidationTolerance = 1.0e-05;
@@ -492,11 +492,13 @@ double ReferenceCalcAmoebaTorsionTorsionForceKernel::execute(ContextImpl& contex
 
 ReferenceCalcAmoebaMultipoleForceKernel::ReferenceCalcAmoebaMultipoleForceKernel(std::string name, const Platform& platform, const System& system) : 
          CalcAmoebaMultipoleForceKernel(name, platform), system(system), numMultipoles(0), mutualInducedMaxIterations(60), mutualInducedTargetEpsilon(1.0e-03),
-                                                         usePme(false),alphaEwald(0.0), cutoffDistance(1.0) {  
+                                                         usePme(false),alphaEwald(0.0), cutoffDistance(1.0), pmeWorkspace(NULL) {  
 
 }
 
 ReferenceCalcAmoebaMultipoleForceKernel::~ReferenceCalcAmoebaMultipoleForceKernel() {
+    if (pmeWorkspace != NULL)
+        delete pmeWorkspace;
 }
 
 void ReferenceCalcAmoebaMultipoleForceKernel::initialize(const System& system, const AmoebaMultipoleForce& force) {
@@ -651,6 +653,12 @@ AmoebaReferenceMultipoleForce* ReferenceCalcAmoebaMultipoleForceKernel::setupAmo
         amoebaReferencePmeMultipoleForce->setAlphaEwald(alphaEwald);
         amoebaReferencePmeMultipoleForce->setCutoffDistance(cutoffDistance);
         amoebaReferencePmeMultipoleForce->setPmeGridDimensions(pmeGridDimension);
+
+        // The thread pool, FFT plans, and grids are expensive to create, so they are kept for the lifetime of the kernel.
+
+        if (pmeWorkspace == NULL)
+            pmeWorkspace = new AmoebaReferencePmeWorkspace(IntVec(pmeGridDimension[0], pmeGridDimension[1], pmeGridDimension[2]));
+        amoebaReferencePmeMultipoleForce->setWorkspace(pmeWorkspace);
         RealVec* boxVectors = extractBoxVectors(context);
         double minAllowedSize = 1.999999*cutoffDistance;
         if (boxVectors[0][0] < minAllowedSize || boxVectors[1][1] < minAllowedSize || boxVectors[2][2] < minAllowedSize) {
@@ -438,6 +438,7 @@ private:
     RealOpenMM alphaEwald;
     RealOpenMM cutoffDistance;
     std::vector<int> pmeGridDimension;
+    AmoebaReferencePmeWorkspace* pmeWorkspace;
 
    const System& system;
 };
@@ -24,7 +24,13 @@
 
 #include "AmoebaReferenceMultipoleForce.h"
 #include "jama_svd.h"
+#include "openmm/internal/hardware.h"
 #include <algorithm>
+#include <cstdlib>
+#include <sstream>
+#ifdef OPENMM_AMOEBA_USE_FFTW
+#include <fftw3.h>
+#endif
 
 // In case we're using some primitive version of Visual Studio this will
 // make sure that erf() and erfc() are defined.
@@ -4820,28 +4826,166 @@ RealOpenMM AmoebaReferenceGeneralizedKirkwoodMultipoleForce::calculateKirkwoodED
     return energy;
 }
 
+#ifdef OPENMM_AMOEBA_USE_FFTW
+// The FFTW planner is not thread safe, so creating and destroying plans is serialized.
+
+static pthread_mutex_t fftwPlannerLock = PTHREAD_MUTEX_INITIALIZER;
+#ifdef OPENMM_AMOEBA_USE_FFTW_THREADS
+static bool hasInitializedFftwThreads = false;
+#endif
+#endif
+
+class AmoebaReferencePmeWorkspace::FFTPlans {
+public:
+#ifdef OPENMM_AMOEBA_USE_FFTW
+    fftw_plan forwardPlan;
+    fftw_plan backwardPlan;
+#else
+    fftpack_t fftplan;
+#endif
+};
+
+AmoebaReferencePmeWorkspace::AmoebaReferencePmeWorkspace(const IntVec& gridDimensions, int numThreads) :
+               _gridDimensions(gridDimensions), _etermAlphaEwald(0.0)
+{
+
+    if (numThreads <= 0) {
+        numThreads = getNumProcessors();
+        char* threadsEnv = getenv("OPENMM_CPU_THREADS");
+        if (threadsEnv != NULL)
+            std::stringstream(threadsEnv) >> numThreads;
+        if (numThreads < 1)
+            numThreads = 1;
+    }
+    _threads = new ThreadPool(numThreads);
+    _plans = new FFTPlans();
+
+    int totalGridSize = gridDimensions[0]*gridDimensions[1]*gridDimensions[2];
+    _eterm.resize(totalGridSize);
+    for (int ii = 0; ii < numThreads; ii++) {
+#ifdef OPENMM_AMOEBA_USE_FFTW
+        _grids.push_back((t_complex*) fftw_malloc(sizeof(t_complex)*totalGridSize));
+#else
+        _grids.push_back(new t_complex[totalGridSize]);
+#endif
+    }
+
+#ifdef OPENMM_AMOEBA_USE_FFTW
+    pthread_mutex_lock(&fftwPlannerLock);
+#ifdef OPENMM_AMOEBA_USE_FFTW_THREADS
+    if (!hasInitializedFftwThreads) {
+        fftw_init_threads();
+        hasInitializedFftwThreads = true;
+    }
+    fftw_plan_with_nthreads(numThreads);
+#endif
+    fftw_complex* grid = reinterpret_cast<fftw_complex*>(_grids[0]);
+    _plans->forwardPlan = fftw_plan_dft_3d(gridDimensions[0], gridDimensions[1], gridDimensions[2], grid, grid, FFTW_FORWARD, FFTW_MEASURE);
+    _plans->backwardPlan = fftw_plan_dft_3d(gridDimensions[0], gridDimensions[1], gridDimensions[2], grid, grid, FFTW_BACKWARD, FFTW_MEASURE);
+    pthread_mutex_unlock(&fftwPlannerLock);
+#else
+    fftpack_init_3d(&_plans->fftplan, gridDimensions[0], gridDimensions[1], gridDimensions[2]);
+#endif
+}
+
+AmoebaReferencePmeWorkspace::~AmoebaReferencePmeWorkspace()
+{
+#ifdef OPENMM_AMOEBA_USE_FFTW
+    pthread_mutex_lock(&fftwPlannerLock);
+    fftw_destroy_plan(_plans->forwardPlan);
+    fftw_destroy_plan(_plans->backwardPlan);
+    pthread_mutex_unlock(&fftwPlannerLock);
+    for (unsigned int ii = 0; ii < _grids.size(); ii++)
+        fftw_free(_grids[ii]);
+#else
+    fftpack_destroy(_plans->fftplan);
+    for (unsigned int ii = 0; ii < _grids.size(); ii++)
+        delete[] _grids[ii];
+#endif
+    delete _plans;
+    delete _threads;
+}
+
+const IntVec& AmoebaReferencePmeWorkspace::getGridDimensions() const
+{
+    return _gridDimensions;
+}
+
+int AmoebaReferencePmeWorkspace::getNumThreads() const
+{
+    return _threads->getNumThreads();
+}
+
+ThreadPool& AmoebaReferencePmeWorkspace::getThreadPool()
+{
+    return *_threads;
+}
+
+t_complex* AmoebaReferencePmeWorkspace::getGrid(int threadIndex)
+{
+    return _grids[threadIndex];
+}
+
+void AmoebaReferencePmeWorkspace::transformGrid(bool forward)
+{
+#ifdef OPENMM_AMOEBA_USE_FFTW
+    fftw_execute(forward ? _plans->forwardPlan : _plans->backwardPlan);
+#else
+    fftpack_exec_3d(_plans->fftplan, forward ? FFTPACK_FORWARD : FFTPACK_BACKWARD, _grids[0], _grids[0]);
+#endif
+}
+
+std::vector<RealOpenMM>& AmoebaReferencePmeWorkspace::getEterm()
+{
+    return _eterm;
+}
+
+bool AmoebaReferencePmeWorkspace::updateEtermParameters(const RealVec* periodicBoxVectors, RealOpenMM alphaEwald)
+{
+    bool changed = (alphaEwald != _etermAlphaEwald);
+    for (int ii = 0; ii < 3; ii++)
+        for (int jj = 0; jj < 3; jj++)
+            changed |= (periodicBoxVectors[ii][jj] != _etermBoxVectors[ii][jj]);
+    if (!changed)
+        return false;
+    _etermAlphaEwald = alphaEwald;
+    _etermBoxVectors[0] = periodicBoxVectors[0];
+    _etermBoxVectors[1] = periodicBoxVectors[1];
+    _etermBoxVectors[2] = periodicBoxVectors[2];
+    return true;
+}
+
 const int AmoebaReferencePmeMultipoleForce::AMOEBA_PME_ORDER = 5;
 
 const RealOpenMM AmoebaReferencePmeMultipoleForce::SQRT_PI = 1.77245385091;
 
+class AmoebaReferencePmeMultipoleForce::ComputeTask : public ThreadPool::Task {
+public:
+    ComputeTask(AmoebaReferencePmeMultipoleForce& owner, ThreadMethod method) : owner(owner), method(method) {
+    }
+    void execute(ThreadPool& threads, int threadIndex) {
+        (owner.*method)(threadIndex, threads.getNumThreads());
+    }
+    AmoebaReferencePmeMultipoleForce& owner;
+    ThreadMethod method;
+};
+
 AmoebaReferencePmeMultipoleForce::AmoebaReferencePmeMultipoleForce() :
                AmoebaReferenceMultipoleForce(PME),
                _cutoffDistance(1.0), _cutoffDistanceSquared(1.0),
-               _pmeGridSize(0), _totalGridSize(0), _alphaEwald(0.0) 
+               _totalGridSize(0), _alphaEwald(0.0) 
 {
 
-    _fftplan = NULL;
+    _workspace = NULL;
+    _ownsWorkspace = false;
     _pmeGrid = NULL;
     _pmeGridDimensions = IntVec(-1, -1, -1);
 } 
 
 AmoebaReferencePmeMultipoleForce::~AmoebaReferencePmeMultipoleForce()
 {
-    if (_fftplan) {
-        fftpack_destroy(_fftplan);
-    }
-    if (_pmeGrid) {
-        delete _pmeGrid;
+    if (_ownsWorkspace) {
+        delete _workspace;
     }
 };
  
@@ -4884,11 +5028,6 @@ void AmoebaReferencePmeMultipoleForce::setPmeGridDimensions(vector<int>& pmeGrid
         (pmeGridDimensions[2] == _pmeGridDimensions[2]))
         return;
 
-    if (_fftplan) {
-        fftpack_destroy(_fftplan);
-    }
-    fftpack_init_3d(&_fftplan,pmeGridDimensions[0], pmeGridDimensions[1], pmeGridDimensions[2]);
-
     _pmeGridDimensions[0] = pmeGridDimensions[0];
     _pmeGridDimensions[1] = pmeGridDimensions[1];
     _pmeGridDimensions[2] = pmeGridDimensions[2];
@@ -4916,6 +5055,15 @@ void AmoebaReferencePmeMultipoleForce::setPeriodicBoxSize(OpenMM::RealVec* vecto
     _recipBoxVectors[2] = RealVec(vectors[1][0]*vectors[2][1]-vectors[1][1]*vectors[2][0], -vectors[0][0]*vectors[2][1], vectors[0][0]*vectors[1][1])*scale;
 };
 
+void AmoebaReferencePmeMultipoleForce::setWorkspace(AmoebaReferencePmeWorkspace* workspace)
+{
+    if (_ownsWorkspace) {
+        delete _workspace;
+    }
+    _workspace = workspace;
+    _ownsWorkspace = false;
+}
+
 int compareInt2(const int2& v1, const int2& v2)
 {
     return v1[1] < v2[1];
@@ -4925,35 +5073,48 @@ void AmoebaReferencePmeMultipoleForce::resizePmeArrays()
 {
 
     _totalGridSize = _pmeGridDimensions[0]*_pmeGridDimensions[1]*_pmeGridDimensions[2];
-    if (_pmeGridSize < _totalGridSize) {
-        if (_pmeGrid) {
-            delete _pmeGrid;
-        }
-        _pmeGrid      = new t_complex[_totalGridSize];
-        _pmeGridSize  = _totalGridSize;
+    if (_workspace == NULL) {
+        _workspace     = new AmoebaReferencePmeWorkspace(_pmeGridDimensions);
+        _ownsWorkspace = true;
+    }
+    const IntVec& workspaceDimensions = _workspace->getGridDimensions();
+    if (workspaceDimensions[0] != _pmeGridDimensions[0] || workspaceDimensions[1] != _pmeGridDimensions[1] ||
+            workspaceDimensions[2] != _pmeGridDimensions[2]) {
+        throw OpenMMException("AmoebaReferencePmeMultipoleForce: the PME workspace does not match the grid dimensions");
     }
+    _pmeGrid = _workspace->getGrid();
 
     for (unsigned int ii = 0; ii < 3; ii++) {
        _pmeBsplineModuli[ii].resize(_pmeGridDimensions[ii]);
        _thetai[ii].resize(AMOEBA_PME_ORDER*_numParticles);
     }
 
-    _iGrid.resize(_numParticles);
+    for (unsigned int ii = 0; ii < 3; ii++)
+       _gridIndex[ii].resize(AMOEBA_PME_ORDER*_numParticles);
     _phi.resize(20*_numParticles);
     _phid.resize(10*_numParticles);
     _phip.resize(10*_numParticles);
     _phidp.resize(20*_numParticles);
 }
 
-void AmoebaReferencePmeMultipoleForce::initializePmeGrid()
+void AmoebaReferencePmeMultipoleForce::executeInParallel(ThreadMethod method)
 {
-    if (_pmeGrid == NULL)
-        return;
+    ThreadPool& threads = _workspace->getThreadPool();
+    ComputeTask task(*this, method);
+    threads.execute(task);
+    threads.waitForThreads();
+}
 
-    for (int jj = 0; jj < _totalGridSize; jj++) {
-        _pmeGrid[jj].re = _pmeGrid[jj].im = 0.0;
+void AmoebaReferencePmeMultipoleForce::sumThreadGrids(int threadIndex, int numThreads)
+{
+    int start = (threadIndex*_totalGridSize)/numThreads;
+    int end   = ((threadIndex+1)*_totalGridSize)/numThreads;
+    for (int ii = 1; ii < numThreads; ii++) {
+        const t_complex* threadGrid = _workspace->getGrid(ii);
+        for (int gridIndex = start; gridIndex < end; gridIndex++)
+            _pmeGrid[gridIndex] += threadGrid[gridIndex];
     }
-}    
+}
 
 void AmoebaReferencePmeMultipoleForce::getPeriodicDelta(RealVec& deltaR) const 
 {
@@ -5195,11 +5356,10 @@ void AmoebaReferencePmeMultipoleForce::calculateFixedMultipoleField(const vector
 
     resizePmeArrays();
     computeAmoebaBsplines(particleData);
-    initializePmeGrid();
     spreadFixedMultipolesOntoGrid(particleData);
-    fftpack_exec_3d(_fftplan, FFTPACK_FORWARD, _pmeGrid, _pmeGrid);
+    _workspace->transformGrid(true);
     performAmoebaReciprocalConvolution();
-    fftpack_exec_3d(_fftplan, FFTPACK_BACKWARD, _pmeGrid, _pmeGrid);
+    _workspace->transformGrid(false);
     computeFixedPotentialFromGrid();
     recordFixedMultipoleField();
 
@@ -5304,25 +5464,30 @@ void AmoebaReferencePmeMultipoleForce::computeAmoebaBsplines(const vector<Multip
     for (unsigned int ii = 0; ii < _numParticles; ii++) {
         RealVec position  = particleData[ii].position;
         getPeriodicDelta(position);
-        IntVec igrid;
         for (unsigned int jj = 0; jj < 3; jj++) {
 
             RealOpenMM w  = position[0]*_recipBoxVectors[0][jj]+position[1]*_recipBoxVectors[1][jj]+position[2]*_recipBoxVectors[2][jj];
             RealOpenMM fr = _pmeGridDimensions[jj]*(w-(int)(w+0.5)+0.5);
             int ifr       = static_cast<int>(floor(fr));
             w             = fr - ifr;
-            igrid[jj]     = ifr - AMOEBA_PME_ORDER + 1;
-            igrid[jj]    += igrid[jj] < 0 ? _pmeGridDimensions[jj] : 0;
+            int igrid     = ifr - AMOEBA_PME_ORDER + 1;
+            igrid        += igrid < 0 ? _pmeGridDimensions[jj] : 0;
             vector<RealOpenMM4> thetaiTemp(AMOEBA_PME_ORDER);
             computeBSplinePoint(thetaiTemp, w);
+
+            // Record the wrapped grid index of every point the spline covers, already multiplied
+            // by the stride along this axis, so the spreading and interpolation passes can reuse them.
+            // AmoebaMultipoleForceImpl::initialize() ensures every grid dimension is at least the
+            // interpolation order, so a single wrap is enough.
+
+            int stride    = (jj == 0 ? _pmeGridDimensions[1]*_pmeGridDimensions[2] : (jj == 1 ? _pmeGridDimensions[2] : 1));
             for (unsigned int kk = 0; kk < AMOEBA_PME_ORDER; kk++) {
                 _thetai[jj][ii*AMOEBA_PME_ORDER+kk] = thetaiTemp[kk];
+                int index = igrid+kk;
+                index    -= index >= _pmeGridDimensions[jj] ? _pmeGridDimensions[jj] : 0;
+                _gridIndex[jj][ii*AMOEBA_PME_ORDER+kk] = index*stride;
             }
         }
-    
-        // Record the grid point.
-
-        _iGrid[ii]               = igrid;
     }
 }
 
@@ -5407,14 +5572,27 @@ void AmoebaReferencePmeMultipoleForce::spreadFixedMultipolesOntoGrid(const vecto
 
     transformMultipolesToFractionalCoordinates(particleData);
 
+    // Each thread spreads a block of atoms onto its own grid, then the grids are summed.
+
+    executeInParallel(&AmoebaReferencePmeMultipoleForce::spreadFixedMultipolesOntoThreadGrid);
+    if (_workspace->getNumThreads() > 1)
+        executeInParallel(&AmoebaReferencePmeMultipoleForce::sumThreadGrids);
+}
+
+void AmoebaReferencePmeMultipoleForce::spreadFixedMultipolesOntoThreadGrid(int threadIndex, int numThreads) 
+{
+
     // Clear the grid.
     
+    t_complex* grid = _workspace->getGrid(threadIndex);
     for (int gridIndex = 0; gridIndex < _totalGridSize; gridIndex++)
-        _pmeGrid[gridIndex] = t_complex(0, 0);
+        grid[gridIndex] = t_complex(0, 0);
     
     // Loop over atoms and spread them on the grid.
     
-    for (int atomIndex = 0; atomIndex < _numParticles; atomIndex++) {
+    int start = (threadIndex*_numParticles)/numThreads;
+    int end   = ((threadIndex+1)*_numParticles)/numThreads;
+    for (int atomIndex = start; atomIndex < end; atomIndex++) {
         RealOpenMM atomCharge       = _transformed[atomIndex].charge;
         RealVec atomDipole          = RealVec(_transformed[atomIndex].dipole[0],
                                               _transformed[atomIndex].dipole[1],
@@ -5426,21 +5604,31 @@ void AmoebaReferencePmeMultipoleForce::spreadFixedMultipolesOntoGrid(const vecto
         RealOpenMM atomQuadrupoleYY = _transformed[atomIndex].quadrupole[QYY];
         RealOpenMM atomQuadrupoleYZ = _transformed[atomIndex].quadrupole[QYZ];
         RealOpenMM atomQuadrupoleZZ = _transformed[atomIndex].quadrupole[QZZ];
-        IntVec& gridPoint = _iGrid[atomIndex];
+        const int* xIndex = &_gridIndex[0][atomIndex*AMOEBA_PME_ORDER];
+        const int* yIndex = &_gridIndex[1][atomIndex*AMOEBA_PME_ORDER];
+        const int* zIndex = &_gridIndex[2][atomIndex*AMOEBA_PME_ORDER];
+
+        // The terms that only depend on the y and z splines are the same for every x offset.
+
+        RealOpenMM term0[AMOEBA_PME_ORDER][AMOEBA_PME_ORDER];
+        RealOpenMM term1[AMOEBA_PME_ORDER][AMOEBA_PME_ORDER];
+        RealOpenMM term2[AMOEBA_PME_ORDER][AMOEBA_PME_ORDER];
+        for (int iy = 0; iy < AMOEBA_PME_ORDER; iy++) {
+            RealOpenMM4 u = _thetai[1][atomIndex*AMOEBA_PME_ORDER+iy];
+            for (int iz = 0; iz < AMOEBA_PME_ORDER; iz++) {
+                RealOpenMM4 v = _thetai[2][atomIndex*AMOEBA_PME_ORDER+iz];
+                term0[iy][iz] = atomCharge*u[0]*v[0] + atomDipole[1]*u[1]*v[0] + atomDipole[2]*u[0]*v[1] + atomQuadrupoleYY*u[2]*v[0] + atomQuadrupoleZZ*u[0]*v[2] + atomQuadrupoleYZ*u[1]*v[1];
+                term1[iy][iz] = atomDipole[0]*u[0]*v[0] + atomQuadrupoleXY*u[1]*v[0] + atomQuadrupoleXZ*u[0]*v[1];
+                term2[iy][iz] = atomQuadrupoleXX * u[0] * v[0];
+            }
+        }
         for (int ix = 0; ix < AMOEBA_PME_ORDER; ix++) {
-            int x = (gridPoint[0]+ix) % _pmeGridDimensions[0];
+            RealOpenMM4 t = _thetai[0][atomIndex*AMOEBA_PME_ORDER+ix];
             for (int iy = 0; iy < AMOEBA_PME_ORDER; iy++) {
-                int y = (gridPoint[1]+iy) % _pmeGridDimensions[1];
+                int xy = xIndex[ix]+yIndex[iy];
                 for (int iz = 0; iz < AMOEBA_PME_ORDER; iz++) {
-                    int z = (gridPoint[2]+iz) % _pmeGridDimensions[2];
-                    RealOpenMM4 t = _thetai[0][atomIndex*AMOEBA_PME_ORDER+ix];
-                    RealOpenMM4 u = _thetai[1][atomIndex*AMOEBA_PME_ORDER+iy];
-                    RealOpenMM4 v = _thetai[2][atomIndex*AMOEBA_PME_ORDER+iz];
-                    RealOpenMM term0 = atomCharge*u[0]*v[0] + atomDipole[1]*u[1]*v[0] + atomDipole[2]*u[0]*v[1] + atomQuadrupoleYY*u[2]*v[0] + atomQuadrupoleZZ*u[0]*v[2] + atomQuadrupoleYZ*u[1]*v[1];
-                    RealOpenMM term1 = atomDipole[0]*u[0]*v[0] + atomQuadrupoleXY*u[1]*v[0] + atomQuadrupoleXZ*u[0]*v[1];
-                    RealOpenMM term2 = atomQuadrupoleXX * u[0] * v[0];
-                    t_complex& gridValue = _pmeGrid[x*_pmeGridDimensions[1]*_pmeGridDimensions[2]+y*_pmeGridDimensions[2]+z];
-                    gridValue.re += term0*t[0] + term1*t[1] + term2*t[2];
+                    t_complex& gridValue = grid[xy+zIndex[iz]];
+                    gridValue.re += term0[iy][iz]*t[0] + term1[iy][iz]*t[1] + term2[iy][iz]*t[2];
                 }
             }
         }
@@ -5448,12 +5636,26 @@ void AmoebaReferencePmeMultipoleForce::spreadFixedMultipolesOntoGrid(const vecto
 }
 
 void AmoebaReferencePmeMultipoleForce::performAmoebaReciprocalConvolution()
+{
+
+    // The scale factors only depend on the box and the Ewald parameter, so they are
+    // recomputed only when one of those changes.
+
+    if (_workspace->updateEtermParameters(_periodicBoxVectors, _alphaEwald))
+        executeInParallel(&AmoebaReferencePmeMultipoleForce::computeReciprocalEterm);
+    executeInParallel(&AmoebaReferencePmeMultipoleForce::applyReciprocalEterm);
+}
+
+void AmoebaReferencePmeMultipoleForce::computeReciprocalEterm(int threadIndex, int numThreads)
 {
 
     RealOpenMM expFactor   = (M_PI*M_PI)/(_alphaEwald*_alphaEwald);
     RealOpenMM scaleFactor = 1.0/(M_PI*_periodicBoxVectors[0][0]*_periodicBoxVectors[1][1]*_periodicBoxVectors[2][2]);
+    vector<RealOpenMM>& eterm = _workspace->getEterm();
 
-    for (int index = 0; index < _totalGridSize; index++)
+    int start = (threadIndex*_totalGridSize)/numThreads;
+    int end   = ((threadIndex+1)*_totalGridSize)/numThreads;
+    for (int index = start; index < end; index++)
     {
         int kx = index/(_pmeGridDimensions[1]*_pmeGridDimensions[2]);
         int remainder = index-kx*_pmeGridDimensions[1]*_pmeGridDimensions[2];
@@ -5461,7 +5663,7 @@ void AmoebaReferencePmeMultipoleForce::performAmoebaReciprocalConvolution()
         int kz = remainder-ky*_pmeGridDimensions[2];
 
         if (kx == 0 && ky == 0 && kz == 0) {
-            _pmeGrid[index].re = _pmeGrid[index].im = 0.0;
+            eterm[index] = 0.0;
             continue;
         }
 
@@ -5479,19 +5681,36 @@ void AmoebaReferencePmeMultipoleForce::performAmoebaReciprocalConvolution()
 
         RealOpenMM m2 = mhx*mhx+mhy*mhy+mhz*mhz;
         RealOpenMM denom = m2*bx*by*bz;
-        RealOpenMM eterm = scaleFactor*EXP(-expFactor*m2)/denom;
+        eterm[index] = scaleFactor*EXP(-expFactor*m2)/denom;
+    }
+}
 
-        _pmeGrid[index].re *= eterm;
-        _pmeGrid[index].im *= eterm;
+void AmoebaReferencePmeMultipoleForce::applyReciprocalEterm(int threadIndex, int numThreads)
+{
+    const vector<RealOpenMM>& eterm = _workspace->getEterm();
+    int start = (threadIndex*_totalGridSize)/numThreads;
+    int end   = ((threadIndex+1)*_totalGridSize)/numThreads;
+    for (int index = start; index < end; index++) {
+        _pmeGrid[index].re *= eterm[index];
+        _pmeGrid[index].im *= eterm[index];
     }
 }
 
 void AmoebaReferencePmeMultipoleForce::computeFixedPotentialFromGrid()
+{
+    executeInParallel(&AmoebaReferencePmeMultipoleForce::computeFixedPotentialFromGrid);
+}
+
+void AmoebaReferencePmeMultipoleForce::computeFixedPotentialFromGrid(int threadIndex, int numThreads)
 {
     // extract the permanent multipole field at each site
 
-    for (int m = 0; m < _numParticles; m++) {
-        IntVec gridPoint = _iGrid[m];
+    int start = (threadIndex*_numParticles)/numThreads;
+    int end   = ((threadIndex+1)*_numParticles)/numThreads;
+    for (int m = start; m < end; m++) {
+        const int* xIndex = &_gridIndex[0][m*AMOEBA_PME_ORDER];
+        const int* yIndex = &_gridIndex[1][m*AMOEBA_PME_ORDER];
+        const int* zIndex = &_gridIndex[2][m*AMOEBA_PME_ORDER];
         RealOpenMM tuv000 = 0.0;
         RealOpenMM tuv001 = 0.0;
         RealOpenMM tuv010 = 0.0;
@@ -5513,7 +5732,7 @@ void AmoebaReferencePmeMultipoleForce::computeFixedPotentialFromGrid()
         RealOpenMM tuv012 = 0.0;
         RealOpenMM tuv111 = 0.0;
         for (int iz = 0; iz < AMOEBA_PME_ORDER; iz++) {
-            int k = gridPoint[2]+iz-(gridPoint[2]+iz >= _pmeGridDimensions[2] ? _pmeGridDimensions[2] : 0);
+            int k = zIndex[iz];
             RealOpenMM4 v = _thetai[2][m*AMOEBA_PME_ORDER+iz];
             RealOpenMM tu00 = 0.0;
             RealOpenMM tu10 = 0.0;
@@ -5526,12 +5745,11 @@ void AmoebaReferencePmeMultipoleForce::computeFixedPotentialFromGrid()
             RealOpenMM tu12 = 0.0;
             RealOpenMM tu03 = 0.0;
             for (int iy = 0; iy < AMOEBA_PME_ORDER; iy++) {
-                int j = gridPoint[1]+iy-(gridPoint[1]+iy >= _pmeGridDimensions[1] ? _pmeGridDimensions[1] : 0);
+                int jk = yIndex[iy]+k;
                 RealOpenMM4 u = _thetai[1][m*AMOEBA_PME_ORDER+iy];
                 RealOpenMM4 t = RealOpenMM4(0.0, 0.0, 0.0, 0.0);
                 for (int ix = 0; ix < AMOEBA_PME_ORDER; ix++) {
-                    int i = gridPoint[0]+ix-(gridPoint[0]+ix >= _pmeGridDimensions[0] ? _pmeGridDimensions[0] : 0);
-                    int gridIndex = i*_pmeGridDimensions[1]*_pmeGridDimensions[2] + j*_pmeGridDimensions[2] + k;
+                    int gridIndex = xIndex[ix]+jk;
                     RealOpenMM tq = _pmeGrid[gridIndex].re;
                     RealOpenMM4 tadd = _thetai[0][m*AMOEBA_PME_ORDER+ix];
                     t[0] += tq*tadd[0];
@@ -5603,40 +5821,70 @@ void AmoebaReferencePmeMultipoleForce::spreadInducedDipolesOnGrid(const vector<R
         for (int j = 0; j < 3; j++)
             cartToFrac[j][i] = _pmeGridDimensions[j]*_recipBoxVectors[i][j];
 
+    // Convert the dipoles to fractional coordinates.
+
+    _fractionalInducedDipole.resize(_numParticles);
+    _fractionalInducedDipolePolar.resize(_numParticles);
+    for (int atomIndex = 0; atomIndex < _numParticles; atomIndex++) {
+        _fractionalInducedDipole[atomIndex] = RealVec(inputInducedDipole[atomIndex][0]*cartToFrac[0][0] + inputInducedDipole[atomIndex][1]*cartToFrac[0][1] + inputInducedDipole[atomIndex][2]*cartToFrac[0][2],
+                                                      inputInducedDipole[atomIndex][0]*cartToFrac[1][0] + inputInducedDipole[atomIndex][1]*cartToFrac[1][1] + inputInducedDipole[atomIndex][2]*cartToFrac[1][2],
+                                                      inputInducedDipole[atomIndex][0]*cartToFrac[2][0] + inputInducedDipole[atomIndex][1]*cartToFrac[2][1] + inputInducedDipole[atomIndex][2]*cartToFrac[2][2]);
+        _fractionalInducedDipolePolar[atomIndex] = RealVec(inputInducedDipolePolar[atomIndex][0]*cartToFrac[0][0] + inputInducedDipolePolar[atomIndex][1]*cartToFrac[0][1] + inputInducedDipolePolar[atomIndex][2]*cartToFrac[0][2],
+                                                           inputInducedDipolePolar[atomIndex][0]*cartToFrac[1][0] + inputInducedDipolePolar[atomIndex][1]*cartToFrac[1][1] + inputInducedDipolePolar[atomIndex][2]*cartToFrac[1][2],
+                                                           inputInducedDipolePolar[atomIndex][0]*cartToFrac[2][0] + inputInducedDipolePolar[atomIndex][1]*cartToFrac[2][1] + inputInducedDipolePolar[atomIndex][2]*cartToFrac[2][2]);
+    }
+
+    // Each thread spreads a block of atoms onto its own grid, then the grids are summed.
+
+    executeInParallel(&AmoebaReferencePmeMultipoleForce::spreadInducedDipolesOnThreadGrid);
+    if (_workspace->getNumThreads() > 1)
+        executeInParallel(&AmoebaReferencePmeMultipoleForce::sumThreadGrids);
+}
+
+void AmoebaReferencePmeMultipoleForce::spreadInducedDipolesOnThreadGrid(int threadIndex, int numThreads) {
+
     // Clear the grid.
     
+    t_complex* grid = _workspace->getGrid(threadIndex);
     for (int gridIndex = 0; gridIndex < _totalGridSize; gridIndex++)
-        _pmeGrid[gridIndex] = t_complex(0, 0);
+        grid[gridIndex] = t_complex(0, 0);
     
-    // Loop over atoms and spread them on the grid.
+    // Loop over atoms and spread them on the grid.  The two sets of dipoles are spread onto the
+    // real and imaginary parts of the grid, so a single complex FFT transforms both of them.
     
-    for (int atomIndex = 0; atomIndex < _numParticles; atomIndex++) {
-        RealVec inducedDipole = RealVec(inputInducedDipole[atomIndex][0]*cartToFrac[0][0] + inputInducedDipole[atomIndex][1]*cartToFrac[0][1] + inputInducedDipole[atomIndex][2]*cartToFrac[0][2],
-                                        inputInducedDipole[atomIndex][0]*cartToFrac[1][0] + inputInducedDipole[atomIndex][1]*cartToFrac[1][1] + inputInducedDipole[atomIndex][2]*cartToFrac[1][2],
-                                        inputInducedDipole[atomIndex][0]*cartToFrac[2][0] + inputInducedDipole[atomIndex][1]*cartToFrac[2][1] + inputInducedDipole[atomIndex][2]*cartToFrac[2][2]);
-        RealVec inducedDipolePolar = RealVec(inputInducedDipolePolar[atomIndex][0]*cartToFrac[0][0] + inputInducedDipolePolar[atomIndex][1]*cartToFrac[0][1] + inputInducedDipolePolar[atomIndex][2]*cartToFrac[0][2],
-                                             inputInducedDipolePolar[atomIndex][0]*cartToFrac[1][0] + inputInducedDipolePolar[atomIndex][1]*cartToFrac[1][1] + inputInducedDipolePolar[atomIndex][2]*cartToFrac[1][2],
-                                             inputInducedDipolePolar[atomIndex][0]*cartToFrac[2][0] + inputInducedDipolePolar[atomIndex][1]*cartToFrac[2][1] + inputInducedDipolePolar[atomIndex][2]*cartToFrac[2][2]);
-        IntVec& gridPoint = _iGrid[atomIndex];
+    int start = (threadIndex*_numParticles)/numThreads;
+    int end   = ((threadIndex+1)*_numParticles)/numThreads;
+    for (int atomIndex = start; atomIndex < end; atomIndex++) {
+        const RealVec& inducedDipole = _fractionalInducedDipole[atomIndex];
+        const RealVec& inducedDipolePolar = _fractionalInducedDipolePolar[atomIndex];
+        const int* xIndex = &_gridIndex[0][atomIndex*AMOEBA_PME_ORDER];
+        const int* yIndex = &_gridIndex[1][atomIndex*AMOEBA_PME_ORDER];
+        const int* zIndex = &_gridIndex[2][atomIndex*AMOEBA_PME_ORDER];
+
+        // The terms that only depend on the y and z splines are the same for every x offset.
+
+        RealOpenMM term01[AMOEBA_PME_ORDER][AMOEBA_PME_ORDER];
+        RealOpenMM term11[AMOEBA_PME_ORDER][AMOEBA_PME_ORDER];
+        RealOpenMM term02[AMOEBA_PME_ORDER][AMOEBA_PME_ORDER];
+        RealOpenMM term12[AMOEBA_PME_ORDER][AMOEBA_PME_ORDER];
+        for (int iy = 0; iy < AMOEBA_PME_ORDER; iy++) {
+            RealOpenMM4 u = _thetai[1][atomIndex*AMOEBA_PME_ORDER+iy];
+            for (int iz = 0; iz < AMOEBA_PME_ORDER; iz++) {
+                RealOpenMM4 v = _thetai[2][atomIndex*AMOEBA_PME_ORDER+iz];
+                term01[iy][iz] = inducedDipole[1]*u[1]*v[0] + inducedDipole[2]*u[0]*v[1];
+                term11[iy][iz] = inducedDipole[0]*u[0]*v[0];
+                term02[iy][iz] = inducedDipolePolar[1]*u[1]*v[0] + inducedDipolePolar[2]*u[0]*v[1];
+                term12[iy][iz] = inducedDipolePolar[0]*u[0]*v[0];
+            }
+        }
         for (int ix = 0; ix < AMOEBA_PME_ORDER; ix++) {
-            int x = (gridPoint[0]+ix) % _pmeGridDimensions[0];
+            RealOpenMM4 t = _thetai[0][atomIndex*AMOEBA_PME_ORDER+ix];
             for (int iy = 0; iy < AMOEBA_PME_ORDER; iy++) {
-                int y = (gridPoint[1]+iy) % _pmeGridDimensions[1];
+                int xy = xIndex[ix]+yIndex[iy];
                 for (int iz = 0; iz < AMOEBA_PME_ORDER; iz++) {
-                    int z = (gridPoint[2]+iz) % _pmeGridDimensions[2];
-                    
-                    RealOpenMM4 t = _thetai[0][atomIndex*AMOEBA_PME_ORDER+ix];
-                    RealOpenMM4 u = _thetai[1][atomIndex*AMOEBA_PME_ORDER+iy];
-                    RealOpenMM4 v = _thetai[2][atomIndex*AMOEBA_PME_ORDER+iz];
-
-                    RealOpenMM term01 = inducedDipole[1]*u[1]*v[0] + inducedDipole[2]*u[0]*v[1];
-                    RealOpenMM term11 = inducedDipole[0]*u[0]*v[0];
-                    RealOpenMM term02 = inducedDipolePolar[1]*u[1]*v[0] + inducedDipolePolar[2]*u[0]*v[1];
-                    RealOpenMM term12 = inducedDipolePolar[0]*u[0]*v[0];
-
-                    t_complex& gridValue = _pmeGrid[x*_pmeGridDimensions[1]*_pmeGridDimensions[2]+y*_pmeGridDimensions[2]+z];
-                    gridValue.re += term01*t[0] + term11*t[1];
-                    gridValue.im += term02*t[0] + term12*t[1];
+                    t_complex& gridValue = grid[xy+zIndex[iz]];
+                    gridValue.re += term01[iy][iz]*t[0] + term11[iy][iz]*t[1];
+                    gridValue.im += term02[iy][iz]*t[0] + term12[iy][iz]*t[1];
                 }
             }
         }
@@ -5644,11 +5892,20 @@ void AmoebaReferencePmeMultipoleForce::spreadInducedDipolesOnGrid(const vector<R
 }
 
 void AmoebaReferencePmeMultipoleForce::computeInducedPotentialFromGrid()
+{
+    executeInParallel(&AmoebaReferencePmeMultipoleForce::computeInducedPotentialFromGrid);
+}
+
+void AmoebaReferencePmeMultipoleForce::computeInducedPotentialFromGrid(int threadIndex, int numThreads)
 {
     // extract the induced dipole field at each site
 
-    for (int m = 0; m < _numParticles; m++) {
-        IntVec gridPoint = _iGrid[m];
+    int start = (threadIndex*_numParticles)/numThreads;
+    int end   = ((threadIndex+1)*_numParticles)/numThreads;
+    for (int m = start; m < end; m++) {
+        const int* xIndex = &_gridIndex[0][m*AMOEBA_PME_ORDER];
+        const int* yIndex = &_gridIndex[1][m*AMOEBA_PME_ORDER];
+        const int* zIndex = &_gridIndex[2][m*AMOEBA_PME_ORDER];
         RealOpenMM tuv100_1 = 0.0;
         RealOpenMM tuv010_1 = 0.0;
         RealOpenMM tuv001_1 = 0.0;
@@ -5688,7 +5945,7 @@ void AmoebaReferencePmeMultipoleForce::computeInducedPotentialFromGrid()
         RealOpenMM tuv012 = 0.0;
         RealOpenMM tuv111 = 0.0;
         for (int iz = 0; iz < AMOEBA_PME_ORDER; iz++) {
-            int k = gridPoint[2]+iz-(gridPoint[2]+iz >= _pmeGridDimensions[2] ? _pmeGridDimensions[2] : 0);
+            int k = zIndex[iz];
             RealOpenMM4 v = _thetai[2][m*AMOEBA_PME_ORDER+iz];
             RealOpenMM tu00_1 = 0.0;
             RealOpenMM tu01_1 = 0.0;
@@ -5713,7 +5970,7 @@ void AmoebaReferencePmeMultipoleForce::computeInducedPotentialFromGrid()
             RealOpenMM tu12 = 0.0;
             RealOpenMM tu03 = 0.0;
             for (int iy = 0; iy < AMOEBA_PME_ORDER; iy++) {
-                int j = gridPoint[1]+iy-(gridPoint[1]+iy >= _pmeGridDimensions[1] ? _pmeGridDimensions[1] : 0);
+                int jk = yIndex[iy]+k;
                 RealOpenMM4 u = _thetai[1][m*AMOEBA_PME_ORDER+iy];
                 RealOpenMM t0_1 = 0.0;
                 RealOpenMM t1_1 = 0.0;
@@ -5723,8 +5980,7 @@ void AmoebaReferencePmeMultipoleForce::computeInducedPotentialFromGrid()
                 RealOpenMM t2_2 = 0.0;
                 RealOpenMM t3 = 0.0;
                 for (int ix = 0; ix < AMOEBA_PME_ORDER; ix++) {
-                    int i = gridPoint[0]+ix-(gridPoint[0]+ix >= _pmeGridDimensions[0] ? _pmeGridDimensions[0] : 0);
-                    int gridIndex = i*_pmeGridDimensions[1]*_pmeGridDimensions[2] + j*_pmeGridDimensions[2] + k;
+                    int gridIndex = xIndex[ix]+jk;
                     t_complex tq = _pmeGrid[gridIndex];
                     RealOpenMM4 tadd = _thetai[0][m*AMOEBA_PME_ORDER+ix];
                     t0_1 += tq.re*tadd[0];
@@ -6076,11 +6332,10 @@ void AmoebaReferencePmeMultipoleForce::calculateReciprocalSpaceInducedDipoleFiel
 {
     // Perform PME for the induced dipoles.
 
-    initializePmeGrid();
     spreadInducedDipolesOnGrid(*updateInducedDipoleFields[0].inducedDipoles, *updateInducedDipoleFields[1].inducedDipoles);
-    fftpack_exec_3d(_fftplan, FFTPACK_FORWARD, _pmeGrid, _pmeGrid);
+    _workspace->transformGrid(true);
     performAmoebaReciprocalConvolution();
-    fftpack_exec_3d(_fftplan, FFTPACK_BACKWARD, _pmeGrid, _pmeGrid);
+    _workspace->transformGrid(false);
     computeInducedPotentialFromGrid();
     recordInducedDipoleField(updateInducedDipoleFields[0].inducedDipoleField, updateInducedDipoleFields[1].inducedDipoleField);
 }
@@ -27,6 +27,7 @@
 #include "RealVec.h"
 #include "openmm/AmoebaMultipoleForce.h"
 #include "AmoebaReferenceGeneralizedKirkwoodForce.h"
+#include "openmm/internal/ThreadPool.h"
 #include <map>
 #include "fftpack.h"
 #include <complex>
@@ -1349,6 +1350,98 @@ private:
 
 };
 
+/**
+ * AmoebaReferencePmeWorkspace holds the resources for the reciprocal space part of AMOEBA PME that are
+ * expensive to create and can be reused from one force evaluation to the next: a pool of worker threads,
+ * the FFT plans, one grid for each thread to spread multipoles onto, and the table of reciprocal space
+ * scale factors.  The FFTs are done with FFTW if it was available when OpenMM was built, and with fftpack
+ * otherwise.
+ */
+class AmoebaReferencePmeWorkspace {
+
+public:
+
+    /**
+     * Constructor
+     * 
+     * @param gridDimensions    dimensions of the PME grid
+     * @param numThreads        number of threads to use.  If this is 0, the value of the OPENMM_CPU_THREADS
+     *                          environment variable is used if it is set, or the number of processors otherwise.
+     */
+    AmoebaReferencePmeWorkspace(const IntVec& gridDimensions, int numThreads = 0);
+ 
+    /**
+     * Destructor
+     * 
+     */
+    ~AmoebaReferencePmeWorkspace();
+ 
+    /**
+     * Get the dimensions of the PME grid.
+     *
+     * @return grid dimensions
+     */
+    const IntVec& getGridDimensions() const;
+
+    /**
+     * Get the number of threads used for the calculation.
+     *
+     * @return number of threads
+     */
+    int getNumThreads() const;
+
+    /**
+     * Get the pool of worker threads.
+     *
+     * @return thread pool
+     */
+    ThreadPool& getThreadPool();
+
+    /**
+     * Get the grid belonging to a thread.  The grid for thread 0 is the one transformGrid() acts on.
+     *
+     * @param threadIndex       index of the thread
+     *
+     * @return grid
+     */
+    t_complex* getGrid(int threadIndex = 0);
+
+    /**
+     * Perform an in-place FFT of the grid for thread 0.
+     *
+     * @param forward           if true perform a forward transform, otherwise a backward transform
+     */
+    void transformGrid(bool forward);
+
+    /**
+     * Get the table of reciprocal space scale factors for each point of the grid.
+     *
+     * @return scale factors
+     */
+    std::vector<RealOpenMM>& getEterm();
+
+    /**
+     * Record the box vectors and Ewald parameter the table of scale factors is about to be valid for.
+     *
+     * @param periodicBoxVectors  the periodic box vectors
+     * @param alphaEwald          the Ewald parameter
+     *
+     * @return true if these differ from the previous values, so the table needs to be recomputed
+     */
+    bool updateEtermParameters(const RealVec* periodicBoxVectors, RealOpenMM alphaEwald);
+
+private:
+
+    class FFTPlans;
+    IntVec _gridDimensions;
+    ThreadPool* _threads;
+    FFTPlans* _plans;
+    std::vector<t_complex*> _grids;
+    std::vector<RealOpenMM> _eterm;
+    RealVec _etermBoxVectors[3];
+    RealOpenMM _etermAlphaEwald;
+};
+
 class AmoebaReferencePmeMultipoleForce : public AmoebaReferenceMultipoleForce {
 
 public:
@@ -1421,8 +1514,20 @@ public:
      */
      void setPeriodicBoxSize(OpenMM::RealVec* vectors);
 
+    /**
+     * Set the workspace to use for the reciprocal space calculation.  The caller retains ownership of it,
+     * and it may be shared by any number of forces with the same PME grid dimensions.  If no workspace is
+     * set, the force creates its own.
+     *
+     * @param workspace  the workspace to use
+     */
+     void setWorkspace(AmoebaReferencePmeWorkspace* workspace);
+
 private:
 
+    class ComputeTask;
+    typedef void (AmoebaReferencePmeMultipoleForce::*ThreadMethod)(int threadIndex, int numThreads);
+
     static const int AMOEBA_PME_ORDER;
     static const RealOpenMM SQRT_PI;
 
@@ -1436,14 +1541,15 @@ private:
     int _totalGridSize;
     IntVec _pmeGridDimensions;
 
-    fftpack_t   _fftplan;
-
-    unsigned int _pmeGridSize;
+    AmoebaReferencePmeWorkspace* _workspace;
+    bool _ownsWorkspace;
     t_complex* _pmeGrid;
+    std::vector<RealVec> _fractionalInducedDipole;
+    std::vector<RealVec> _fractionalInducedDipolePolar;
  
     std::vector<RealOpenMM> _pmeBsplineModuli[3];
     std::vector<RealOpenMM4> _thetai[3];
-    std::vector<IntVec> _iGrid;
+    std::vector<int> _gridIndex[3];
     std::vector<RealOpenMM> _phi;
     std::vector<RealOpenMM> _phid;
     std::vector<RealOpenMM> _phip;
@@ -1458,9 +1564,19 @@ private:
     void resizePmeArrays();
 
     /**
-     * Zero Pme grid.
+     * Call a method on every thread in the workspace's thread pool, and wait until all of them have finished.
+     *
+     * @param method  the method to call; it is passed the index of the thread and the number of threads
+     */
+    void executeInParallel(ThreadMethod method);
+
+    /**
+     * Add the grids of all threads other than the first one to the grid of the first thread.
+     *
+     * @param threadIndex  index of the thread
+     * @param numThreads   number of threads
      */
-    void initializePmeGrid();
+    void sumThreadGrids(int threadIndex, int numThreads);
 
     /**
      * Modify input vector of differences in particle positions for periodic boundary conditions.
@@ -1541,12 +1657,36 @@ private:
      */
     void spreadFixedMultipolesOntoGrid(const vector<MultipoleParticleData>& particleData);
 
+    /**
+     * Spread the fixed multipoles of one thread's block of particles onto that thread's grid.
+     *
+     * @param threadIndex  index of the thread
+     * @param numThreads   number of threads
+     */
+    void spreadFixedMultipolesOntoThreadGrid(int threadIndex, int numThreads);
+
     /**
      * Perform reciprocal convolution.
      * 
      */
     void performAmoebaReciprocalConvolution();
 
+    /**
+     * Compute the reciprocal space scale factors for one thread's block of grid points.
+     *
+     * @param threadIndex  index of the thread
+     * @param numThreads   number of threads
+     */
+    void computeReciprocalEterm(int threadIndex, int numThreads);
+
+    /**
+     * Multiply one thread's block of grid points by the reciprocal space scale factors.
+     *
+     * @param threadIndex  index of the thread
+     * @param numThreads   number of threads
+     */
+    void applyReciprocalEterm(int threadIndex, int numThreads);
+
     /**
      * Compute reciprocal potential due fixed multipoles at each particle site.
      * 
@@ -1554,11 +1694,27 @@ private:
     void computeFixedPotentialFromGrid(void);
 
     /**
-     * Compute reciprocal potential due fixed multipoles at each particle site.
+     * Compute reciprocal potential due fixed multipoles at the sites in one thread's block of particles.
+     *
+     * @param threadIndex  index of the thread
+     * @param numThreads   number of threads
+     */
+    void computeFixedPotentialFromGrid(int threadIndex, int numThreads);
+
+    /**
+     * Compute reciprocal potential due induced dipoles at each particle site.
      * 
      */
     void computeInducedPotentialFromGrid();
 
+    /**
+     * Compute reciprocal potential due induced dipoles at the sites in one thread's block of particles.
+     *
+     * @param threadIndex  index of the thread
+     * @param numThreads   number of threads
+     */
+    void computeInducedPotentialFromGrid(int threadIndex, int numThreads);
+
     /**
      * Calculate reciprocal space energy and force due to fixed multipoles.
      * 
@@ -1628,6 +1784,14 @@ private:
     void spreadInducedDipolesOnGrid(const std::vector<RealVec>& inputInducedDipole,
                                     const std::vector<RealVec>& inputInducedDipolePolar);
 
+    /**
+     * Spread the induced dipoles of one thread's block of particles onto that thread's grid.
+     *
+     * @param threadIndex  index of the thread
+     * @param numThreads   number of threads
+     */
+    void spreadInducedDipolesOnThreadGrid(int threadIndex, int numThreads);
+
     /**
      * Calculate induced dipole fields.
      * 
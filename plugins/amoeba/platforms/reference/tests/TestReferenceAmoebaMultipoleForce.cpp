@@ -581,6 +581,23 @@ static void setupAndGetForcesEnergyMultipoleWater(AmoebaMultipoleForce::Nonbonde
     energy                           = state.getPotentialEnergy();
 }
 
+// check that a PME grid smaller than the interpolation order is rejected
+
+static void testSmallPmeGrid() {
+
+    std::vector<Vec3> forces;
+    double energy;
+    bool threwException = false;
+    try {
+        setupAndGetForcesEnergyMultipoleWater(AmoebaMultipoleForce::PME, AmoebaMultipoleForce::Direct,
+                                              0.70, 4, forces, energy);
+    }
+    catch (const OpenMMException& ex) {
+        threwException = true;
+    }
+    ASSERT(threwException);
+}
+
 // test multipole direct polarization using PME for box of water
 
 static void testMultipoleWaterPMEDirectPolarization() {
@@ -2892,6 +2909,7 @@ int main(int numberOfArguments, char* argv[]) {
 
         testMultipoleWaterPMEDirectPolarization();
         testMultipoleWaterPMEMutualPolarization();
+        testSmallPmeGrid();
 
         // check validation of traceless/symmetric quadrupole tensor
 
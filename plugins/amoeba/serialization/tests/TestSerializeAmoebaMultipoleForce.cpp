@@ -33,6 +33,7 @@
 #include "openmm/internal/AssertionUtilities.h"
 #include "openmm/AmoebaMultipoleForce.h"
 #include "openmm/serialization/XmlSerializer.h"
+#include "openmm/serialization/BinarySerializer.h"
 #include <iostream>
 #include <sstream>
 #include <stdlib.h>
@@ -187,6 +188,18 @@ void testSerialization() {
             }
         }
     }
+
+    // Serializing it in binary format should produce an identical force.
+
+    stringstream binaryBuffer;
+    BinarySerializer::serialize<AmoebaMultipoleForce>(&force1, "Force", binaryBuffer);
+    AmoebaMultipoleForce* binaryCopy = BinarySerializer::deserialize<AmoebaMultipoleForce>(binaryBuffer);
+    stringstream xml1, xml2;
+    XmlSerializer::serialize<AmoebaMultipoleForce>(&force1, "Force", xml1);
+    XmlSerializer::serialize<AmoebaMultipoleForce>(binaryCopy, "Force", xml2);
+    ASSERT_EQUAL(xml1.str(), xml2.str());
+    ASSERT(binaryBuffer.str().size() < xml1.str().size());
+    delete binaryCopy;
 }
 
 int main() {
@@ -0,0 +1,72 @@
+/* -------------------------------------------------------------------------- *
+ *                              OpenMMDrude                                   *
+ * -------------------------------------------------------------------------- *
+ * This is part of the OpenMM molecular simulation toolkit originating from   *
+ * Simbios, the NIH National Center for Physics-Based Simulation of           *
+ * Biological Structures at Stanford, funded under the NIH Roadmap for        *
+ * Medical Research, grant U54 GM072970. See https://simtk.org.               *
+ *                                                                            *
+ * Portions copyright (c) 2016 Stanford University and the Authors.           *
+ * Authors: Peter Eastman                                                     *
+ * Contributors:                                                              *
+ *                                                                            *
+ * This program is free software: you can redistribute it and/or modify       *
+ * it under the terms of the GNU Lesser General Public License as published   *
+ * by the Free Software Foundation, either version 3 of the License, or       *
+ * (at your option) any later version.                                        *
+ *                                                                            *
+ * This program is distributed in the hope that it will be useful,            *
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of             *
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the              *
+ * GNU Lesser General Public License for more details.                        *
+ *                                                                            *
+ * You should have received a copy of the GNU Lesser General Public License   *
+ * along with this program.  If not, see <http://www.gnu.org/licenses/>.      *
+ * -------------------------------------------------------------------------- */
+
+#include "CpuDrudeKernelFactory.h"
+#include "CpuDrudeKernels.h"
+#include "CpuPlatform.h"
+#include "openmm/internal/ContextImpl.h"
+#include "openmm/OpenMMException.h"
+
+using namespace OpenMM;
+
+extern "C" OPENMM_EXPORT void registerPlatforms() {
+}
+
+extern "C" OPENMM_EXPORT void registerKernelFactories() {
+    try {
+        Platform& platform = Platform::getPlatformByName("CPU");
+        CpuDrudeKernelFactory* factory = new CpuDrudeKernelFactory();
+        platform.registerKernelFactory(CalcDrudeForceKernel::Name(), factory);
+        platform.registerKernelFactory(IntegrateDrudeLangevinStepKernel::Name(), factory);
+        platform.registerKernelFactory(IntegrateDrudeSCFStepKernel::Name(), factory);
+    }
+    catch (std::exception ex) {
+        // Ignore
+    }
+}
+
+extern "C" OPENMM_EXPORT void registerDrudeCpuKernelFactories() {
+    try {
+        Platform::getPlatformByName("CPU");
+    }
+    catch (...) {
+        if (CpuPlatform::isProcessorSupported())
+            Platform::registerPlatform(new CpuPlatform());
+    }
+    registerKernelFactories();
+}
+
+KernelImpl* CpuDrudeKernelFactory::createKernelImpl(std::string name, const Platform& platform, ContextImpl& context) const {
+    ReferencePlatform::PlatformData& refData = *static_cast<ReferencePlatform::PlatformData*>(context.getPlatformData());
+    CpuPlatform::PlatformData& data = CpuPlatform::getPlatformData(context);
+    if (name == CalcDrudeForceKernel::Name())
+        return new CpuCalcDrudeForceKernel(name, platform, data);
+    if (name == IntegrateDrudeLangevinStepKernel::Name())
+        return new CpuIntegrateDrudeLangevinStepKernel(name, platform, refData, data);
+    if (name == IntegrateDrudeSCFStepKernel::Name())
+        return new CpuIntegrateDrudeSCFStepKernel(name, platform, refData, data);
+    throw OpenMMException((std::string("Tried to create kernel with illegal kernel name '")+name+"'").c_str());
+}
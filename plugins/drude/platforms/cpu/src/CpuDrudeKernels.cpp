@@ -0,0 +1,717 @@
+/* -------------------------------------------------------------------------- *
+ *                                   OpenMM                                   *
+ * -------------------------------------------------------------------------- *
+ * This is part of the OpenMM molecular simulation toolkit originating from   *
+ * Simbios, the NIH National Center for Physics-Based Simulation of           *
+ * Biological Structures at Stanford, funded under the NIH Roadmap for        *
+ * Medical Research, grant U54 GM072970. See https://simtk.org.               *
+ *                                                                            *
+ * Portions copyright (c) 2016 Stanford University and the Authors.           *
+ * Authors: Peter Eastman                                                     *
+ * Contributors:                                                              *
+ *                                                                            *
+ * Permission is hereby granted, free of charge, to any person obtaining a    *
+ * copy of this software and associated documentation files (the "Software"), *
+ * to deal in the Software without restriction, including without limitation  *
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense,   *
+ * and/or sell copies of the Software, and to permit persons to whom the      *
+ * Software is furnished to do so, subject to the following conditions:       *
+ *                                                                            *
+ * The above copyright notice and this permission notice shall be included in *
+ * all copies or substantial portions of the Software.                        *
+ *                                                                            *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR *
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   *
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    *
+ * THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,    *
+ * DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR      *
+ * OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE  *
+ * USE OR OTHER DEALINGS IN THE SOFTWARE.                                     *
+ * -------------------------------------------------------------------------- */
+
+#include "CpuDrudeKernels.h"
+#include "openmm/OpenMMException.h"
+#include "openmm/internal/ContextImpl.h"
+#include "ReferenceBondIxn.h"
+#include "ReferenceConstraints.h"
+#include "ReferenceVirtualSites.h"
+#include "SimTKOpenMMUtilities.h"
+#include <set>
+
+using namespace OpenMM;
+using namespace std;
+
+static vector<RealVec>& extractPositions(ContextImpl& context) {
+    ReferencePlatform::PlatformData* data = reinterpret_cast<ReferencePlatform::PlatformData*>(context.getPlatformData());
+    return *((vector<RealVec>*) data->positions);
+}
+
+static vector<RealVec>& extractVelocities(ContextImpl& context) {
+    ReferencePlatform::PlatformData* data = reinterpret_cast<ReferencePlatform::PlatformData*>(context.getPlatformData());
+    return *((vector<RealVec>*) data->velocities);
+}
+
+static vector<RealVec>& extractForces(ContextImpl& context) {
+    ReferencePlatform::PlatformData* data = reinterpret_cast<ReferencePlatform::PlatformData*>(context.getPlatformData());
+    return *((vector<RealVec>*) data->forces);
+}
+
+static ReferenceConstraints& extractConstraints(ContextImpl& context) {
+    ReferencePlatform::PlatformData* data = reinterpret_cast<ReferencePlatform::PlatformData*>(context.getPlatformData());
+    return *(ReferenceConstraints*) data->constraints;
+}
+
+static double computeShiftedKineticEnergy(ContextImpl& context, vector<double>& inverseMasses, double timeShift) {
+    const System& system = context.getSystem();
+    int numParticles = system.getNumParticles();
+    vector<RealVec>& posData = extractPositions(context);
+    vector<RealVec>& velData = extractVelocities(context);
+    vector<RealVec>& forceData = extractForces(context);
+    
+    // Compute the shifted velocities.
+    
+    vector<RealVec> shiftedVel(numParticles);
+    for (int i = 0; i < numParticles; ++i) {
+        if (inverseMasses[i] > 0)
+            shiftedVel[i] = velData[i]+forceData[i]*(timeShift*inverseMasses[i]);
+        else
+            shiftedVel[i] = velData[i];
+    }
+    
+    // Apply constraints to them.
+    
+    extractConstraints(context).applyToVelocities(posData, shiftedVel, inverseMasses, 1e-4);
+    
+    // Compute the kinetic energy.
+    
+    double energy = 0.0;
+    for (int i = 0; i < numParticles; ++i)
+        if (inverseMasses[i] > 0)
+            energy += (shiftedVel[i].dot(shiftedVel[i]))/inverseMasses[i];
+    return 0.5*energy;
+}
+
+/**
+ * This computes the harmonic springs connecting a Drude particle to its parent.  The atoms are the Drude particle,
+ * its parent, and the two pairs of particles defining the anisotropic directions.  The parameters are the spring
+ * constants k1, k2, and k3.  An anisotropic term is omitted when its spring constant is 0.
+ */
+class DrudeSpringIxn : public ReferenceBondIxn {
+public:
+    void calculateBondIxn(int* atomIndices, vector<RealVec>& atomCoordinates, RealOpenMM* parameters, vector<RealVec>& forces, RealOpenMM* totalEnergy) const {
+        int p = atomIndices[0];
+        int p1 = atomIndices[1];
+        int p2 = atomIndices[2];
+        int p3 = atomIndices[3];
+        int p4 = atomIndices[4];
+        RealOpenMM k1 = parameters[0];
+        RealOpenMM k2 = parameters[1];
+        RealOpenMM k3 = parameters[2];
+        RealOpenMM energy = 0;
+        
+        // Compute the isotropic force.
+        
+        RealVec delta = atomCoordinates[p]-atomCoordinates[p1];
+        RealOpenMM r2 = delta.dot(delta);
+        energy += 0.5*k3*r2;
+        forces[p] -= delta*k3;
+        forces[p1] += delta*k3;
+        
+        // Compute the first anisotropic force.
+        
+        if (k1 != 0) {
+            RealVec dir = atomCoordinates[p1]-atomCoordinates[p2];
+            RealOpenMM invDist = 1.0/sqrt(dir.dot(dir));
+            dir *= invDist;
+            RealOpenMM rprime = dir.dot(delta);
+            energy += 0.5*k1*rprime*rprime;
+            RealVec f1 = dir*(k1*rprime); 
+            RealVec f2 = (delta-dir*rprime)*(k1*rprime*invDist);
+            forces[p] -= f1;
+            forces[p1] += f1-f2;
+            forces[p2] += f2;
+        }
+        
+        // Compute the second anisotropic force.
+        
+        if (k2 != 0) {
+            RealVec dir = atomCoordinates[p3]-atomCoordinates[p4];
+            RealOpenMM invDist = 1.0/sqrt(dir.dot(dir));
+            dir *= invDist;
+            RealOpenMM rprime = dir.dot(delta);
+            energy += 0.5*k2*rprime*rprime;
+            RealVec f1 = dir*(k2*rprime);
+            RealVec f2 = (delta-dir*rprime)*(k2*rprime*invDist);
+            forces[p] -= f1;
+            forces[p1] += f1;
+            forces[p3] -= f2;
+            forces[p4] += f2;
+        }
+        if (totalEnergy != NULL)
+            *totalEnergy += energy;
+    }
+};
+
+/**
+ * This computes the screened interaction between two bonded dipoles.  The atoms are the Drude particle and parent
+ * of the first dipole, followed by those of the second dipole.  The parameters are the product of the two charges
+ * and the screening scale factor.
+ */
+class DrudeScreenedPairIxn : public ReferenceBondIxn {
+public:
+    void calculateBondIxn(int* atomIndices, vector<RealVec>& atomCoordinates, RealOpenMM* parameters, vector<RealVec>& forces, RealOpenMM* totalEnergy) const {
+        RealOpenMM uscale = parameters[1];
+        RealOpenMM energy = 0;
+        for (int j = 0; j < 2; j++)
+            for (int k = 0; k < 2; k++) {
+                int p1 = atomIndices[j];
+                int p2 = atomIndices[2+k];
+                RealOpenMM chargeProduct = parameters[0]*(j == k ? 1 : -1);
+                RealVec delta = atomCoordinates[p1]-atomCoordinates[p2];
+                RealOpenMM r = sqrt(delta.dot(delta));
+                RealOpenMM u = r*uscale;
+                RealOpenMM screening = 1.0 - (1.0+0.5*u)*exp(-u);
+                energy += ONE_4PI_EPS0*chargeProduct*screening/r;
+                RealVec f = delta*(ONE_4PI_EPS0*chargeProduct/(r*r))*(screening/r-0.5*(1+u)*exp(-u)*uscale);
+                forces[p1] += f;
+                forces[p2] -= f;
+            }
+        if (totalEnergy != NULL)
+            *totalEnergy += energy;
+    }
+};
+
+CpuCalcDrudeForceKernel::~CpuCalcDrudeForceKernel() {
+    if (particleIndexArray != NULL) {
+        for (int i = 0; i < numParticles; i++) {
+            delete[] particleIndexArray[i];
+            delete[] particleParamArray[i];
+        }
+        delete[] particleIndexArray;
+        delete[] particleParamArray;
+    }
+    if (pairIndexArray != NULL) {
+        for (int i = 0; i < numPairs; i++) {
+            delete[] pairIndexArray[i];
+            delete[] pairParamArray[i];
+        }
+        delete[] pairIndexArray;
+        delete[] pairParamArray;
+    }
+}
+
+void CpuCalcDrudeForceKernel::initialize(const System& system, const DrudeForce& force) {
+    // Initialize particle parameters.  Missing particles for the anisotropic terms are replaced by the
+    // parent particle so CpuBondForce sees only valid indices.
+    
+    numParticles = force.getNumParticles();
+    particle.resize(numParticles);
+    particle1.resize(numParticles);
+    particle2.resize(numParticles);
+    particle3.resize(numParticles);
+    particle4.resize(numParticles);
+    charge.resize(numParticles);
+    polarizability.resize(numParticles);
+    particleIndexArray = new int*[numParticles];
+    particleParamArray = new RealOpenMM*[numParticles];
+    for (int i = 0; i < numParticles; i++) {
+        double aniso12, aniso34;
+        force.getParticleParameters(i, particle[i], particle1[i], particle2[i], particle3[i], particle4[i], charge[i], polarizability[i], aniso12, aniso34);
+        bool hasAniso34 = (particle3[i] != -1 && particle4[i] != -1);
+        particleIndexArray[i] = new int[5];
+        particleIndexArray[i][0] = particle[i];
+        particleIndexArray[i][1] = particle1[i];
+        particleIndexArray[i][2] = (particle2[i] == -1 ? particle1[i] : particle2[i]);
+        particleIndexArray[i][3] = (hasAniso34 ? particle3[i] : particle1[i]);
+        particleIndexArray[i][4] = (hasAniso34 ? particle4[i] : particle1[i]);
+        particleParamArray[i] = new RealOpenMM[3];
+        setParticleParameters(i, particle2[i], particle3[i], particle4[i], charge[i], polarizability[i], aniso12, aniso34);
+    }
+    particleForce.initialize(system.getNumParticles(), numParticles, 5, particleIndexArray, data.threads);
+    
+    // Initialize screened pair parameters.
+    
+    numPairs = force.getNumScreenedPairs();
+    pairIndexArray = new int*[numPairs];
+    pairParamArray = new RealOpenMM*[numPairs];
+    for (int i = 0; i < numPairs; i++) {
+        int dipole1, dipole2;
+        double thole;
+        force.getScreenedPairParameters(i, dipole1, dipole2, thole);
+        pairIndexArray[i] = new int[4];
+        pairIndexArray[i][0] = particle[dipole1];
+        pairIndexArray[i][1] = particle1[dipole1];
+        pairIndexArray[i][2] = particle[dipole2];
+        pairIndexArray[i][3] = particle1[dipole2];
+        pairParamArray[i] = new RealOpenMM[2];
+        setPairParameters(i, dipole1, dipole2, thole);
+    }
+    pairForce.initialize(system.getNumParticles(), numPairs, 4, pairIndexArray, data.threads);
+}
+
+void CpuCalcDrudeForceKernel::setParticleParameters(int index, int p2, int p3, int p4, double charge, double polarizability, double aniso12, double aniso34) {
+    RealOpenMM a1 = (p2 == -1 ? 1 : aniso12);
+    RealOpenMM a2 = (p3 == -1 || p4 == -1 ? 1 : aniso34);
+    RealOpenMM a3 = 3-a1-a2;
+    RealOpenMM k3 = ONE_4PI_EPS0*charge*charge/(polarizability*a3);
+    RealOpenMM k1 = ONE_4PI_EPS0*charge*charge/(polarizability*a1) - k3;
+    RealOpenMM k2 = ONE_4PI_EPS0*charge*charge/(polarizability*a2) - k3;
+    particleParamArray[index][0] = (p2 == -1 ? 0 : k1);
+    particleParamArray[index][1] = (p3 == -1 || p4 == -1 ? 0 : k2);
+    particleParamArray[index][2] = k3;
+}
+
+void CpuCalcDrudeForceKernel::setPairParameters(int index, int dipole1, int dipole2, double thole) {
+    pairParamArray[index][0] = charge[dipole1]*charge[dipole2];
+    pairParamArray[index][1] = thole/pow(polarizability[dipole1]*polarizability[dipole2], 1.0/6.0);
+}
+
+double CpuCalcDrudeForceKernel::execute(ContextImpl& context, bool includeForces, bool includeEnergy) {
+    vector<RealVec>& posData = extractPositions(context);
+    vector<RealVec>& forceData = extractForces(context);
+    RealOpenMM energy = 0;
+    DrudeSpringIxn springIxn;
+    DrudeScreenedPairIxn pairIxn;
+    particleForce.calculateForce(posData, particleParamArray, forceData, includeEnergy ? &energy : NULL, springIxn);
+    pairForce.calculateForce(posData, pairParamArray, forceData, includeEnergy ? &energy : NULL, pairIxn);
+    return energy;
+}
+
+void CpuCalcDrudeForceKernel::copyParametersToContext(ContextImpl& context, const DrudeForce& force) {
+    if (force.getNumParticles() != numParticles)
+        throw OpenMMException("updateParametersInContext: The number of Drude particles has changed");
+    if (force.getNumScreenedPairs() != numPairs)
+        throw OpenMMException("updateParametersInContext: The number of screened pairs has changed");
+    for (int i = 0; i < numParticles; i++) {
+        int p, p1, p2, p3, p4;
+        double aniso12, aniso34;
+        force.getParticleParameters(i, p, p1, p2, p3, p4, charge[i], polarizability[i], aniso12, aniso34);
+        if (p != particle[i] || p1 != particle1[i] || p2 != particle2[i] || p3 != particle3[i] || p4 != particle4[i])
+            throw OpenMMException("updateParametersInContext: A particle index has changed");
+        setParticleParameters(i, p2, p3, p4, charge[i], polarizability[i], aniso12, aniso34);
+    }
+    for (int i = 0; i < numPairs; i++) {
+        int dipole1, dipole2;
+        double thole;
+        force.getScreenedPairParameters(i, dipole1, dipole2, thole);
+        if (particle[dipole1] != pairIndexArray[i][0] || particle1[dipole1] != pairIndexArray[i][1] ||
+                particle[dipole2] != pairIndexArray[i][2] || particle1[dipole2] != pairIndexArray[i][3])
+            throw OpenMMException("updateParametersInContext: A particle index for a screened pair has changed");
+        setPairParameters(i, dipole1, dipole2, thole);
+    }
+}
+
+class CpuIntegrateDrudeLangevinStepKernel::Update1Task : public ThreadPool::Task {
+public:
+    Update1Task(CpuIntegrateDrudeLangevinStepKernel& owner) : owner(owner) {
+    }
+    void execute(ThreadPool& threads, int threadIndex) {
+        owner.threadUpdate1(threadIndex);
+    }
+    CpuIntegrateDrudeLangevinStepKernel& owner;
+};
+
+class CpuIntegrateDrudeLangevinStepKernel::Update2Task : public ThreadPool::Task {
+public:
+    Update2Task(CpuIntegrateDrudeLangevinStepKernel& owner) : owner(owner) {
+    }
+    void execute(ThreadPool& threads, int threadIndex) {
+        owner.threadUpdate2(threadIndex);
+    }
+    CpuIntegrateDrudeLangevinStepKernel& owner;
+};
+
+class CpuIntegrateDrudeLangevinStepKernel::Update3Task : public ThreadPool::Task {
+public:
+    Update3Task(CpuIntegrateDrudeLangevinStepKernel& owner) : owner(owner) {
+    }
+    void execute(ThreadPool& threads, int threadIndex) {
+        owner.threadUpdate3(threadIndex);
+    }
+    CpuIntegrateDrudeLangevinStepKernel& owner;
+};
+
+CpuIntegrateDrudeLangevinStepKernel::~CpuIntegrateDrudeLangevinStepKernel() {
+}
+
+void CpuIntegrateDrudeLangevinStepKernel::initialize(const System& system, const DrudeLangevinIntegrator& integrator, const DrudeForce& force) {
+    data.random.initialize(integrator.getRandomNumberSeed(), data.threads.getNumThreads());
+    
+    // Identify particle pairs and ordinary particles.
+    
+    set<int> particles;
+    for (int i = 0; i < system.getNumParticles(); i++) {
+        particles.insert(i);
+        double mass = system.getParticleMass(i);
+        particleMass.push_back(mass);
+        particleInvMass.push_back(mass == 0.0 ? 0.0 : 1.0/mass);
+    }
+    for (int i = 0; i < force.getNumParticles(); i++) {
+        int p, p1, p2, p3, p4;
+        double charge, polarizability, aniso12, aniso34;
+        force.getParticleParameters(i, p, p1, p2, p3, p4, charge, polarizability, aniso12, aniso34);
+        particles.erase(p);
+        particles.erase(p1);
+        pairParticles.push_back(make_pair(p, p1));
+        double m1 = system.getParticleMass(p);
+        double m2 = system.getParticleMass(p1);
+        pairInvTotalMass.push_back(1.0/(m1+m2));
+        pairInvReducedMass.push_back((m1+m2)/(m1*m2));
+    }
+    normalParticles.insert(normalParticles.begin(), particles.begin(), particles.end());
+    xPrime.resize(system.getNumParticles());
+}
+
+void CpuIntegrateDrudeLangevinStepKernel::execute(ContextImpl& context, const DrudeLangevinIntegrator& integrator) {
+    vector<RealVec>& posData = extractPositions(context);
+    vector<RealVec>& velData = extractVelocities(context);
+    vector<RealVec>& forceData = extractForces(context);
+    
+    // Record the parameters for the threads.
+    
+    pos = &posData[0];
+    vel = &velData[0];
+    force = &forceData[0];
+    dt = integrator.getStepSize();
+    vscale = exp(-integrator.getStepSize()*integrator.getFriction());
+    fscale = (1-vscale)/integrator.getFriction();
+    const RealOpenMM kT = BOLTZ*integrator.getTemperature();
+    noisescale = sqrt(2*kT*integrator.getFriction())*sqrt(0.5*(1-vscale*vscale)/integrator.getFriction());
+    vscaleDrude = exp(-integrator.getStepSize()*integrator.getDrudeFriction());
+    fscaleDrude = (1-vscaleDrude)/integrator.getDrudeFriction();
+    const RealOpenMM kTDrude = BOLTZ*integrator.getDrudeTemperature();
+    noisescaleDrude = sqrt(2*kTDrude*integrator.getDrudeFriction())*sqrt(0.5*(1-vscaleDrude*vscaleDrude)/integrator.getDrudeFriction());
+    
+    // Update the velocities and compute the new positions.
+    
+    Update1Task task1(*this);
+    data.threads.execute(task1);
+    data.threads.waitForThreads();
+    Update2Task task2(*this);
+    data.threads.execute(task2);
+    data.threads.waitForThreads();
+    
+    // Apply constraints.
+    
+    extractConstraints(context).apply(posData, xPrime, particleInvMass, integrator.getConstraintTolerance());
+    
+    // Record the constrained positions and velocities.
+    
+    Update3Task task3(*this);
+    data.threads.execute(task3);
+    data.threads.waitForThreads();
+    applyHardWallConstraints(integrator);
+    ReferenceVirtualSites::computePositions(context.getSystem(), posData);
+    refData.time += integrator.getStepSize();
+    refData.stepCount++;
+}
+
+void CpuIntegrateDrudeLangevinStepKernel::threadUpdate1(int threadIndex) {
+    int numThreads = data.threads.getNumThreads();
+    
+    // Update velocities of ordinary particles.
+    
+    int start = threadIndex*normalParticles.size()/numThreads;
+    int end = (threadIndex+1)*normalParticles.size()/numThreads;
+    for (int i = start; i < end; i++) {
+        int index = normalParticles[i];
+        RealOpenMM invMass = particleInvMass[index];
+        if (invMass != 0.0) {
+            RealOpenMM sqrtInvMass = sqrt(invMass);
+            for (int j = 0; j < 3; j++)
+                vel[index][j] = vscale*vel[index][j] + fscale*invMass*force[index][j] + noisescale*sqrtInvMass*data.random.getGaussianRandom(threadIndex);
+        }
+    }
+    
+    // Update velocities of Drude particle pairs.
+    
+    start = threadIndex*pairParticles.size()/numThreads;
+    end = (threadIndex+1)*pairParticles.size()/numThreads;
+    for (int i = start; i < end; i++) {
+        int p1 = pairParticles[i].first;
+        int p2 = pairParticles[i].second;
+        RealOpenMM mass1fract = pairInvTotalMass[i]/particleInvMass[p1];
+        RealOpenMM mass2fract = pairInvTotalMass[i]/particleInvMass[p2];
+        RealOpenMM sqrtInvTotalMass = sqrt(pairInvTotalMass[i]);
+        RealOpenMM sqrtInvReducedMass = sqrt(pairInvReducedMass[i]);
+        RealVec cmVel = vel[p1]*mass1fract+vel[p2]*mass2fract;
+        RealVec relVel = vel[p2]-vel[p1];
+        RealVec cmForce = force[p1]+force[p2];
+        RealVec relForce = force[p2]*mass1fract - force[p1]*mass2fract;
+        for (int j = 0; j < 3; j++) {
+            cmVel[j] = vscale*cmVel[j] + fscale*pairInvTotalMass[i]*cmForce[j] + noisescale*sqrtInvTotalMass*data.random.getGaussianRandom(threadIndex);
+            relVel[j] = vscaleDrude*relVel[j] + fscaleDrude*pairInvReducedMass[i]*relForce[j] + noisescaleDrude*sqrtInvReducedMass*data.random.getGaussianRandom(threadIndex);
+        }
+        vel[p1] = cmVel-relVel*mass2fract;
+        vel[p2] = cmVel+relVel*mass1fract;
+    }
+}
+
+void CpuIntegrateDrudeLangevinStepKernel::threadUpdate2(int threadIndex) {
+    int numParticles = particleInvMass.size();
+    int start = threadIndex*numParticles/data.threads.getNumThreads();
+    int end = (threadIndex+1)*numParticles/data.threads.getNumThreads();
+    for (int i = start; i < end; i++) {
+        if (particleInvMass[i] != 0.0)
+            xPrime[i] = pos[i]+vel[i]*dt;
+        else
+            xPrime[i] = pos[i];
+    }
+}
+
+void CpuIntegrateDrudeLangevinStepKernel::threadUpdate3(int threadIndex) {
+    int numParticles = particleInvMass.size();
+    int start = threadIndex*numParticles/data.threads.getNumThreads();
+    int end = (threadIndex+1)*numParticles/data.threads.getNumThreads();
+    RealOpenMM dtInv = 1.0/dt;
+    for (int i = start; i < end; i++) {
+        if (particleInvMass[i] != 0.0) {
+            vel[i] = (xPrime[i]-pos[i])*dtInv;
+            pos[i] = xPrime[i];
+        }
+    }
+}
+
+void CpuIntegrateDrudeLangevinStepKernel::applyHardWallConstraints(const DrudeLangevinIntegrator& integrator) {
+    const RealOpenMM maxDrudeDistance = integrator.getMaxDrudeDistance();
+    if (maxDrudeDistance <= 0)
+        return;
+    const RealOpenMM hardwallscaleDrude = sqrt(BOLTZ*integrator.getDrudeTemperature());
+    for (int i = 0; i < (int) pairParticles.size(); i++) {
+        int p1 = pairParticles[i].first;
+        int p2 = pairParticles[i].second;
+        RealVec delta = pos[p1]-pos[p2];
+        RealOpenMM r = sqrt(delta.dot(delta));
+        RealOpenMM rInv = 1/r;
+        if (rInv*maxDrudeDistance < 1.0) {
+            // The constraint has been violated, so make the inter-particle distance "bounce"
+            // off the hard wall.
+            
+            if (rInv*maxDrudeDistance < 0.5)
+                throw OpenMMException("Drude particle moved too far beyond hard wall constraint");
+            RealVec bondDir = delta*rInv;
+            RealVec vel1 = vel[p1];
+            RealVec vel2 = vel[p2];
+            RealOpenMM mass1 = particleMass[p1];
+            RealOpenMM mass2 = particleMass[p2];
+            RealOpenMM deltaR = r-maxDrudeDistance;
+            RealOpenMM deltaT = dt;
+            RealOpenMM dotvr1 = vel1.dot(bondDir);
+            RealVec vb1 = bondDir*dotvr1;
+            RealVec vp1 = vel1-vb1;
+            if (mass2 == 0) {
+                // The parent particle is massless, so move only the Drude particle.
+
+                if (dotvr1 != 0.0)
+                    deltaT = deltaR/abs(dotvr1);
+                if (deltaT > dt)
+                    deltaT = dt;
+                dotvr1 = -dotvr1*hardwallscaleDrude/(abs(dotvr1)*sqrt(mass1));
+                RealOpenMM dr = -deltaR + deltaT*dotvr1;
+                pos[p1] += bondDir*dr;
+                vel[p1] = vp1 + bondDir*dotvr1;
+            }
+            else {
+                // Move both particles.
+
+                RealOpenMM invTotalMass = pairInvTotalMass[i];
+                RealOpenMM dotvr2 = vel2.dot(bondDir);
+                RealVec vb2 = bondDir*dotvr2;
+                RealVec vp2 = vel2-vb2;
+                RealOpenMM vbCMass = (mass1*dotvr1 + mass2*dotvr2)*invTotalMass;
+                dotvr1 -= vbCMass;
+                dotvr2 -= vbCMass;
+                if (dotvr1 != dotvr2)
+                    deltaT = deltaR/abs(dotvr1-dotvr2);
+                if (deltaT > dt)
+                    deltaT = dt;
+                RealOpenMM vBond = hardwallscaleDrude/sqrt(mass1);
+                dotvr1 = -dotvr1*vBond*mass2*invTotalMass/abs(dotvr1);
+                dotvr2 = -dotvr2*vBond*mass1*invTotalMass/abs(dotvr2);
+                RealOpenMM dr1 = -deltaR*mass2*invTotalMass + deltaT*dotvr1;
+                RealOpenMM dr2 = deltaR*mass1*invTotalMass + deltaT*dotvr2;
+                dotvr1 += vbCMass;
+                dotvr2 += vbCMass;
+                pos[p1] += bondDir*dr1;
+                pos[p2] += bondDir*dr2;
+                vel[p1] = vp1 + bondDir*dotvr1;
+                vel[p2] = vp2 + bondDir*dotvr2;
+            }
+        }
+    }
+}
+
+double CpuIntegrateDrudeLangevinStepKernel::computeKineticEnergy(ContextImpl& context, const DrudeLangevinIntegrator& integrator) {
+    return computeShiftedKineticEnergy(context, particleInvMass, 0.5*integrator.getStepSize());
+}
+
+class CpuIntegrateDrudeSCFStepKernel::Update1Task : public ThreadPool::Task {
+public:
+    Update1Task(CpuIntegrateDrudeSCFStepKernel& owner) : owner(owner) {
+    }
+    void execute(ThreadPool& threads, int threadIndex) {
+        owner.threadUpdate1(threadIndex);
+    }
+    CpuIntegrateDrudeSCFStepKernel& owner;
+};
+
+class CpuIntegrateDrudeSCFStepKernel::Update2Task : public ThreadPool::Task {
+public:
+    Update2Task(CpuIntegrateDrudeSCFStepKernel& owner) : owner(owner) {
+    }
+    void execute(ThreadPool& threads, int threadIndex) {
+        owner.threadUpdate2(threadIndex);
+    }
+    CpuIntegrateDrudeSCFStepKernel& owner;
+};
+
+CpuIntegrateDrudeSCFStepKernel::~CpuIntegrateDrudeSCFStepKernel() {
+    if (minimizerPos != NULL)
+        lbfgs_free(minimizerPos);
+}
+
+void CpuIntegrateDrudeSCFStepKernel::initialize(const System& system, const DrudeSCFIntegrator& integrator, const DrudeForce& force) {
+    // Identify Drude particles.
+    
+    for (int i = 0; i < force.getNumParticles(); i++) {
+        int p, p1, p2, p3, p4;
+        double charge, polarizability, aniso12, aniso34;
+        force.getParticleParameters(i, p, p1, p2, p3, p4, charge, polarizability, aniso12, aniso34);
+        drudeParticles.push_back(p);
+    }
+
+    // Record particle masses.
+
+    for (int i = 0; i < system.getNumParticles(); i++) {
+        double mass = system.getParticleMass(i);
+        particleInvMass.push_back(mass == 0.0 ? 0.0 : 1.0/mass);
+    }
+    xPrime.resize(system.getNumParticles());
+    
+    // Initialize the energy minimizer.
+    
+    minimizerPos = lbfgs_malloc(drudeParticles.size()*3);
+    if (minimizerPos == NULL)
+        throw OpenMMException("DrudeSCFIntegrator: Failed to allocate memory");
+    lbfgs_parameter_init(&minimizerParams);
+    minimizerParams.linesearch = LBFGS_LINESEARCH_BACKTRACKING_STRONG_WOLFE;
+    if (sizeof(RealOpenMM) < 8)
+        minimizerParams.xtol = 1e-7;
+}
+
+void CpuIntegrateDrudeSCFStepKernel::execute(ContextImpl& context, const DrudeSCFIntegrator& integrator) {
+    vector<RealVec>& posData = extractPositions(context);
+    vector<RealVec>& velData = extractVelocities(context);
+    vector<RealVec>& forceData = extractForces(context);
+    
+    // Update the positions and velocities.
+    
+    pos = &posData[0];
+    vel = &velData[0];
+    force = &forceData[0];
+    dt = integrator.getStepSize();
+    Update1Task task1(*this);
+    data.threads.execute(task1);
+    data.threads.waitForThreads();
+        
+    // Apply constraints.
+    
+    extractConstraints(context).apply(posData, xPrime, particleInvMass, integrator.getConstraintTolerance());
+    
+    // Record the constrained positions and velocities.
+    
+    Update2Task task2(*this);
+    data.threads.execute(task2);
+    data.threads.waitForThreads();
+    
+    // Update the positions of virtual sites and Drude particles.
+    
+    ReferenceVirtualSites::computePositions(context.getSystem(), posData);
+    minimize(context, integrator.getMinimizationErrorTolerance());
+    refData.time += integrator.getStepSize();
+    refData.stepCount++;
+}
+
+void CpuIntegrateDrudeSCFStepKernel::threadUpdate1(int threadIndex) {
+    int numParticles = particleInvMass.size();
+    int start = threadIndex*numParticles/data.threads.getNumThreads();
+    int end = (threadIndex+1)*numParticles/data.threads.getNumThreads();
+    for (int i = start; i < end; i++) {
+        if (particleInvMass[i] != 0.0) {
+            vel[i] += force[i]*particleInvMass[i]*dt;
+            xPrime[i] = pos[i]+vel[i]*dt;
+        }
+        else
+            xPrime[i] = pos[i];
+    }
+}
+
+void CpuIntegrateDrudeSCFStepKernel::threadUpdate2(int threadIndex) {
+    int numParticles = particleInvMass.size();
+    int start = threadIndex*numParticles/data.threads.getNumThreads();
+    int end = (threadIndex+1)*numParticles/data.threads.getNumThreads();
+    RealOpenMM dtInv = 1.0/dt;
+    for (int i = start; i < end; i++) {
+        if (particleInvMass[i] != 0.0) {
+            vel[i] = (xPrime[i]-pos[i])*dtInv;
+            pos[i] = xPrime[i];
+        }
+    }
+}
+
+double CpuIntegrateDrudeSCFStepKernel::computeKineticEnergy(ContextImpl& context, const DrudeSCFIntegrator& integrator) {
+    return computeShiftedKineticEnergy(context, particleInvMass, 0.5*integrator.getStepSize());
+}
+
+struct MinimizerData {
+    ContextImpl& context;
+    vector<int>& drudeParticles;
+    MinimizerData(ContextImpl& context, vector<int>& drudeParticles) : context(context), drudeParticles(drudeParticles) {}
+};
+
+static lbfgsfloatval_t evaluate(void *instance, const lbfgsfloatval_t *x, lbfgsfloatval_t *g, const int n, const lbfgsfloatval_t step) {
+    MinimizerData* data = reinterpret_cast<MinimizerData*>(instance);
+    ContextImpl& context = data->context;
+    vector<int>& drudeParticles = data->drudeParticles;
+    int numDrudeParticles = drudeParticles.size();
+
+    // Compute the force and energy for this configuration.  Only the Drude particles move, and only by
+    // small amounts, so the CPU nonbonded kernel keeps using its existing neighbor list.
+
+    vector<RealVec>& pos = extractPositions(context);
+    vector<RealVec>& force = extractForces(context);
+    for (int i = 0; i < numDrudeParticles; i++)
+        pos[drudeParticles[i]] = RealVec(x[3*i], x[3*i+1], x[3*i+2]);
+    double energy = context.calcForcesAndEnergy(true, true);
+    for (int i = 0; i < numDrudeParticles; i++) {
+        RealVec f = force[drudeParticles[i]];
+        g[3*i] = -f[0];
+        g[3*i+1] = -f[1];
+        g[3*i+2] = -f[2];
+    }
+    return energy;
+}
+
+void CpuIntegrateDrudeSCFStepKernel::minimize(ContextImpl& context, double tolerance) {
+    // Record the initial positions and determine a normalization constant for scaling the tolerance.
+
+    vector<RealVec>& pos = extractPositions(context);
+    int numDrudeParticles = drudeParticles.size();
+    double norm = 0.0;
+    for (int i = 0; i < numDrudeParticles; i++) {
+        RealVec p = pos[drudeParticles[i]];
+        minimizerPos[3*i] = p[0];
+        minimizerPos[3*i+1] = p[1];
+        minimizerPos[3*i+2] = p[2];
+        norm += p.dot(p);
+    }
+    norm /= numDrudeParticles;
+    norm = (norm < 1 ? 1 : sqrt(norm));
+    minimizerParams.epsilon = tolerance/norm;
+    
+    // Perform the minimization.
+
+    lbfgsfloatval_t fx;
+    MinimizerData data(context, drudeParticles);
+    lbfgs(numDrudeParticles*3, minimizerPos, &fx, evaluate, NULL, &data, &minimizerParams);
+}
@@ -0,0 +1,216 @@
+#ifndef CPU_DRUDE_KERNELS_H_
+#define CPU_DRUDE_KERNELS_H_
+
+/* -------------------------------------------------------------------------- *
+ *                                   OpenMM                                   *
+ * -------------------------------------------------------------------------- *
+ * This is part of the OpenMM molecular simulation toolkit originating from   *
+ * Simbios, the NIH National Center for Physics-Based Simulation of           *
+ * Biological Structures at Stanford, funded under the NIH Roadmap for        *
+ * Medical Research, grant U54 GM072970. See https://simtk.org.               *
+ *                                                                            *
+ * Portions copyright (c) 2016 Stanford University and the Authors.           *
+ * Authors: Peter Eastman                                                     *
+ * Contributors:                                                              *
+ *                                                                            *
+ * Permission is hereby granted, free of charge, to any person obtaining a    *
+ * copy of this software and associated documentation files (the "Software"), *
+ * to deal in the Software without restriction, including without limitation  *
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense,   *
+ * and/or sell copies of the Software, and to permit persons to whom the      *
+ * Software is furnished to do so, subject to the following conditions:       *
+ *                                                                            *
+ * The above copyright notice and this permission notice shall be included in *
+ * all copies or substantial portions of the Software.                        *
+ *                                                                            *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR *
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   *
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    *
+ * THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,    *
+ * DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR      *
+ * OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE  *
+ * USE OR OTHER DEALINGS IN THE SOFTWARE.                                     *
+ * -------------------------------------------------------------------------- */
+
+#include "CpuBondForce.h"
+#include "CpuPlatform.h"
+#include "ReferencePlatform.h"
+#include "openmm/DrudeKernels.h"
+#include "RealVec.h"
+#include "lbfgs.h"
+#include <utility>
+#include <vector>
+
+namespace OpenMM {
+
+/**
+ * This kernel is invoked by DrudeForce to calculate the forces acting on the system and the energy of the system.
+ * The springs and screened pairs are divided between threads with CpuBondForce.
+ */
+class CpuCalcDrudeForceKernel : public CalcDrudeForceKernel {
+public:
+    CpuCalcDrudeForceKernel(std::string name, const Platform& platform, CpuPlatform::PlatformData& data) : CalcDrudeForceKernel(name, platform),
+            data(data), particleIndexArray(NULL), particleParamArray(NULL), pairIndexArray(NULL), pairParamArray(NULL) {
+    }
+    ~CpuCalcDrudeForceKernel();
+    /**
+     * Initialize the kernel.
+     * 
+     * @param system     the System this kernel will be applied to
+     * @param force      the DrudeForce this kernel will be used for
+     */
+    void initialize(const System& system, const DrudeForce& force);
+    /**
+     * Execute the kernel to calculate the forces and/or energy.
+     *
+     * @param context        the context in which to execute this kernel
+     * @param includeForces  true if forces should be calculated
+     * @param includeEnergy  true if the energy should be calculated
+     * @return the potential energy due to the force
+     */
+    double execute(ContextImpl& context, bool includeForces, bool includeEnergy);
+    /**
+     * Copy changed parameters over to a context.
+     *
+     * @param context    the context to copy parameters to
+     * @param force      the DrudeForce to copy the parameters from
+     */
+    void copyParametersToContext(ContextImpl& context, const DrudeForce& force);
+private:
+    void setParticleParameters(int index, int p2, int p3, int p4, double charge, double polarizability, double aniso12, double aniso34);
+    void setPairParameters(int index, int dipole1, int dipole2, double thole);
+    CpuPlatform::PlatformData& data;
+    int numParticles, numPairs;
+    int** particleIndexArray;
+    RealOpenMM** particleParamArray;
+    int** pairIndexArray;
+    RealOpenMM** pairParamArray;
+    std::vector<int> particle, particle1, particle2, particle3, particle4;
+    std::vector<double> charge, polarizability;
+    CpuBondForce particleForce, pairForce;
+};
+
+/**
+ * This kernel is invoked by DrudeLangevinIntegrator to take one time step
+ */
+class CpuIntegrateDrudeLangevinStepKernel : public IntegrateDrudeLangevinStepKernel {
+public:
+    class Update1Task;
+    class Update2Task;
+    class Update3Task;
+    CpuIntegrateDrudeLangevinStepKernel(std::string name, const Platform& platform, ReferencePlatform::PlatformData& refData, CpuPlatform::PlatformData& data) :
+        IntegrateDrudeLangevinStepKernel(name, platform), refData(refData), data(data) {
+    }
+    ~CpuIntegrateDrudeLangevinStepKernel();
+    /**
+     * Initialize the kernel.
+     * 
+     * @param system     the System this kernel will be applied to
+     * @param integrator the DrudeLangevinIntegrator this kernel will be used for
+     * @param force      the DrudeForce to get particle parameters from
+     */
+    void initialize(const System& system, const DrudeLangevinIntegrator& integrator, const DrudeForce& force);
+    /**
+     * Execute the kernel.
+     * 
+     * @param context        the context in which to execute this kernel
+     * @param integrator     the DrudeLangevinIntegrator this kernel is being used for
+     */
+    void execute(ContextImpl& context, const DrudeLangevinIntegrator& integrator);
+    /**
+     * Compute the kinetic energy.
+     * 
+     * @param context    the context in which to execute this kernel
+     * @param integrator the DrudeLangevinIntegrator this kernel is being used for
+     */
+    double computeKineticEnergy(ContextImpl& context, const DrudeLangevinIntegrator& integrator);
+    /**
+     * Update the velocities of the particles assigned to a thread.
+     */
+    void threadUpdate1(int threadIndex);
+    /**
+     * Compute the unconstrained positions of the particles assigned to a thread.
+     */
+    void threadUpdate2(int threadIndex);
+    /**
+     * Record the constrained positions and velocities of the particles assigned to a thread.
+     */
+    void threadUpdate3(int threadIndex);
+private:
+    void applyHardWallConstraints(const DrudeLangevinIntegrator& integrator);
+    ReferencePlatform::PlatformData& refData;
+    CpuPlatform::PlatformData& data;
+    std::vector<int> normalParticles;
+    std::vector<std::pair<int, int> > pairParticles;
+    std::vector<double> particleMass;
+    std::vector<double> particleInvMass;
+    std::vector<double> pairInvTotalMass;
+    std::vector<double> pairInvReducedMass;
+    std::vector<RealVec> xPrime;
+    // The following variables are used to pass information to the threads.
+    RealVec* pos;
+    RealVec* vel;
+    RealVec* force;
+    RealOpenMM dt, vscale, fscale, noisescale, vscaleDrude, fscaleDrude, noisescaleDrude;
+};
+
+/**
+ * This kernel is invoked by DrudeSCFIntegrator to take one time step
+ */
+class CpuIntegrateDrudeSCFStepKernel : public IntegrateDrudeSCFStepKernel {
+public:
+    class Update1Task;
+    class Update2Task;
+    CpuIntegrateDrudeSCFStepKernel(std::string name, const Platform& platform, ReferencePlatform::PlatformData& refData, CpuPlatform::PlatformData& data) :
+        IntegrateDrudeSCFStepKernel(name, platform), refData(refData), data(data), minimizerPos(NULL) {
+    }
+    ~CpuIntegrateDrudeSCFStepKernel();
+    /**
+     * Initialize the kernel.
+     * 
+     * @param system     the System this kernel will be applied to
+     * @param integrator the DrudeSCFIntegrator this kernel will be used for
+     * @param force      the DrudeForce to get particle parameters from
+     */
+    void initialize(const System& system, const DrudeSCFIntegrator& integrator, const DrudeForce& force);
+    /**
+     * Execute the kernel.
+     * 
+     * @param context        the context in which to execute this kernel
+     * @param integrator     the DrudeSCFIntegrator this kernel is being used for
+     */
+    void execute(ContextImpl& context, const DrudeSCFIntegrator& integrator);
+    /**
+     * Compute the kinetic energy.
+     * 
+     * @param context    the context in which to execute this kernel
+     * @param integrator the DrudeSCFIntegrator this kernel is being used for
+     */
+    double computeKineticEnergy(ContextImpl& context, const DrudeSCFIntegrator& integrator);
+    /**
+     * Update the velocities and compute the unconstrained positions of the particles assigned to a thread.
+     */
+    void threadUpdate1(int threadIndex);
+    /**
+     * Record the constrained positions and velocities of the particles assigned to a thread.
+     */
+    void threadUpdate2(int threadIndex);
+private:
+    void minimize(ContextImpl& context, double tolerance);
+    ReferencePlatform::PlatformData& refData;
+    CpuPlatform::PlatformData& data;
+    std::vector<int> drudeParticles;
+    std::vector<double> particleInvMass;
+    std::vector<RealVec> xPrime;
+    lbfgsfloatval_t *minimizerPos;
+    lbfgs_parameter_t minimizerParams;
+    // The following variables are used to pass information to the threads.
+    RealVec* pos;
+    RealVec* vel;
+    RealVec* force;
+    RealOpenMM dt;
+};
+
+} // namespace OpenMM
+
+#endif /*CPU_DRUDE_KERNELS_H_*/
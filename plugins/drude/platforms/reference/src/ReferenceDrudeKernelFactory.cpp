@@ -29,6 +29,8 @@
 #include "ReferencePlatform.h"
 #include "openmm/internal/ContextImpl.h"
 #include "openmm/OpenMMException.h"
+#include <string>
+#include <vector>
 
 using namespace OpenMM;
 
@@ -36,9 +38,16 @@ extern "C" OPENMM_EXPORT void registerPlatforms() {
 }
 
 extern "C" OPENMM_EXPORT void registerKernelFactories() {
+    // Platforms derived from ReferencePlatform (such as CPU) may provide their own implementations,
+    // so only register with ones that do not already support the Drude kernels.
+
+    std::vector<std::string> kernelNames;
+    kernelNames.push_back(CalcDrudeForceKernel::Name());
+    kernelNames.push_back(IntegrateDrudeLangevinStepKernel::Name());
+    kernelNames.push_back(IntegrateDrudeSCFStepKernel::Name());
     for (int i = 0; i < Platform::getNumPlatforms(); i++) {
         Platform& platform = Platform::getPlatform(i);
-        if (dynamic_cast<ReferencePlatform*>(&platform) != NULL) {
+        if (dynamic_cast<ReferencePlatform*>(&platform) != NULL && !platform.supportsKernels(kernelNames)) {
             ReferenceDrudeKernelFactory* factory = new ReferenceDrudeKernelFactory();
             platform.registerKernelFactory(CalcDrudeForceKernel::Name(), factory);
             platform.registerKernelFactory(IntegrateDrudeLangevinStepKernel::Name(), factory);
@@ -0,0 +1,114 @@
+#ifndef OPENMM_BINARY_SERIALIZER_H_
+#define OPENMM_BINARY_SERIALIZER_H_
+
+/* -------------------------------------------------------------------------- *
+ *                                   OpenMM                                   *
+ * -------------------------------------------------------------------------- *
+ * This is part of the OpenMM molecular simulation toolkit originating from   *
+ * Simbios, the NIH National Center for Physics-Based Simulation of           *
+ * Biological Structures at Stanford, funded under the NIH Roadmap for        *
+ * Medical Research, grant U54 GM072970. See https://simtk.org.               *
+ *                                                                            *
+ * Portions copyright (c) 2010-2016 Stanford University and the Authors.      *
+ * Authors: Peter Eastman                                                     *
+ * Contributors:                                                              *
+ *                                                                            *
+ * Permission is hereby granted, free of charge, to any person obtaining a    *
+ * copy of this software and associated documentation files (the "Software"), *
+ * to deal in the Software without restriction, including without limitation  *
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense,   *
+ * and/or sell copies of the Software, and to permit persons to whom the      *
+ * Software is furnished to do so, subject to the following conditions:       *
+ *                                                                            *
+ * The above copyright notice and this permission notice shall be included in *
+ * all copies or substantial portions of the Software.                        *
+ *                                                                            *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR *
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   *
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    *
+ * THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,    *
+ * DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR      *
+ * OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE  *
+ * USE OR OTHER DEALINGS IN THE SOFTWARE.                                     *
+ * -------------------------------------------------------------------------- */
+
+#include "openmm/serialization/SerializationNode.h"
+#include "openmm/serialization/SerializationProxy.h"
+#include "openmm/OpenMMException.h"
+#include "openmm/internal/windowsExport.h"
+#include <iosfwd>
+
+namespace OpenMM {
+
+/**
+ * BinarySerializer is used for serializing objects in a compact binary format, and for reconstructing them again.
+ * It uses the same SerializationProxies as XmlSerializer, so any object that can be serialized as XML can also
+ * be serialized with this class, and deserializing it produces exactly the same object.
+ *
+ * Runs of child nodes that have the same name and the same set of properties (such as the particles of a
+ * System or the bonds of a Force) are stored as tables with one typed array per property.  Properties whose
+ * values are all integers or all numbers are stored as 32 bit integers or 64 bit floating point values instead
+ * of text.  The data can optionally be compressed with zlib, if OpenMM was built with zlib support.
+ */
+
+class OPENMM_EXPORT BinarySerializer {
+public:
+    /**
+     * Serialize an object in binary format.
+     *
+     * @param object    the object to serialize
+     * @param rootName  the name to use for the root node
+     * @param stream    an output stream to write the data to.  It should be opened in binary mode.
+     * @param compress  if true, compress the data.  An exception is thrown if compression is not supported.
+     */
+    template <class T>
+    static void serialize(const T* object, const std::string& rootName, std::ostream& stream, bool compress=false) {
+        const SerializationProxy& proxy = SerializationProxy::getProxy(typeid(*object));
+        SerializationNode node;
+        node.setName(rootName);
+        proxy.serialize(object, node);
+        if (node.hasProperty("type"))
+            throw OpenMMException(proxy.getTypeName()+" created node with reserved property 'type'");
+        node.setStringProperty("type", proxy.getTypeName());
+        serialize(node, stream, compress);
+    }
+    /**
+     * Reconstruct an object that has been serialized in binary format.
+     *
+     * @param stream    an input stream to read the data from.  It should be opened in binary mode.
+     * @return a pointer to the newly created object.  The caller assumes ownership of the object.
+     */
+    template <class T>
+    static T* deserialize(std::istream& stream) {
+        return reinterpret_cast<T*>(deserializeStream(stream));
+    }
+    /**
+     * Write a tree of SerializationNodes to a stream in binary format.
+     *
+     * @param node      the root node to write
+     * @param stream    an output stream to write the data to
+     * @param compress  if true, compress the data.  An exception is thrown if compression is not supported.
+     */
+    static void serialize(const SerializationNode& node, std::ostream& stream, bool compress=false);
+    /**
+     * Read a tree of SerializationNodes that was written in binary format.
+     *
+     * @param stream    an input stream to read the data from
+     * @param node      the root node of the tree is stored into this
+     */
+    static void deserialize(std::istream& stream, SerializationNode& node);
+    /**
+     * Get whether this build of OpenMM supports compressing the data.
+     */
+    static bool isCompressionSupported();
+private:
+    class Writer;
+    class Reader;
+    static void* deserializeStream(std::istream& stream);
+    static void encodeNode(const SerializationNode& node, Writer& writer);
+    static void decodeNode(SerializationNode& node, Reader& reader);
+};
+
+} // namespace OpenMM
+
+#endif /*OPENMM_BINARY_SERIALIZER_H_*/
@@ -65,7 +65,8 @@ public:
         serialize(node, stream);
     }
     /**
-     * Reconstruct an object that has been serialized as XML.
+     * Reconstruct an object that has been serialized as XML.  The stream is read incrementally, so the
+     * document is never held in memory, and the stream does not need to support seeking.
      *
      * @param stream    an input stream to read the XML from
      * @return a pointer to the newly created object.  The caller assumes ownership of the object.
@@ -86,11 +87,26 @@ public:
         proxy.serialize(&object, node);
         return reinterpret_cast<T*>(proxy.deserialize(node));
     }
+    /**
+     * Write a tree of SerializationNodes as an XML document.
+     *
+     * @param node      the root node to write
+     * @param stream    an output stream to write the XML to
+     */
+    static void serialize(const SerializationNode& node, std::ostream& stream);
+    /**
+     * Read a tree of SerializationNodes from an XML document.  The stream is read incrementally, so the
+     * document is never held in memory.
+     *
+     * @param stream    an input stream to read the XML from
+     * @param node      the root element of the document is stored into this
+     */
+    static void deserialize(std::istream& stream, SerializationNode& node);
 private:
     class StreamReader;
-    static void serialize(const SerializationNode& node, std::ostream& stream);
     static void* deserializeStream(std::istream& stream);
     static void encodeNode(const SerializationNode& node, std::ostream& stream, int depth);
+    static void decodeNode(SerializationNode& node, StreamReader& reader);
 };
 
 } // namespace OpenMM
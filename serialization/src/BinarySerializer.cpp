@@ -0,0 +1,489 @@
+/* -------------------------------------------------------------------------- *
+ *                                   OpenMM                                   *
+ * -------------------------------------------------------------------------- *
+ * This is part of the OpenMM molecular simulation toolkit originating from   *
+ * Simbios, the NIH National Center for Physics-Based Simulation of           *
+ * Biological Structures at Stanford, funded under the NIH Roadmap for        *
+ * Medical Research, grant U54 GM072970. See https://simtk.org.               *
+ *                                                                            *
+ * Portions copyright (c) 2010-2016 Stanford University and the Authors.      *
+ * Authors: Peter Eastman                                                     *
+ * Contributors:                                                              *
+ *                                                                            *
+ * Permission is hereby granted, free of charge, to any person obtaining a    *
+ * copy of this software and associated documentation files (the "Software"), *
+ * to deal in the Software without restriction, including without limitation  *
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense,   *
+ * and/or sell copies of the Software, and to permit persons to whom the      *
+ * Software is furnished to do so, subject to the following conditions:       *
+ *                                                                            *
+ * The above copyright notice and this permission notice shall be included in *
+ * all copies or substantial portions of the Software.                        *
+ *                                                                            *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR *
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   *
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    *
+ * THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,    *
+ * DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR      *
+ * OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE  *
+ * USE OR OTHER DEALINGS IN THE SOFTWARE.                                     *
+ * -------------------------------------------------------------------------- */
+
+#include "openmm/serialization/BinarySerializer.h"
+#include <cstdio>
+#include <cstdlib>
+#include <algorithm>
+#include <cstring>
+#include <iostream>
+#include <map>
+#ifdef OPENMM_USE_ZLIB
+#include <zlib.h>
+#endif
+
+using namespace OpenMM;
+using namespace std;
+
+extern "C" char* g_fmt(char*, double);
+extern "C" double strtod2(const char* s00, char** se);
+
+/**
+ * The file begins with these four bytes, followed by a version number, a byte of flags, and the length of the
+ * uncompressed data as a 64 bit integer.  Compressed data is preceded by its own length as another 64 bit integer,
+ * so a reader consumes exactly the bytes that were written.  All values are stored in little endian byte order.
+ */
+static const char MAGIC[] = {'O', 'M', 'M', 'B'};
+static const unsigned char FORMAT_VERSION = 1;
+static const unsigned char FLAG_COMPRESSED = 1;
+
+// Each block in a list of children is either a single node, or a table of nodes with identical structure.
+
+static const unsigned char BLOCK_NODE = 0;
+static const unsigned char BLOCK_TABLE = 1;
+
+// The types a property value can be stored as.
+
+static const unsigned char VALUE_STRING = 0;
+static const unsigned char VALUE_INT = 1;
+static const unsigned char VALUE_DOUBLE = 2;
+
+/**
+ * Determine whether a string is exactly what SerializationNode::setIntProperty() would produce for some value.
+ */
+static bool isCanonicalInt(const string& value, int& result) {
+    if (value.empty() || value.size() > 11)
+        return false;
+    char* end;
+    long parsed = strtol(value.c_str(), &end, 10);
+    if (*end != 0 || parsed != (int) parsed)
+        return false;
+    char buffer[16];
+    sprintf(buffer, "%d", (int) parsed);
+    if (value != buffer)
+        return false;
+    result = (int) parsed;
+    return true;
+}
+
+/**
+ * Determine whether a string is exactly what SerializationNode::setDoubleProperty() would produce for some value.
+ */
+static bool isCanonicalDouble(const string& value, double& result) {
+    if (value.empty() || value.size() > 31)
+        return false;
+    double parsed = strtod2(value.c_str(), NULL);
+    char buffer[32];
+    g_fmt(buffer, parsed);
+    if (value != buffer)
+        return false;
+    result = parsed;
+    return true;
+}
+
+static string formatInt(int value) {
+    char buffer[16];
+    sprintf(buffer, "%d", value);
+    return string(buffer);
+}
+
+static string formatDouble(double value) {
+    char buffer[32];
+    g_fmt(buffer, value);
+    return string(buffer);
+}
+
+/**
+ * Accumulates the encoded data in memory.
+ */
+class BinarySerializer::Writer {
+public:
+    void writeByte(unsigned char value) {
+        data.push_back((char) value);
+    }
+    void writeInt(unsigned int value) {
+        for (int i = 0; i < 4; i++)
+            data.push_back((char) ((value>>(8*i))&0xFF));
+    }
+    void writeLong(unsigned long long value) {
+        for (int i = 0; i < 8; i++)
+            data.push_back((char) ((value>>(8*i))&0xFF));
+    }
+    void writeDouble(double value) {
+        unsigned long long bits;
+        memcpy(&bits, &value, sizeof(bits));
+        writeLong(bits);
+    }
+    void writeString(const string& value) {
+        writeInt(value.size());
+        data.append(value);
+    }
+    string data;
+};
+
+/**
+ * Decodes data from a buffer, checking that it never reads past the end.
+ */
+class BinarySerializer::Reader {
+public:
+    Reader(const string& data) : data(data), position(0) {
+    }
+    unsigned char readByte() {
+        require(1);
+        return (unsigned char) data[position++];
+    }
+    unsigned int readInt() {
+        require(4);
+        unsigned int value = 0;
+        for (int i = 0; i < 4; i++)
+            value |= ((unsigned int) (unsigned char) data[position++])<<(8*i);
+        return value;
+    }
+    unsigned long long readLong() {
+        require(8);
+        unsigned long long value = 0;
+        for (int i = 0; i < 8; i++)
+            value |= ((unsigned long long) (unsigned char) data[position++])<<(8*i);
+        return value;
+    }
+    double readDouble() {
+        unsigned long long bits = readLong();
+        double value;
+        memcpy(&value, &bits, sizeof(value));
+        return value;
+    }
+    string readString() {
+        unsigned int length = readInt();
+        require(length);
+        string value = data.substr(position, length);
+        position += length;
+        return value;
+    }
+private:
+    void require(size_t bytes) {
+        if (data.size()-position < bytes)
+            throw OpenMMException("BinarySerializer: Unexpected end of data");
+    }
+    const string& data;
+    size_t position;
+};
+
+/**
+ * Get whether two nodes can be stored in the same table: they must have the same name and the same
+ * properties, and neither may have children.
+ */
+static bool haveSameStructure(const SerializationNode& node1, const SerializationNode& node2) {
+    if (node1.getName() != node2.getName() || node1.getChildren().size() > 0 || node2.getChildren().size() > 0)
+        return false;
+    const map<string, string>& properties1 = node1.getProperties();
+    const map<string, string>& properties2 = node2.getProperties();
+    if (properties1.size() != properties2.size())
+        return false;
+    for (map<string, string>::const_iterator iter1 = properties1.begin(), iter2 = properties2.begin(); iter1 != properties1.end(); ++iter1, ++iter2)
+        if (iter1->first != iter2->first)
+            return false;
+    return true;
+}
+
+void BinarySerializer::encodeNode(const SerializationNode& node, Writer& writer) {
+    writer.writeString(node.getName());
+    const map<string, string>& properties = node.getProperties();
+    writer.writeInt(properties.size());
+    for (map<string, string>::const_iterator iter = properties.begin(); iter != properties.end(); ++iter) {
+        writer.writeString(iter->first);
+        int intValue;
+        double doubleValue;
+        if (isCanonicalInt(iter->second, intValue)) {
+            writer.writeByte(VALUE_INT);
+            writer.writeInt((unsigned int) intValue);
+        }
+        else if (isCanonicalDouble(iter->second, doubleValue)) {
+            writer.writeByte(VALUE_DOUBLE);
+            writer.writeDouble(doubleValue);
+        }
+        else {
+            writer.writeByte(VALUE_STRING);
+            writer.writeString(iter->second);
+        }
+    }
+
+    // Divide the children into blocks.  Each run of nodes with the same structure becomes a table.
+
+    const vector<SerializationNode>& children = node.getChildren();
+    vector<pair<int, int> > blocks;
+    for (int start = 0; start < (int) children.size(); ) {
+        int end = start+1;
+        while (end < (int) children.size() && haveSameStructure(children[start], children[end]))
+            end++;
+        blocks.push_back(make_pair(start, end));
+        start = end;
+    }
+    writer.writeInt(blocks.size());
+    for (int block = 0; block < (int) blocks.size(); block++) {
+        int start = blocks[block].first;
+        int end = blocks[block].second;
+        if (end-start == 1) {
+            writer.writeByte(BLOCK_NODE);
+            encodeNode(children[start], writer);
+            continue;
+        }
+        writer.writeByte(BLOCK_TABLE);
+        writer.writeString(children[start].getName());
+        writer.writeInt(end-start);
+        const map<string, string>& columns = children[start].getProperties();
+        writer.writeInt(columns.size());
+        for (map<string, string>::const_iterator column = columns.begin(); column != columns.end(); ++column) {
+            // Store the column with the most compact type that every value in it can be converted to.
+
+            const string& key = column->first;
+            vector<int> intValues;
+            vector<double> doubleValues;
+            bool allInts = true, allDoubles = true;
+            for (int i = start; i < end && allInts; i++) {
+                int value;
+                allInts = isCanonicalInt(children[i].getStringProperty(key), value);
+                intValues.push_back(value);
+            }
+            if (!allInts) {
+                for (int i = start; i < end && allDoubles; i++) {
+                    double value;
+                    allDoubles = isCanonicalDouble(children[i].getStringProperty(key), value);
+                    doubleValues.push_back(value);
+                }
+            }
+            writer.writeString(key);
+            if (allInts) {
+                writer.writeByte(VALUE_INT);
+                for (int i = 0; i < (int) intValues.size(); i++)
+                    writer.writeInt((unsigned int) intValues[i]);
+            }
+            else if (allDoubles) {
+                writer.writeByte(VALUE_DOUBLE);
+                for (int i = 0; i < (int) doubleValues.size(); i++)
+                    writer.writeDouble(doubleValues[i]);
+            }
+            else {
+                writer.writeByte(VALUE_STRING);
+                for (int i = start; i < end; i++)
+                    writer.writeString(children[i].getStringProperty(key));
+            }
+        }
+    }
+}
+
+void BinarySerializer::decodeNode(SerializationNode& node, Reader& reader) {
+    node.setName(reader.readString());
+    int numProperties = reader.readInt();
+    for (int i = 0; i < numProperties; i++) {
+        string key = reader.readString();
+        unsigned char type = reader.readByte();
+        if (type == VALUE_INT)
+            node.setStringProperty(key, formatInt((int) reader.readInt()));
+        else if (type == VALUE_DOUBLE)
+            node.setStringProperty(key, formatDouble(reader.readDouble()));
+        else if (type == VALUE_STRING)
+            node.setStringProperty(key, reader.readString());
+        else
+            throw OpenMMException("BinarySerializer: Unknown value type in data");
+    }
+    int numBlocks = reader.readInt();
+    vector<SerializationNode>& children = node.getChildren();
+    for (int block = 0; block < numBlocks; block++) {
+        unsigned char blockType = reader.readByte();
+        if (blockType == BLOCK_NODE) {
+            children.push_back(SerializationNode());
+            decodeNode(children.back(), reader);
+        }
+        else if (blockType == BLOCK_TABLE) {
+            string name = reader.readString();
+            int numRows = reader.readInt();
+            int numColumns = reader.readInt();
+            int start = children.size();
+            children.resize(start+numRows);
+            for (int i = start; i < start+numRows; i++)
+                children[i].setName(name);
+            for (int column = 0; column < numColumns; column++) {
+                string key = reader.readString();
+                unsigned char type = reader.readByte();
+                for (int i = start; i < start+numRows; i++) {
+                    if (type == VALUE_INT)
+                        children[i].setStringProperty(key, formatInt((int) reader.readInt()));
+                    else if (type == VALUE_DOUBLE)
+                        children[i].setStringProperty(key, formatDouble(reader.readDouble()));
+                    else if (type == VALUE_STRING)
+                        children[i].setStringProperty(key, reader.readString());
+                    else
+                        throw OpenMMException("BinarySerializer: Unknown value type in data");
+                }
+            }
+        }
+        else
+            throw OpenMMException("BinarySerializer: Unknown block type in data");
+    }
+}
+
+bool BinarySerializer::isCompressionSupported() {
+#ifdef OPENMM_USE_ZLIB
+    return true;
+#else
+    return false;
+#endif
+}
+
+void BinarySerializer::serialize(const SerializationNode& node, ostream& stream, bool compress) {
+    if (compress && !isCompressionSupported())
+        throw OpenMMException("BinarySerializer: This build of OpenMM does not support compression");
+    Writer writer;
+    encodeNode(node, writer);
+    Writer header;
+    header.data.append(MAGIC, 4);
+    header.writeByte(FORMAT_VERSION);
+    header.writeByte(compress ? FLAG_COMPRESSED : 0);
+    header.writeLong(writer.data.size());
+    if (!compress) {
+        stream.write(header.data.c_str(), header.data.size());
+        stream.write(writer.data.c_str(), writer.data.size());
+        return;
+    }
+#ifdef OPENMM_USE_ZLIB
+    // Compress the data in chunks, so no limit is imposed on the size.
+
+    z_stream zstream;
+    memset(&zstream, 0, sizeof(zstream));
+    if (deflateInit(&zstream, Z_DEFAULT_COMPRESSION) != Z_OK)
+        throw OpenMMException("BinarySerializer: Failed to initialize compression");
+    const size_t chunkSize = 1<<20;
+    vector<char> output(chunkSize);
+    string compressed;
+    size_t inputPosition = 0;
+    int flush;
+    do {
+        size_t inputSize = min(chunkSize, writer.data.size()-inputPosition);
+        zstream.next_in = (Bytef*) writer.data.c_str()+inputPosition;
+        zstream.avail_in = inputSize;
+        inputPosition += inputSize;
+        flush = (inputPosition == writer.data.size() ? Z_FINISH : Z_NO_FLUSH);
+        do {
+            zstream.next_out = (Bytef*) &output[0];
+            zstream.avail_out = chunkSize;
+            deflate(&zstream, flush);
+            compressed.append(&output[0], chunkSize-zstream.avail_out);
+        } while (zstream.avail_out == 0);
+    } while (flush != Z_FINISH);
+    deflateEnd(&zstream);
+    header.writeLong(compressed.size());
+    stream.write(header.data.c_str(), header.data.size());
+    stream.write(compressed.c_str(), compressed.size());
+#endif
+}
+
+/**
+ * Read a block of data from a stream.  It is read in chunks, so a corrupt length cannot cause a huge allocation
+ * before the stream runs out.
+ */
+static void readData(istream& stream, string& data, unsigned long long size) {
+    const size_t chunkSize = 1<<20;
+    while (data.size() < size) {
+        size_t start = data.size();
+        size_t length = (size_t) min((unsigned long long) chunkSize, size-start);
+        data.resize(start+length);
+        stream.read(&data[start], length);
+        if ((size_t) stream.gcount() != length)
+            throw OpenMMException("BinarySerializer: Unexpected end of data");
+    }
+}
+
+void BinarySerializer::deserialize(istream& stream, SerializationNode& node) {
+    char headerData[14];
+    stream.read(headerData, 14);
+    if (stream.gcount() != 14 || memcmp(headerData, MAGIC, 4) != 0)
+        throw OpenMMException("BinarySerializer: The data is not in OpenMM binary format");
+    string headerString(headerData, 14);
+    Reader header(headerString);
+    for (int i = 0; i < 4; i++)
+        header.readByte();
+    if (header.readByte() > FORMAT_VERSION)
+        throw OpenMMException("BinarySerializer: The data was written by a newer version of OpenMM");
+    bool compressed = ((header.readByte() & FLAG_COMPRESSED) != 0);
+    unsigned long long size = header.readLong();
+    string data;
+    if (!compressed)
+        readData(stream, data, size);
+    else {
+#ifdef OPENMM_USE_ZLIB
+        string lengthString;
+        readData(stream, lengthString, 8);
+        unsigned long long remaining = Reader(lengthString).readLong();
+
+        // Read exactly the stored number of compressed bytes, and never let the output grow past the size given
+        // in the header.
+
+        z_stream zstream;
+        memset(&zstream, 0, sizeof(zstream));
+        if (inflateInit(&zstream) != Z_OK)
+            throw OpenMMException("BinarySerializer: Failed to initialize decompression");
+        const size_t chunkSize = 1<<20;
+        vector<char> input(chunkSize), output(chunkSize);
+        int result = Z_OK;
+        while (result != Z_STREAM_END) {
+            if (zstream.avail_in == 0) {
+                if (remaining == 0)
+                    break;
+                size_t inputSize = (size_t) min((unsigned long long) chunkSize, remaining);
+                stream.read(&input[0], inputSize);
+                if ((size_t) stream.gcount() != inputSize) {
+                    inflateEnd(&zstream);
+                    throw OpenMMException("BinarySerializer: Unexpected end of data");
+                }
+                remaining -= inputSize;
+                zstream.next_in = (Bytef*) &input[0];
+                zstream.avail_in = inputSize;
+            }
+            zstream.next_out = (Bytef*) &output[0];
+            zstream.avail_out = chunkSize;
+            result = inflate(&zstream, Z_NO_FLUSH);
+            size_t outputSize = chunkSize-zstream.avail_out;
+            if ((result != Z_OK && result != Z_STREAM_END && result != Z_BUF_ERROR) || outputSize > size-data.size()) {
+                inflateEnd(&zstream);
+                throw OpenMMException("BinarySerializer: The compressed data is corrupt");
+            }
+            data.append(&output[0], outputSize);
+        }
+        bool usedAllInput = (remaining == 0 && zstream.avail_in == 0);
+        inflateEnd(&zstream);
+        if (result != Z_STREAM_END)
+            throw OpenMMException("BinarySerializer: Unexpected end of data");
+        if (!usedAllInput || data.size() != size)
+            throw OpenMMException("BinarySerializer: The compressed data is corrupt");
+#else
+        throw OpenMMException("BinarySerializer: The data is compressed, but this build of OpenMM does not support compression");
+#endif
+    }
+    Reader reader(data);
+    decodeNode(node, reader);
+}
+
+void* BinarySerializer::deserializeStream(istream& stream) {
+    SerializationNode root;
+    deserialize(stream, root);
+    const SerializationProxy& proxy = SerializationProxy::getProxy(root.getStringProperty("type"));
+    return proxy.deserialize(root);
+}
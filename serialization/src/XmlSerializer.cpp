@@ -30,15 +30,13 @@
  * -------------------------------------------------------------------------- */
 
 #include "openmm/serialization/XmlSerializer.h"
-#include "irrXML.h"
+#include <cstdlib>
 #include <cstring>
 #include <iostream>
 #include <map>
 
 using namespace OpenMM;
 using namespace std;
-using namespace irr;
-using namespace io;
 
 /**
  * Apply XML encoding to a string.  This is adapted from TinyXML (written by Lee Thomason).
@@ -136,63 +134,227 @@ void XmlSerializer::encodeNode(const SerializationNode& node, std::ostream& stre
 }
 
 /**
- * Adapter class to let irrXML read a C++ stream.
+ * Reads characters from a stream one block at a time, so the document never needs to be held in memory.
+ * It also does not require the stream to support seeking.
  */
-class XmlSerializer::StreamReader : public IFileReadCallBack {
+class XmlSerializer::StreamReader {
 public:
-    StreamReader(std::istream& stream) : stream(stream) {
-        stream.seekg(0, ios_base::end);
-        size = stream.tellg();
-        stream.seekg(0);
+    StreamReader(std::istream& stream) : stream(stream), position(0) {
     }
-    int read(void* buffer, int sizeToRead) {
-        stream.read((char*) buffer, sizeToRead);
-        return stream.gcount();
+    /**
+     * Get the next character without consuming it, or -1 if the end of the stream has been reached.
+     */
+    int peek() {
+        if (position == buffer.size() && !fill(1))
+            return -1;
+        return (unsigned char) buffer[position];
     }
-    int getSize() {
-        return size;
+    /**
+     * Consume and return the next character.  An exception is thrown if the end of the stream has been reached.
+     */
+    char next() {
+        if (position == buffer.size() && !fill(1))
+            throw OpenMMException("XmlSerializer: Unexpected end of document");
+        return buffer[position++];
+    }
+    /**
+     * Get whether the upcoming characters match a string.  If they do, they are consumed.
+     */
+    bool match(const char* text) {
+        size_t length = strlen(text);
+        if (buffer.size()-position < length)
+            fill(length);
+        if (buffer.compare(position, length, text) != 0)
+            return false;
+        position += length;
+        return true;
+    }
+    /**
+     * Consume characters up to and including the next occurrence of a string.
+     */
+    void skipPast(const char* text) {
+        while (!match(text))
+            next();
+    }
+    void skipWhitespace() {
+        int c = peek();
+        while (c == ' ' || c == '\t' || c == '\n' || c == '\r') {
+            position++;
+            c = peek();
+        }
+    }
+    /**
+     * Read an element or attribute name.
+     */
+    string readName() {
+        string name;
+        while (true) {
+            int c = peek();
+            if (c == -1 || c == ' ' || c == '\t' || c == '\n' || c == '\r' || c == '/' || c == '>' || c == '=')
+                break;
+            name += (char) c;
+            position++;
+        }
+        if (name.empty())
+            throw OpenMMException("XmlSerializer: Invalid XML document");
+        return name;
     }
 private:
+    /**
+     * Discard the characters that have already been consumed, then read blocks until at least the
+     * specified number of characters are available.  Returns false if the stream ended first.
+     */
+    bool fill(size_t required) {
+        buffer.erase(0, position);
+        position = 0;
+        char block[65536];
+        while (buffer.size() < required && stream) {
+            stream.read(block, sizeof(block));
+            buffer.append(block, stream.gcount());
+        }
+        return (buffer.size() >= required);
+    }
     std::istream& stream;
-    int size;
+    string buffer;
+    size_t position;
 };
 
 /**
- * Process an XML node, storing its content into a SerializationNode.
+ * Replace entity and character references in an attribute value with the characters they represent.
  */
-static void decodeNode(SerializationNode& node, IrrXMLReader& xml) {
-    for (int i = 0; i < xml.getAttributeCount(); i++)
-        node.setStringProperty(xml.getAttributeName(i), xml.getAttributeValue(i));
-    if (xml.isEmptyElement())
-        return;
-    while (xml.read()) {
-        switch (xml.getNodeType()) {
-            case EXN_ELEMENT:
-            {
-                SerializationNode& childNode = node.createChildNode(xml.getNodeName());
-                decodeNode(childNode, xml);
-                break;
+static string decodeString(const string& str) {
+    size_t ampersand = str.find('&');
+    if (ampersand == string::npos)
+        return str;
+    string result = str.substr(0, ampersand);
+    for (size_t i = ampersand; i < str.size(); i++) {
+        size_t semicolon;
+        if (str[i] != '&' || (semicolon = str.find(';', i)) == string::npos) {
+            result += str[i];
+            continue;
+        }
+        string entity = str.substr(i+1, semicolon-i-1);
+        if (entity == "amp")
+            result += '&';
+        else if (entity == "lt")
+            result += '<';
+        else if (entity == "gt")
+            result += '>';
+        else if (entity == "quot")
+            result += '"';
+        else if (entity == "apos")
+            result += '\'';
+        else if (entity.size() > 1 && entity[0] == '#') {
+            unsigned long code = (entity[1] == 'x' ? strtoul(entity.c_str()+2, NULL, 16) : strtoul(entity.c_str()+1, NULL, 10));
+            if (code < 0x80)
+                result += (char) code;
+            else if (code < 0x800) {
+                result += (char) (0xC0 | (code>>6));
+                result += (char) (0x80 | (code&0x3F));
+            }
+            else if (code < 0x10000) {
+                result += (char) (0xE0 | (code>>12));
+                result += (char) (0x80 | ((code>>6)&0x3F));
+                result += (char) (0x80 | (code&0x3F));
+            }
+            else {
+                result += (char) (0xF0 | (code>>18));
+                result += (char) (0x80 | ((code>>12)&0x3F));
+                result += (char) (0x80 | ((code>>6)&0x3F));
+                result += (char) (0x80 | (code&0x3F));
             }
-            case EXN_ELEMENT_END:
-                return;
         }
+        else {
+            result += str[i];
+            continue;
+        }
+        i = semicolon;
     }
+    return result;
 }
 
-void* XmlSerializer::deserializeStream(std::istream& stream) {
-    SerializationNode root;
+void XmlSerializer::decodeNode(SerializationNode& node, StreamReader& reader) {
+    // The opening '<' has already been consumed.  Read the name and attributes.
+
+    node.setName(reader.readName());
+    while (true) {
+        reader.skipWhitespace();
+        if (reader.match("/>"))
+            return;
+        if (reader.match(">"))
+            break;
+        string name = reader.readName();
+        reader.skipWhitespace();
+        if (reader.next() != '=')
+            throw OpenMMException("XmlSerializer: Invalid XML document");
+        reader.skipWhitespace();
+        char quote = reader.next();
+        if (quote != '"' && quote != '\'')
+            throw OpenMMException("XmlSerializer: Invalid XML document");
+        string value;
+        for (char c = reader.next(); c != quote; c = reader.next())
+            value += c;
+        node.setStringProperty(name, decodeString(value));
+    }
+
+    // Process the content.  Text is ignored, since serialized objects store everything in attributes.
+
+    while (true) {
+        if (reader.peek() != '<') {
+            reader.next();
+            continue;
+        }
+        if (reader.match("</")) {
+            if (reader.readName() != node.getName())
+                throw OpenMMException("XmlSerializer: Mismatched closing tag for element '"+node.getName()+"'");
+            reader.skipPast(">");
+            return;
+        }
+        if (reader.match("<![CDATA[")) {
+            reader.skipPast("]]>");
+            continue;
+        }
+        if (reader.match("<!--")) {
+            reader.skipPast("-->");
+            continue;
+        }
+        if (reader.match("<?") || reader.match("<!")) {
+            reader.skipPast(">");
+            continue;
+        }
+        reader.next();
+        SerializationNode& childNode = node.createChildNode("");
+        decodeNode(childNode, reader);
+    }
+}
+
+void XmlSerializer::deserialize(std::istream& stream, SerializationNode& node) {
     StreamReader reader(stream);
-    IrrXMLReader* xml = createIrrXMLReader(&reader);
-    
+
     // Find the root node in the file.
-    
-    while (xml->read() && xml->getNodeType() != EXN_ELEMENT)
-        ;
-    decodeNode(root, *xml);
-    delete xml;
-    
+
+    while (true) {
+        reader.skipWhitespace();
+        if (reader.peek() == -1)
+            throw OpenMMException("XmlSerializer: The document does not contain any elements");
+        if (reader.match("<!--"))
+            reader.skipPast("-->");
+        else if (reader.match("<?") || reader.match("<!"))
+            reader.skipPast(">");
+        else if (reader.match("<"))
+            break;
+        else
+            reader.next();
+    }
+    decodeNode(node, reader);
+}
+
+void* XmlSerializer::deserializeStream(std::istream& stream) {
+    SerializationNode root;
+    deserialize(stream, root);
+
     // Process the SerializationNodes.
-    
+
     const SerializationProxy& proxy = SerializationProxy::getProxy(root.getStringProperty("type"));
     return proxy.deserialize(root);
 }
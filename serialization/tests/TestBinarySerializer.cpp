@@ -0,0 +1,273 @@
+/* -------------------------------------------------------------------------- *
+ *                                   OpenMM                                   *
+ * -------------------------------------------------------------------------- *
+ * This is part of the OpenMM molecular simulation toolkit originating from   *
+ * Simbios, the NIH National Center for Physics-Based Simulation of           *
+ * Biological Structures at Stanford, funded under the NIH Roadmap for        *
+ * Medical Research, grant U54 GM072970. See https://simtk.org.               *
+ *                                                                            *
+ * Portions copyright (c) 2016 Stanford University and the Authors.           *
+ * Authors: Peter Eastman                                                     *
+ * Contributors:                                                              *
+ *                                                                            *
+ * Permission is hereby granted, free of charge, to any person obtaining a    *
+ * copy of this software and associated documentation files (the "Software"), *
+ * to deal in the Software without restriction, including without limitation  *
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense,   *
+ * and/or sell copies of the Software, and to permit persons to whom the      *
+ * Software is furnished to do so, subject to the following conditions:       *
+ *                                                                            *
+ * The above copyright notice and this permission notice shall be included in *
+ * all copies or substantial portions of the Software.                        *
+ *                                                                            *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR *
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   *
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    *
+ * THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,    *
+ * DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR      *
+ * OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE  *
+ * USE OR OTHER DEALINGS IN THE SOFTWARE.                                     *
+ * -------------------------------------------------------------------------- */
+
+#include "openmm/internal/AssertionUtilities.h"
+#include "openmm/CustomNonbondedForce.h"
+#include "openmm/HarmonicBondForce.h"
+#include "openmm/NonbondedForce.h"
+#include "openmm/State.h"
+#include "openmm/System.h"
+#include "openmm/serialization/BinarySerializer.h"
+#include "openmm/serialization/XmlSerializer.h"
+#include <iostream>
+#include <limits>
+#include <sstream>
+
+using namespace OpenMM;
+using namespace std;
+
+void compareNodes(const SerializationNode& node1, const SerializationNode& node2) {
+    ASSERT_EQUAL(node1.getName(), node2.getName());
+    ASSERT(node1.getProperties() == node2.getProperties());
+    ASSERT_EQUAL(node1.getChildren().size(), node2.getChildren().size());
+    for (int i = 0; i < (int) node1.getChildren().size(); i++)
+        compareNodes(node1.getChildren()[i], node2.getChildren()[i]);
+}
+
+void testNodes(bool compress) {
+    // Build a tree containing tables of every type, as well as values that cannot be stored as numbers.
+
+    SerializationNode root;
+    root.setName("Root");
+    root.setIntProperty("int", -5);
+    root.setDoubleProperty("double", 0.1);
+    root.setDoubleProperty("infinity", numeric_limits<double>::infinity());
+    root.setStringProperty("string", "a \"string\" <with> odd & characters\n");
+    root.setStringProperty("empty", "");
+    root.setStringProperty("padded", "007");
+    SerializationNode& ints = root.createChildNode("Ints");
+    for (int i = 0; i < 10; i++)
+        ints.createChildNode("Int").setIntProperty("v", i*i-20).setBoolProperty("b", i%2 == 0);
+    SerializationNode& doubles = root.createChildNode("Doubles");
+    for (int i = 0; i < 10; i++)
+        doubles.createChildNode("Double").setDoubleProperty("v", 1.0/(i+1)).setIntProperty("i", i);
+    SerializationNode& strings = root.createChildNode("Strings");
+    for (int i = 0; i < 10; i++)
+        strings.createChildNode("String").setStringProperty("v", i == 5 ? "x" : "1.5");
+    SerializationNode& mixed = root.createChildNode("Mixed");
+    mixed.createChildNode("A").setIntProperty("v", 1);
+    mixed.createChildNode("A").setIntProperty("v", 2);
+    mixed.createChildNode("A").setIntProperty("w", 3);
+    mixed.createChildNode("B").setIntProperty("v", 4);
+    mixed.createChildNode("B").createChildNode("C").setDoubleProperty("v", 5.5);
+    mixed.createChildNode("B");
+    mixed.createChildNode("B");
+    stringstream buffer;
+    BinarySerializer::serialize(root, buffer, compress);
+    SerializationNode copy;
+    BinarySerializer::deserialize(buffer, copy);
+    compareNodes(root, copy);
+}
+
+void testSystem(bool compress) {
+    // Create a System.
+
+    const int numParticles = 100;
+    System system;
+    NonbondedForce* nonbonded = new NonbondedForce();
+    HarmonicBondForce* bonds = new HarmonicBondForce();
+    CustomNonbondedForce* custom = new CustomNonbondedForce("a*r^2; a=sqrt(a1*a2)");
+    custom->addPerParticleParameter("a");
+    system.addForce(nonbonded);
+    system.addForce(bonds);
+    system.addForce(custom);
+    vector<double> params(1);
+    for (int i = 0; i < numParticles; i++) {
+        system.addParticle(1.0+0.1*i);
+        nonbonded->addParticle(0.1*(i%3-1), 0.3+0.001*i, 0.5/(i+1));
+        params[0] = 1.0/(i+1);
+        custom->addParticle(params);
+        if (i > 0) {
+            bonds->addBond(i-1, i, 0.1*i, 1000.0);
+            nonbonded->addException(i-1, i, 0.0, 1.0, 0.0);
+            custom->addExclusion(i-1, i);
+        }
+    }
+    system.setDefaultPeriodicBoxVectors(Vec3(3, 0, 0), Vec3(0, 3.5, 0), Vec3(0.5, 0, 4));
+
+    // Serialize it in binary format, then deserialize it, and make sure it is identical.
+
+    stringstream buffer;
+    BinarySerializer::serialize<System>(&system, "System", buffer, compress);
+    System* copy = BinarySerializer::deserialize<System>(buffer);
+    stringstream xml1, xml2;
+    XmlSerializer::serialize<System>(&system, "System", xml1);
+    XmlSerializer::serialize<System>(copy, "System", xml2);
+    ASSERT_EQUAL(xml1.str(), xml2.str());
+    ASSERT(buffer.str().size() < xml1.str().size());
+    delete copy;
+}
+
+void testState(bool compress) {
+    vector<Vec3> positions, velocities;
+    for (int i = 0; i < 50; i++) {
+        positions.push_back(Vec3(i*0.1, i*0.2, -i*0.3));
+        velocities.push_back(Vec3(1.0/(i+1), 0, i));
+    }
+    State::StateBuilder builder(1.5);
+    builder.setPositions(positions);
+    builder.setVelocities(velocities);
+    builder.setEnergy(10.0, -100.0);
+    builder.setPeriodicBoxVectors(Vec3(2, 0, 0), Vec3(0, 2, 0), Vec3(0, 0, 2));
+    State state = builder.getState();
+    stringstream buffer;
+    BinarySerializer::serialize<State>(&state, "State", buffer, compress);
+    State* copy = BinarySerializer::deserialize<State>(buffer);
+    stringstream xml1, xml2;
+    XmlSerializer::serialize<State>(&state, "State", xml1);
+    XmlSerializer::serialize<State>(copy, "State", xml2);
+    ASSERT_EQUAL(xml1.str(), xml2.str());
+    delete copy;
+}
+
+void testInvalidData() {
+    SerializationNode root;
+    root.setName("Root");
+    for (int i = 0; i < 10; i++)
+        root.createChildNode("Child").setIntProperty("v", i);
+    stringstream buffer;
+    BinarySerializer::serialize(root, buffer);
+    string data = buffer.str();
+
+    // Truncated data should produce an exception.
+
+    stringstream truncated(data.substr(0, data.size()-5));
+    SerializationNode copy;
+    bool threwException = false;
+    try {
+        BinarySerializer::deserialize(truncated, copy);
+    }
+    catch (const OpenMMException& ex) {
+        threwException = true;
+    }
+    ASSERT(threwException);
+
+    // So should data that is not in the binary format at all.
+
+    stringstream xml("<?xml version=\"1.0\" ?>\n<Root/>\n");
+    threwException = false;
+    try {
+        BinarySerializer::deserialize(xml, copy);
+    }
+    catch (const OpenMMException& ex) {
+        threwException = true;
+    }
+    ASSERT(threwException);
+}
+
+/**
+ * Check that deserializing some data throws an OpenMMException.
+ */
+void assertInvalid(const string& data) {
+    stringstream buffer(data);
+    SerializationNode copy;
+    bool threwException = false;
+    try {
+        BinarySerializer::deserialize(buffer, copy);
+    }
+    catch (const OpenMMException& ex) {
+        threwException = true;
+    }
+    ASSERT(threwException);
+}
+
+/**
+ * Replace the 64 bit little endian integer stored at an offset in the data.
+ */
+string setLong(const string& data, int offset, unsigned long long value) {
+    string result = data;
+    for (int i = 0; i < 8; i++)
+        result[offset+i] = (char) ((value>>(8*i))&0xFF);
+    return result;
+}
+
+void testInvalidCompressedData() {
+    SerializationNode root;
+    root.setName("Root");
+    for (int i = 0; i < 100; i++)
+        root.createChildNode("Child").setIntProperty("v", i);
+    stringstream buffer;
+    BinarySerializer::serialize(root, buffer, true);
+    string data = buffer.str();
+    assertInvalid(data.substr(0, data.size()-5));
+
+    // The size in the header must match the decompressed data.  A huge size must not be allocated up front.
+
+    unsigned long long size = 0;
+    for (int i = 0; i < 8; i++)
+        size |= ((unsigned long long) (unsigned char) data[6+i])<<(8*i);
+    assertInvalid(setLong(data, 6, size-1));
+    assertInvalid(setLong(data, 6, size+1));
+    assertInvalid(setLong(data, 6, 1ULL<<62));
+    assertInvalid(setLong(setLong(data, 6, 1ULL<<62), 14, 1ULL<<62));
+
+    // So must the length of the compressed data.
+
+    assertInvalid(setLong(data, 14, data.size()-22-1));
+    assertInvalid(data.substr(0, 20));
+
+    // Several objects written to one stream should be read back one at a time.
+
+    SerializationNode root2;
+    root2.setName("Root2");
+    root2.setStringProperty("name", "second");
+    BinarySerializer::serialize(root2, buffer, true);
+    BinarySerializer::serialize(root, buffer, false);
+    SerializationNode copy1, copy2, copy3;
+    BinarySerializer::deserialize(buffer, copy1);
+    BinarySerializer::deserialize(buffer, copy2);
+    BinarySerializer::deserialize(buffer, copy3);
+    ASSERT_EQUAL(100, copy1.getChildren().size());
+    ASSERT_EQUAL(99, copy1.getChildren()[99].getIntProperty("v"));
+    ASSERT_EQUAL("second", copy2.getStringProperty("name"));
+    ASSERT_EQUAL(100, copy3.getChildren().size());
+}
+
+int main() {
+    try {
+        testNodes(false);
+        testSystem(false);
+        testState(false);
+        if (BinarySerializer::isCompressionSupported()) {
+            testNodes(true);
+            testSystem(true);
+            testState(true);
+            testInvalidCompressedData();
+        }
+        testInvalidData();
+    }
+    catch(const exception& e) {
+        cout << "exception: " << e.what() << endl;
+        return 1;
+    }
+    cout << "Done" << endl;
+    return 0;
+}
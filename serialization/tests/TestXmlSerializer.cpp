@@ -0,0 +1,115 @@
+/* -------------------------------------------------------------------------- *
+ *                                   OpenMM                                   *
+ * -------------------------------------------------------------------------- *
+ * This is part of the OpenMM molecular simulation toolkit originating from   *
+ * Simbios, the NIH National Center for Physics-Based Simulation of           *
+ * Biological Structures at Stanford, funded under the NIH Roadmap for        *
+ * Medical Research, grant U54 GM072970. See https://simtk.org.               *
+ *                                                                            *
+ * Portions copyright (c) 2016 Stanford University and the Authors.           *
+ * Authors: Peter Eastman                                                     *
+ * Contributors:                                                              *
+ *                                                                            *
+ * Permission is hereby granted, free of charge, to any person obtaining a    *
+ * copy of this software and associated documentation files (the "Software"), *
+ * to deal in the Software without restriction, including without limitation  *
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense,   *
+ * and/or sell copies of the Software, and to permit persons to whom the      *
+ * Software is furnished to do so, subject to the following conditions:       *
+ *                                                                            *
+ * The above copyright notice and this permission notice shall be included in *
+ * all copies or substantial portions of the Software.                        *
+ *                                                                            *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR *
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   *
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    *
+ * THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,    *
+ * DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR      *
+ * OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE  *
+ * USE OR OTHER DEALINGS IN THE SOFTWARE.                                     *
+ * -------------------------------------------------------------------------- */
+
+#include "openmm/internal/AssertionUtilities.h"
+#include "openmm/serialization/XmlSerializer.h"
+#include <iostream>
+#include <sstream>
+
+using namespace OpenMM;
+using namespace std;
+
+void testParseDocument() {
+    string xml = "<?xml version=\"1.0\" ?>\n"
+                 "<!DOCTYPE Root>\n"
+                 "<!-- a comment <with> markup -->\n"
+                 "<Root a=\"1\" b = 'two' c=\"&lt;&amp;&gt;&quot;&apos;&#x41;&#66;\">\n"
+                 "\tsome text\n"
+                 "\t<Child x=\".5\"/>\n"
+                 "\t<!-- <Ignored/> -->\n"
+                 "\t<![CDATA[ <Ignored/> ]]>\n"
+                 "\t<Child x=\"2\"><Grandchild/></Child>\n"
+                 "</Root>\n";
+    stringstream stream(xml);
+    SerializationNode root;
+    XmlSerializer::deserialize(stream, root);
+    ASSERT_EQUAL("Root", root.getName());
+    ASSERT_EQUAL(3, root.getProperties().size());
+    ASSERT_EQUAL(1, root.getIntProperty("a"));
+    ASSERT_EQUAL("two", root.getStringProperty("b"));
+    ASSERT_EQUAL("<&>\"'AB", root.getStringProperty("c"));
+    ASSERT_EQUAL(2, root.getChildren().size());
+    ASSERT_EQUAL("Child", root.getChildren()[0].getName());
+    ASSERT_EQUAL(0.5, root.getChildren()[0].getDoubleProperty("x"));
+    ASSERT_EQUAL(0, root.getChildren()[0].getChildren().size());
+    ASSERT_EQUAL(2.0, root.getChildren()[1].getDoubleProperty("x"));
+    ASSERT_EQUAL(1, root.getChildren()[1].getChildren().size());
+    ASSERT_EQUAL("Grandchild", root.getChildren()[1].getChildren()[0].getName());
+}
+
+void testRoundTrip() {
+    // Build a document that is much larger than the block size used for reading, and contains strings that
+    // need to be encoded.
+
+    SerializationNode root;
+    root.setName("Root");
+    root.setStringProperty("text", "a <string> with \"special\" & 'odd' characters");
+    for (int i = 0; i < 20000; i++)
+        root.createChildNode("Child").setIntProperty("index", i).setDoubleProperty("value", 1.0/(i+1));
+    stringstream buffer;
+    XmlSerializer::serialize(root, buffer);
+    SerializationNode copy;
+    XmlSerializer::deserialize(buffer, copy);
+    ASSERT_EQUAL(root.getStringProperty("text"), copy.getStringProperty("text"));
+    ASSERT_EQUAL(root.getChildren().size(), copy.getChildren().size());
+    for (int i = 0; i < (int) root.getChildren().size(); i++)
+        ASSERT(root.getChildren()[i].getProperties() == copy.getChildren()[i].getProperties());
+}
+
+void testInvalidDocument(const string& xml) {
+    stringstream stream(xml);
+    SerializationNode root;
+    bool threwException = false;
+    try {
+        XmlSerializer::deserialize(stream, root);
+    }
+    catch (const OpenMMException& ex) {
+        threwException = true;
+    }
+    ASSERT(threwException);
+}
+
+int main() {
+    try {
+        testParseDocument();
+        testRoundTrip();
+        testInvalidDocument("");
+        testInvalidDocument("<Root><Child></Root>");
+        testInvalidDocument("<Root a=\"1\"><Child/>");
+        testInvalidDocument("<Root a=1/>");
+    }
+    catch(const exception& e) {
+        cout << "exception: " << e.what() << endl;
+        return 1;
+    }
+    cout << "Done" << endl;
+    return 0;
+}
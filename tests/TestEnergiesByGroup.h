@@ -0,0 +1,144 @@
+/* -------------------------------------------------------------------------- *
+ *                                   OpenMM                                   *
+ * -------------------------------------------------------------------------- *
+ * This is part of the OpenMM molecular simulation toolkit originating from   *
+ * Simbios, the NIH National Center for Physics-Based Simulation of           *
+ * Biological Structures at Stanford, funded under the NIH Roadmap for        *
+ * Medical Research, grant U54 GM072970. See https://simtk.org.               *
+ *                                                                            *
+ * Portions copyright (c) 2016 Stanford University and the Authors.           *
+ * Authors: Peter Eastman                                                     *
+ * Contributors:                                                              *
+ *                                                                            *
+ * Permission is hereby granted, free of charge, to any person obtaining a    *
+ * copy of this software and associated documentation files (the "Software"), *
+ * to deal in the Software without restriction, including without limitation  *
+ * the rights to use, copy, modify, merge, publish, distribute, sublicense,   *
+ * and/or sell copies of the Software, and to permit persons to whom the      *
+ * Software is furnished to do so, subject to the following conditions:       *
+ *                                                                            *
+ * The above copyright notice and this permission notice shall be included in *
+ * all copies or substantial portions of the Software.                        *
+ *                                                                            *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR *
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,   *
+ * FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL    *
+ * THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,    *
+ * DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR      *
+ * OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE  *
+ * USE OR OTHER DEALINGS IN THE SOFTWARE.                                     *
+ * -------------------------------------------------------------------------- */
+
+#include "openmm/internal/AssertionUtilities.h"
+#include "openmm/Context.h"
+#include "openmm/HarmonicAngleForce.h"
+#include "openmm/HarmonicBondForce.h"
+#include "openmm/NonbondedForce.h"
+#include "openmm/PeriodicTorsionForce.h"
+#include "openmm/System.h"
+#include "openmm/VerletIntegrator.h"
+#include "sfmt/SFMT.h"
+#include <iostream>
+#include <vector>
+
+using namespace OpenMM;
+using namespace std;
+
+void testEnergiesByGroup() {
+    const int numMolecules = 10;
+    const int numParticles = 4*numMolecules;
+    const double boxSize = 3.0;
+    System system;
+    system.setDefaultPeriodicBoxVectors(Vec3(boxSize, 0, 0), Vec3(0, boxSize, 0), Vec3(0, 0, boxSize));
+    HarmonicBondForce* bonds = new HarmonicBondForce();
+    HarmonicAngleForce* angles = new HarmonicAngleForce();
+    NonbondedForce* nonbonded = new NonbondedForce();
+    PeriodicTorsionForce* torsions = new PeriodicTorsionForce();
+    system.addForce(bonds);
+    system.addForce(angles);
+    system.addForce(nonbonded);
+    system.addForce(torsions);
+    bonds->setForceGroup(0);
+    angles->setForceGroup(1);
+    nonbonded->setForceGroup(2);
+    nonbonded->setReciprocalSpaceForceGroup(3);
+    torsions->setForceGroup(5);
+    nonbonded->setNonbondedMethod(NonbondedForce::PME);
+    nonbonded->setCutoffDistance(1.0);
+    vector<Vec3> positions(numParticles);
+    OpenMM_SFMT::SFMT sfmt;
+    init_gen_rand(0, sfmt);
+    for (int i = 0; i < numMolecules; i++) {
+        Vec3 start(boxSize*genrand_real2(sfmt), boxSize*genrand_real2(sfmt), boxSize*genrand_real2(sfmt));
+        for (int j = 0; j < 4; j++) {
+            int index = 4*i+j;
+            system.addParticle(1.0);
+            nonbonded->addParticle(j%2 == 0 ? 0.2 : -0.2, 0.2, 0.5);
+            positions[index] = start+Vec3(0.15*j, 0.1*genrand_real2(sfmt), 0.1*(j%2));
+        }
+        bonds->addBond(4*i, 4*i+1, 0.15, 1000.0);
+        bonds->addBond(4*i+1, 4*i+2, 0.15, 1000.0);
+        bonds->addBond(4*i+2, 4*i+3, 0.15, 1000.0);
+        angles->addAngle(4*i, 4*i+1, 4*i+2, 2.0, 100.0);
+        angles->addAngle(4*i+1, 4*i+2, 4*i+3, 2.0, 100.0);
+        torsions->addTorsion(4*i, 4*i+1, 4*i+2, 4*i+3, 2, 0.5, 10.0);
+        for (int j = 0; j < 4; j++)
+            for (int k = j+1; k < 4; k++)
+                nonbonded->addException(4*i+j, 4*i+k, 0.0, 1.0, 0.0);
+    }
+    VerletIntegrator integrator(0.001);
+    Context context(system, integrator, platform);
+    context.setPositions(positions);
+
+    // The energy of every group should match what getState() computes for that group alone.
+
+    vector<double> energies;
+    context.getEnergiesByGroup(energies);
+    ASSERT_EQUAL(32, energies.size());
+    double total = 0.0;
+    for (int i = 0; i < 32; i++) {
+        double expected = context.getState(State::Energy, false, 1<<i).getPotentialEnergy();
+        ASSERT_EQUAL_TOL(expected, energies[i], 1e-5);
+        total += energies[i];
+    }
+    ASSERT(energies[2] != 0.0);
+    ASSERT(energies[3] != 0.0);
+    ASSERT_EQUAL_TOL(context.getState(State::Energy).getPotentialEnergy(), total, 1e-5);
+
+    // Groups that are not requested should be 0.
+
+    context.getEnergiesByGroup(energies, (1<<1)+(1<<3));
+    ASSERT_EQUAL(32, energies.size());
+    for (int i = 0; i < 32; i++) {
+        if (i == 1 || i == 3) {
+            ASSERT_EQUAL_TOL(context.getState(State::Energy, false, 1<<i).getPotentialEnergy(), energies[i], 1e-5);
+        }
+        else {
+            ASSERT_EQUAL(0.0, energies[i]);
+        }
+    }
+
+    // Computing the energies should not change the forces.
+
+    State state1 = context.getState(State::Forces);
+    context.getEnergiesByGroup(energies);
+    State state2 = context.getState(State::Forces);
+    for (int i = 0; i < numParticles; i++)
+        ASSERT_EQUAL_VEC(state1.getForces()[i], state2.getForces()[i], 1e-5);
+}
+
+void runPlatformTests();
+
+int main(int argc, char* argv[]) {
+    try {
+        initializeTests(argc, argv);
+        testEnergiesByGroup();
+        runPlatformTests();
+    }
+    catch(const exception& e) {
+        cout << "exception: " << e.what() << endl;
+        return 1;
+    }
+    cout << "Done" << endl;
+    return 0;
+}
@@ -13,17 +13,20 @@ __maintainer__ = "Peter Eastman"
 __email__ = "peastman@stanford.edu"
 
 from .topology import Topology, Chain, Residue, Atom
-from .pdbfile import PDBFile
+from .pdbfile import PDBFile, PDBTrajectory
 from .pdbxfile import PDBxFile
 from .forcefield import ForceField
 from .simulation import Simulation
+from .replicamanager import ReplicaManager
 from .pdbreporter import PDBReporter, PDBxReporter
 from .amberprmtopfile import AmberPrmtopFile, HCT, OBC1, OBC2, GBn, GBn2
 from .amberinpcrdfile import AmberInpcrdFile
 from .dcdfile import DCDFile
-from .gromacsgrofile import GromacsGroFile
+from .gromacsgrofile import GromacsGroFile, GromacsGroTrajectory
 from .gromacstopfile import GromacsTopFile
 from .dcdreporter import DCDReporter
+from .ambernetcdffile import AmberNetcdfFile
+from .netcdfreporter import NetcdfReporter
 from .modeller import Modeller
 from .statedatareporter import StateDataReporter
 from .element import Element
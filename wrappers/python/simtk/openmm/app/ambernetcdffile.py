@@ -0,0 +1,287 @@
+"""
+ambernetcdffile.py: Reads and writes AMBER NetCDF trajectory files.
+
+This is part of the OpenMM molecular simulation toolkit originating from
+Simbios, the NIH National Center for Physics-Based Simulation of
+Biological Structures at Stanford, funded under the NIH Roadmap for
+Medical Research, grant U54 GM072970. See https://simtk.org.
+
+Portions copyright (c) 2016 Stanford University and the Authors.
+Authors: Peter Eastman
+Contributors:
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+from __future__ import absolute_import
+__author__ = "Peter Eastman"
+__version__ = "1.0"
+
+import math
+from simtk.openmm import Vec3
+from simtk.unit import angstroms, nanometers, picoseconds, degrees, is_quantity
+from simtk.openmm.app.internal.netcdf import NetCDFFile
+from simtk.openmm.app.internal.unitcell import computePeriodicBoxVectors, computeLengthsAndAngles
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class AmberNetcdfFile(object):
+    """AmberNetcdfFile reads and writes trajectories in the AMBER NetCDF format.
+
+    The format stores coordinates, and optionally velocities and periodic unit cells, as double precision
+    values in a NetCDF-3 file following the AMBER conventions, so the files can be read by AMBER and the
+    analysis tools that support it.  Frames are appended to the end of the file as they are written, and any
+    frame can be read without loading the rest of the trajectory.  This class does not depend on any NetCDF
+    library, but it does require numpy.
+
+    To write a trajectory, create an AmberNetcdfFile with mode 'w', then call writeModel() once for each
+    frame.  To add frames to an existing trajectory, use mode 'a'.  To read a trajectory, use mode 'r' and
+    call getPositions(), getVelocities(), getPeriodicBoxVectors(), and getTime() with the index of a frame.
+    Restart files, which contain a single frame with no frame dimension, can be read the same way.
+    """
+
+    def __init__(self, file, mode='r', topology=None, velocities=False, periodic=None, title=''):
+        """Open an AMBER NetCDF trajectory.
+
+        Parameters
+        ----------
+        file : string
+            The name of the file
+        mode : string='r'
+            'r' to read an existing file, 'w' to create a new file, or 'a' to
+            append frames to an existing file
+        topology : Topology=None
+            The Topology defining the molecular system being written.  This is
+            required when creating a file.  When appending, it is used to check
+            that the file contains the right number of atoms.
+        velocities : bool=False
+            When creating a file, whether to store velocities in it
+        periodic : bool=None
+            When creating a file, whether to store the periodic unit cell in it.
+            If None, the unit cell is stored if the Topology has periodic box
+            vectors.
+        title : string=''
+            When creating a file, the title to store in it
+        """
+        self._nc = None
+        if mode == 'w':
+            if topology is None:
+                raise ValueError('A Topology is required to create an AMBER NetCDF file')
+            if periodic is None:
+                periodic = (topology.getPeriodicBoxVectors() is not None)
+            self._nc = NetCDFFile(file, 'w')
+            self._createVariables(topology.getNumAtoms(), velocities, periodic, title)
+        elif mode in ('r', 'a'):
+            self._nc = NetCDFFile(file, mode)
+            if 'coordinates' not in self._nc.variables:
+                raise ValueError('%s is not an AMBER NetCDF file' % file)
+            if topology is not None and topology.getNumAtoms() != self._nc.dimensions['atom']:
+                raise ValueError('The file contains %d atoms, but the Topology has %d' % (self._nc.dimensions['atom'], topology.getNumAtoms()))
+        else:
+            raise ValueError("Illegal mode '%s': must be 'r', 'w', or 'a'" % mode)
+        self._variables = self._nc.variables
+
+    def _createVariables(self, numAtoms, velocities, periodic, title):
+        """Define the dimensions, variables, and attributes of a new file."""
+        nc = self._nc
+        try:
+            from simtk.openmm.version import version
+        except ImportError:
+            version = 'unknown'
+        nc.attributes['title'] = title
+        nc.attributes['application'] = 'OpenMM'
+        nc.attributes['program'] = 'OpenMM'
+        nc.attributes['programVersion'] = version
+        nc.attributes['Conventions'] = 'AMBER'
+        nc.attributes['ConventionVersion'] = '1.0'
+        nc.createDimension('frame', None)
+        nc.createDimension('spatial', 3)
+        nc.createDimension('atom', numAtoms)
+        if periodic:
+            nc.createDimension('cell_spatial', 3)
+            nc.createDimension('label', 5)
+            nc.createDimension('cell_angular', 3)
+        nc.createVariable('spatial', 'c', ('spatial',))
+        nc.createVariable('time', 'd', ('frame',)).attributes['units'] = 'picosecond'
+        nc.createVariable('coordinates', 'd', ('frame', 'atom', 'spatial')).attributes['units'] = 'angstrom'
+        if periodic:
+            nc.createVariable('cell_spatial', 'c', ('cell_spatial',))
+            nc.createVariable('cell_angular', 'c', ('cell_angular', 'label'))
+            nc.createVariable('cell_lengths', 'd', ('frame', 'cell_spatial')).attributes['units'] = 'angstrom'
+            nc.createVariable('cell_angles', 'd', ('frame', 'cell_angular')).attributes['units'] = 'degree'
+        if velocities:
+            nc.createVariable('velocities', 'd', ('frame', 'atom', 'spatial')).attributes['units'] = 'angstrom/picosecond'
+        nc.variables['spatial'][:] = 'xyz'
+        if periodic:
+            nc.variables['cell_spatial'][:] = 'abc'
+            nc.variables['cell_angular'][:] = ['alpha', 'beta', 'gamma']
+
+    def __len__(self):
+        return self.getNumFrames()
+
+    def getNumFrames(self):
+        """Get the number of frames in the file."""
+        coordinates = self._variables['coordinates']
+        return (coordinates.shape[0] if coordinates.isrec else 1)
+
+    def getNumAtoms(self):
+        """Get the number of atoms in each frame."""
+        return self._nc.dimensions['atom']
+
+    def hasVelocities(self):
+        """Get whether the file contains velocities."""
+        return 'velocities' in self._variables
+
+    def hasPeriodicBoxVectors(self):
+        """Get whether the file contains periodic unit cells."""
+        return 'cell_lengths' in self._variables and 'cell_angles' in self._variables
+
+    def _frameData(self, name, frame):
+        """Get the data for one frame of a variable."""
+        variable = self._variables[name]
+        if not variable.isrec:
+            if frame not in (0, -1):
+                raise IndexError('The file contains only one frame')
+            return variable[:]
+        return variable[frame]
+
+    def _toArray(self, values, unit, name):
+        """Convert a list of vectors to an (n, 3) array in the specified unit, checking for invalid values."""
+        if is_quantity(values):
+            values = values.value_in_unit(unit)
+        values = numpy.asarray(values, dtype=numpy.float64)
+        if values.shape != (self.getNumAtoms(), 3):
+            raise ValueError('The number of %s (%d) does not match the number of atoms (%d)' % (name, len(values), self.getNumAtoms()))
+        if not numpy.all(numpy.isfinite(values)):
+            raise ValueError('Particle %s are NaN or infinite' % name)
+        return values
+
+    def writeModel(self, positions, velocities=None, periodicBoxVectors=None, time=None):
+        """Append a frame to the file.
+
+        Parameters
+        ----------
+        positions : list
+            The list of atomic positions to write
+        velocities : list=None
+            The list of atomic velocities to write.  This is required if the file
+            stores velocities, and ignored otherwise.
+        periodicBoxVectors : tuple of Vec3=None
+            The periodic box vectors of this frame.  This is required if the file
+            stores the unit cell, and ignored otherwise.
+        time : time=None
+            The simulation time of this frame.  If None, the index of the frame
+            is written instead.
+        """
+        # Convert everything before writing anything, so an invalid frame leaves the file unchanged.
+
+        data = [('coordinates', self._toArray(positions, angstroms, 'positions'))]
+        if self.hasVelocities():
+            if velocities is None:
+                raise ValueError('This file stores velocities, so they must be specified')
+            data.append(('velocities', self._toArray(velocities, angstroms/picoseconds, 'velocities')))
+        if self.hasPeriodicBoxVectors():
+            if periodicBoxVectors is None:
+                raise ValueError('This file stores periodic box vectors, so they must be specified')
+            (a, b, c, alpha, beta, gamma) = computeLengthsAndAngles(periodicBoxVectors)
+            data.append(('cell_lengths', [10*a, 10*b, 10*c]))
+            data.append(('cell_angles', [math.degrees(alpha), math.degrees(beta), math.degrees(gamma)]))
+        frame = self.getNumFrames()
+        if time is None:
+            time = frame
+        elif is_quantity(time):
+            time = time.value_in_unit(picoseconds)
+        data.append(('time', time))
+        for name, values in data:
+            self._variables[name][frame] = values
+        self._nc.flush()
+
+    def getPositions(self, frame=0, asNumpy=False):
+        """Get the atomic positions in a frame.
+
+        Parameters
+        ----------
+        frame : int=0
+            The index of the frame to read
+        asNumpy : bool=False
+            if true, the values are returned as a numpy array instead of a list
+            of Vec3s
+        """
+        return self._vectors(self._frameData('coordinates', frame), nanometers, asNumpy)
+
+    def getVelocities(self, frame=0, asNumpy=False):
+        """Get the atomic velocities in a frame, or None if the file does not contain velocities.
+
+        Parameters
+        ----------
+        frame : int=0
+            The index of the frame to read
+        asNumpy : bool=False
+            if true, the values are returned as a numpy array instead of a list
+            of Vec3s
+        """
+        if not self.hasVelocities():
+            return None
+        scale = self._variables['velocities'].attributes.get('scale_factor', 1.0)
+        return self._vectors(self._frameData('velocities', frame)*scale, nanometers/picoseconds, asNumpy)
+
+    def _vectors(self, values, unit, asNumpy):
+        """Convert an array of values in AMBER units to a Quantity."""
+        values = values*0.1
+        if asNumpy:
+            return values*unit
+        return [Vec3(*v) for v in values.tolist()]*unit
+
+    def getPeriodicBoxVectors(self, frame=0):
+        """Get the periodic box vectors of a frame, or None if the file does not contain unit cells.
+
+        Parameters
+        ----------
+        frame : int=0
+            The index of the frame to read
+        """
+        if not self.hasPeriodicBoxVectors():
+            return None
+        lengths = self._frameData('cell_lengths', frame).tolist()
+        angles = self._frameData('cell_angles', frame).tolist()
+        return computePeriodicBoxVectors(*([x*angstroms for x in lengths]+[x*degrees for x in angles]))
+
+    def getTime(self, frame=0):
+        """Get the simulation time of a frame, or None if the file does not contain times.
+
+        Parameters
+        ----------
+        frame : int=0
+            The index of the frame to read
+        """
+        if 'time' not in self._variables:
+            return None
+        time = self._variables['time']
+        if time.isrec:
+            return time[frame].item()*picoseconds
+        return time.getValue()*picoseconds
+
+    def close(self):
+        """Close the file."""
+        if self._nc is not None:
+            self._nc.close()
+
+    def __del__(self):
+        self.close()
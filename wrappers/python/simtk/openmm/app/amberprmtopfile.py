@@ -143,10 +143,10 @@ class AmberPrmtopFile(object):
         # Add bonds to the topology
 
         atoms = list(top.atoms())
-        for bond in prmtop.getBondsWithH():
-            top.addBond(atoms[bond[0]], atoms[bond[1]])
-        for bond in prmtop.getBondsNoH():
-            top.addBond(atoms[bond[0]], atoms[bond[1]])
+        for flag in ('BONDS_INC_HYDROGEN', 'BONDS_WITHOUT_HYDROGEN'):
+            atom1, atom2 = prmtop._getBondColumns(flag)[:2]
+            for i, j in zip(amber_file_parser._toList(atom1), amber_file_parser._toList(atom2)):
+                top.addBond(atoms[i], atoms[j])
 
         # Set the periodic box size.
 
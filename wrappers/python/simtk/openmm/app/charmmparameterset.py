@@ -35,13 +35,20 @@ USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 from __future__ import absolute_import
 import os
+import sys
+import hashlib
+import json
+import pickle
+import struct
+import tempfile
 from simtk.openmm.app.internal.charmm._charmmfile import (
             CharmmFile, CharmmStreamFile)
 from simtk.openmm.app.internal.charmm.topologyobjects import (
             AtomType, BondType, AngleType, DihedralType, ImproperType, CmapType,
-            UreyBradleyType, NoUreyBradley)
+            UreyBradleyType, NoUreyBradley, WildCard)
 from simtk.openmm.app.internal.charmm.exceptions import CharmmFileError
 from simtk.openmm.app.element import Element, get_by_symbol
+from simtk.openmm.app.internal.fileutil import replaceFile
 import simtk.unit as u
 import warnings
 
@@ -89,8 +96,25 @@ class CharmmParameterSet(object):
     Examples
     --------
     >>> params = CharmmParameterSet('charmm22.top', 'charmm22.par', 'file.str')
+
+    Parsing and condensing a large parameter set takes a while, so it can be
+    saved to a binary cache that is only reused as long as none of the files
+    it was read from have changed:
+
+    >>> params = CharmmParameterSet.loadCache('charmm22.cache')
+    >>> if params is None:
+    ...     params = CharmmParameterSet('charmm22.top', 'charmm22.par').condense()
+    ...     params.saveCache('charmm22.cache')
     """
 
+    # Identifies cache files, and the version of their format.  Increment the
+    # version whenever the attributes stored in the cache change.  The magic
+    # string, version, and Python version are followed by the list of source
+    # files as JSON, so a cache can be checked without unpickling anything.
+    _CACHE_MAGIC = b'OpenMM CharmmParameterSet cache\n'
+    _CACHE_VERSION = 2
+    _CACHE_HEADER = struct.Struct('<III')
+
     @staticmethod
     def _convert(data, type, msg=''):
         """
@@ -115,6 +139,8 @@ class CharmmParameterSet(object):
         self.cmap_types = dict()
         self.nbfix_types = dict()
         self.parametersets = []
+        # (absolute path, SHA-1 hash) of every file read, for validating caches
+        self._sourcefiles = []
 
         # Load all of the files
         tops, pars, strs = [], [], []
@@ -215,6 +241,7 @@ class CharmmParameterSet(object):
         if isinstance(pfile, str):
             own_handle = True
             f = CharmmFile(pfile)
+            self._addSourceFile(pfile)
         else:
             own_handle = False
             f = pfile
@@ -546,6 +573,7 @@ class CharmmParameterSet(object):
         if isinstance(tfile, str):
             own_handle = True
             f = CharmmFile(tfile)
+            self._addSourceFile(tfile)
         else:
             own_handle = False
             f = tfile
@@ -591,6 +619,7 @@ class CharmmParameterSet(object):
             f = sfile
         else:
             f = CharmmStreamFile(sfile)
+            self._addSourceFile(sfile)
 
         title, section = f.next_section()
         while title is not None and section is not None:
@@ -654,4 +683,125 @@ class CharmmParameterSet(object):
                 if typedict[key1] == typedict[key2]:
                     typedict[key2] = typedict[key1]
 
+    def _addSourceFile(self, fname):
+        """Records a file that was read, so caches can be checked against it"""
+        path = os.path.abspath(fname)
+        if path not in [source[0] for source in self._sourcefiles]:
+            self._sourcefiles.append((path, _hashFile(path)))
+
+    def saveCache(self, filename):
+        """
+        Saves this parameter set, including any condensing that was done to it,
+        to a binary cache file that can be reloaded with loadCache().
+
+        The cache records the SHA-1 hash of every topology, parameter, and
+        stream file that was read by name, so it is only reused while all of
+        them are unchanged. Parameters read from open file objects are stored
+        in the cache, but cannot be checked.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the cache file to write. It is replaced atomically, so
+            several processes sharing one cache never see a partial file.
+        """
+        sourcefiles = json.dumps(self._sourcefiles).encode('utf-8')
+        directory = os.path.dirname(os.path.abspath(filename))
+        fd, tmpname = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(CharmmParameterSet._CACHE_MAGIC)
+                f.write(CharmmParameterSet._CACHE_HEADER.pack(
+                        CharmmParameterSet._CACHE_VERSION, sys.version_info[0],
+                        len(sourcefiles)))
+                f.write(sourcefiles)
+                _CachePickler(f, 2).dump(self.__dict__)
+            replaceFile(tmpname, filename)
+        except:
+            os.remove(tmpname)
+            raise
+
+    @classmethod
+    def loadCache(cls, filename):
+        """
+        Loads a parameter set from a cache file written by saveCache().
+
+        The header of the file is checked before anything is unpickled, but the
+        parameters themselves are stored with pickle, so only load caches from
+        a trusted location. Never load a cache that someone else could have
+        written.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the cache file to read
+
+        Returns
+        -------
+        CharmmParameterSet
+            The cached parameter set, or None if the cache does not exist, was
+            written by an incompatible version, is corrupt, or any of the files
+            the parameters were read from has been modified or removed since it
+            was written. The caller should then read the files and save a new
+            cache.
+
+        Raises
+        ------
+        CharmmFileError if the file is not a CharmmParameterSet cache
+        """
+        if not os.path.isfile(filename):
+            return None
+        magic = CharmmParameterSet._CACHE_MAGIC
+        header = CharmmParameterSet._CACHE_HEADER
+        with open(filename, 'rb') as f:
+            if f.read(len(magic)) != magic:
+                raise CharmmFileError('%s is not a CharmmParameterSet cache' %
+                                      filename)
+            try:
+                version, pyversion, length = header.unpack(f.read(header.size))
+                if (version != CharmmParameterSet._CACHE_VERSION or
+                        pyversion != sys.version_info[0]):
+                    return None
+                sourcefiles = json.loads(f.read(length).decode('utf-8'))
+            except (struct.error, ValueError):
+                return None
+            for path, digest in sourcefiles:
+                if not os.path.isfile(path) or _hashFile(path) != digest:
+                    return None
+            try:
+                data = _CacheUnpickler(f).load()
+            except Exception:
+                # A truncated or corrupt cache is treated as a cache miss.
+                return None
+        inst = cls.__new__(cls)
+        inst.__dict__.update(data)
+        return inst
+
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _hashFile(fname):
+    """Returns the SHA-1 hash of the contents of a file"""
+    sha = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        for block in iter(lambda: f.read(1<<20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+# NoUreyBradley and WildCard are singletons that are compared by identity, so
+# they are stored in caches by name and restored as the singletons themselves
+_cacheSingletons = {'NoUreyBradley': NoUreyBradley, 'WildCard': WildCard}
+
+class _CachePickler(pickle.Pickler):
+    def persistent_id(self, obj):
+        if obj is NoUreyBradley:
+            return 'NoUreyBradley'
+        if obj is WildCard:
+            return 'WildCard'
+        return None
+
+class _CacheUnpickler(pickle.Unpickler):
+    def persistent_load(self, pid):
+        try:
+            return _cacheSingletons[pid]
+        except KeyError:
+            raise pickle.UnpicklingError('Unknown object in cache: %s' % pid)
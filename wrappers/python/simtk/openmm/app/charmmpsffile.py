@@ -56,6 +56,10 @@ from simtk.openmm.app.internal.charmm.exceptions import (
                 CharmmPSFError, MoleculeError, CharmmPSFWarning,
                 MissingParameter, CharmmPsfEOF)
 import warnings
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 TINY = 1e-8
 WATNAMES = ('WAT', 'HOH', 'TIP3', 'TIP4', 'TIP5', 'SPCE', 'SPC')
@@ -1040,46 +1044,12 @@ class CharmmPsfFile(object):
                 force.addParticle(atm.charge, 1.0, 0.0)
             # Now add the custom nonbonded force that implements NBFIX. First
             # thing we need to do is condense our number of types
-            lj_idx_list = [0 for atom in self.atom_list]
-            lj_radii, lj_depths = [], []
-            num_lj_types = 0
-            lj_type_list = []
-            for i, atom in enumerate(self.atom_list):
-                atom = atom.type
-                if lj_idx_list[i]: continue # already assigned
-                num_lj_types += 1
-                lj_idx_list[i] = num_lj_types
-                ljtype = (atom.rmin, atom.epsilon)
-                lj_type_list.append(atom)
-                lj_radii.append(atom.rmin)
-                lj_depths.append(atom.epsilon)
-                for j in range(i+1, len(self.atom_list)):
-                    atom2 = self.atom_list[j].type
-                    if lj_idx_list[j] > 0: continue # already assigned
-                    if atom2 is atom:
-                        lj_idx_list[j] = num_lj_types
-                    elif not atom.nbfix:
-                        # Only non-NBFIXed atom types can be compressed
-                        ljtype2 = (atom2.rmin, atom2.epsilon)
-                        if ljtype == ljtype2:
-                            lj_idx_list[j] = num_lj_types
+            lj_idx_list, lj_type_list = _condense_lj_types(self.atom_list)
+            num_lj_types = len(lj_type_list)
             # Now everything is assigned. Create the A-coefficient and
             # B-coefficient arrays
-            acoef = [0 for i in range(num_lj_types*num_lj_types)]
-            bcoef = acoef[:]
-            for i in range(num_lj_types):
-                for j in range(num_lj_types):
-                    namej = lj_type_list[j].name
-                    try:
-                        rij, wdij, rij14, wdij14 = lj_type_list[i].nbfix[namej]
-                    except KeyError:
-                        rij = (lj_radii[i] + lj_radii[j]) * length_conv
-                        wdij = sqrt(lj_depths[i] * lj_depths[j]) * ene_conv
-                    else:
-                        rij *= length_conv
-                        wdij *= ene_conv
-                    acoef[i+num_lj_types*j] = sqrt(wdij) * rij**6
-                    bcoef[i+num_lj_types*j] = 2 * wdij * rij**6
+            acoef, bcoef = _lj_coefficient_tables(lj_type_list, length_conv,
+                                                  ene_conv)
             cforce = mm.CustomNonbondedForce('(a/r6)^2-b/r6; r6=r^6;'
                                              'a=acoef(type1, type2);'
                                              'b=bcoef(type1, type2)')
@@ -1113,52 +1083,31 @@ class CharmmPsfFile(object):
                 cforce.setUseSwitchingFunction(True)
                 cforce.setSwitchingDistance(switchDistance)
             for i in lj_idx_list:
-                cforce.addParticle((i - 1,)) # adjust for indexing from 0
+                cforce.addParticle((i,))
 
         # Add 1-4 interactions
-        excluded_atom_pairs = set() # save these pairs so we don't zero them out
+        pairs14, exclusions = self._getExceptionPairs()
         sigma_scale = 2**(-1/6)
-        for tor in self.dihedral_parameter_list:
-            # First check to see if atoms 1 and 4 are already excluded because
-            # they are 1-2 or 1-3 pairs (would happen in 6-member rings or
-            # fewer). Then check that they're not already added as exclusions
-            if tor.atom1 in tor.atom4.bond_partners: continue
-            if tor.atom1 in tor.atom4.angle_partners: continue
-            key = min((tor.atom1.idx, tor.atom4.idx),
-                      (tor.atom4.idx, tor.atom1.idx))
-            if key in excluded_atom_pairs: continue # multiterm...
-            charge_prod = (tor.atom1.charge * tor.atom4.charge)
-            epsilon = (sqrt(abs(tor.atom1.type.epsilon_14) * ene_conv *
-                            abs(tor.atom4.type.epsilon_14) * ene_conv))
-            sigma = (tor.atom1.type.rmin_14 + tor.atom4.type.rmin_14) * (
+        atoms = self.atom_list
+        for i, j in pairs14:
+            atom1, atom4 = atoms[i], atoms[j]
+            charge_prod = (atom1.charge * atom4.charge)
+            epsilon = (sqrt(abs(atom1.type.epsilon_14) * ene_conv *
+                            abs(atom4.type.epsilon_14) * ene_conv))
+            sigma = (atom1.type.rmin_14 + atom4.type.rmin_14) * (
                      length_conv * sigma_scale)
-            force.addException(tor.atom1.idx, tor.atom4.idx,
-                               charge_prod, sigma, epsilon)
-            excluded_atom_pairs.add(
-                    min((tor.atom1.idx, tor.atom4.idx),
-                        (tor.atom4.idx, tor.atom1.idx))
-            )
+            force.addException(i, j, charge_prod, sigma, epsilon)
 
         # Add excluded atoms
-        for atom in self.atom_list:
-            # Exclude all bonds and angles
-            for atom2 in atom.bond_partners:
-                if atom2.idx > atom.idx:
-                    force.addException(atom.idx, atom2.idx, 0.0, 0.1, 0.0)
-            for atom2 in atom.angle_partners:
-                if atom2.idx > atom.idx:
-                    force.addException(atom.idx, atom2.idx, 0.0, 0.1, 0.0)
-            for atom2 in atom.dihedral_partners:
-                if atom2.idx <= atom.idx: continue
-                if ((atom.idx, atom2.idx) in excluded_atom_pairs):
-                    continue
-                force.addException(atom.idx, atom2.idx, 0.0, 0.1, 0.0)
+        for i, j in exclusions:
+            force.addException(i, j, 0.0, 0.1, 0.0)
         system.addForce(force)
         # If we needed a CustomNonbondedForce, map all of the exceptions from
         # the NonbondedForce to the CustomNonbondedForce
         if has_nbfix_terms:
-            for i in range(force.getNumExceptions()):
-                ii, jj, q, eps, sig = force.getExceptionParameters(i)
+            for ii, jj in pairs14:
+                cforce.addExclusion(ii, jj)
+            for ii, jj in exclusions:
                 cforce.addExclusion(ii, jj)
             system.addForce(cforce)
 
@@ -1246,6 +1195,52 @@ class CharmmPsfFile(object):
 
         return system
 
+    def _getExceptionPairs(self):
+        """
+        Finds the pairs of atoms whose nonbonded interactions must be modified.
+
+        Returns
+        -------
+        pairs14 : list of (int, int)
+            The 1-4 pairs of the dihedrals in dihedral_parameter_list, in the
+            order they first appear, omitting any that are also 1-2 or 1-3
+            pairs
+        exclusions : list of (int, int)
+            The pairs of atoms whose interactions are excluded: all bond and
+            angle partners, and any dihedral partners not in pairs14. These are
+            sorted by the first atom, then by bonds, angles, and dihedrals,
+            then by the second atom.
+        """
+        pairs14 = []
+        excluded_atom_pairs = set()
+        for tor in self.dihedral_parameter_list:
+            # First check to see if atoms 1 and 4 are already excluded
+            # because they are 1-2 or 1-3 pairs (would happen in 6-member
+            # rings or fewer). Then check that they're not already added as
+            # exclusions
+            if tor.atom1 in tor.atom4.bond_partners: continue
+            if tor.atom1 in tor.atom4.angle_partners: continue
+            key = min((tor.atom1.idx, tor.atom4.idx),
+                      (tor.atom4.idx, tor.atom1.idx))
+            if key in excluded_atom_pairs: continue # multiterm...
+            pairs14.append((tor.atom1.idx, tor.atom4.idx))
+            excluded_atom_pairs.add(key)
+        exclusions = []
+        for atom in self.atom_list:
+            # Exclude all bonds and angles
+            for atom2 in atom.bond_partners:
+                if atom2.idx > atom.idx:
+                    exclusions.append((atom.idx, atom2.idx))
+            for atom2 in atom.angle_partners:
+                if atom2.idx > atom.idx:
+                    exclusions.append((atom.idx, atom2.idx))
+            for atom2 in atom.dihedral_partners:
+                if atom2.idx <= atom.idx: continue
+                if ((atom.idx, atom2.idx) in excluded_atom_pairs):
+                    continue
+                exclusions.append((atom.idx, atom2.idx))
+        return pairs14, exclusions
+
     @property
     def system(self):
         """
@@ -1315,6 +1310,80 @@ class CharmmPsfFile(object):
 
 # ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+def _condense_lj_types(atom_list):
+    """
+    Assigns every atom a Lennard-Jones type for the NBFIX tables. Each atom type
+    with NBFIX terms gets its own LJ type, and all other atom types with the
+    same radius and well depth share one. LJ types are numbered in the order
+    they first appear.
+
+    Returns
+    -------
+    lj_idx_list : list of int
+        The LJ type of each atom
+    lj_type_list : list of AtomType
+        An atom type with the parameters of each LJ type
+    """
+    lj_idx_list = []
+    lj_type_list = []
+    type_indices = dict() # id(AtomType) -> LJ type
+    key_indices = dict() # atom type name or (rmin, epsilon) -> LJ type
+    for atom in atom_list:
+        typ = atom.type
+        try:
+            lj_idx_list.append(type_indices[id(typ)])
+            continue
+        except KeyError:
+            pass
+        if typ.nbfix:
+            key = typ.name
+        else:
+            key = (typ.rmin, typ.epsilon)
+        if key not in key_indices:
+            key_indices[key] = len(lj_type_list)
+            lj_type_list.append(typ)
+        type_indices[id(typ)] = key_indices[key]
+        lj_idx_list.append(key_indices[key])
+    return lj_idx_list, lj_type_list
+
+def _lj_coefficient_tables(lj_type_list, length_conv, ene_conv):
+    """
+    Builds the A and B coefficient tables used to compute the Lennard-Jones
+    interaction between each pair of LJ types, applying any NBFIX terms. The
+    coefficient for types i and j is at index i+num_lj_types*j of each table.
+    """
+    num_lj_types = len(lj_type_list)
+    nbfix_indices = dict((typ.name, i) for i, typ in enumerate(lj_type_list)
+                         if typ.nbfix)
+    if numpy is not None:
+        radii = numpy.array([typ.rmin for typ in lj_type_list])
+        depths = numpy.array([typ.epsilon for typ in lj_type_list])
+        rij = numpy.add.outer(radii, radii) * length_conv
+        wdij = numpy.sqrt(numpy.multiply.outer(depths, depths)) * ene_conv
+    else:
+        rij = [[(typi.rmin + typj.rmin) * length_conv
+                for typj in lj_type_list] for typi in lj_type_list]
+        wdij = [[sqrt(typi.epsilon * typj.epsilon) * ene_conv
+                 for typj in lj_type_list] for typi in lj_type_list]
+    for i, typ in enumerate(lj_type_list):
+        for name, (rmin, epsilon, rmin14, epsilon14) in typ.nbfix.items():
+            j = nbfix_indices.get(name)
+            if j is not None:
+                rij[i][j] = rmin * length_conv
+                wdij[i][j] = epsilon * ene_conv
+    if numpy is not None:
+        rij6 = rij**6
+        acoef = numpy.sqrt(wdij) * rij6
+        bcoef = 2 * wdij * rij6
+        return acoef.ravel(order='F').tolist(), bcoef.ravel(order='F').tolist()
+    acoef = [sqrt(wdij[i][j]) * rij[i][j]**6
+             for j in range(num_lj_types) for i in range(num_lj_types)]
+    bcoef = [2 * wdij[i][j] * rij[i][j]**6
+             for j in range(num_lj_types) for i in range(num_lj_types)]
+    return acoef, bcoef
+
+# ++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
 def set_molecules(atom_list):
     """
     Correctly sets the molecularity of the system based on connectivity
@@ -32,14 +32,23 @@ from __future__ import absolute_import
 __author__ = "Robert McGibbon"
 __version__ = "1.0"
 
+try:
+    import gzip
+    have_gzip = True
+except: have_gzip = False
+
 import simtk.openmm as mm
+from simtk.openmm.app.internal.fileutil import replaceFile
+import os
+import shutil
+import threading
 __all__ = ['CheckpointReporter']
 
 
 class CheckpointReporter(object):
     """CheckpointReporter saves periodic checkpoints of a simulation.
-    The checkpoints will overwrite one another -- only the last checkpoint
-    will be saved in the file.
+    By default the checkpoints will overwrite one another -- only the last
+    checkpoint will be saved in the file.
 
     To use it, create a CheckpointReporter, then add it to the Simulation's
     list of reporters. To load a checkpoint file and continue a simulation,
@@ -48,6 +57,17 @@ class CheckpointReporter(object):
     >>> with open('checkput.chk', 'rb') as f:
     >>>     simulation.context.loadCheckpoint(f.read())
 
+    If the checkpoints are compressed, use Simulation.loadCheckpoint() instead,
+    which recognizes compressed checkpoints automatically.
+
+    When the file is specified by name, the reporter can also write each
+    checkpoint to a temporary file and then rename it, so a crash while
+    writing never destroys the previous checkpoint.  It can keep several
+    checkpoints, in which case older ones are named by appending '.1', '.2',
+    etc. to the filename, with '.1' being the most recent after the file
+    itself.  The checkpoints can be compressed with gzip, and the writing can
+    be done on a background thread so the simulation does not wait for it.
+
     Notes:
     A checkpoint contains not only publicly visible data such as the particle
     positions and velocities, but also internal data such as the states of
@@ -68,7 +88,7 @@ class CheckpointReporter(object):
     throwing an exception.
 
     """
-    def __init__(self, file, reportInterval):
+    def __init__(self, file, reportInterval, atomic=False, keep=1, compress=False, writeInBackground=False):
         """Create a CheckpointReporter.
 
         Parameters
@@ -77,15 +97,43 @@ class CheckpointReporter(object):
             The file to write to. Any current contents will be overwritten.
         reportInterval : int
             The interval (in time steps) at which to write checkpoints.
+        atomic : bool=False
+            If True, write each checkpoint to a temporary file and then rename
+            it, so an existing checkpoint is never partially overwritten.
+            This requires file to be a filename.
+        keep : int=1
+            The number of checkpoints to keep.  If this is greater than 1, file
+            must be a filename, and atomic writing is always used.
+        compress : bool=False
+            If True, compress the checkpoints with gzip.
+        writeInBackground : bool=False
+            If True, checkpoints are written on a background thread.  The data
+            is captured from the Context immediately, so the simulation can
+            continue while it is being written.
         """
 
         self._reportInterval = reportInterval
-        if isinstance(file, str):
+        self._thread = None
+        self._error = None
+        self._out = None
+        self._own_handle = False
+        if keep < 1:
+            raise ValueError('keep must be at least 1')
+        if compress and not have_gzip:
+            raise RuntimeError("Cannot compress checkpoints because Python could not import gzip library")
+        self._atomic = atomic or keep > 1
+        self._keep = keep
+        self._compress = compress
+        self._writeInBackground = writeInBackground
+        if self._atomic:
+            if not isinstance(file, str):
+                raise ValueError('Atomic writing and keeping multiple checkpoints require a filename')
+            self._filename = file
+        elif isinstance(file, str):
             self._own_handle = True
             self._out = open(file, 'w+b', 0)
         else:
             self._out = file
-            self._own_handle = False
 
     def describeNextReport(self, simulation):
         """Get information about the next report this object will generate.
@@ -116,13 +164,109 @@ class CheckpointReporter(object):
         state : State
             The current state of the simulation
         """
-        self._out.seek(0)
         chk = simulation.context.createCheckpoint()
-        self._out.write(chk)
-        self._out.truncate()
-        self._out.flush()
+        if self._compress:
+            chk = _compress(chk)
+
+        # Wait for the previous checkpoint to be written.  If that failed, still write this one before reporting
+        # the error, so the new checkpoint is not lost.
+
+        try:
+            self.wait()
+            error = None
+        except Exception as e:
+            error = e
+        if self._writeInBackground:
+            self._thread = threading.Thread(target=self._writeInThread, args=(chk,))
+            self._thread.start()
+        else:
+            self._write(chk)
+        if error is not None:
+            raise error
+
+    def wait(self):
+        """Wait until any checkpoint that is being written on a background
+        thread has been completely written.  If writing it failed, the
+        exception is raised here.
+        """
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+    def _writeInThread(self, chk):
+        try:
+            self._write(chk)
+        except Exception as e:
+            self._error = e
+
+    def _write(self, chk):
+        if not self._atomic:
+            self._out.seek(0)
+            self._out.write(chk)
+            self._out.truncate()
+            self._out.flush()
+            return
+
+        # Write the checkpoint to a temporary file in the same directory, so it can be renamed without copying.
+
+        temp = '%s.%d.tmp' % (self._filename, os.getpid())
+        try:
+            with open(temp, 'wb') as f:
+                f.write(chk)
+                f.flush()
+                os.fsync(f.fileno())
+
+            # Shift the older checkpoints down by one and save a second copy of the current one as '.1'.  The
+            # current checkpoint stays in place until the new one atomically replaces it.
+
+            for i in range(self._keep-1, 1, -1):
+                older = '%s.%d' % (self._filename, i-1)
+                if os.path.exists(older):
+                    replaceFile(older, '%s.%d' % (self._filename, i))
+            if self._keep > 1 and os.path.exists(self._filename):
+                _backup(self._filename, '%s.1' % self._filename)
+            replaceFile(temp, self._filename)
+        except:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
 
     def __del__(self):
+        # Never raise from a finalizer.  Errors from background writes are reported by wait() or report().
+
+        if self._thread is not None:
+            self._thread.join()
         if self._own_handle:
             self._out.close()
 
+
+def _compress(data):
+    """Compress a checkpoint with gzip."""
+    import io
+    buffer = io.BytesIO()
+    f = gzip.GzipFile(fileobj=buffer, mode='wb')
+    f.write(data)
+    f.close()
+    return buffer.getvalue()
+
+
+def _backup(source, dest):
+    """Make dest a copy of source, using a hard link if possible.  dest is replaced atomically."""
+    temp = '%s.tmp' % dest
+    if os.path.exists(temp):
+        os.remove(temp)
+    try:
+        try:
+            os.link(source, temp)
+        except (AttributeError, OSError):
+            shutil.copyfile(source, temp)
+        replaceFile(temp, dest)
+    except:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
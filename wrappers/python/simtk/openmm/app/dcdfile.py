@@ -40,6 +40,10 @@ import math
 from simtk.unit import picoseconds, nanometers, angstroms, is_quantity, norm
 from simtk.openmm import Vec3
 from simtk.openmm.app.internal.unitcell import computeLengthsAndAngles
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class DCDFile(object):
     """DCDFile provides methods for creating DCD files.
@@ -106,14 +110,21 @@ class DCDFile(object):
         periodicBoxVectors : tuple of Vec3=None
             The vectors defining the periodic box.
         """
-        if len(list(self._topology.atoms())) != len(positions):
+        if self._topology.getNumAtoms() != len(positions):
             raise ValueError('The number of positions must match the number of atoms')
         if is_quantity(positions):
             positions = positions.value_in_unit(nanometers)
-        if any(math.isnan(norm(pos)) for pos in positions):
-            raise ValueError('Particle position is NaN')
-        if any(math.isinf(norm(pos)) for pos in positions):
-            raise ValueError('Particle position is infinite')
+        isArray = (numpy is not None and isinstance(positions, numpy.ndarray))
+        if isArray:
+            if numpy.isnan(positions).any():
+                raise ValueError('Particle position is NaN')
+            if numpy.isinf(positions).any():
+                raise ValueError('Particle position is infinite')
+        else:
+            if any(math.isnan(norm(pos)) for pos in positions):
+                raise ValueError('Particle position is NaN')
+            if any(math.isinf(norm(pos)) for pos in positions):
+                raise ValueError('Particle position is infinite')
         file = self._file
 
         # Update the header.
@@ -146,6 +157,9 @@ class DCDFile(object):
         length = struct.pack('<i', 4*len(positions))
         for i in range(3):
             file.write(length)
-            data = array.array('f', (10*x[i] for x in positions))
-            data.tofile(file)
+            if isArray:
+                file.write((10*positions[:,i]).astype(numpy.float32).tobytes())
+            else:
+                data = array.array('f', (10*x[i] for x in positions))
+                data.tofile(file)
             file.write(length)
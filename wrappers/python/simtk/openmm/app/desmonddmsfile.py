@@ -33,9 +33,14 @@ from simtk import openmm as mm
 from simtk.openmm.app import forcefield as ff
 from simtk.openmm.app import Element, Topology, PDBFile
 from simtk.openmm.app.element import hydrogen
-from simtk.unit import (nanometer, angstrom, dalton, radian,
-                        kilocalorie_per_mole, kilojoule_per_mole,
-                        degree, elementary_charge)
+from simtk.unit import nanometer, angstrom, kilocalorie_per_mole
+
+# DMS files use Angstroms, kcal/mol, and degrees.  Terms are converted to
+# OpenMM's units with these factors as plain floats, since creating a Quantity
+# for every parameter of every term dominates the time to build a large System.
+_angstromToNm = 0.1
+_kcalToKj = 4.184
+_degToRad = math.pi/180
 
 
 class DesmondDMSFile(object):
@@ -87,8 +92,6 @@ class DesmondDMSFile(object):
         # Build the topology
         self.topology, self.positions = self._createTopology()
         self._topologyAtoms = list(self.topology.atoms())
-        self._atomBonds = [{} for x in range(len(self._topologyAtoms))]
-        self._angleConstraints = [{} for x in range(len(self._topologyAtoms))]
 
     def getPositions(self):
         """Get the positions of each atom in the system
@@ -189,10 +192,15 @@ class DesmondDMSFile(object):
             raise ValueError('Illegal nonbonded method for a non-periodic system')
 
         # Create all of the particles
-        for mass in self._conn.execute('SELECT mass from particle'):
-            sys.addParticle(mass[0]*dalton)
-
-        # Add all of the forces
+        for mass, in self._conn.execute('SELECT mass from particle'):
+            sys.addParticle(mass)
+
+        # Add all of the forces.  Bond lengths are recorded in _atomBonds,
+        # keyed by the sorted atom pair, for use when constraining angles, and
+        # each constrained angle is recorded in _angleConstraints as a (center,
+        # end, end) triple in both orders.
+        self._atomBonds = {}
+        self._angleConstraints = set()
         self._addBondsToSystem(sys)
         self._addAnglesToSystem(sys)
         self._addConstraintsToSystem(sys)
@@ -234,20 +242,22 @@ class DesmondDMSFile(object):
         bonds = mm.HarmonicBondForce()
         sys.addForce(bonds)
 
+        # Desmond writes the harmonic bond force without 1/2
+        # so we need to to double the force constant
+        kScale = 2*_kcalToKj/_angstromToNm**2
+        atomBonds = self._atomBonds
         q = """SELECT p0, p1, r0, fc, constrained
         FROM stretch_harm_term INNER JOIN stretch_harm_param
         ON stretch_harm_term.param=stretch_harm_param.id"""
         for p0, p1, r0, fc, constrained in self._conn.execute(q):
+            r0 *= _angstromToNm
             if constrained:
-                sys.addConstraint(p0, p1, r0*angstrom)
+                sys.addConstraint(p0, p1, r0)
             else:
-                # Desmond writes the harmonic bond force without 1/2
-                # so we need to to double the force constant
-                bonds.addBond(p0, p1, r0*angstrom, 2*fc*kilocalorie_per_mole/angstrom**2)
+                bonds.addBond(p0, p1, r0, kScale*fc)
 
             # Record information that will be needed for constraining angles.
-            self._atomBonds[p0][p1] = r0*angstrom
-            self._atomBonds[p1][p0] = r0*angstrom
+            atomBonds[(p0, p1) if p0 < p1 else (p1, p0)] = r0
 
         return bonds
 
@@ -256,23 +266,25 @@ class DesmondDMSFile(object):
         """
         angles = mm.HarmonicAngleForce()
         sys.addForce(angles)
-        degToRad = math.pi/180
 
+        # Desmond writes the harmonic angle force without 1/2
+        # so we need to to double the force constant
+        kScale = 2*_kcalToKj
+        atomBonds = self._atomBonds
         q = """SELECT p0, p1, p2, theta0, fc, constrained
         FROM angle_harm_term INNER JOIN angle_harm_param
         ON angle_harm_term.param=angle_harm_param.id"""
         for p0, p1, p2, theta0, fc, constrained in self._conn.execute(q):
+            theta0 *= _degToRad
             if constrained:
-                l1 = self._atomBonds[p1][p0]
-                l2 = self._atomBonds[p1][p2]
-                length = (l1*l1 + l2*l2 - 2*l1*l2*math.cos(theta0*degToRad)).sqrt()
+                l1 = atomBonds[(p0, p1) if p0 < p1 else (p1, p0)]
+                l2 = atomBonds[(p1, p2) if p1 < p2 else (p2, p1)]
+                length = math.sqrt(l1*l1 + l2*l2 - 2*l1*l2*math.cos(theta0))
                 sys.addConstraint(p0, p2, length)
-                self._angleConstraints[p1][p0] = p2
-                self._angleConstraints[p1][p2] = p0
+                self._angleConstraints.add((p1, p0, p2))
+                self._angleConstraints.add((p1, p2, p0))
             else:
-                # Desmond writes the harmonic angle force without 1/2
-                # so we need to to double the force constant
-                angles.addAngle(p0, p1, p2, theta0*degToRad, 2*fc*kilocalorie_per_mole/radian**2)
+                angles.addAngle(p0, p1, p2, theta0, kScale*fc)
 
         return angles
 
@@ -288,22 +300,22 @@ class DesmondDMSFile(object):
             ON %(term)s.param=%(param)s.id""" % \
                 {'term': term_table, 'param': param_table}
             for p0, p1, r1 in self._conn.execute(q):
-                if not p1 in self._atomBonds[p0]:
-                    sys.addConstraint(p0, p1, r1*angstrom)
-                    self._atomBonds[p0][p1] = r1*angstrom
-                    self._atomBonds[p1][p0] = r1*angstrom
+                key = ((p0, p1) if p0 < p1 else (p1, p0))
+                if key not in self._atomBonds:
+                    r1 *= _angstromToNm
+                    sys.addConstraint(p0, p1, r1)
+                    self._atomBonds[key] = r1
 
         if 'constraint_hoh_term' in self._tables:
-            degToRad = math.pi/180
             q = """SELECT p0, p1, p2, r1, r2, theta
             FROM constraint_hoh_term INNER JOIN constraint_hoh_param
             ON constraint_hoh_term.param=constraint_hoh_param.id"""
             for p0, p1, p2, r1, r2, theta in self._conn.execute(q):
                 # Here, p0 is the heavy atom and p1 and p2 are the H1 and H2
                 # wihth O-H1 and O-H2 distances r1 and r2
-                if not (self._angleConstraints[p0].get(p1, None) == p2):
-                    length = (r1*r1 + r2*r2 - 2*r1*r2*math.cos(theta*degToRad)).sqrt()
-                    sys.addConstraint(p1, p2, length)
+                if (p0, p1, p2) not in self._angleConstraints:
+                    length = math.sqrt(r1*r1 + r2*r2 - 2*r1*r2*math.cos(theta*_degToRad))
+                    sys.addConstraint(p1, p2, length*_angstromToNm)
 
     def _addPeriodicTorsionsToSystem(self, sys):
         """Create the torsion terms
@@ -314,11 +326,13 @@ class DesmondDMSFile(object):
         q = """SELECT p0, p1, p2, p3, phi0, fc0, fc1, fc2, fc3, fc4, fc5, fc6
         FROM dihedral_trig_term INNER JOIN dihedral_trig_param
         ON dihedral_trig_term.param=dihedral_trig_param.id"""
-        for p0, p1, p2, p3, phi0, fc0, fc1, fc2, fc3, fc4, fc5, fc6 in self._conn.execute(q):
-            for order, fc in enumerate([fc0, fc1, fc2, fc3, fc4, fc5, fc6]):
+        for row in self._conn.execute(q):
+            p0, p1, p2, p3 = row[:4]
+            phi0 = row[4]*_degToRad
+            for order, fc in enumerate(row[5:]):
                 if fc == 0:
                     continue
-                periodic.addTorsion(p0, p1, p2, p3, order, phi0*degree, fc*kilocalorie_per_mole)
+                periodic.addTorsion(p0, p1, p2, p3, order, phi0, fc*_kcalToKj)
 
 
     def _addImproperHarmonicTorsionsToSystem(self, sys):
@@ -336,7 +350,7 @@ class DesmondDMSFile(object):
         FROM improper_harm_term INNER JOIN improper_harm_param
         ON improper_harm_term.param=improper_harm_param.id"""
         for p0, p1, p2, p3, phi0, fc in self._conn.execute(q):
-            harmonicTorsion.addTorsion(p0, p1, p2, p3, [phi0*degree, fc*kilocalorie_per_mole])
+            harmonicTorsion.addTorsion(p0, p1, p2, p3, [phi0*_degToRad, fc*_kcalToKj])
 
     def _addCMAPToSystem(self, sys):
         """Create the CMAP terms
@@ -380,23 +394,23 @@ class DesmondDMSFile(object):
         FROM particle INNER JOIN nonbonded_param
         ON particle.nbtype=nonbonded_param.id"""
         for charge, sigma, epsilon in self._conn.execute(q):
-            nb.addParticle(charge, sigma*angstrom, epsilon*kilocalorie_per_mole)
+            nb.addParticle(charge, sigma*_angstromToNm, epsilon*_kcalToKj)
 
         for p0, p1 in self._conn.execute('SELECT p0, p1 FROM exclusion'):
             nb.addException(p0, p1, 0.0, 1.0, 0.0)
 
+        aScale = _kcalToKj*_angstromToNm**12
+        bScale = _kcalToKj*_angstromToNm**6
         q = """SELECT p0, p1, aij, bij, qij
         FROM pair_12_6_es_term INNER JOIN pair_12_6_es_param
         ON pair_12_6_es_term.param=pair_12_6_es_param.id;"""
         for p0, p1, a_ij, b_ij, q_ij in self._conn.execute(q):
-            a_ij = (a_ij*kilocalorie_per_mole*(angstrom**12)).in_units_of(kilojoule_per_mole*(nanometer**12))
-            b_ij = (b_ij*kilocalorie_per_mole*(angstrom**6)).in_units_of(kilojoule_per_mole*(nanometer**6))
-            q_ij = q_ij*elementary_charge**2
-
-            if (b_ij._value == 0.0) or (a_ij._value == 0.0):
+            if (b_ij == 0.0) or (a_ij == 0.0):
                 new_epsilon = 0
                 new_sigma = 1
             else:
+                a_ij *= aScale
+                b_ij *= bScale
                 new_epsilon =  b_ij**2/(4*a_ij)
                 new_sigma = (a_ij / b_ij)**(1.0/6.0)
             nb.addException(p0, p1, q_ij, new_sigma, new_epsilon, True)
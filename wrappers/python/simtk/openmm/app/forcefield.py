@@ -38,6 +38,10 @@ import itertools
 import xml.etree.ElementTree as etree
 import math
 from math import sqrt, cos
+try:
+    import numpy
+except ImportError:
+    numpy = None
 import simtk.openmm as mm
 import simtk.unit as unit
 from . import element as elem
@@ -762,11 +766,18 @@ class ForceField(object):
 
         # Find the template matching each residue and assign atom types.
         # If no templates are found, attempt to use residue template generators to create new templates (and potentially atom types/parameters).
+        # Identical residues (for example, solvent molecules) always match the same template in the same way, so the
+        # match is only computed for the first one and then reused for all the others.
 
+        residueMatches = {}
         for chain in topology.chains():
             for res in chain.residues():
-                # Attempt to match one of the existing templates.
-                [template, matches] = self._getResidueTemplateMatches(res, bondedToAtom)
+                residueKey = _createResidueKey(res, bondedToAtom)
+                if residueKey in residueMatches:
+                    [template, matches] = residueMatches[residueKey]
+                else:
+                    # Attempt to match one of the existing templates.
+                    [template, matches] = self._getResidueTemplateMatches(res, bondedToAtom)
                 if matches is None:
                     # No existing templates match.  Try any registered residue template generators.
                     for generator in self._templateGenerators:
@@ -783,6 +794,7 @@ class ForceField(object):
                 # Raise an exception if we have found no templates that match.
                 if matches is None:
                     raise ValueError('No template found for residue %d (%s).  %s' % (res.index+1, res.name, _findMatchErrors(self, res)))
+                residueMatches[residueKey] = [template, matches]
 
                 # Store parameters for the matched residue template.
                 matchAtoms = dict(zip(matches, res.atoms()))
@@ -833,49 +845,11 @@ class ForceField(object):
         elif nonbondedMethod not in [NoCutoff, CutoffNonPeriodic]:
             raise ValueError('Requested periodic boundary conditions for a Topology that does not specify periodic box dimensions')
 
-        # Make a list of all unique angles
+        # Make lists of all unique angles, proper torsions, and improper torsions
 
-        uniqueAngles = set()
-        for bond in data.bonds:
-            for atom in bondedToAtom[bond.atom1]:
-                if atom != bond.atom2:
-                    if atom < bond.atom2:
-                        uniqueAngles.add((atom, bond.atom1, bond.atom2))
-                    else:
-                        uniqueAngles.add((bond.atom2, bond.atom1, atom))
-            for atom in bondedToAtom[bond.atom2]:
-                if atom != bond.atom1:
-                    if atom > bond.atom1:
-                        uniqueAngles.add((bond.atom1, bond.atom2, atom))
-                    else:
-                        uniqueAngles.add((atom, bond.atom2, bond.atom1))
-        data.angles = sorted(list(uniqueAngles))
-
-        # Make a list of all unique proper torsions
-
-        uniquePropers = set()
-        for angle in data.angles:
-            for atom in bondedToAtom[angle[0]]:
-                if atom != angle[1]:
-                    if atom < angle[2]:
-                        uniquePropers.add((atom, angle[0], angle[1], angle[2]))
-                    else:
-                        uniquePropers.add((angle[2], angle[1], angle[0], atom))
-            for atom in bondedToAtom[angle[2]]:
-                if atom != angle[1]:
-                    if atom > angle[0]:
-                        uniquePropers.add((angle[0], angle[1], angle[2], atom))
-                    else:
-                        uniquePropers.add((atom, angle[2], angle[1], angle[0]))
-        data.propers = sorted(list(uniquePropers))
-
-        # Make a list of all unique improper torsions
-
-        for atom in range(len(bondedToAtom)):
-            bondedTo = bondedToAtom[atom]
-            if len(bondedTo) > 2:
-                for subset in itertools.combinations(bondedTo, 3):
-                    data.impropers.append((atom, subset[0], subset[1], subset[2]))
+        data.angles = _findAngles(bondedToAtom)
+        data.propers = _findPropers(bondedToAtom, data.angles)
+        data.impropers = _findImpropers(bondedToAtom)
 
         # Identify bonds that should be implemented with constraints
 
@@ -984,6 +958,175 @@ def _createResidueSignature(elements):
         s += element.symbol+str(count)
     return s
 
+def _adjacencyArrays(bondedToAtom):
+    """Convert the sets of bonded atoms to compressed sparse row form.
+
+    The neighbors of atom i are neighbors[starts[i]:starts[i+1]], listed in the same order
+    the set bondedToAtom[i] iterates over them.
+    """
+    degree = numpy.array([len(bonded) for bonded in bondedToAtom], dtype=numpy.int64)
+    starts = numpy.zeros(len(bondedToAtom)+1, dtype=numpy.int64)
+    numpy.cumsum(degree, out=starts[1:])
+    neighbors = numpy.fromiter(itertools.chain.from_iterable(bondedToAtom), dtype=numpy.int64, count=int(starts[-1]))
+    return starts, neighbors, degree
+
+def _expandNeighbors(starts, degree, atoms):
+    """For each atom in an array, list all of its neighbors.
+
+    Returns a tuple (index, position), where index[k] is the index into atoms of the k'th entry
+    and position[k] is the location of the neighbor in the neighbors array.
+    """
+    counts = degree[atoms]
+    index = numpy.repeat(numpy.arange(len(atoms)), counts)
+    offsets = numpy.arange(len(index)) - numpy.repeat(numpy.cumsum(counts)-counts, counts)
+    return index, starts[atoms][index]+offsets
+
+def _toTuples(array):
+    """Convert a 2D array of atom indices to a list of tuples of Python ints."""
+    return list(zip(*array.T.tolist()))
+
+def _findAngles(bondedToAtom):
+    """Make a sorted list of all unique angles.
+
+    Each angle is a tuple (atom1, atom2, atom3) in which atom2 is bonded to the other two, and atom1 < atom3.
+    """
+    if numpy is None:
+        uniqueAngles = set()
+        for atom2 in range(len(bondedToAtom)):
+            for (atom1, atom3) in itertools.combinations(bondedToAtom[atom2], 2):
+                if atom1 < atom3:
+                    uniqueAngles.add((atom1, atom2, atom3))
+                else:
+                    uniqueAngles.add((atom3, atom2, atom1))
+        return sorted(uniqueAngles)
+    starts, neighbors, degree = _adjacencyArrays(bondedToAtom)
+    blocks = []
+    for d in numpy.unique(degree[degree > 1]):
+        centers = numpy.nonzero(degree == d)[0]
+        bonded = neighbors[starts[centers][:,numpy.newaxis]+numpy.arange(d)]
+        for (k1, k2) in itertools.combinations(range(d), 2):
+            ends = bonded[:,(k1, k2)]
+            blocks.append(numpy.column_stack((ends.min(axis=1), centers, ends.max(axis=1))))
+    if len(blocks) == 0:
+        return []
+    angles = numpy.concatenate(blocks)
+    order = numpy.lexsort((angles[:,2], angles[:,1], angles[:,0]))
+    return _toTuples(angles[order])
+
+def _findPropers(bondedToAtom, angles):
+    """Make a sorted list of all unique proper torsions.
+
+    Each torsion is a tuple (atom1, atom2, atom3, atom4) of consecutively bonded atoms, ordered so that atom1 < atom4.
+    Torsions around three membered rings, in which atom1 == atom4, follow the same conventions as extending each
+    angle by one atom at either end.
+    """
+    if numpy is None:
+        uniquePropers = set()
+        for angle in angles:
+            for atom in bondedToAtom[angle[0]]:
+                if atom != angle[1]:
+                    if atom < angle[2]:
+                        uniquePropers.add((atom, angle[0], angle[1], angle[2]))
+                    else:
+                        uniquePropers.add((angle[2], angle[1], angle[0], atom))
+            for atom in bondedToAtom[angle[2]]:
+                if atom != angle[1]:
+                    if atom > angle[0]:
+                        uniquePropers.add((angle[0], angle[1], angle[2], atom))
+                    else:
+                        uniquePropers.add((atom, angle[2], angle[1], angle[0]))
+        return sorted(uniquePropers)
+
+    # Enumerate every directed path atom1-atom2-atom3-atom4 by walking outward from each directed bond atom2-atom3.
+
+    starts, neighbors, degree = _adjacencyArrays(bondedToAtom)
+    atom2 = numpy.repeat(numpy.arange(len(bondedToAtom)), degree)
+    atom3 = neighbors
+    index, position = _expandNeighbors(starts, degree, atom2)
+    atom1 = neighbors[position]
+    keep = (atom1 != atom3[index])
+    atom1 = atom1[keep]
+    atom2 = atom2[index[keep]]
+    atom3 = atom3[index[keep]]
+    index, position = _expandNeighbors(starts, degree, atom3)
+    atom4 = neighbors[position]
+    atom1 = atom1[index]
+    atom2 = atom2[index]
+    atom3 = atom3[index]
+    keep = (atom4 != atom2)
+
+    # Each path is found in both directions, so keep only the canonical one.
+
+    keep &= (atom1 < atom4) | ((atom1 == atom4) & ((atom3 < atom1) | (atom1 < atom2)))
+    propers = numpy.column_stack((atom1[keep], atom2[keep], atom3[keep], atom4[keep]))
+    order = numpy.lexsort((propers[:,3], propers[:,2], propers[:,1], propers[:,0]))
+    return _toTuples(propers[order])
+
+def _findImpropers(bondedToAtom):
+    """Make a list of all improper torsions.
+
+    Each torsion is a tuple (atom1, atom2, atom3, atom4), where atom1 is bonded to the other three.  They are listed
+    in order of the central atom, then in the order itertools.combinations() produces the sets of bonded atoms.
+    """
+    if numpy is None:
+        impropers = []
+        for atom in range(len(bondedToAtom)):
+            bondedTo = bondedToAtom[atom]
+            if len(bondedTo) > 2:
+                for subset in itertools.combinations(bondedTo, 3):
+                    impropers.append((atom, subset[0], subset[1], subset[2]))
+        return impropers
+    starts, neighbors, degree = _adjacencyArrays(bondedToAtom)
+    blocks = []
+    combinationIndex = []
+    for d in numpy.unique(degree[degree > 2]):
+        centers = numpy.nonzero(degree == d)[0]
+        bonded = neighbors[starts[centers][:,numpy.newaxis]+numpy.arange(d)]
+        for i, subset in enumerate(itertools.combinations(range(d), 3)):
+            blocks.append(numpy.column_stack((centers, bonded[:,subset])))
+            combinationIndex.append(numpy.full(len(centers), i, dtype=numpy.int64))
+    if len(blocks) == 0:
+        return []
+    impropers = numpy.concatenate(blocks)
+    order = numpy.lexsort((numpy.concatenate(combinationIndex), impropers[:,0]))
+    return _toTuples(impropers[order])
+
+def _createResidueKey(res, bondedToAtom):
+    """Create a hashable key describing everything about a residue that affects which template it matches.
+
+    Two residues with the same key have the same atom names and elements in the same order, the same internal
+    bonds, and the same number of external bonds to each atom, so they are guaranteed to match the same template
+    with the same correspondence between atoms.
+
+    Parameters
+    ----------
+    res : Residue
+        The residue to create a key for
+    bondedToAtom : list
+        Enumerates which other atoms each atom is bonded to
+
+    Returns
+    -------
+    tuple
+        the key for the residue
+    """
+    atoms = list(res.atoms())
+    renumberAtoms = {}
+    for i in range(len(atoms)):
+        renumberAtoms[atoms[i].index] = i
+    bonds = []
+    externalBonds = []
+    for i, atom in enumerate(atoms):
+        numExternal = 0
+        for other in bondedToAtom[atom.index]:
+            if other in renumberAtoms:
+                if renumberAtoms[other] > i:
+                    bonds.append((i, renumberAtoms[other]))
+            else:
+                numExternal += 1
+        externalBonds.append(numExternal)
+    return (tuple((atom.name, atom.element) for atom in atoms), tuple(sorted(bonds)), tuple(externalBonds))
+
 def _matchResidue(res, template, bondedToAtom):
     """Determine whether a residue matches a template and return a list of corresponding atoms.
 
@@ -1196,19 +1339,28 @@ class HarmonicBondGenerator(object):
             sys.addForce(force)
         else:
             force = existing[0]
+        # The matching definition depends only on the atom types, so it is looked up once for each combination of types.
+
+        definitionForTypes = {}
         for bond in data.bonds:
             type1 = data.atomType[data.atoms[bond.atom1]]
             type2 = data.atomType[data.atoms[bond.atom2]]
-            for i in range(len(self.types1)):
-                types1 = self.types1[i]
-                types2 = self.types2[i]
-                if (type1 in types1 and type2 in types2) or (type1 in types2 and type2 in types1):
-                    bond.length = self.length[i]
-                    if bond.isConstrained:
-                        data.addConstraint(sys, bond.atom1, bond.atom2, self.length[i])
-                    elif self.k[i] != 0:
-                        force.addBond(bond.atom1, bond.atom2, self.length[i], self.k[i])
-                    break
+            key = (type1, type2)
+            if key not in definitionForTypes:
+                definitionForTypes[key] = None
+                for i in range(len(self.types1)):
+                    types1 = self.types1[i]
+                    types2 = self.types2[i]
+                    if (type1 in types1 and type2 in types2) or (type1 in types2 and type2 in types1):
+                        definitionForTypes[key] = i
+                        break
+            i = definitionForTypes[key]
+            if i is not None:
+                bond.length = self.length[i]
+                if bond.isConstrained:
+                    data.addConstraint(sys, bond.atom1, bond.atom2, self.length[i])
+                elif self.k[i] != 0:
+                    force.addBond(bond.atom1, bond.atom2, self.length[i], self.k[i])
 
 parsers["HarmonicBondForce"] = HarmonicBondGenerator.parseElement
 
@@ -1249,39 +1401,48 @@ class HarmonicAngleGenerator(object):
             sys.addForce(force)
         else:
             force = existing[0]
+        # The matching definition depends only on the atom types, so it is looked up once for each combination of types.
+
+        definitionForTypes = {}
         for (angle, isConstrained) in zip(data.angles, data.isAngleConstrained):
             type1 = data.atomType[data.atoms[angle[0]]]
             type2 = data.atomType[data.atoms[angle[1]]]
             type3 = data.atomType[data.atoms[angle[2]]]
-            for i in range(len(self.types1)):
-                types1 = self.types1[i]
-                types2 = self.types2[i]
-                types3 = self.types3[i]
-                if (type1 in types1 and type2 in types2 and type3 in types3) or (type1 in types3 and type2 in types2 and type3 in types1):
-                    if isConstrained:
-                        # Find the two bonds that make this angle.
-
-                        bond1 = None
-                        bond2 = None
-                        for bond in data.atomBonds[angle[1]]:
-                            atom1 = data.bonds[bond].atom1
-                            atom2 = data.bonds[bond].atom2
-                            if atom1 == angle[0] or atom2 == angle[0]:
-                                bond1 = bond
-                            elif atom1 == angle[2] or atom2 == angle[2]:
-                                bond2 = bond
-
-                        # Compute the distance between atoms and add a constraint
-
-                        if bond1 is not None and bond2 is not None:
-                            l1 = data.bonds[bond1].length
-                            l2 = data.bonds[bond2].length
-                            if l1 is not None and l2 is not None:
-                                length = sqrt(l1*l1 + l2*l2 - 2*l1*l2*cos(self.angle[i]))
-                                data.addConstraint(sys, angle[0], angle[2], length)
-                    elif self.k[i] != 0:
-                        force.addAngle(angle[0], angle[1], angle[2], self.angle[i], self.k[i])
-                    break
+            key = (type1, type2, type3)
+            if key not in definitionForTypes:
+                definitionForTypes[key] = None
+                for i in range(len(self.types1)):
+                    types1 = self.types1[i]
+                    types2 = self.types2[i]
+                    types3 = self.types3[i]
+                    if (type1 in types1 and type2 in types2 and type3 in types3) or (type1 in types3 and type2 in types2 and type3 in types1):
+                        definitionForTypes[key] = i
+                        break
+            i = definitionForTypes[key]
+            if i is not None:
+                if isConstrained:
+                    # Find the two bonds that make this angle.
+
+                    bond1 = None
+                    bond2 = None
+                    for bond in data.atomBonds[angle[1]]:
+                        atom1 = data.bonds[bond].atom1
+                        atom2 = data.bonds[bond].atom2
+                        if atom1 == angle[0] or atom2 == angle[0]:
+                            bond1 = bond
+                        elif atom1 == angle[2] or atom2 == angle[2]:
+                            bond2 = bond
+
+                    # Compute the distance between atoms and add a constraint
+
+                    if bond1 is not None and bond2 is not None:
+                        l1 = data.bonds[bond1].length
+                        l2 = data.bonds[bond2].length
+                        if l1 is not None and l2 is not None:
+                            length = sqrt(l1*l1 + l2*l2 - 2*l1*l2*cos(self.angle[i]))
+                            data.addConstraint(sys, angle[0], angle[2], length)
+                elif self.k[i] != 0:
+                    force.addAngle(angle[0], angle[1], angle[2], self.angle[i], self.k[i])
 
 parsers["HarmonicAngleForce"] = HarmonicAngleGenerator.parseElement
 
@@ -1336,60 +1497,80 @@ class PeriodicTorsionGenerator(object):
         else:
             force = existing[0]
         wildcard = self.ff._atomClasses['']
+
+        # The matching definitions depend only on the atom types, so they are looked up once for each combination of types.
+
+        properForTypes = {}
         for torsion in data.propers:
             type1 = data.atomType[data.atoms[torsion[0]]]
             type2 = data.atomType[data.atoms[torsion[1]]]
             type3 = data.atomType[data.atoms[torsion[2]]]
             type4 = data.atomType[data.atoms[torsion[3]]]
-            match = None
-            for tordef in self.proper:
-                types1 = tordef.types1
-                types2 = tordef.types2
-                types3 = tordef.types3
-                types4 = tordef.types4
-                if (type2 in types2 and type3 in types3 and type4 in types4 and type1 in types1) or (type2 in types3 and type3 in types2 and type4 in types1 and type1 in types4):
-                    hasWildcard = (wildcard in (types1, types2, types3, types4))
-                    if match is None or not hasWildcard: # Prefer specific definitions over ones with wildcards
-                        match = tordef
-                    if not hasWildcard:
-                        break
+            key = (type1, type2, type3, type4)
+            if key not in properForTypes:
+                match = None
+                for tordef in self.proper:
+                    types1 = tordef.types1
+                    types2 = tordef.types2
+                    types3 = tordef.types3
+                    types4 = tordef.types4
+                    if (type2 in types2 and type3 in types3 and type4 in types4 and type1 in types1) or (type2 in types3 and type3 in types2 and type4 in types1 and type1 in types4):
+                        hasWildcard = (wildcard in (types1, types2, types3, types4))
+                        if match is None or not hasWildcard: # Prefer specific definitions over ones with wildcards
+                            match = tordef
+                        if not hasWildcard:
+                            break
+                properForTypes[key] = match
+            match = properForTypes[key]
             if match is not None:
                 for i in range(len(match.phase)):
                     if match.k[i] != 0:
                         force.addTorsion(torsion[0], torsion[1], torsion[2], torsion[3], match.periodicity[i], match.phase[i], match.k[i])
+        improperForTypes = {}
         for torsion in data.impropers:
             type1 = data.atomType[data.atoms[torsion[0]]]
             type2 = data.atomType[data.atoms[torsion[1]]]
             type3 = data.atomType[data.atoms[torsion[2]]]
             type4 = data.atomType[data.atoms[torsion[3]]]
-            match = None
-            for tordef in self.improper:
-                types1 = tordef.types1
-                types2 = tordef.types2
-                types3 = tordef.types3
-                types4 = tordef.types4
-                hasWildcard = (wildcard in (types1, types2, types3, types4))
-                if match is not None and hasWildcard:
-                    # Prefer specific definitions over ones with wildcards
-                    continue
-                if type1 in types1:
-                    for (t2, t3, t4) in itertools.permutations(((type2, 1), (type3, 2), (type4, 3))):
-                        if t2[0] in types2 and t3[0] in types3 and t4[0] in types4:
-                            # Workaround to be more consistent with AMBER.  It uses wildcards to define most of its
-                            # impropers, which leaves the ordering ambiguous.  It then follows some bizarre rules
-                            # to pick the order.
-                            a1 = torsion[t2[1]]
-                            a2 = torsion[t3[1]]
-                            e1 = data.atoms[a1].element
-                            e2 = data.atoms[a2].element
-                            if e1 == e2 and a1 > a2:
-                                (a1, a2) = (a2, a1)
-                            elif e1 != elem.carbon and (e2 == elem.carbon or e1.mass < e2.mass):
-                                (a1, a2) = (a2, a1)
-                            match = (a1, a2, torsion[0], torsion[t4[1]], tordef)
-                            break
+            key = (type1, type2, type3, type4)
+            if key not in improperForTypes:
+                # Record the matching definition, along with the positions within the torsion of the atoms that
+                # correspond to its second, third, and fourth types.
+
+                match = None
+                for tordef in self.improper:
+                    types1 = tordef.types1
+                    types2 = tordef.types2
+                    types3 = tordef.types3
+                    types4 = tordef.types4
+                    hasWildcard = (wildcard in (types1, types2, types3, types4))
+                    if match is not None and hasWildcard:
+                        # Prefer specific definitions over ones with wildcards
+                        continue
+                    if type1 in types1:
+                        for (t2, t3, t4) in itertools.permutations(((type2, 1), (type3, 2), (type4, 3))):
+                            if t2[0] in types2 and t3[0] in types3 and t4[0] in types4:
+                                match = (t2[1], t3[1], t4[1], tordef)
+                                break
+                improperForTypes[key] = match
+            match = improperForTypes[key]
             if match is not None:
-                (a1, a2, a3, a4, tordef) = match
+                (p2, p3, p4, tordef) = match
+
+                # Workaround to be more consistent with AMBER.  It uses wildcards to define most of its
+                # impropers, which leaves the ordering ambiguous.  It then follows some bizarre rules
+                # to pick the order.
+
+                a1 = torsion[p2]
+                a2 = torsion[p3]
+                e1 = data.atoms[a1].element
+                e2 = data.atoms[a2].element
+                if e1 == e2 and a1 > a2:
+                    (a1, a2) = (a2, a1)
+                elif e1 != elem.carbon and (e2 == elem.carbon or e1.mass < e2.mass):
+                    (a1, a2) = (a2, a1)
+                a3 = torsion[0]
+                a4 = torsion[p4]
                 for i in range(len(tordef.phase)):
                     if tordef.k[i] != 0:
                         force.addTorsion(a1, a2, a3, a4, tordef.periodicity[i], tordef.phase[i], tordef.k[i])
@@ -2286,19 +2467,28 @@ class AmoebaBondGenerator(object):
         force.setAmoebaGlobalBondCubic(self.cubic)
         force.setAmoebaGlobalBondQuartic(self.quartic)
 
+        # The matching definition depends only on the atom types, so it is looked up once for each combination of types.
+
+        definitionForTypes = {}
         for bond in data.bonds:
             type1 = data.atomType[data.atoms[bond.atom1]]
             type2 = data.atomType[data.atoms[bond.atom2]]
-            for i in range(len(self.types1)):
-                types1 = self.types1[i]
-                types2 = self.types2[i]
-                if (type1 in types1 and type2 in types2) or (type1 in types2 and type2 in types1):
-                    bond.length = self.length[i]
-                    if bond.isConstrained:
-                        data.addConstraint(sys, bond.atom1, bond.atom2, self.length[i])
-                    elif self.k[i] != 0:
-                        force.addBond(bond.atom1, bond.atom2, self.length[i], self.k[i])
-                    break
+            key = (type1, type2)
+            if key not in definitionForTypes:
+                definitionForTypes[key] = None
+                for i in range(len(self.types1)):
+                    types1 = self.types1[i]
+                    types2 = self.types2[i]
+                    if (type1 in types1 and type2 in types2) or (type1 in types2 and type2 in types1):
+                        definitionForTypes[key] = i
+                        break
+            i = definitionForTypes[key]
+            if i is not None:
+                bond.length = self.length[i]
+                if bond.isConstrained:
+                    data.addConstraint(sys, bond.atom1, bond.atom2, self.length[i])
+                elif self.k[i] != 0:
+                    force.addBond(bond.atom1, bond.atom2, self.length[i], self.k[i])
 
 parsers["AmoebaBondForce"] = AmoebaBondGenerator.parseElement
 
@@ -37,11 +37,12 @@ import sys
 from simtk.openmm import Vec3
 from re import sub, match
 from simtk.unit import nanometers, angstroms, Quantity
+from simtk.openmm.app.internal.trajectoryreader import TrajectoryReader
 from . import element as elem
 try:
     import numpy
-except:
-    pass
+except ImportError:
+    numpy = None
 
 def _isint(word):
     """ONLY matches integers! If you have a decimal point? None shall pass!
@@ -90,6 +91,22 @@ def _is_gro_box(line):
     else:
         return 0
 
+def _parse_atom_info(line):
+    """Parse the residue and atom information from a line containing a GROMACS atom.
+
+    @param[in] line The line to parse
+    @return (residue number, residue name, atom name, element).  The element is None if it cannot be determined.
+    """
+    (thisresnum, thisresname, thisatomname) = [line[i*5:i*5+5].strip() for i in range(3)]
+    thiselem = thisatomname
+    if len(thiselem) > 1:
+        thiselem = thiselem[0] + sub('[A-Z0-9]','',thiselem[1:])
+    try:
+        element = elem.get_by_symbol(thiselem)
+    except KeyError:
+        element = None
+    return (int(thisresnum), thisresname, thisatomname, element)
+
 def _construct_box_vectors(line):
     """Create the periodic box vectors based on the values stored in the file.
 
@@ -136,17 +153,11 @@ class GromacsGroFile(object):
                 na = int(line.strip())
             elif _is_gro_coord(line):
                 if frame == 0: # Create the list of residues, atom names etc. only if it's the first frame.
-                    (thisresnum, thisresname, thisatomname) = [line[i*5:i*5+5].strip() for i in range(3)]
+                    (thisresnum, thisresname, thisatomname, thiselem) = _parse_atom_info(line)
                     resname.append(thisresname)
-                    resid.append(int(thisresnum))
+                    resid.append(thisresnum)
                     atomname.append(thisatomname)
-                    thiselem = thisatomname
-                    if len(thiselem) > 1:
-                        thiselem = thiselem[0] + sub('[A-Z0-9]','',thiselem[1:])
-                        try:
-                            elements.append(elem.get_by_symbol(thiselem))
-                        except KeyError:
-                            elements.append(None)
+                    elements.append(thiselem)
                 firstDecimalPos = line.index('.', 20)
                 secondDecimalPos = line.index('.', firstDecimalPos+1)
                 digits = secondDecimalPos-firstDecimalPos
@@ -222,3 +233,80 @@ class GromacsGroFile(object):
         ysize = self._periodicBoxVectors[frame][1][1].value_in_unit(nanometers)
         zsize = self._periodicBoxVectors[frame][2][2].value_in_unit(nanometers)
         return Vec3(xsize, ysize, zsize)*nanometers
+
+
+class GromacsGroTrajectory(TrajectoryReader):
+    """GromacsGroTrajectory reads a multi-frame Gromacs .gro file one frame at a time.
+
+    Unlike GromacsGroFile, which parses every frame when the file is loaded, this class only records where
+    each frame begins.  Frames are parsed when they are requested, either by index with getPositions() or
+    in order by iterating over the object, so trajectories of any length can be processed in constant memory.
+    Positions are returned as numpy arrays, so this class requires numpy.
+
+    The atom and residue information stored in the file is read from the first frame, and is available in
+    the same public fields as in GromacsGroFile.
+    """
+
+    def __init__(self, file):
+        """Open a .gro file.
+
+        Parameters
+        ----------
+        file : string
+            the name of the file to load
+        """
+        self._numAtoms = None
+        self._boxLines = []
+        TrajectoryReader.__init__(self, file)
+        f = self._file
+        f.seek(self._offsets[0])
+        f.readline()
+        f.readline()
+        atoms = [_parse_atom_info(f.readline().decode('utf-8')) for i in range(self._numAtoms)]
+        ## A list containing the element of each atom stored in the file
+        self.elements = [atom[3] for atom in atoms]
+        ## A list containing the name of each atom stored in the file
+        self.atomNames = [atom[2] for atom in atoms]
+        ## A list containing the ID of the residue that each atom belongs to
+        self.residueIds = [atom[0] for atom in atoms]
+        ## A list containing the name of the residue that each atom belongs to
+        self.residueNames = [atom[1] for atom in atoms]
+
+    def _scanFrame(self, file):
+        title = file.readline()
+        if len(title.strip()) == 0:
+            return False
+        numAtoms = int(file.readline())
+        if self._numAtoms is None:
+            self._numAtoms = numAtoms
+        elif numAtoms != self._numAtoms:
+            raise ValueError('Frame %d of the .gro file contains %d atoms, but the first frame contains %d' % (len(self._offsets), numAtoms, self._numAtoms))
+        for i in range(numAtoms):
+            if len(file.readline()) == 0:
+                raise ValueError('Unexpected end of .gro file')
+        box = file.readline().decode('utf-8')
+        if not _is_gro_box(box):
+            raise ValueError('Unexpected line in .gro file: '+box)
+        self._boxLines.append(box)
+        return True
+
+    def _readPositions(self, file):
+        file.readline()
+        file.readline()
+        lines = [file.readline() for i in range(self._numAtoms)]
+        firstDecimalPos = lines[0].index(b'.', 20)
+        secondDecimalPos = lines[0].index(b'.', firstDecimalPos+1)
+        digits = secondDecimalPos-firstDecimalPos
+        starts = (20, 20+digits, 20+2*digits)
+        values = [float(line[i:i+digits]) for line in lines for i in starts]
+        return numpy.array(values).reshape((self._numAtoms, 3))
+
+    def getPeriodicBoxVectors(self, frame=0):
+        """Get the vectors defining the periodic box of a frame.
+
+        Parameters
+        ----------
+        frame : int=0
+            the index of the frame for which to get the box vectors
+        """
+        return _construct_box_vectors(self._boxLines[frame])
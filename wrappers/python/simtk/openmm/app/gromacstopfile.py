@@ -37,11 +37,15 @@ from simtk.openmm.app import PDBFile
 from . import forcefield as ff
 from . import element as elem
 from . import amberprmtopfile as prmtop
+from simtk.openmm.app.internal.fileutil import replaceFile
 import simtk.unit as unit
 import simtk.openmm as mm
 import math
 import os
 import re
+import hashlib
+import pickle
+import tempfile
 import distutils.spawn
 from collections import OrderedDict
 
@@ -62,13 +66,34 @@ def _find_all_instances_in_string(string, substr):
         idx = string.find(substr, idx+1)
     return indices
 
+# Compiled regular expressions for define names, with the most recently used at the end.  The number
+# kept is limited so processing many files with different defines does not use unbounded memory.
+_defineRegexes = OrderedDict()
+_maxDefineRegexes = 1000
+
+def _define_regex(names):
+    """ Get a compiled regular expression that matches any of the given names as a whole token """
+    key = tuple(names)
+    regex = _defineRegexes.pop(key, None)
+    if regex is None:
+        pattern = '|'.join(re.escape(name) for name in sorted(key, key=len, reverse=True))
+        regex = re.compile(r'(?<!\w)(?:%s)(?!\w)' % pattern)
+        if len(_defineRegexes) >= _maxDefineRegexes:
+            _defineRegexes.popitem(last=False)
+    _defineRegexes[key] = regex
+    return regex
+
 def _replace_defines(line, defines):
     """ Replaces defined tokens in a given line """
     if not defines: return line
     for define in reversed(defines):
         value = defines[define]
+        if define not in line: continue
+        if '"' not in line and "'" not in line and novarcharre.search(define) is None:
+            # Nothing can be quoted, so a regular expression substitution is equivalent
+            line = _define_regex((define,)).sub(lambda match: value, line)
+            continue
         indices = _find_all_instances_in_string(line, define)
-        if not indices: continue
         # Check to see if it's inside of quotes
         inside = ''
         idx = 0
@@ -102,6 +127,15 @@ def _replace_defines(line, defines):
 
     return line
 
+# Parsed #include files, keyed by the file and everything its contents depend on.  Each entry is
+# the sequence of events that processing the file produced, so it can be replayed without reading
+# the file again.
+_includeCache = {}
+
+# Identifies the files written to a cache directory.  It is checked before a file is unpickled, and should be
+# changed whenever the format of the cached events changes.
+_cacheMagic = b'OpenMM GromacsTopFile cache 1\n'
+
 class GromacsTopFile(object):
     """GromacsTopFile parses a Gromacs top file and constructs a Topology and (optionally) an OpenMM System from it."""
 
@@ -117,6 +151,37 @@ class GromacsTopFile(object):
             self.cmaps = []
             self.has_virtual_sites = False
 
+    class _MoleculeTemplate(object):
+        """Inner class to store the parameters of a molecule type after they have been looked up.
+        Atom indices are relative to the first atom of the molecule, so the same template can be
+        copied to every instance of the molecule."""
+        def __init__(self):
+            self.masses = []
+            self.constraints = []
+            self.bonds = []
+            self.angles = []
+            self.periodicTorsions = []
+            self.harmonicTorsions = []
+            self.rbTorsions = []
+            self.cmaps = []
+            self.nonbonded = []
+            self.gb = []
+            self.bondIndices = []
+            self.exceptions = []
+            self.forces = []
+
+        def useForce(self, force):
+            """Record that a force is needed by this molecule."""
+            if force not in self.forces:
+                self.forces.append(force)
+
+    class _Recorder(object):
+        """Inner class to record the events produced by processing an #include file."""
+        def __init__(self, depth):
+            self.events = []
+            self.depth = depth
+            self.cacheable = True
+
     def _processFile(self, file):
         append = ''
         for line in open(file):
@@ -126,6 +191,107 @@ class GromacsTopFile(object):
                 self._processLine(append+' '+line, file)
                 append = ''
 
+    def _includeFile(self, file):
+        """Process an #include file, reusing the result of parsing it before if possible."""
+        try:
+            stat = os.stat(file)
+            key = (os.path.abspath(file), stat.st_mtime, stat.st_size, self._includeDirs, tuple(self._defines.items()))
+            hash(key)
+        except (OSError, TypeError):
+            self._processFile(file)
+            return
+        events = _includeCache.get(key)
+        if events is None and self._cacheDir is not None:
+            events = self._loadCachedInclude(key)
+        if events is not None:
+            self._replayEvents(events)
+            return
+
+        # Process the file, recording what it does.
+
+        recorder = GromacsTopFile._Recorder(len(self._ifStack))
+        self._recorders.append(recorder)
+        try:
+            self._processFile(file)
+        finally:
+            del self._recorders[-1]
+        if recorder.cacheable and len(self._ifStack) == recorder.depth:
+            events = tuple(recorder.events)
+            _includeCache[key] = events
+            if self._cacheDir is not None:
+                self._saveCachedInclude(key, events)
+
+    def _recordEvent(self, *event):
+        """Record an event for the #include file currently being processed."""
+        if self._recorders:
+            self._recorders[-1].events.append(event)
+
+    def _replayEvents(self, events):
+        """Repeat the events recorded while processing an #include file."""
+        for event in events:
+            kind = event[0]
+            if kind == 'data':
+                self._processData(event[1])
+            elif kind == 'category':
+                self._currentCategory = event[1]
+            elif kind == 'include':
+                self._includeFile(event[1])
+            elif kind == 'define':
+                self._setDefine(event[1], event[2])
+            elif kind == 'undef':
+                self._removeDefine(event[1])
+
+    def _cacheFileName(self, key):
+        """Get the name of the file in the cache directory that stores a parsed #include file."""
+        return os.path.join(self._cacheDir, 'top-%s.pickle' % hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+
+    def _loadCachedInclude(self, key):
+        """Load a parsed #include file from the cache directory, or return None if it is not there."""
+        try:
+            with open(self._cacheFileName(key), 'rb') as f:
+                if f.read(len(_cacheMagic)) != _cacheMagic:
+                    return None
+                cachedKey, events = pickle.load(f)
+        except Exception:
+            # A missing, incomplete, or incompatible file is treated as a cache miss.
+            return None
+        if cachedKey != key:
+            return None
+        _includeCache[key] = events
+        return events
+
+    def _saveCachedInclude(self, key, events):
+        """Save a parsed #include file to the cache directory."""
+        filename = self._cacheFileName(key)
+        tempName = None
+        try:
+            if not os.path.isdir(self._cacheDir):
+                os.makedirs(self._cacheDir)
+            fd, tempName = tempfile.mkstemp(dir=self._cacheDir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_cacheMagic)
+                pickle.dump((key, events), f, 2)
+            replaceFile(tempName, filename)
+        except Exception:
+            # The cache is only an optimization, so failing to write it is not an error, but do not
+            # leave a partial file behind.
+            if tempName is not None and os.path.exists(tempName):
+                try:
+                    os.remove(tempName)
+                except OSError:
+                    pass
+
+    def _setDefine(self, name, value):
+        """Add a value to our list of defines."""
+        self._defines[name] = value
+        self._definesRegex = None
+
+    def _removeDefine(self, name):
+        """Remove a value from our list of defines."""
+        if name in self._defines:
+            self._defines.pop(name)
+            self._definesRegex = None
+
     def _processLine(self, line, file):
         """Process one line from a file."""
         if ';' in line:
@@ -141,6 +307,7 @@ class GromacsTopFile(object):
             if not stripped.endswith(']'):
                 raise ValueError('Illegal line in .top file: '+line)
             self._currentCategory = stripped[1:-1].strip()
+            self._recordEvent('category', self._currentCategory)
 
         elif stripped.startswith('#'):
             # A preprocessor command.
@@ -157,7 +324,8 @@ class GromacsTopFile(object):
                     file = os.path.join(dir, name)
                     if os.path.isfile(file):
                         # We found the file, so process it.
-                        self._processFile(file)
+                        self._recordEvent('include', file)
+                        self._includeFile(file)
                         break
                 else:
                     raise ValueError('Could not locate #include file: '+name)
@@ -169,7 +337,8 @@ class GromacsTopFile(object):
                 valueStart = stripped.find(name, len(command))+len(name)+1
                 value = line[valueStart:].strip()
                 value = value or '1' # Default define is 1
-                self._defines[name] = value
+                self._setDefine(name, value)
+                self._recordEvent('define', name, value)
             elif command == '#ifdef':
                 # See whether this block should be ignored.
                 if len(fields) < 2:
@@ -181,8 +350,8 @@ class GromacsTopFile(object):
                 # Un-define a variable
                 if len(fields) < 2:
                     raise ValueError('Illegal line in .top file: '+line)
-                if fields[1] in self._defines:
-                    self._defines.pop(fields[1])
+                self._removeDefine(fields[1])
+                self._recordEvent('undef', fields[1])
             elif command == '#ifndef':
                 # See whether this block should be ignored.
                 if len(fields) < 2:
@@ -194,6 +363,7 @@ class GromacsTopFile(object):
                 # Pop an entry off the if stack.
                 if len(self._ifStack) == 0:
                     raise ValueError('Unexpected line in .top file: '+line)
+                self._checkIfStackChange()
                 del(self._ifStack[-1])
                 del(self._elseStack[-1])
             elif command == '#else':
@@ -203,6 +373,7 @@ class GromacsTopFile(object):
                 if self._elseStack[-1]:
                     raise ValueError('Unexpected line in .top file: '
                                      '#else has already been used ' + line)
+                self._checkIfStackChange()
                 self._ifStack[-1] = (not self._ifStack[-1])
                 self._elseStack[-1] = True
 
@@ -211,49 +382,33 @@ class GromacsTopFile(object):
             # parameters for individual terms (for instance, this is how
             # ff99SB-ILDN is implemented). So make sure we do the appropriate
             # pre-processor replacements necessary
-            line = _replace_defines(line, self._defines)
-            # A line of data for the current category
-            if self._currentCategory is None:
-                raise ValueError('Unexpected line in .top file: '+line)
-            if self._currentCategory == 'defaults':
-                self._processDefaults(line)
-            elif self._currentCategory == 'moleculetype':
-                self._processMoleculeType(line)
-            elif self._currentCategory == 'molecules':
-                self._processMolecule(line)
-            elif self._currentCategory == 'atoms':
-                self._processAtom(line)
-            elif self._currentCategory == 'bonds':
-                self._processBond(line)
-            elif self._currentCategory == 'angles':
-                self._processAngle(line)
-            elif self._currentCategory == 'dihedrals':
-                self._processDihedral(line)
-            elif self._currentCategory == 'exclusions':
-                self._processExclusion(line)
-            elif self._currentCategory == 'pairs':
-                self._processPair(line)
-            elif self._currentCategory == 'cmap':
-                self._processCmap(line)
-            elif self._currentCategory == 'atomtypes':
-                self._processAtomType(line)
-            elif self._currentCategory == 'bondtypes':
-                self._processBondType(line)
-            elif self._currentCategory == 'angletypes':
-                self._processAngleType(line)
-            elif self._currentCategory == 'dihedraltypes':
-                self._processDihedralType(line)
-            elif self._currentCategory == 'implicit_genborn_params':
-                self._processImplicitType(line)
-            elif self._currentCategory == 'pairtypes':
-                self._processPairType(line)
-            elif self._currentCategory == 'cmaptypes':
-                self._processCmapType(line)
-            elif self._currentCategory.startswith('virtual_sites'):
-                if self._currentMoleculeType is None:
-                    raise ValueError('Found %s before [ moleculetype ]' %
-                                     self._currentCategory)
-                self._currentMoleculeType.has_virtual_sites = True
+            if self._defines:
+                if self._definesRegex is None:
+                    self._definesRegex = _define_regex(self._defines)
+                if self._definesRegex.search(line) is not None:
+                    line = _replace_defines(line, self._defines)
+            self._recordEvent('data', line)
+            self._processData(line)
+
+    def _checkIfStackChange(self):
+        """An #else or #endif is about to modify the top of the if stack.  If that entry was
+        pushed by a file that includes the one being recorded, the recording cannot be reused."""
+        for recorder in self._recorders:
+            if len(self._ifStack) <= recorder.depth:
+                recorder.cacheable = False
+
+    def _processData(self, line):
+        """Process a line of data for the current category."""
+        if self._currentCategory is None:
+            raise ValueError('Unexpected line in .top file: '+line)
+        handler = GromacsTopFile._categoryHandlers.get(self._currentCategory)
+        if handler is not None:
+            handler(self, line)
+        elif self._currentCategory.startswith('virtual_sites'):
+            if self._currentMoleculeType is None:
+                raise ValueError('Found %s before [ moleculetype ]' %
+                                 self._currentCategory)
+            self._currentMoleculeType.has_virtual_sites = True
 
     def _processDefaults(self, line):
         """Process the [ defaults ] line."""
@@ -430,7 +585,25 @@ class GromacsTopFile(object):
             raise ValueError('Unsupported function type in [ cmaptypes ] line: '+line)
         self._cmapTypes[tuple(fields[:5])] = fields
 
-    def __init__(self, file, periodicBoxVectors=None, unitCellDimensions=None, includeDir=None, defines=None):
+    _categoryHandlers = {'defaults': _processDefaults,
+                         'moleculetype': _processMoleculeType,
+                         'molecules': _processMolecule,
+                         'atoms': _processAtom,
+                         'bonds': _processBond,
+                         'angles': _processAngle,
+                         'dihedrals': _processDihedral,
+                         'exclusions': _processExclusion,
+                         'pairs': _processPair,
+                         'cmap': _processCmap,
+                         'atomtypes': _processAtomType,
+                         'bondtypes': _processBondType,
+                         'angletypes': _processAngleType,
+                         'dihedraltypes': _processDihedralType,
+                         'implicit_genborn_params': _processImplicitType,
+                         'pairtypes': _processPairType,
+                         'cmaptypes': _processCmapType}
+
+    def __init__(self, file, periodicBoxVectors=None, unitCellDimensions=None, includeDir=None, defines=None, cacheDir=None):
         """Load a top file.
 
         Parameters
@@ -449,6 +622,17 @@ class GromacsTopFile(object):
             /usr/local, this will resolve to /usr/local/gromacs/share/gromacs/top
         defines : dict={}
             preprocessor definitions that should be predefined when parsing the file
+        cacheDir : string=None
+            A directory in which to save the parsed contents of #include files.
+            Parsed #include files are always cached in memory, so loading
+            another topology that includes the same files with the same defines
+            does not parse them again.  If a directory is specified, the cache
+            is also saved there so that it can be reused by other processes.
+            Cached files are identified by their path, modification time, and
+            size, so editing a file invalidates its entry.  The cache is
+            stored with pickle, so the directory must be a trusted location
+            that only you can write to.  Never use a directory that other
+            users share.
          """
         if includeDir is None:
             includeDir = _defaultGromacsIncludeDir()
@@ -461,8 +645,11 @@ class GromacsTopFile(object):
         self._defines['FLEXIBLE'] = True
         self._genpairs = True
         if defines is not None:
-            for define, value in defines.iteritems():
+            for define, value in defines.items():
                 self._defines[define] = value
+        self._definesRegex = None
+        self._cacheDir = cacheDir
+        self._recorders = []
 
         # Parse the file.
 
@@ -493,6 +680,7 @@ class GromacsTopFile(object):
         else:
             top.setUnitCellDimensions(unitCellDimensions)
         PDBFile._loadNameReplacementTables()
+        residueTemplates = {}
         for moleculeName, moleculeCount in self._molecules:
             if moleculeName not in self._moleculeTypes:
                 raise ValueError("Unknown molecule type: "+moleculeName)
@@ -500,20 +688,23 @@ class GromacsTopFile(object):
             if moleculeCount > 0 and moleculeType.has_virtual_sites:
                 raise ValueError('Virtual sites not yet supported by Gromacs parsers')
 
-            # Create the specified number of molecules of this type.
+            if moleculeCount <= 0:
+                continue
 
-            for i in range(moleculeCount):
-                atoms = []
+            # Work out the residues and atoms of this molecule type the first time it is used.
+
+            if moleculeName not in residueTemplates:
+                residues = []
                 lastResidue = None
-                c = top.addChain()
-                for index, fields in enumerate(moleculeType.atoms):
+                for fields in moleculeType.atoms:
                     resNumber = fields[2]
                     if resNumber != lastResidue:
                         lastResidue = resNumber
                         resName = fields[3]
                         if resName in PDBFile._residueNameReplacements:
                             resName = PDBFile._residueNameReplacements[resName]
-                        r = top.addResidue(resName, c)
+                        residueAtoms = []
+                        residues.append((resName, residueAtoms))
                         if resName in PDBFile._atomNameReplacements:
                             atomReplacements = PDBFile._atomNameReplacements[resName]
                         else:
@@ -536,12 +727,258 @@ class GromacsTopFile(object):
                             element = elem.get_by_symbol(atomName[0])
                         except KeyError:
                             element = None
-                    atoms.append(top.addAtom(atomName, element, r))
+                    residueAtoms.append((atomName, element))
+                bonds = [(int(fields[0])-1, int(fields[1])-1) for fields in moleculeType.bonds]
+                residueTemplates[moleculeName] = (residues, bonds)
+            residues, bonds = residueTemplates[moleculeName]
+
+            # Create the specified number of molecules of this type.
+
+            for i in range(moleculeCount):
+                atoms = []
+                c = top.addChain()
+                for resName, residueAtoms in residues:
+                    r = top.addResidue(resName, c)
+                    for atomName, element in residueAtoms:
+                        atoms.append(top.addAtom(atomName, element, r))
 
                 # Add bonds to the topology
 
-                for fields in moleculeType.bonds:
-                    top.addBond(atoms[int(fields[0])-1], atoms[int(fields[1])-1])
+                for atom1, atom2 in bonds:
+                    top.addBond(atoms[atom1], atoms[atom2])
+
+    def _createMoleculeTemplate(self, moleculeType, topologyAtoms, constraints, rigidWater, implicitSolvent, fudgeQQ,
+                                dihedralTypeTable, wildcardDihedralTypes):
+        """Look up the parameters for all the interactions in a molecule type.
+
+        Parameters
+        ----------
+        moleculeType : _MoleculeType
+            the molecule type to create a template for
+        topologyAtoms : list
+            the Topology atoms of one instance of the molecule
+        fudgeQQ : float
+            the scale factor for 1-4 Coulomb interactions
+        dihedralTypeTable : dict
+            maps pairs of central atom types to the dihedral types that may match them
+        wildcardDihedralTypes : list
+            the dihedral types whose central atoms are wildcards
+
+        The remaining parameters are the same as for createSystem().
+
+        Returns
+        -------
+        _MoleculeTemplate
+            the parameters of the molecule
+        """
+        template = GromacsTopFile._MoleculeTemplate()
+
+        # Record the types of all atoms.
+
+        atomTypes = [atom[1] for atom in moleculeType.atoms]
+        try:
+            bondedTypes = [self._atomTypes[t][1] for t in atomTypes]
+        except KeyError as e:
+            raise ValueError('Unknown atom type: ' + e.args[0])
+        bondedTypes = [b if b is not None else a for a, b in zip(atomTypes, bondedTypes)]
+
+        # Add atoms.
+
+        for fields in moleculeType.atoms:
+            if len(fields) >= 8:
+                mass = float(fields[7])
+            else:
+                mass = float(self._atomTypes[fields[1]][3])
+            template.masses.append(mass)
+
+        # Add bonds.
+
+        atomBonds = [{} for x in range(len(moleculeType.atoms))]
+        for fields in moleculeType.bonds:
+            atoms = [int(x)-1 for x in fields[:2]]
+            types = tuple(bondedTypes[i] for i in atoms)
+            if len(fields) >= 5:
+                params = fields[3:5]
+            elif types in self._bondTypes:
+                params = self._bondTypes[types][3:5]
+            elif types[::-1] in self._bondTypes:
+                params = self._bondTypes[types[::-1]][3:5]
+            else:
+                raise ValueError('No parameters specified for bond: '+fields[0]+', '+fields[1])
+            # Decide whether to use a constraint or a bond.
+            useConstraint = False
+            if rigidWater and topologyAtoms[atoms[0]].residue.name == 'HOH':
+                useConstraint = True
+            if constraints in (AllBonds, HAngles):
+                useConstraint = True
+            elif constraints is HBonds:
+                elements = [topologyAtoms[i].element for i in atoms]
+                if elem.hydrogen in elements:
+                    useConstraint = True
+            # Add the bond or constraint.
+            length = float(params[0])
+            if useConstraint:
+                template.constraints.append((atoms[0], atoms[1], length))
+            else:
+                template.useForce('bonds')
+                template.bonds.append((atoms[0], atoms[1], length, float(params[1])))
+            # Record information that will be needed for constraining angles.
+            atomBonds[atoms[0]][atoms[1]] = length
+            atomBonds[atoms[1]][atoms[0]] = length
+
+        # Add angles.
+
+        degToRad = math.pi/180
+        for fields in moleculeType.angles:
+            atoms = [int(x)-1 for x in fields[:3]]
+            types = tuple(bondedTypes[i] for i in atoms)
+            if len(fields) >= 6:
+                params = fields[4:]
+            elif types in self._angleTypes:
+                params = self._angleTypes[types][4:]
+            elif types[::-1] in self._angleTypes:
+                params = self._angleTypes[types[::-1]][4:]
+            else:
+                raise ValueError('No parameters specified for angle: '+fields[0]+', '+fields[1]+', '+fields[2])
+            # Decide whether to use a constraint or a bond.
+            useConstraint = False
+            if rigidWater and topologyAtoms[atoms[0]].residue.name == 'HOH':
+                useConstraint = True
+            if constraints is HAngles:
+                elements = [topologyAtoms[i].element for i in atoms]
+                if elements[0] == elem.hydrogen and elements[2] == elem.hydrogen:
+                    useConstraint = True
+                elif elements[1] == elem.oxygen and (elements[0] == elem.hydrogen or elements[2] == elem.hydrogen):
+                    useConstraint = True
+            # Add the bond or constraint.
+            theta = float(params[0])*degToRad
+            if useConstraint:
+                # Compute the distance between atoms and add a constraint
+                if atoms[0] in atomBonds[atoms[1]] and atoms[2] in atomBonds[atoms[1]]:
+                    l1 = atomBonds[atoms[1]][atoms[0]]
+                    l2 = atomBonds[atoms[1]][atoms[2]]
+                    length = math.sqrt(l1*l1 + l2*l2 - 2*l1*l2*math.cos(theta))
+                    template.constraints.append((atoms[0], atoms[2], length))
+            else:
+                template.useForce('angles')
+                template.angles.append((atoms[0], atoms[1], atoms[2], theta, float(params[1])))
+                if fields[3] == '5':
+                    # This is a Urey-Bradley term, so add the bond.
+                    template.useForce('bonds')
+                    k = float(params[3])
+                    if k != 0:
+                        template.bonds.append((atoms[0], atoms[2], float(params[2]), k))
+
+        # Add torsions.
+
+        for fields in moleculeType.dihedrals:
+            atoms = [int(x)-1 for x in fields[:4]]
+            types = tuple(bondedTypes[i] for i in atoms)
+            dihedralType = fields[4]
+            reversedTypes = types[::-1]+(dihedralType,)
+            types = types+(dihedralType,)
+            if (dihedralType in ('1', '2', '4', '9') and len(fields) > 7) or (dihedralType == '3' and len(fields) > 10):
+                paramsList = [fields]
+            else:
+                # Look for a matching dihedral type.
+                paramsList = None
+                if (types[1], types[2]) in dihedralTypeTable:
+                    dihedralTypes = dihedralTypeTable[(types[1], types[2])]
+                else:
+                    dihedralTypes = wildcardDihedralTypes
+                for key in dihedralTypes:
+                    if all(a == b or a == 'X' for a, b in zip(key, types)) or all(a == b or a == 'X' for a, b in zip(key, reversedTypes)):
+                        paramsList = self._dihedralTypes[key]
+                        if 'X' not in key:
+                            break
+                if paramsList is None:
+                    raise ValueError('No parameters specified for dihedral: '+fields[0]+', '+fields[1]+', '+fields[2]+', '+fields[3])
+            for params in paramsList:
+                if dihedralType in ('1', '4', '9'):
+                    # Periodic torsion
+                    k = float(params[6])
+                    if k != 0:
+                        template.useForce('periodic')
+                        template.periodicTorsions.append(tuple(atoms)+(int(params[7]), float(params[5])*degToRad, k))
+                elif dihedralType == '2':
+                    # Harmonic torsion
+                    k = float(params[6])
+                    if k != 0:
+                        template.useForce('harmonicTorsion')
+                        template.harmonicTorsions.append(tuple(atoms)+((float(params[5])*degToRad, k),))
+                else:
+                    # RB Torsion
+                    c = [float(x) for x in params[5:11]]
+                    if any(x != 0 for x in c):
+                        template.useForce('rb')
+                        template.rbTorsions.append(tuple(atoms)+tuple(c))
+
+        # Add CMAP terms.
+
+        for fields in moleculeType.cmaps:
+            atoms = [int(x)-1 for x in fields[:5]]
+            types = tuple(bondedTypes[i] for i in atoms)
+            if len(fields) >= 8 and len(fields) >= 8+int(fields[6])*int(fields[7]):
+                params = fields
+            elif types in self._cmapTypes:
+                params = self._cmapTypes[types]
+            elif types[::-1] in self._cmapTypes:
+                params = self._cmapTypes[types[::-1]]
+            else:
+                raise ValueError('No parameters specified for cmap: '+fields[0]+', '+fields[1]+', '+fields[2]+', '+fields[3]+', '+fields[4])
+            template.useForce('cmap')
+            mapSize = int(params[6])
+            if mapSize != int(params[7]):
+                raise ValueError('Non-square CMAPs are not supported')
+            map = []
+            for i in range(mapSize):
+                for j in range(mapSize):
+                    map.append(float(params[8+mapSize*((j+mapSize//2)%mapSize)+((i+mapSize//2)%mapSize)]))
+            template.cmaps.append((mapSize, tuple(map), tuple(atoms)))
+
+        # Set nonbonded parameters for particles.
+
+        charges = []
+        for fields in moleculeType.atoms:
+            params = self._atomTypes[fields[1]]
+            if len(fields) > 6:
+                q = float(fields[6])
+            else:
+                q = float(params[4])
+            charges.append(q)
+            template.nonbonded.append((q, float(params[6]), float(params[7])))
+            if implicitSolvent is OBC2:
+                if fields[1] not in self._implicitTypes:
+                    raise ValueError('No implicit solvent parameters specified for atom type: '+fields[1])
+                gbparams = self._implicitTypes[fields[1]]
+                template.gb.append((q, float(gbparams[4]), float(gbparams[5])))
+        for fields in moleculeType.bonds:
+            atoms = [int(x)-1 for x in fields[:2]]
+            template.bondIndices.append((atoms[0], atoms[1]))
+
+        # Record nonbonded exceptions.
+
+        for fields in moleculeType.pairs:
+            atoms = [int(x)-1 for x in fields[:2]]
+            types = tuple(atomTypes[i] for i in atoms)
+            if len(fields) >= 5:
+                params = fields[3:5]
+            elif types in self._pairTypes:
+                params = self._pairTypes[types][3:5]
+            elif types[::-1] in self._pairTypes:
+                params = self._pairTypes[types[::-1]][3:5]
+            elif not self._genpairs:
+                raise ValueError('No pair parameters defined for atom '
+                                 'types %s and gen-pairs is "no"' % (types,))
+            else:
+                continue # We'll use the automatically generated parameters
+            template.exceptions.append((atoms[0], atoms[1], charges[atoms[0]]*charges[atoms[1]]*fudgeQQ, float(params[0]), float(params[1])))
+        for fields in moleculeType.exclusions:
+            atoms = [int(x)-1 for x in fields]
+            for atom in atoms[1:]:
+                if atom > atoms[0]:
+                    template.exceptions.append((atoms[0], atom, 0.0, 0.0, 0.0))
+        return template
 
     def createSystem(self, nonbondedMethod=ff.NoCutoff, nonbondedCutoff=1.0*unit.nanometer,
                      constraints=None, rigidWater=True, implicitSolvent=None, soluteDielectric=1.0, solventDielectric=78.5, ewaldErrorTolerance=0.0005, removeCMMotion=True, hydrogenMass=None):
@@ -631,239 +1068,76 @@ class GromacsTopFile(object):
                 for types in dihedralTypeTable.values():
                     types.append(key)
 
-        # Loop over molecules and create the specified number of each type.
+        # Loop over molecules and create the specified number of each type.  The parameters of each
+        # molecule type are looked up once, then copied to every instance of it.
 
+        templates = {}
         for moleculeName, moleculeCount in self._molecules:
-            moleculeType = self._moleculeTypes[moleculeName]
-            for i in range(moleculeCount):
-
-                # Record the types of all atoms.
-
-                baseAtomIndex = sys.getNumParticles()
-                atomTypes = [atom[1] for atom in moleculeType.atoms]
-                try:
-                    bondedTypes = [self._atomTypes[t][1] for t in atomTypes]
-                except KeyError as e:
-                    raise ValueError('Unknown atom type: ' + e.message)
-                bondedTypes = [b if b is not None else a for a, b in zip(atomTypes, bondedTypes)]
-
-                # Add atoms.
-
-                for fields in moleculeType.atoms:
-                    if len(fields) >= 8:
-                        mass = float(fields[7])
-                    else:
-                        mass = float(self._atomTypes[fields[1]][3])
-                    sys.addParticle(mass)
-
-                # Add bonds.
-
-                atomBonds = [{} for x in range(len(moleculeType.atoms))]
-                for fields in moleculeType.bonds:
-                    atoms = [int(x)-1 for x in fields[:2]]
-                    types = tuple(bondedTypes[i] for i in atoms)
-                    if len(fields) >= 5:
-                        params = fields[3:5]
-                    elif types in self._bondTypes:
-                        params = self._bondTypes[types][3:5]
-                    elif types[::-1] in self._bondTypes:
-                        params = self._bondTypes[types[::-1]][3:5]
-                    else:
-                        raise ValueError('No parameters specified for bond: '+fields[0]+', '+fields[1])
-                    # Decide whether to use a constraint or a bond.
-                    useConstraint = False
-                    if rigidWater and topologyAtoms[baseAtomIndex+atoms[0]].residue.name == 'HOH':
-                        useConstraint = True
-                    if constraints in (AllBonds, HAngles):
-                        useConstraint = True
-                    elif constraints is HBonds:
-                        elements = [topologyAtoms[baseAtomIndex+i].element for i in atoms]
-                        if elem.hydrogen in elements:
-                            useConstraint = True
-                    # Add the bond or constraint.
-                    length = float(params[0])
-                    if useConstraint:
-                        sys.addConstraint(baseAtomIndex+atoms[0], baseAtomIndex+atoms[1], length)
-                    else:
-                        if bonds is None:
-                            bonds = mm.HarmonicBondForce()
-                            sys.addForce(bonds)
-                        bonds.addBond(baseAtomIndex+atoms[0], baseAtomIndex+atoms[1], length, float(params[1]))
-                    # Record information that will be needed for constraining angles.
-                    atomBonds[atoms[0]][atoms[1]] = length
-                    atomBonds[atoms[1]][atoms[0]] = length
-
-                # Add angles.
-
-                degToRad = math.pi/180
-                for fields in moleculeType.angles:
-                    atoms = [int(x)-1 for x in fields[:3]]
-                    types = tuple(bondedTypes[i] for i in atoms)
-                    if len(fields) >= 6:
-                        params = fields[4:]
-                    elif types in self._angleTypes:
-                        params = self._angleTypes[types][4:]
-                    elif types[::-1] in self._angleTypes:
-                        params = self._angleTypes[types[::-1]][4:]
-                    else:
-                        raise ValueError('No parameters specified for angle: '+fields[0]+', '+fields[1]+', '+fields[2])
-                    # Decide whether to use a constraint or a bond.
-                    useConstraint = False
-                    if rigidWater and topologyAtoms[baseAtomIndex+atoms[0]].residue.name == 'HOH':
-                        useConstraint = True
-                    if constraints is HAngles:
-                        elements = [topologyAtoms[baseAtomIndex+i].element for i in atoms]
-                        if elements[0] == elem.hydrogen and elements[2] == elem.hydrogen:
-                            useConstraint = True
-                        elif elements[1] == elem.oxygen and (elements[0] == elem.hydrogen or elements[2] == elem.hydrogen):
-                            useConstraint = True
-                    # Add the bond or constraint.
-                    theta = float(params[0])*degToRad
-                    if useConstraint:
-                        # Compute the distance between atoms and add a constraint
-                        if atoms[0] in atomBonds[atoms[1]] and atoms[2] in atomBonds[atoms[1]]:
-                            l1 = atomBonds[atoms[1]][atoms[0]]
-                            l2 = atomBonds[atoms[1]][atoms[2]]
-                            length = math.sqrt(l1*l1 + l2*l2 - 2*l1*l2*math.cos(theta))
-                            sys.addConstraint(baseAtomIndex+atoms[0], baseAtomIndex+atoms[2], length)
-                    else:
-                        if angles is None:
-                            angles = mm.HarmonicAngleForce()
-                            sys.addForce(angles)
-                        angles.addAngle(baseAtomIndex+atoms[0], baseAtomIndex+atoms[1], baseAtomIndex+atoms[2], theta, float(params[1]))
-                        if fields[3] == '5':
-                            # This is a Urey-Bradley term, so add the bond.
-                            if bonds is None:
-                                bonds = mm.HarmonicBondForce()
-                                sys.addForce(bonds)
-                            k = float(params[3])
-                            if k != 0:
-                                bonds.addBond(baseAtomIndex+atoms[0], baseAtomIndex+atoms[2], float(params[2]), k)
-
-                # Add torsions.
-
-                for fields in moleculeType.dihedrals:
-                    atoms = [int(x)-1 for x in fields[:4]]
-                    types = tuple(bondedTypes[i] for i in atoms)
-                    dihedralType = fields[4]
-                    reversedTypes = types[::-1]+(dihedralType,)
-                    types = types+(dihedralType,)
-                    if (dihedralType in ('1', '2', '4', '9') and len(fields) > 7) or (dihedralType == '3' and len(fields) > 10):
-                        paramsList = [fields]
-                    else:
-                        # Look for a matching dihedral type.
-                        paramsList = None
-                        if (types[1], types[2]) in dihedralTypeTable:
-                            dihedralTypes = dihedralTypeTable[(types[1], types[2])]
-                        else:
-                            dihedralTypes = wildcardDihedralTypes
-                        for key in dihedralTypes:
-                            if all(a == b or a == 'X' for a, b in zip(key, types)) or all(a == b or a == 'X' for a, b in zip(key, reversedTypes)):
-                                paramsList = self._dihedralTypes[key]
-                                if 'X' not in key:
-                                    break
-                        if paramsList is None:
-                            raise ValueError('No parameters specified for dihedral: '+fields[0]+', '+fields[1]+', '+fields[2]+', '+fields[3])
-                    for params in paramsList:
-                        if dihedralType in ('1', '4', '9'):
-                            # Periodic torsion
-                            k = float(params[6])
-                            if k != 0:
-                                if periodic is None:
-                                    periodic = mm.PeriodicTorsionForce()
-                                    sys.addForce(periodic)
-                                periodic.addTorsion(baseAtomIndex+atoms[0], baseAtomIndex+atoms[1], baseAtomIndex+atoms[2], baseAtomIndex+atoms[3], int(params[7]), float(params[5])*degToRad, k)
-                        elif dihedralType == '2':
-                            # Harmonic torsion
-                            k = float(params[6])
-                            if k != 0:
-                                if harmonicTorsion is None:
-                                    harmonicTorsion = mm.CustomTorsionForce('0.5*k*(theta-theta0)^2')
-                                    harmonicTorsion.addPerTorsionParameter('theta0')
-                                    harmonicTorsion.addPerTorsionParameter('k')
-                                    sys.addForce(harmonicTorsion)
-                                harmonicTorsion.addTorsion(baseAtomIndex+atoms[0], baseAtomIndex+atoms[1], baseAtomIndex+atoms[2], baseAtomIndex+atoms[3], (float(params[5])*degToRad, k))
-                        else:
-                            # RB Torsion
-                            c = [float(x) for x in params[5:11]]
-                            if any(x != 0 for x in c):
-                                if rb is None:
-                                    rb = mm.RBTorsionForce()
-                                    sys.addForce(rb)
-                                rb.addTorsion(baseAtomIndex+atoms[0], baseAtomIndex+atoms[1], baseAtomIndex+atoms[2], baseAtomIndex+atoms[3], c[0], c[1], c[2], c[3], c[4], c[5])
-
-                # Add CMAP terms.
-
-                for fields in moleculeType.cmaps:
-                    atoms = [int(x)-1 for x in fields[:5]]
-                    types = tuple(bondedTypes[i] for i in atoms)
-                    if len(fields) >= 8 and len(fields) >= 8+int(fields[6])*int(fields[7]):
-                        params = fields
-                    elif types in self._cmapTypes:
-                        params = self._cmapTypes[types]
-                    elif types[::-1] in self._cmapTypes:
-                        params = self._cmapTypes[types[::-1]]
-                    else:
-                        raise ValueError('No parameters specified for cmap: '+fields[0]+', '+fields[1]+', '+fields[2]+', '+fields[3]+', '+fields[4])
-                    if cmap is None:
+            if moleculeCount <= 0:
+                continue
+            template = templates.get(moleculeName)
+            if template is None:
+                moleculeAtoms = topologyAtoms[sys.getNumParticles():sys.getNumParticles()+len(self._moleculeTypes[moleculeName].atoms)]
+                template = self._createMoleculeTemplate(self._moleculeTypes[moleculeName], moleculeAtoms, constraints, rigidWater,
+                                                        implicitSolvent, fudgeQQ, dihedralTypeTable, wildcardDihedralTypes)
+                templates[moleculeName] = template
+
+                # Create any forces this molecule needs, in the order they are first used.
+
+                for force in template.forces:
+                    if force == 'bonds' and bonds is None:
+                        bonds = mm.HarmonicBondForce()
+                        sys.addForce(bonds)
+                    elif force == 'angles' and angles is None:
+                        angles = mm.HarmonicAngleForce()
+                        sys.addForce(angles)
+                    elif force == 'periodic' and periodic is None:
+                        periodic = mm.PeriodicTorsionForce()
+                        sys.addForce(periodic)
+                    elif force == 'harmonicTorsion' and harmonicTorsion is None:
+                        harmonicTorsion = mm.CustomTorsionForce('0.5*k*(theta-theta0)^2')
+                        harmonicTorsion.addPerTorsionParameter('theta0')
+                        harmonicTorsion.addPerTorsionParameter('k')
+                        sys.addForce(harmonicTorsion)
+                    elif force == 'rb' and rb is None:
+                        rb = mm.RBTorsionForce()
+                        sys.addForce(rb)
+                    elif force == 'cmap' and cmap is None:
                         cmap = mm.CMAPTorsionForce()
                         sys.addForce(cmap)
-                    mapSize = int(params[6])
-                    if mapSize != int(params[7]):
-                        raise ValueError('Non-square CMAPs are not supported')
-                    map = []
-                    for i in range(mapSize):
-                        for j in range(mapSize):
-                            map.append(float(params[8+mapSize*((j+mapSize/2)%mapSize)+((i+mapSize/2)%mapSize)]))
-                    map = tuple(map)
+                cmapTorsions = []
+                for mapSize, map, atoms in template.cmaps:
                     if map not in mapIndices:
                         mapIndices[map] = cmap.addMap(mapSize, map)
-                    cmap.addTorsion(mapIndices[map], baseAtomIndex+atoms[0], baseAtomIndex+atoms[1], baseAtomIndex+atoms[2], baseAtomIndex+atoms[3],
-                                 baseAtomIndex+atoms[1], baseAtomIndex+atoms[2], baseAtomIndex+atoms[3], baseAtomIndex+atoms[4])
-
-                # Set nonbonded parameters for particles.
+                    cmapTorsions.append((mapIndices[map],)+atoms)
+                template.cmaps = cmapTorsions
 
-                for fields in moleculeType.atoms:
-                    params = self._atomTypes[fields[1]]
-                    if len(fields) > 6:
-                        q = float(fields[6])
-                    else:
-                        q = float(params[4])
-                    nb.addParticle(q, float(params[6]), float(params[7]))
-                    if implicitSolvent is OBC2:
-                        if fields[1] not in self._implicitTypes:
-                            raise ValueError('No implicit solvent parameters specified for atom type: '+fields[1])
-                        gbparams = self._implicitTypes[fields[1]]
-                        gb.addParticle(q, float(gbparams[4]), float(gbparams[5]))
-                for fields in moleculeType.bonds:
-                    atoms = [int(x)-1 for x in fields[:2]]
-                    bondIndices.append((baseAtomIndex+atoms[0], baseAtomIndex+atoms[1]))
-
-                # Record nonbonded exceptions.
-
-                for fields in moleculeType.pairs:
-                    atoms = [int(x)-1 for x in fields[:2]]
-                    types = tuple(atomTypes[i] for i in atoms)
-                    if len(fields) >= 5:
-                        params = fields[3:5]
-                    elif types in self._pairTypes:
-                        params = self._pairTypes[types][3:5]
-                    elif types[::-1] in self._pairTypes:
-                        params = self._pairTypes[types[::-1]][3:5]
-                    elif not self._genpairs:
-                        raise ValueError('No pair parameters defined for atom '
-                                         'types %s and gen-pairs is "no"' % types)
-                    else:
-                        continue # We'll use the automatically generated parameters
-                    atom1params = nb.getParticleParameters(baseAtomIndex+atoms[0])
-                    atom2params = nb.getParticleParameters(baseAtomIndex+atoms[1])
-                    exceptions.append((baseAtomIndex+atoms[0], baseAtomIndex+atoms[1], atom1params[0]*atom2params[0]*fudgeQQ, params[0], params[1]))
-                for fields in moleculeType.exclusions:
-                    atoms = [int(x)-1 for x in fields]
-                    for atom in atoms[1:]:
-                        if atom > atoms[0]:
-                            exceptions.append((baseAtomIndex+atoms[0], baseAtomIndex+atom, 0, 0, 0))
+            # Create the specified number of molecules of this type.
 
+            for i in range(moleculeCount):
+                base = sys.getNumParticles()
+                for mass in template.masses:
+                    sys.addParticle(mass)
+                for a1, a2, length in template.constraints:
+                    sys.addConstraint(base+a1, base+a2, length)
+                for a1, a2, length, k in template.bonds:
+                    bonds.addBond(base+a1, base+a2, length, k)
+                for a1, a2, a3, theta, k in template.angles:
+                    angles.addAngle(base+a1, base+a2, base+a3, theta, k)
+                for a1, a2, a3, a4, periodicity, phase, k in template.periodicTorsions:
+                    periodic.addTorsion(base+a1, base+a2, base+a3, base+a4, periodicity, phase, k)
+                for a1, a2, a3, a4, params in template.harmonicTorsions:
+                    harmonicTorsion.addTorsion(base+a1, base+a2, base+a3, base+a4, params)
+                for a1, a2, a3, a4, c0, c1, c2, c3, c4, c5 in template.rbTorsions:
+                    rb.addTorsion(base+a1, base+a2, base+a3, base+a4, c0, c1, c2, c3, c4, c5)
+                for mapIndex, a1, a2, a3, a4, a5 in template.cmaps:
+                    cmap.addTorsion(mapIndex, base+a1, base+a2, base+a3, base+a4, base+a2, base+a3, base+a4, base+a5)
+                for q, sigma, epsilon in template.nonbonded:
+                    nb.addParticle(q, sigma, epsilon)
+                for q, radius, scale in template.gb:
+                    gb.addParticle(q, radius, scale)
+                bondIndices.extend((base+a1, base+a2) for a1, a2 in template.bondIndices)
+                exceptions.extend((base+a1, base+a2, chargeProd, sigma, epsilon) for a1, a2, chargeProd, sigma, epsilon in template.exceptions)
 
         # Create nonbonded exceptions.
 
@@ -42,6 +42,7 @@ from __future__ import absolute_import, print_function
 
 import os
 import re
+from itertools import chain
 from math import ceil, cos, sin, asin, sqrt, pi
 import warnings
 
@@ -56,6 +57,7 @@ from simtk.openmm.app import element as elem
 from simtk.openmm.app.internal.unitcell import computePeriodicBoxVectors
 from simtk.openmm.vec3 import Vec3
 from . import customgbforces as customgb
+from .netcdf import NetCDFFile
 
 #=============================================================================================
 # AMBER parmtop loader (from 'zander', by Randall J. Radmer)
@@ -83,6 +85,60 @@ class NbfixPresent(Exception):
     """ Exception raised when NBFIX is used for the Lennard-Jones terms """
     pass
 
+def _parseSection(lines, itemType, iLength):
+    """Convert the data lines of one %FLAG section into a sequence of values.
+
+    Integer and floating point sections are converted in a single pass.  When
+    numpy is available the lines are padded to whole fields and viewed as a
+    fixed-width string array, which is cast to int64 or float64 in one call;
+    otherwise each field is converted as it is sliced.  Character sections, and
+    numeric sections containing fields that cannot be parsed, are returned as
+    lists of stripped strings.
+    """
+    lines = [line.rstrip() for line in lines]
+    itemType = itemType.upper()
+    if itemType in ('I', 'E', 'F'):
+        try:
+            if np is not None:
+                padded = ''.join(line.ljust(-(-len(line)//iLength)*iLength) for line in lines)
+                fields = np.frombuffer(padded.encode('ascii'), dtype='S%d' % iLength)
+                return fields.astype(np.int64 if itemType == 'I' else np.float64)
+            convert = (int if itemType == 'I' else float)
+            return [convert(line[index:index+iLength]) for line in lines for index in range(0, len(line), iLength)]
+        except ValueError:
+            pass
+    return [line[index:index+iLength].strip() for line in lines for index in range(0, len(line), iLength)]
+
+def _toList(values):
+    """Return a parsed section, or a column derived from one, as a plain list."""
+    if np is not None and isinstance(values, np.ndarray):
+        return values.tolist()
+    return list(values)
+
+def _pointerTable(pointers, width):
+    """Return term pointers as an (n, width) int64 array, or as a list of n rows without numpy."""
+    if np is not None:
+        return np.asarray(pointers, dtype=np.int64).reshape(-1, width)
+    return [[int(p) for p in pointers[i:i+width]] for i in range(0, len(pointers), width)]
+
+def _negativePointerRows(table, numAtoms):
+    """Return the rows of a pointer table with a negative value among their first numAtoms atom pointers."""
+    if np is not None:
+        return table[(table[:,:numAtoms] < 0).any(axis=1)].tolist()
+    return [row for row in table if min(row[:numAtoms]) < 0]
+
+def _concatenate(first, second):
+    """Concatenate two parsed sections."""
+    if np is not None:
+        return np.concatenate((np.asarray(first), np.asarray(second)))
+    return list(first)+list(second)
+
+def _columns(rows, width):
+    """Transpose a list of term tuples into one list per field."""
+    if not rows:
+        return tuple([] for i in range(width))
+    return tuple(list(column) for column in zip(*rows))
+
 class PrmtopLoader(object):
     """Parsed AMBER prmtop file.
 
@@ -132,6 +188,8 @@ class PrmtopLoader(object):
                             raise TypeError('CHAMBER-style topology files are not supported here. '
                                             'Consider using the CHARMM files directly with CharmmPsfFile '
                                             'or ParmEd (where CHAMBER topologies are supported)')
+                        if self._flags:
+                            self._convertSection(self._flags[-1])
                         self._flags.append(flag)
                         self._raw_data[flag] = []
                     elif line.startswith('%FORMAT'):
@@ -148,14 +206,10 @@ class PrmtopLoader(object):
                      and not self._raw_data['TITLE']:
                     self._raw_data['TITLE'] = line.rstrip()
                 else:
-                    flag=self._flags[-1]
-                    (format, numItems, itemType,
-                     iLength, itemPrecision) = self._getFormat(flag)
-                    line = line.rstrip()
-                    for index in range(0, len(line), iLength):
-                        item = line[index:index+iLength]
-                        if item:
-                            self._raw_data[flag].append(item.strip())
+                    # Collect the raw lines; they are parsed all at once when the section ends.
+                    self._raw_data[self._flags[-1]].append(line)
+        if self._flags:
+            self._convertSection(self._flags[-1])
         # See if this is a CHAMBER-style topology file, which is not supported
         # for creating Systems
         self.chamber = 'CTITLE' in self._flags
@@ -165,6 +219,14 @@ class PrmtopLoader(object):
             flag=self._flags[-1]
         return self._raw_format[flag]
 
+    def _convertSection(self, flag):
+        """Replace the raw lines collected for a section with its parsed values."""
+        lines = self._raw_data[flag]
+        if isinstance(lines, list) and flag in self._raw_format:
+            (format, numItems, itemType,
+             iLength, itemPrecision) = self._getFormat(flag)
+            self._raw_data[flag] = _parseSection(lines, itemType, iLength)
+
     def _getPointerValue(self, pointerLabel):
         """Return pointer value given pointer label
 
@@ -230,7 +292,7 @@ class PrmtopLoader(object):
         try:
             return self._massList
         except AttributeError:
-            self._massList = [float(x) for x in self._raw_data['MASS']]
+            self._massList = _toList(self._raw_data['MASS'])
             return self._massList
 
     def getCharges(self):
@@ -238,7 +300,11 @@ class PrmtopLoader(object):
         try:
             return self._chargeList
         except AttributeError:
-            self._chargeList = [float(x)/18.2223 for x in self._raw_data['CHARGE']]
+            charges = self._raw_data['CHARGE']
+            if np is not None:
+                self._chargeList = (np.asarray(charges)/18.2223).tolist()
+            else:
+                self._chargeList = [float(x)/18.2223 for x in charges]
             return self._chargeList
 
     def getAtomName(self, iAtom):
@@ -254,7 +320,7 @@ class PrmtopLoader(object):
         try:
             return self._atomTypeIndexes
         except AttributeError:
-            self._atomTypeIndexes = [int(x) for x in self._raw_data['ATOM_TYPE_INDEX']]
+            self._atomTypeIndexes = _toList(self._raw_data['ATOM_TYPE_INDEX'])
             return self._atomTypeIndexes
 
     def getAtomType(self, iAtom):
@@ -282,20 +348,25 @@ class PrmtopLoader(object):
             return self.getResidueLabel(iRes=self._getResiduePointer(iAtom))
 
     def _getResiduePointer(self, iAtom):
+        return self._getResidueIndexes()[iAtom]
+
+    def _getResidueIndexes(self):
+        """Return a list containing the index of the residue each atom belongs to"""
         try:
-            return self.residuePointerDict[iAtom]
-        except:
+            return self._residueIndexes
+        except AttributeError:
             pass
-        self.residuePointerDict = {}
-        resPointers=self._raw_data['RESIDUE_POINTER']
-        firstAtom = [int(p)-1 for p in resPointers]
-        firstAtom.append(self.getNumAtoms())
-        res = 0
-        for i in range(self.getNumAtoms()):
-            while firstAtom[res+1] <= i:
-                res += 1
-            self.residuePointerDict[i] = res
-        return self.residuePointerDict[iAtom]
+        numAtoms = self.getNumAtoms()
+        firstAtom = _toList(self._raw_data['RESIDUE_POINTER'])
+        if np is not None:
+            counts = np.diff(np.array(firstAtom+[numAtoms+1]))
+            self._residueIndexes = np.repeat(np.arange(len(firstAtom)), counts).tolist()
+        else:
+            self._residueIndexes = []
+            for res in range(len(firstAtom)):
+                end = (firstAtom[res+1] if res+1 < len(firstAtom) else numAtoms+1)
+                self._residueIndexes += [res]*(end-firstAtom[res])
+        return self._residueIndexes
 
     def getNonbondTerms(self):
         """
@@ -303,50 +374,67 @@ class PrmtopLoader(object):
         elements of the Lennard-Jones A and B coefficient matrices are found,
         NbfixPresent exception is raised
         """
+        try:
+            return self._nonbondTerms
+        except AttributeError:
+            pass
+        rVdw, epsilon = self._getNonbondColumns()
+        self._nonbondTerms = list(zip(_toList(rVdw), _toList(epsilon)))
+        return self._nonbondTerms
+
+    def _getNonbondColumns(self):
+        """
+        Return the per-atom rVdw and epsilon values as two sequences. The
+        Lennard-Jones parameters are derived once per atom type, then expanded
+        to atoms by indexing. If off-diagonal elements of the Lennard-Jones A
+        and B coefficient matrices are found, NbfixPresent exception is raised
+        """
         if self._has_nbfix_terms:
             raise NbfixPresent('Off-diagonal Lennard-Jones elements found. '
                         'Cannot determine LJ parameters for individual atoms.')
         try:
-            return self._nonbondTerms
+            return self._nonbondColumns
         except AttributeError:
             pass
         # Check if there are any non-zero HBOND terms
         for x, y in zip(self._raw_data['HBOND_ACOEF'], self._raw_data['HBOND_BCOEF']):
             if float(x) or float(y):
                 raise Exception('10-12 interactions are not supported')
-        self._nonbondTerms=[]
         lengthConversionFactor = units.angstrom.conversion_factor_to(units.nanometer)
         energyConversionFactor = units.kilocalorie_per_mole.conversion_factor_to(units.kilojoule_per_mole)
         numTypes = self.getNumTypes()
-        atomTypeIndexes=self._getAtomTypeIndexes()
+        nbIndexes = self._raw_data['NONBONDED_PARM_INDEX']
+        acoefs = self._raw_data['LENNARD_JONES_ACOEF']
+        bcoefs = self._raw_data['LENNARD_JONES_BCOEF']
+        atomTypeIndexes = self._raw_data['ATOM_TYPE_INDEX']
+        if np is not None:
+            usedTypes = np.unique(atomTypeIndexes).tolist()
+        else:
+            usedTypes = sorted(set(atomTypeIndexes))
         type_parameters = [(0, 0) for i in range(numTypes)]
-        for iAtom in range(self.getNumAtoms()):
-            index=(numTypes+1)*(atomTypeIndexes[iAtom]-1)
-            nbIndex=int(self._raw_data['NONBONDED_PARM_INDEX'][index])-1
+        for iType in usedTypes:
+            nbIndex=int(nbIndexes[(numTypes+1)*(iType-1)])-1
             if nbIndex<0:
                 raise Exception("10-12 interactions are not supported")
-            acoef = float(self._raw_data['LENNARD_JONES_ACOEF'][nbIndex])
-            bcoef = float(self._raw_data['LENNARD_JONES_BCOEF'][nbIndex])
+            acoef = float(acoefs[nbIndex])
+            bcoef = float(bcoefs[nbIndex])
             try:
                 rMin = (2*acoef/bcoef)**(1/6.0)
                 epsilon = 0.25*bcoef*bcoef/acoef
             except ZeroDivisionError:
                 rMin = 1.0
                 epsilon = 0.0
-            type_parameters[atomTypeIndexes[iAtom]-1] = (rMin/2.0, epsilon)
-            rVdw = rMin/2.0*lengthConversionFactor
-            epsilon = epsilon*energyConversionFactor
-            self._nonbondTerms.append( (rVdw, epsilon) )
+            type_parameters[iType-1] = (rMin/2.0, epsilon)
         # Check if we have any off-diagonal modified LJ terms that would require
         # an NBFIX-like solution
         for i in range(numTypes):
             for j in range(numTypes):
-                index = int(self._raw_data['NONBONDED_PARM_INDEX'][numTypes*i+j]) - 1
+                index = int(nbIndexes[numTypes*i+j]) - 1
                 if index < 0: continue
                 rij = type_parameters[i][0] + type_parameters[j][0]
                 wdij = sqrt(type_parameters[i][1] * type_parameters[j][1])
-                a = float(self._raw_data['LENNARD_JONES_ACOEF'][index])
-                b = float(self._raw_data['LENNARD_JONES_BCOEF'][index])
+                a = float(acoefs[index])
+                b = float(bcoefs[index])
                 if a == 0 or b == 0:
                     if a != 0 or b != 0 or (wdij != 0 and rij != 0):
                         self._has_nbfix_terms = True
@@ -359,26 +447,49 @@ class PrmtopLoader(object):
                     raise NbfixPresent('Off-diagonal Lennard-Jones elements '
                                        'found. Cannot determine LJ parameters '
                                        'for individual atoms.')
-        return self._nonbondTerms
+        typeRVdw = [p[0]*lengthConversionFactor for p in type_parameters]
+        typeEpsilon = [p[1]*energyConversionFactor for p in type_parameters]
+        if np is not None:
+            types = np.asarray(atomTypeIndexes)-1
+            self._nonbondColumns = (np.array(typeRVdw)[types], np.array(typeEpsilon)[types])
+        else:
+            self._nonbondColumns = ([typeRVdw[t-1] for t in atomTypeIndexes],
+                                    [typeEpsilon[t-1] for t in atomTypeIndexes])
+        return self._nonbondColumns
 
-    def _getBonds(self, bondPointers):
+    def _getBondColumns(self, flag):
+        """
+        Return the bonds in a BONDS_* section as four sequences: the first atom
+        index, the second atom index, K, and Rmin
+        """
+        try:
+            return self._bondColumns[flag]
+        except AttributeError:
+            self._bondColumns = {}
+        except KeyError:
+            pass
         forceConstant=self._raw_data["BOND_FORCE_CONSTANT"]
         bondEquil=self._raw_data["BOND_EQUIL_VALUE"]
-        returnList=[]
         forceConstConversionFactor = (units.kilocalorie_per_mole/(units.angstrom*units.angstrom)).conversion_factor_to(units.kilojoule_per_mole/(units.nanometer*units.nanometer))
         lengthConversionFactor = units.angstrom.conversion_factor_to(units.nanometer)
-        for ii in range(0,len(bondPointers),3):
-             if int(bondPointers[ii])<0 or \
-                int(bondPointers[ii+1])<0:
-                 raise Exception("Found negative bonded atom pointers %s"
-                                 % ((bondPointers[ii],
-                                     bondPointers[ii+1]),))
-             iType=int(bondPointers[ii+2])-1
-             returnList.append((int(bondPointers[ii])//3,
-                                int(bondPointers[ii+1])//3,
-                                float(forceConstant[iType])*forceConstConversionFactor,
-                                float(bondEquil[iType])*lengthConversionFactor))
-        return returnList
+        bondPointers = _pointerTable(self._raw_data[flag], 3)
+        for row in _negativePointerRows(bondPointers, 2):
+            raise Exception("Found negative bonded atom pointers %s"
+                            % (tuple(row[:2]),))
+        if np is not None:
+            iType = bondPointers[:,2]-1
+            columns = (bondPointers[:,0]//3,
+                       bondPointers[:,1]//3,
+                       np.asarray(forceConstant, dtype=np.float64)[iType]*forceConstConversionFactor,
+                       np.asarray(bondEquil, dtype=np.float64)[iType]*lengthConversionFactor)
+        else:
+            columns = _columns([(row[0]//3,
+                                 row[1]//3,
+                                 float(forceConstant[row[2]-1])*forceConstConversionFactor,
+                                 float(bondEquil[row[2]-1])*lengthConversionFactor)
+                                for row in bondPointers], 4)
+        self._bondColumns[flag] = columns
+        return columns
 
     def getBondsWithH(self):
         """Return list of bonded atom pairs, K, and Rmin for each bond with a hydrogen"""
@@ -386,8 +497,8 @@ class PrmtopLoader(object):
             return self._bondListWithH
         except AttributeError:
             pass
-        bondPointers=self._raw_data["BONDS_INC_HYDROGEN"]
-        self._bondListWithH = self._getBonds(bondPointers)
+        columns = self._getBondColumns("BONDS_INC_HYDROGEN")
+        self._bondListWithH = list(zip(*[_toList(c) for c in columns]))
         return self._bondListWithH
 
 
@@ -397,159 +508,214 @@ class PrmtopLoader(object):
             return self._bondListNoH
         except AttributeError:
             pass
-        bondPointers=self._raw_data["BONDS_WITHOUT_HYDROGEN"]
-        self._bondListNoH = self._getBonds(bondPointers)
+        columns = self._getBondColumns("BONDS_WITHOUT_HYDROGEN")
+        self._bondListNoH = list(zip(*[_toList(c) for c in columns]))
         return self._bondListNoH
 
-    def getAngles(self):
-        """Return list of atom triplets, K, and ThetaMin for each bond angle"""
+    def _getAngleColumns(self):
+        """
+        Return the angles as five sequences: the three atom indices, K, and
+        ThetaMin
+        """
         try:
-            return self._angleList
+            return self._angleColumns
         except AttributeError:
             pass
         forceConstant=self._raw_data["ANGLE_FORCE_CONSTANT"]
         angleEquil=self._raw_data["ANGLE_EQUIL_VALUE"]
-        anglePointers = self._raw_data["ANGLES_INC_HYDROGEN"] \
-                       +self._raw_data["ANGLES_WITHOUT_HYDROGEN"]
-        self._angleList=[]
+        anglePointers = _pointerTable(_concatenate(self._raw_data["ANGLES_INC_HYDROGEN"],
+                                                   self._raw_data["ANGLES_WITHOUT_HYDROGEN"]), 4)
+        for row in _negativePointerRows(anglePointers, 3):
+            raise Exception("Found negative angle atom pointers %s"
+                            % (tuple(row[:3]),))
         forceConstConversionFactor = (units.kilocalorie_per_mole/(units.radian*units.radian)).conversion_factor_to(units.kilojoule_per_mole/(units.radian*units.radian))
-        for ii in range(0,len(anglePointers),4):
-             if int(anglePointers[ii])<0 or \
-                int(anglePointers[ii+1])<0 or \
-                int(anglePointers[ii+2])<0:
-                 raise Exception("Found negative angle atom pointers %s"
-                                 % ((anglePointers[ii],
-                                     anglePointers[ii+1],
-                                     anglePointers[ii+2]),))
-             iType=int(anglePointers[ii+3])-1
-             self._angleList.append((int(anglePointers[ii])//3,
-                                int(anglePointers[ii+1])//3,
-                                int(anglePointers[ii+2])//3,
-                                float(forceConstant[iType])*forceConstConversionFactor,
-                                float(angleEquil[iType])))
+        if np is not None:
+            iType = anglePointers[:,3]-1
+            self._angleColumns = (anglePointers[:,0]//3,
+                                  anglePointers[:,1]//3,
+                                  anglePointers[:,2]//3,
+                                  np.asarray(forceConstant, dtype=np.float64)[iType]*forceConstConversionFactor,
+                                  np.asarray(angleEquil, dtype=np.float64)[iType])
+        else:
+            self._angleColumns = _columns([(row[0]//3,
+                                            row[1]//3,
+                                            row[2]//3,
+                                            float(forceConstant[row[3]-1])*forceConstConversionFactor,
+                                            float(angleEquil[row[3]-1]))
+                                           for row in anglePointers], 5)
+        return self._angleColumns
+
+    def getAngles(self):
+        """Return list of atom triplets, K, and ThetaMin for each bond angle"""
+        try:
+            return self._angleList
+        except AttributeError:
+            pass
+        self._angleList = list(zip(*[_toList(c) for c in self._getAngleColumns()]))
         return self._angleList
 
-    def getDihedrals(self):
-        """Return list of atom quads, K, phase and periodicity for each dihedral angle"""
+    def _getDihedralPointers(self):
+        """Return the pointers of all dihedrals, with and without hydrogen, as an (n, 5) table"""
+        return _pointerTable(_concatenate(self._raw_data["DIHEDRALS_INC_HYDROGEN"],
+                                          self._raw_data["DIHEDRALS_WITHOUT_HYDROGEN"]), 5)
+
+    def _getDihedralColumns(self):
+        """
+        Return the dihedrals as seven sequences: the four atom indices, K,
+        phase, and periodicity
+        """
         try:
-            return self._dihedralList
+            return self._dihedralColumns
         except AttributeError:
             pass
         forceConstant=self._raw_data["DIHEDRAL_FORCE_CONSTANT"]
         phase=self._raw_data["DIHEDRAL_PHASE"]
         periodicity=self._raw_data["DIHEDRAL_PERIODICITY"]
-        dihedralPointers = self._raw_data["DIHEDRALS_INC_HYDROGEN"] \
-                          +self._raw_data["DIHEDRALS_WITHOUT_HYDROGEN"]
-        self._dihedralList=[]
+        dihedralPointers = self._getDihedralPointers()
+        for row in _negativePointerRows(dihedralPointers, 2):
+            raise Exception("Found negative dihedral atom pointers %s"
+                            % (tuple(row[:4]),))
         forceConstConversionFactor = (units.kilocalorie_per_mole).conversion_factor_to(units.kilojoule_per_mole)
-        for ii in range(0,len(dihedralPointers),5):
-             if int(dihedralPointers[ii])<0 or int(dihedralPointers[ii+1])<0:
-                 raise Exception("Found negative dihedral atom pointers %s"
-                                 % ((dihedralPointers[ii],
-                                    dihedralPointers[ii+1],
-                                    dihedralPointers[ii+2],
-                                    dihedralPointers[ii+3]),))
-             iType=int(dihedralPointers[ii+4])-1
-             self._dihedralList.append((int(dihedralPointers[ii])//3,
-                                int(dihedralPointers[ii+1])//3,
-                                abs(int(dihedralPointers[ii+2]))//3,
-                                abs(int(dihedralPointers[ii+3]))//3,
-                                float(forceConstant[iType])*forceConstConversionFactor,
-                                float(phase[iType]),
-                                int(0.5+float(periodicity[iType]))))
+        if np is not None:
+            iType = dihedralPointers[:,4]-1
+            self._dihedralColumns = (dihedralPointers[:,0]//3,
+                                     dihedralPointers[:,1]//3,
+                                     np.abs(dihedralPointers[:,2])//3,
+                                     np.abs(dihedralPointers[:,3])//3,
+                                     np.asarray(forceConstant, dtype=np.float64)[iType]*forceConstConversionFactor,
+                                     np.asarray(phase, dtype=np.float64)[iType],
+                                     (0.5+np.asarray(periodicity, dtype=np.float64)[iType]).astype(np.int64))
+        else:
+            self._dihedralColumns = _columns([(row[0]//3,
+                                               row[1]//3,
+                                               abs(row[2])//3,
+                                               abs(row[3])//3,
+                                               float(forceConstant[row[4]-1])*forceConstConversionFactor,
+                                               float(phase[row[4]-1]),
+                                               int(0.5+float(periodicity[row[4]-1])))
+                                              for row in dihedralPointers], 7)
+        return self._dihedralColumns
+
+    def getDihedrals(self):
+        """Return list of atom quads, K, phase and periodicity for each dihedral angle"""
+        try:
+            return self._dihedralList
+        except AttributeError:
+            pass
+        self._dihedralList = list(zip(*[_toList(c) for c in self._getDihedralColumns()]))
         return self._dihedralList
 
-    def get14Interactions(self):
-        """Return list of atom pairs, chargeProduct, rMin and epsilon for each 1-4 interaction"""
-        dihedralPointers = self._raw_data["DIHEDRALS_INC_HYDROGEN"] \
-                          +self._raw_data["DIHEDRALS_WITHOUT_HYDROGEN"]
-        returnList=[]
-        charges=self.getCharges()
+    def _get14Columns(self):
+        """
+        Return the 1-4 interactions as seven sequences: the two atom indices,
+        chargeProduct, rMin, epsilon, and the electrostatic and Lennard-Jones
+        scaling factors
+        """
+        dihedralPointers = self._getDihedralPointers()
+        charges = self.getCharges()
+        numDihedralTypes = len(self._raw_data["DIHEDRAL_FORCE_CONSTANT"])
+        scee = self._raw_data.get("SCEE_SCALE_FACTOR", [1.2]*numDihedralTypes)
+        scnb = self._raw_data.get("SCNB_SCALE_FACTOR", [2.0]*numDihedralTypes)
         try:
-            nonbondTerms = self.getNonbondTerms()
+            rVdw, epsilon = self._getNonbondColumns()
+            nbfix = False
         except NbfixPresent:
-            # We need to do the unit conversions here, since getNonbondTerms
-            # never finished and it has unit conversions in there
+            # The pair parameters come straight from the A and B coefficients,
+            # with the unit conversions getNonbondTerms would have applied
+            nbfix = True
             length_conv = units.angstrom.conversion_factor_to(units.nanometers)
             ene_conv = units.kilocalories_per_mole.conversion_factor_to(
                                 units.kilojoules_per_mole)
-            parm_acoef = [float(x) for x in self._raw_data['LENNARD_JONES_ACOEF']]
-            parm_bcoef = [float(x) for x in self._raw_data['LENNARD_JONES_BCOEF']]
-            nbidx = [int(x) for x in self._raw_data['NONBONDED_PARM_INDEX']]
+            parm_acoef = self._raw_data['LENNARD_JONES_ACOEF']
+            parm_bcoef = self._raw_data['LENNARD_JONES_BCOEF']
+            nbidx = self._raw_data['NONBONDED_PARM_INDEX']
             numTypes = self.getNumTypes()
-            atomTypeIndexes=self._getAtomTypeIndexes()
-            for ii in range(0, len(dihedralPointers), 5):
-                if int(dihedralPointers[ii+2])>0 and int(dihedralPointers[ii+3])>0:
-                    iAtom = int(dihedralPointers[ii])//3
-                    lAtom = int(dihedralPointers[ii+3])//3
-                    iidx = int(dihedralPointers[ii+4]) - 1
-                    chargeProd = charges[iAtom]*charges[lAtom]
+            atomTypeIndexes = self._raw_data['ATOM_TYPE_INDEX']
+        if np is not None:
+            dihedralPointers = dihedralPointers[(dihedralPointers[:,2] > 0) & (dihedralPointers[:,3] > 0)]
+            iAtom = dihedralPointers[:,0]//3
+            lAtom = dihedralPointers[:,3]//3
+            iidx = dihedralPointers[:,4]-1
+            charges = np.asarray(charges)
+            if nbfix:
+                atomTypeIndexes = np.asarray(atomTypeIndexes)
+                idx = np.asarray(nbidx)[numTypes*(atomTypeIndexes[iAtom]-1)+atomTypeIndexes[lAtom]-1]-1
+                keep = (idx >= 0)
+                iAtom, lAtom, iidx, idx = iAtom[keep], lAtom[keep], iidx[keep], idx[keep]
+                a = np.asarray(parm_acoef, dtype=np.float64)[idx]
+                b = np.asarray(parm_bcoef, dtype=np.float64)[idx]
+                zero = (a == 0) | (b == 0)
+                a = np.where(zero, 1.0, a)
+                b = np.where(zero, 1.0, b)
+                pairEpsilon = np.where(zero, 0.0, b*b/(4*a)*ene_conv)
+                pairRMin = np.where(zero, 1.0, (2*a/b)**(1/6.0)*length_conv)
+            else:
+                pairRMin = rVdw[iAtom]+rVdw[lAtom]
+                pairEpsilon = np.sqrt(epsilon[iAtom]*epsilon[lAtom])
+            return (iAtom, lAtom, charges[iAtom]*charges[lAtom], pairRMin, pairEpsilon,
+                    np.asarray(scee, dtype=np.float64)[iidx], np.asarray(scnb, dtype=np.float64)[iidx])
+        returnList = []
+        for row in dihedralPointers:
+            if row[2] > 0 and row[3] > 0:
+                iAtom = row[0]//3
+                lAtom = row[3]//3
+                iidx = row[4]-1
+                chargeProd = charges[iAtom]*charges[lAtom]
+                if nbfix:
                     typ1 = atomTypeIndexes[iAtom] - 1
                     typ2 = atomTypeIndexes[lAtom] - 1
-                    idx = nbidx[numTypes*typ1+typ2] - 1
+                    idx = int(nbidx[numTypes*typ1+typ2]) - 1
                     if idx < 0: continue
-                    a = parm_acoef[idx]
-                    b = parm_bcoef[idx]
+                    a = float(parm_acoef[idx])
+                    b = float(parm_bcoef[idx])
                     try:
-                        epsilon = b * b / (4 * a) * ene_conv
-                        rMin = (2 * a / b) ** (1/6.0) * length_conv
+                        pairEpsilon = b * b / (4 * a) * ene_conv
+                        pairRMin = (2 * a / b) ** (1/6.0) * length_conv
                     except ZeroDivisionError:
-                        rMin = 1
-                        epsilon = 0
-                    try:
-                        iScee = float(self._raw_data['SCEE_SCALE_FACTOR'][iidx])
-                    except KeyError:
-                        iScee = 1.2
-                    try:
-                        iScnb = float(self._raw_data['SCNB_SCALE_FACTOR'][iidx])
-                    except KeyError:
-                        iScnb = 2.0
-                    returnList.append((iAtom, lAtom, chargeProd, rMin, epsilon, iScee, iScnb))
-        else:
-            # This block gets hit if NbfixPresent is _not_ caught
-            for ii in range(0,len(dihedralPointers),5):
-                if int(dihedralPointers[ii+2])>0 and int(dihedralPointers[ii+3])>0:
-                    iAtom = int(dihedralPointers[ii])//3
-                    lAtom = int(dihedralPointers[ii+3])//3
-                    iidx = int(dihedralPointers[ii+4]) - 1
-                    chargeProd = charges[iAtom]*charges[lAtom]
-                    (rVdwI, epsilonI) = nonbondTerms[iAtom]
-                    (rVdwL, epsilonL) = nonbondTerms[lAtom]
-                    rMin = (rVdwI+rVdwL)
-                    epsilon = sqrt(epsilonI*epsilonL)
-                    try:
-                        iScee = float(self._raw_data["SCEE_SCALE_FACTOR"][iidx])
-                    except KeyError:
-                        iScee = 1.2
-                    try:
-                        iScnb = float(self._raw_data["SCNB_SCALE_FACTOR"][iidx])
-                    except KeyError:
-                        iScnb = 2.0
-    
-                    returnList.append((iAtom, lAtom, chargeProd, rMin, epsilon, iScee, iScnb))
-        return returnList
+                        pairRMin = 1
+                        pairEpsilon = 0
+                else:
+                    pairRMin = rVdw[iAtom]+rVdw[lAtom]
+                    pairEpsilon = sqrt(epsilon[iAtom]*epsilon[lAtom])
+                returnList.append((iAtom, lAtom, chargeProd, pairRMin, pairEpsilon,
+                                   float(scee[iidx]), float(scnb[iidx])))
+        return _columns(returnList, 7)
 
-    def getExcludedAtoms(self):
-        """Return list of lists, giving all pairs of atoms that should have no non-bond interactions"""
-        try:
-            return self._excludedAtoms
-        except AttributeError:
-            pass
-        self._excludedAtoms=[]
+    def get14Interactions(self):
+        """Return list of atom pairs, chargeProduct, rMin and epsilon for each 1-4 interaction"""
+        return list(zip(*[_toList(c) for c in self._get14Columns()]))
+
+    def _getExclusionColumns(self):
+        """Return the excluded atom pairs as two sequences of atom indices"""
         numExcludedAtomsList=self._raw_data["NUMBER_EXCLUDED_ATOMS"]
         excludedAtomsList=self._raw_data["EXCLUDED_ATOMS_LIST"]
+        if np is not None:
+            counts = np.asarray(numExcludedAtomsList, dtype=np.int64)[:self.getNumAtoms()]
+            jAtom = np.asarray(excludedAtomsList, dtype=np.int64)[:counts.sum()]
+            iAtom = np.repeat(np.arange(len(counts)), counts)
+            keep = (jAtom > 0)
+            return (iAtom[keep], jAtom[keep]-1)
+        pairs = []
         total=0
         for iAtom in range(self.getNumAtoms()):
             index0=total
-            n=int(numExcludedAtomsList[iAtom])
-            total+=n
-            index1=total
-            atomList=[]
-            for jAtom in excludedAtomsList[index0:index1]:
+            total+=int(numExcludedAtomsList[iAtom])
+            for jAtom in excludedAtomsList[index0:total]:
                 j=int(jAtom)
                 if j>0:
-                    atomList.append(j-1)
-            self._excludedAtoms.append(atomList)
+                    pairs.append((iAtom, j-1))
+        return _columns(pairs, 2)
+
+    def getExcludedAtoms(self):
+        """Return list of lists, giving all pairs of atoms that should have no non-bond interactions"""
+        try:
+            return self._excludedAtoms
+        except AttributeError:
+            pass
+        self._excludedAtoms=[[] for iAtom in range(self.getNumAtoms())]
+        iAtoms, jAtoms = self._getExclusionColumns()
+        for iAtom, jAtom in zip(_toList(iAtoms), _toList(jAtoms)):
+            self._excludedAtoms[iAtom].append(jAtom)
         return self._excludedAtoms
 
     def getBoxBetaAndDimensions(self):
@@ -666,15 +832,18 @@ def readAmberSystem(topology, prmtop_filename=None, prmtop_loader=None, shake=No
         system.addParticle(mass)
 
     # Add constraints.
-    isWater = [prmtop.getResidueLabel(i) in ('WAT', 'HOH', 'TP4', 'TP5', 'T4E') for i in range(prmtop.getNumAtoms())]
+    waterResidues = [label in ('WAT', 'HOH', 'TP4', 'TP5', 'T4E') for label in prmtop._raw_data['RESIDUE_LABEL']]
+    isWater = [waterResidues[res] for res in prmtop._getResidueIndexes()]
+    bondsWithH = [_toList(c) for c in prmtop._getBondColumns('BONDS_INC_HYDROGEN')]
+    bondsNoH = [_toList(c) for c in prmtop._getBondColumns('BONDS_WITHOUT_HYDROGEN')]
     if shake in ('h-bonds', 'all-bonds', 'h-angles'):
-        for (iAtom, jAtom, k, rMin) in prmtop.getBondsWithH():
+        for (iAtom, jAtom, k, rMin) in zip(*bondsWithH):
             system.addConstraint(iAtom, jAtom, rMin)
     if shake in ('all-bonds', 'h-angles'):
-        for (iAtom, jAtom, k, rMin) in prmtop.getBondsNoH():
+        for (iAtom, jAtom, k, rMin) in zip(*bondsNoH):
             system.addConstraint(iAtom, jAtom, rMin)
     if rigidWater and shake == None:
-        for (iAtom, jAtom, k, rMin) in prmtop.getBondsWithH():
+        for (iAtom, jAtom, k, rMin) in zip(*bondsWithH):
             if isWater[iAtom] and isWater[jAtom]:
                 system.addConstraint(iAtom, jAtom, rMin)
 
@@ -682,11 +851,11 @@ def readAmberSystem(topology, prmtop_filename=None, prmtop_loader=None, shake=No
     if verbose: print("Adding bonds...")
     force = mm.HarmonicBondForce()
     if flexibleConstraints or (shake not in ('h-bonds', 'all-bonds', 'h-angles')):
-        for (iAtom, jAtom, k, rMin) in prmtop.getBondsWithH():
+        for (iAtom, jAtom, k, rMin) in zip(*bondsWithH):
             if flexibleConstraints or not (rigidWater and isWater[iAtom] and isWater[jAtom]):
                 force.addBond(iAtom, jAtom, rMin, 2*k)
     if flexibleConstraints or (shake not in ('all-bonds', 'h-angles')):
-        for (iAtom, jAtom, k, rMin) in prmtop.getBondsNoH():
+        for (iAtom, jAtom, k, rMin) in zip(*bondsNoH):
             force.addBond(iAtom, jAtom, rMin, 2*k)
     system.addForce(force)
 
@@ -695,14 +864,14 @@ def readAmberSystem(topology, prmtop_filename=None, prmtop_loader=None, shake=No
     force = mm.HarmonicAngleForce()
     if shake == 'h-angles':
         numConstrainedBonds = system.getNumConstraints()
-        atomConstraints = [[]]*system.getNumParticles()
+        atomConstraints = [[] for i in range(system.getNumParticles())]
         for i in range(numConstrainedBonds):
             c = system.getConstraintParameters(i)
             distance = c[2].value_in_unit(units.nanometer)
             atomConstraints[c[0]].append((c[1], distance))
             atomConstraints[c[1]].append((c[0], distance))
     topatoms = list(topology.atoms())
-    for (iAtom, jAtom, kAtom, k, aMin) in prmtop.getAngles():
+    for (iAtom, jAtom, kAtom, k, aMin) in zip(*[_toList(c) for c in prmtop._getAngleColumns()]):
         if shake == 'h-angles':
             atomI = topatoms[iAtom]
             atomJ = topatoms[jAtom]
@@ -731,7 +900,7 @@ def readAmberSystem(topology, prmtop_filename=None, prmtop_loader=None, shake=No
     # Add torsions.
     if verbose: print("Adding torsions...")
     force = mm.PeriodicTorsionForce()
-    for (iAtom, jAtom, kAtom, lAtom, forceConstant, phase, periodicity) in prmtop.getDihedrals():
+    for (iAtom, jAtom, kAtom, lAtom, forceConstant, phase, periodicity) in zip(*[_toList(c) for c in prmtop._getDihedralColumns()]):
         force.addTorsion(iAtom, jAtom, kAtom, lAtom, periodicity, phase, forceConstant)
     system.addForce(force)
 
@@ -786,7 +955,7 @@ def readAmberSystem(topology, prmtop_filename=None, prmtop_loader=None, shake=No
     sigmaScale = 2**(-1./6.) * 2.0
     nbfix = False
     try:
-        nonbondTerms = prmtop.getNonbondTerms()
+        rVdwColumn, epsilonColumn = prmtop._getNonbondColumns()
     except NbfixPresent:
         nbfix = True
         for charge in prmtop.getCharges():
@@ -834,7 +1003,7 @@ def readAmberSystem(topology, prmtop_filename=None, prmtop_loader=None, shake=No
         for atom in prmtop._getAtomTypeIndexes():
             cforce.addParticle((atom-1,))
     else:
-        for (charge, (rVdw, epsilon)) in zip(prmtop.getCharges(), nonbondTerms):
+        for (charge, rVdw, epsilon) in zip(prmtop.getCharges(), _toList(rVdwColumn), _toList(epsilonColumn)):
             sigma = rVdw * sigmaScale
             force.addParticle(charge, sigma, epsilon)
         if has_1264:
@@ -861,7 +1030,7 @@ def readAmberSystem(topology, prmtop_filename=None, prmtop_loader=None, shake=No
     excludedAtomPairs = set()
     sigmaScale = 2**(-1./6.)
     _scee, _scnb = scee, scnb
-    for (iAtom, lAtom, chargeProd, rMin, epsilon, iScee, iScnb) in prmtop.get14Interactions():
+    for (iAtom, lAtom, chargeProd, rMin, epsilon, iScee, iScnb) in zip(*[_toList(c) for c in prmtop._get14Columns()]):
         if scee is None: _scee = iScee
         if scnb is None: _scnb = iScnb
         chargeProd /= _scee
@@ -871,12 +1040,10 @@ def readAmberSystem(topology, prmtop_filename=None, prmtop_loader=None, shake=No
         excludedAtomPairs.add(min((iAtom, lAtom), (lAtom, iAtom)))
 
     # Add Excluded Atoms
-    excludedAtoms=prmtop.getExcludedAtoms()
     excludeParams = (0.0, 0.1, 0.0)
-    for iAtom in range(prmtop.getNumAtoms()):
-        for jAtom in excludedAtoms[iAtom]:
-            if min((iAtom, jAtom), (jAtom, iAtom)) in excludedAtomPairs: continue
-            force.addException(iAtom, jAtom, excludeParams[0], excludeParams[1], excludeParams[2])
+    for (iAtom, jAtom) in zip(*[_toList(c) for c in prmtop._getExclusionColumns()]):
+        if min((iAtom, jAtom), (jAtom, iAtom)) in excludedAtomPairs: continue
+        force.addException(iAtom, jAtom, excludeParams[0], excludeParams[1], excludeParams[2])
 
     # Copy the exceptions as exclusions to the CustomNonbondedForce if we have
     # NBFIX terms
@@ -928,7 +1095,7 @@ def readAmberSystem(topology, prmtop_filename=None, prmtop_loader=None, shake=No
         distOH = [None]*numRes
         distHH = [None]*numRes
         distOE = [None]*numRes
-        for (atom1, atom2, k, dist) in prmtop.getBondsWithH()+prmtop.getBondsNoH():
+        for (atom1, atom2, k, dist) in chain(zip(*bondsWithH), zip(*bondsNoH)):
             res = prmtop.getResidueNumber(atom1)
             if res in epRes:
                 name1 = prmtop.getAtomName(atom1)
@@ -1239,7 +1406,7 @@ class AmberNetcdfRestart(object):
     """
     Amber restart/inpcrd file in the NetCDF format (full double-precision
     coordinates, velocities, and unit cell parameters). Reads NetCDF restarts
-    written by LEaP and pmemd/sander. Requires scipy to parse NetCDF files.
+    written by LEaP and pmemd/sander. Requires numpy to parse NetCDF files.
 
     Parameters
     ----------
@@ -1271,37 +1438,26 @@ class AmberNetcdfRestart(object):
     ------
         `IOError' if the file does not exist
         `TypeError' if the file is not a NetCDF v3 file
-        `ImportError' if scipy is not available
+        `ImportError' if numpy is not available
     Example
     -------
     >>> f = AmberNetcdfRestart('alanine-dipeptide.ncrst')
     >>> coordinates = f.coordinates
     """
     def __init__(self, filename, asNumpy=False):
-        try:
-            from scipy.io.netcdf import NetCDFFile
-        except ImportError:
-            raise ImportError('scipy is necessary to parse NetCDF restarts')
-        
         self.filename = filename
         self.velocities = self.boxVectors = self.time = None
 
-        # Extract the information from the NetCDF file. We need to make copies
-        # here because the NetCDF variables are mem-mapped, but is only mapped
-        # to valid memory while the file handle is open. Since the context
-        # manager GCs the ncfile handle, the memory for the original variables
-        # is no longer valid. So copy those arrays while the handle is still
-        # open. This is unnecessary in scipy v.0.12 and lower because NetCDFFile
-        # accidentally leaks the file handle, but that was 'fixed' in 0.13. This
-        # fix taken from MDTraj
+        # Extract the information from the NetCDF file. Indexing a variable
+        # copies the data out of the memory map, so the arrays stay valid after
+        # the file is closed.
         ncfile = NetCDFFile(filename, 'r')
         try:
             self.natom = ncfile.dimensions['atom']
-            self.coordinates = np.array(ncfile.variables['coordinates'][:])
+            self.coordinates = ncfile.variables['coordinates'][:]
             if 'velocities' in ncfile.variables:
                 vels = ncfile.variables['velocities']
-                self.velocities = np.array(vels[:]) * vels.scale_factor
-                del vels # Get rid of reference to variable to avoid warnings
+                self.velocities = vels[:] * vels.attributes.get('scale_factor', 1.0)
             if ('cell_lengths' in ncfile.variables and
                 'cell_angles' in ncfile.variables):
                 self.boxVectors = np.zeros((3,3), np.float32)
@@ -1311,7 +1467,6 @@ class AmberNetcdfRestart(object):
                         units.degrees)
                 self.boxVectors = computePeriodicBoxVectors(leng[0], leng[1],
                         leng[2], angl[0], angl[1], angl[2])
-                del leng, angl # Avoid warnings
             if 'time' in ncfile.variables:
                 self.time = ncfile.variables['time'].getValue()
         finally:
@@ -0,0 +1,202 @@
+"""
+celllist.py: A spatial index for quickly finding points that are close to each other.
+
+This is part of the OpenMM molecular simulation toolkit originating from
+Simbios, the NIH National Center for Physics-Based Simulation of
+Biological Structures at Stanford, funded under the NIH Roadmap for
+Medical Research, grant U54 GM072970. See https://simtk.org.
+
+Portions copyright (c) 2016 Stanford University and the Authors.
+Authors: Peter Eastman
+Contributors:
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+from __future__ import division
+from __future__ import absolute_import
+__author__ = "Peter Eastman"
+__version__ = "1.0"
+
+from simtk.unit import nanometers, is_quantity
+from math import floor, sqrt
+
+class CellList(object):
+    """CellList sorts a set of points into a grid of cells, so that all points within a cutoff distance of
+    any position can be found without looping over every point.
+
+    Building the index takes time proportional to the number of points, and each query only examines the
+    points in the 27 cells surrounding the query position.  Positions are stored in nanometers.  If periodic
+    box vectors are specified, distances are computed using periodic boundary conditions.
+    """
+
+    def __init__(self, positions, cutoff, periodicBoxVectors=None):
+        """Create a new CellList.
+
+        Parameters
+        ----------
+        positions : list or (N,3) array
+            the positions of the points to index.  If these do not have units, they are assumed to be in nanometers.
+        cutoff : distance
+            the maximum distance at which points will be considered to be neighbors
+        periodicBoxVectors : tuple of Vec3=None
+            the periodic box vectors.  If this is None, periodic boundary conditions are not applied.  The box may
+            be triclinic, but the vectors must be in the reduced form OpenMM requires.
+        """
+        if is_quantity(positions):
+            positions = positions.value_in_unit(nanometers)
+        if is_quantity(cutoff):
+            cutoff = cutoff.value_in_unit(nanometers)
+        if cutoff <= 0:
+            raise ValueError('The cutoff distance must be positive')
+        if hasattr(positions, 'tolist'):
+            positions = positions.tolist()
+        self.positions = [(float(p[0]), float(p[1]), float(p[2])) for p in positions]
+        self.cutoff = cutoff
+        if periodicBoxVectors is None:
+            self.vectors = None
+            self.numCells = None
+            self.cellSize = (cutoff, cutoff, cutoff)
+        else:
+            if is_quantity(periodicBoxVectors):
+                periodicBoxVectors = periodicBoxVectors.value_in_unit(nanometers)
+            self.vectors = tuple(tuple(float(x) for x in v) for v in periodicBoxVectors)
+            a, b, c = self.vectors
+            box = (a[0], b[1], c[2])
+            self.invBox = tuple(1.0/x for x in box)
+
+            # Cells are assigned in fractional coordinates, so each cell is a small copy of the (possibly triclinic)
+            # periodic box.  The number of cells along each axis is chosen so the distance between opposite faces
+            # of a cell is at least the cutoff.
+
+            volume = box[0]*box[1]*box[2]
+            faceAreas = (_norm(_cross(b, c)), _norm(_cross(c, a)), _norm(_cross(a, b)))
+            self.numCells = tuple(max(1, int(floor(volume/(faceAreas[i]*cutoff)))) for i in range(3))
+            self.cellSize = None
+        self.cells = {}
+        for i, pos in enumerate(self.positions):
+            cell = self._cellForPosition(pos)
+            if cell in self.cells:
+                self.cells[cell].append(i)
+            else:
+                self.cells[cell] = [i]
+
+    def _cellForPosition(self, pos):
+        """Get the index of the cell containing a position."""
+        if self.numCells is None:
+            return (int(floor(pos[0]/self.cellSize[0])), int(floor(pos[1]/self.cellSize[1])), int(floor(pos[2]/self.cellSize[2])))
+
+        # Convert to fractional coordinates.  This assumes the box vectors are in reduced form, as required by OpenMM.
+
+        v = self.vectors
+        fz = pos[2]*self.invBox[2]
+        fy = (pos[1]-fz*v[2][1])*self.invBox[1]
+        fx = (pos[0]-fz*v[2][0]-fy*v[1][0])*self.invBox[0]
+        n = self.numCells
+        return (int(floor(fx*n[0]))%n[0], int(floor(fy*n[1]))%n[1], int(floor(fz*n[2]))%n[2])
+
+    def _neighborCells(self, cell):
+        """Get the list of cells adjacent to (and including) a cell."""
+        offsets = (-1, 0, 1)
+        cells = [(cell[0]+i, cell[1]+j, cell[2]+k) for i in offsets for j in offsets for k in offsets]
+        if self.numCells is not None:
+            # Wrap the cells into the box, removing duplicates in case the box is only one or two cells wide.
+
+            cells = set((c[0]%self.numCells[0], c[1]%self.numCells[1], c[2]%self.numCells[2]) for c in cells)
+        return cells
+
+    def delta(self, pos1, pos2):
+        """Compute the displacement vector pos2-pos1, taking periodic boundary conditions into account."""
+        dx = pos2[0]-pos1[0]
+        dy = pos2[1]-pos1[1]
+        dz = pos2[2]-pos1[2]
+        if self.vectors is not None:
+            v = self.vectors
+            scale = floor(dz*self.invBox[2]+0.5)
+            dx -= scale*v[2][0]
+            dy -= scale*v[2][1]
+            dz -= scale*v[2][2]
+            scale = floor(dy*self.invBox[1]+0.5)
+            dx -= scale*v[1][0]
+            dy -= scale*v[1][1]
+            scale = floor(dx*self.invBox[0]+0.5)
+            dx -= scale*v[0][0]
+        return (dx, dy, dz)
+
+    def neighbors(self, position, cutoff=None):
+        """Find all indexed points within a cutoff distance of a position.
+
+        Parameters
+        ----------
+        position : Vec3
+            the position to search around
+        cutoff : distance=None
+            the maximum distance to search.  This may not be larger than the cutoff the CellList was created
+            with.  If this is None, the CellList's cutoff is used.
+
+        Returns
+        -------
+        list
+            the indices of all points closer than the cutoff distance to the position, in increasing order
+        """
+        if is_quantity(position):
+            position = position.value_in_unit(nanometers)
+        if cutoff is None:
+            cutoff = self.cutoff
+        elif is_quantity(cutoff):
+            cutoff = cutoff.value_in_unit(nanometers)
+        if cutoff > self.cutoff:
+            raise ValueError('The cutoff distance cannot be larger than the one the CellList was created with')
+        cutoff2 = cutoff*cutoff
+        position = (float(position[0]), float(position[1]), float(position[2]))
+        result = []
+        for cell in self._neighborCells(self._cellForPosition(position)):
+            if cell in self.cells:
+                for i in self.cells[cell]:
+                    d = self.delta(position, self.positions[i])
+                    if d[0]*d[0]+d[1]*d[1]+d[2]*d[2] < cutoff2:
+                        result.append(i)
+        result.sort()
+        return result
+
+    def pairs(self, cutoff=None):
+        """Find all pairs of indexed points within a cutoff distance of each other.
+
+        Parameters
+        ----------
+        cutoff : distance=None
+            the maximum distance between points.  This may not be larger than the cutoff the CellList was created
+            with.  If this is None, the CellList's cutoff is used.
+
+        Returns
+        -------
+        list
+            a sorted list of tuples (i, j) with i < j, one for each pair of points closer than the cutoff distance
+        """
+        result = []
+        for i, pos in enumerate(self.positions):
+            for j in self.neighbors(pos, cutoff):
+                if j > i:
+                    result.append((i, j))
+        return result
+
+def _cross(u, v):
+    return (u[1]*v[2]-u[2]*v[1], u[2]*v[0]-u[0]*v[2], u[0]*v[1]-u[1]*v[0])
+
+def _norm(u):
+    return sqrt(u[0]*u[0]+u[1]*u[1]+u[2]*u[2])
@@ -0,0 +1,540 @@
+"""
+netcdf.py: Reads and writes NetCDF-3 files without external NetCDF libraries.
+
+This is part of the OpenMM molecular simulation toolkit originating from
+Simbios, the NIH National Center for Physics-Based Simulation of
+Biological Structures at Stanford, funded under the NIH Roadmap for
+Medical Research, grant U54 GM072970. See https://simtk.org.
+
+Portions copyright (c) 2016 Stanford University and the Authors.
+Authors: Peter Eastman
+Contributors:
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+from __future__ import absolute_import
+__author__ = "Peter Eastman"
+__version__ = "1.0"
+
+import mmap
+import os
+import struct
+from collections import OrderedDict
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NC_BYTE = 1
+NC_CHAR = 2
+NC_SHORT = 3
+NC_INT = 4
+NC_FLOAT = 5
+NC_DOUBLE = 6
+NC_DIMENSION = 10
+NC_VARIABLE = 11
+NC_ATTRIBUTE = 12
+STREAMING = -1
+
+_typecodes = {'b':NC_BYTE, 'c':NC_CHAR, 'h':NC_SHORT, 'i':NC_INT, 'f':NC_FLOAT, 'd':NC_DOUBLE}
+_dtypes = {NC_BYTE:'>i1', NC_CHAR:'S1', NC_SHORT:'>i2', NC_INT:'>i4', NC_FLOAT:'>f4', NC_DOUBLE:'>f8'}
+
+def _padding(size):
+    """Get the number of zero bytes needed to round a size up to a multiple of 4."""
+    return -size % 4
+
+def _decode(data):
+    """Convert the contents of a name or character attribute to a string."""
+    data = data.rstrip(b'\x00')
+    if not isinstance(data, str):
+        data = data.decode('utf-8')
+    return data
+
+class _HeaderReader(object):
+    """Reads the fields of a NetCDF header from a buffer."""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.position = 0
+
+    def read(self, format):
+        size = struct.calcsize(format)
+        values = struct.unpack(format, self.buffer[self.position:self.position+size])
+        self.position += size
+        return values[0] if len(values) == 1 else values
+
+    def readBytes(self, size):
+        data = self.buffer[self.position:self.position+size]
+        self.position += size+_padding(size)
+        return data
+
+    def readName(self):
+        return _decode(self.readBytes(self.read('>i')))
+
+    def readListHeader(self, tag):
+        (listTag, count) = self.read('>ii')
+        if listTag not in (0, tag) or (listTag == 0 and count != 0):
+            raise ValueError('Malformed NetCDF header')
+        return count
+
+    def readAttributes(self):
+        attributes = OrderedDict()
+        for i in range(self.readListHeader(NC_ATTRIBUTE)):
+            name = self.readName()
+            (nctype, count) = self.read('>ii')
+            dtype = numpy.dtype(_dtypes[nctype])
+            data = self.readBytes(count*dtype.itemsize)
+            if nctype == NC_CHAR:
+                attributes[name] = _decode(data)
+            else:
+                values = numpy.frombuffer(data, dtype).astype(dtype.newbyteorder('='))
+                attributes[name] = (values[0].item() if count == 1 else values)
+        return attributes
+
+
+class NetCDFFile(object):
+    """NetCDFFile reads and writes files in the NetCDF-3 format, both the classic format and the 64-bit offset format.
+
+    The interface follows the one used by scipy.io.netcdf.  A file contains named dimensions, global
+    attributes, and named variables.  The first dimension of a variable may be the record dimension (created
+    with a length of None), which grows without limit as records are written.  New records are appended to the
+    end of the file, so extending a file never requires rewriting existing data.  Files are read through a
+    read-only memory map: indexing a variable copies only the selected elements into memory.
+
+    Global attributes are stored in the attributes dict.  As in scipy.io.netcdf, they can also be read and set as
+    Python attributes of the file (nc.title = 'x').  Names that start with an underscore, and the names of the
+    file's own members, are ordinary Python attributes instead.
+
+    To create a file, open it with mode 'w', call createDimension() and createVariable(), set attributes, then
+    write data by assigning to the variables.  The header is written the first time data is accessed.  Files
+    opened with mode 'a' can have records appended to them, but their definitions cannot be changed.
+    """
+
+    def __init__(self, filename, mode='r', version=2):
+        """Open a NetCDF file.
+
+        Parameters
+        ----------
+        filename : string
+            The name of the file
+        mode : string='r'
+            'r' to read an existing file, 'w' to create a new file, or 'a' to
+            append records to an existing file
+        version : int=2
+            The format for new files: 1 for the classic format, or 2 for the
+            64-bit offset format
+        """
+        if numpy is None:
+            raise ImportError('numpy is required to read and write NetCDF files')
+        if mode not in ('r', 'w', 'a'):
+            raise ValueError("Illegal mode '%s': must be 'r', 'w', or 'a'" % mode)
+        if version not in (1, 2):
+            raise ValueError('Unsupported NetCDF version: %s' % version)
+        self._file = None
+        self._map = None
+        self.filename = filename
+        self.mode = mode
+        self.version = version
+        self.dimensions = OrderedDict()
+        self.variables = OrderedDict()
+        self.attributes = OrderedDict()
+        self._numRecords = 0
+        self._recordStart = 0
+        self._recordSize = 0
+        self._defineMode = (mode == 'w')
+        self._file = open(filename, {'r':'rb', 'w':'w+b', 'a':'r+b'}[mode])
+        if mode != 'w':
+            self._readHeader()
+
+    _members = frozenset(['filename', 'mode', 'version', 'dimensions', 'variables', 'attributes'])
+
+    def __getattr__(self, name):
+        attributes = self.__dict__.get('attributes', {})
+        if name in attributes:
+            return attributes[name]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_') or name in self._members or hasattr(type(self), name):
+            object.__setattr__(self, name, value)
+        else:
+            self._checkDefineMode()
+            self.attributes[name] = value
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
+
+    def createDimension(self, name, length):
+        """Create a new dimension.
+
+        Parameters
+        ----------
+        name : string
+            The name of the dimension
+        length : int
+            The length of the dimension, or None for the record dimension
+        """
+        self._checkDefineMode()
+        if length is None and None in self.dimensions.values():
+            raise ValueError('A NetCDF file can only have one record dimension')
+        self.dimensions[name] = length
+
+    def createVariable(self, name, type, dimensions):
+        """Create a new variable.
+
+        Parameters
+        ----------
+        name : string
+            The name of the variable
+        type : string
+            The type of the variable: 'b' (8 bit integer), 'c' (character),
+            'h' (16 bit integer), 'i' (32 bit integer), 'f' (32 bit float), or
+            'd' (64 bit float)
+        dimensions : tuple of strings
+            The names of the variable's dimensions.  Only the first one may be
+            the record dimension.
+
+        Returns
+        -------
+        NetCDFVariable
+            The newly created variable
+        """
+        self._checkDefineMode()
+        if type not in _typecodes:
+            raise ValueError("Unsupported variable type '%s'" % type)
+        dimensions = tuple(dimensions)
+        for i, dim in enumerate(dimensions):
+            if dim not in self.dimensions:
+                raise ValueError("Unknown dimension '%s'" % dim)
+            if i > 0 and self.dimensions[dim] is None:
+                raise ValueError('Only the first dimension of a variable may be the record dimension')
+        variable = NetCDFVariable(self, name, _typecodes[type], dimensions)
+        self.variables[name] = variable
+        return variable
+
+    def flush(self):
+        """Write any buffered data to disk."""
+        if getattr(self, '_file', None) is None or self.mode == 'r':
+            return
+        if self._defineMode:
+            self._endDefine()
+        self._file.flush()
+
+    sync = flush
+
+    def close(self):
+        """Close the file.  Any data that has not yet been written is flushed first."""
+        if getattr(self, '_file', None) is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._map = None
+            self._file.close()
+            self._file = None
+
+    def _checkDefineMode(self):
+        if not self._defineMode:
+            raise RuntimeError('The dimensions, variables, and attributes of an existing NetCDF file cannot be changed')
+
+    def _readHeader(self):
+        """Parse the header of an existing file."""
+        buffer = self._buffer()
+        if buffer is None or buffer[:3] != b'CDF':
+            raise TypeError('%s is not a NetCDF-3 file' % self.filename)
+        reader = _HeaderReader(buffer)
+        reader.position = 3
+        self.version = reader.read('>B')
+        if self.version not in (1, 2):
+            raise TypeError('Unsupported NetCDF version: %d' % self.version)
+        numRecords = reader.read('>i')
+        dimensionNames = []
+        for i in range(reader.readListHeader(NC_DIMENSION)):
+            name = reader.readName()
+            length = reader.read('>i')
+            self.dimensions[name] = (None if length == 0 else length)
+            dimensionNames.append(name)
+        self.attributes = reader.readAttributes()
+        beginFormat = ('>i' if self.version == 1 else '>q')
+        for i in range(reader.readListHeader(NC_VARIABLE)):
+            name = reader.readName()
+            numDims = reader.read('>i')
+            dimensions = tuple(dimensionNames[reader.read('>i')] for j in range(numDims))
+            attributes = reader.readAttributes()
+            (nctype, vsize) = reader.read('>ii')
+            variable = NetCDFVariable(self, name, nctype, dimensions, attributes)
+            variable._begin = reader.read(beginFormat)
+            self.variables[name] = variable
+        self._computeRecordLayout()
+        if numRecords == STREAMING:
+            numRecords = (len(buffer)-self._recordStart)//self._recordSize if self._recordSize > 0 else 0
+        self._numRecords = numRecords
+
+    def _computeRecordLayout(self):
+        """Compute the size of one record from the record variables."""
+        records = [v for v in self.variables.values() if v.isrec]
+        if len(records) == 1:
+            # A single record variable is not padded.
+            self._recordSize = records[0]._size()
+        else:
+            self._recordSize = sum(v._paddedSize() for v in records)
+        if len(records) > 0:
+            self._recordStart = min(v._begin for v in records)
+
+    def _headerBytes(self):
+        """Build the header for a new file."""
+        def name(value):
+            if not isinstance(value, bytes):
+                value = value.encode('utf-8')
+            return struct.pack('>i', len(value))+value+b'\x00'*_padding(len(value))
+        def attributes(values):
+            if len(values) == 0:
+                return struct.pack('>ii', 0, 0)
+            data = [struct.pack('>ii', NC_ATTRIBUTE, len(values))]
+            for key, value in values.items():
+                (nctype, count, content) = _encodeAttribute(value)
+                data += [name(key), struct.pack('>ii', nctype, count), content, b'\x00'*_padding(len(content))]
+            return b''.join(data)
+        dimensionNames = list(self.dimensions.keys())
+        data = [struct.pack('>3sBi', b'CDF', self.version, self._numRecords)]
+        if len(self.dimensions) == 0:
+            data.append(struct.pack('>ii', 0, 0))
+        else:
+            data.append(struct.pack('>ii', NC_DIMENSION, len(self.dimensions)))
+            for key, length in self.dimensions.items():
+                data += [name(key), struct.pack('>i', length or 0)]
+        data.append(attributes(self.attributes))
+        if len(self.variables) == 0:
+            data.append(struct.pack('>ii', 0, 0))
+        else:
+            data.append(struct.pack('>ii', NC_VARIABLE, len(self.variables)))
+            beginFormat = ('>i' if self.version == 1 else '>q')
+            for key, variable in self.variables.items():
+                data += [name(key), struct.pack('>i', len(variable.dimensions))]
+                data += [struct.pack('>i', dimensionNames.index(dim)) for dim in variable.dimensions]
+                data.append(attributes(variable.attributes))
+                data.append(struct.pack('>ii', variable._nctype, min(variable._paddedSize(), 2**31-1)))
+                data.append(struct.pack(beginFormat, variable._begin))
+        return b''.join(data)
+
+    def _endDefine(self):
+        """Lay out the variables and write the header of a new file."""
+        self._defineMode = False
+        offset = len(self._headerBytes())
+        variables = list(self.variables.values())
+        for variable in variables:
+            if not variable.isrec:
+                variable._begin = offset
+                offset += variable._paddedSize()
+        self._recordStart = offset
+        for variable in variables:
+            if variable.isrec:
+                variable._begin = offset
+                offset += variable._paddedSize()
+        if self.version == 1 and offset >= 2**31:
+            raise ValueError('The variables are too large for the classic NetCDF format; use version 2')
+        self._computeRecordLayout()
+        self._write(0, self._headerBytes())
+        self._extend(self._recordStart)
+
+    def _write(self, offset, data):
+        self._map = None
+        self._file.seek(offset)
+        self._file.write(data)
+
+    def _extend(self, size):
+        """Make sure the file is at least a given size, filling any new space with zeros."""
+        self._file.seek(0, os.SEEK_END)
+        if self._file.tell() < size:
+            self._map = None
+            self._file.truncate(size)
+
+    def _setNumRecords(self, numRecords):
+        """Record that the file contains at least a given number of records."""
+        if numRecords > self._numRecords:
+            self._numRecords = numRecords
+            self._extend(self._recordStart+numRecords*self._recordSize)
+            self._write(4, struct.pack('>i', numRecords))
+
+    def _buffer(self):
+        """Get a read-only memory map of the whole file, or None if it is empty."""
+        if self._defineMode:
+            self._endDefine()
+        if self.mode != 'r':
+            self._file.flush()
+        size = os.fstat(self._file.fileno()).st_size
+        if self._map is None or len(self._map) != size:
+            self._map = (None if size == 0 else mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ))
+        return self._map
+
+
+def _encodeAttribute(value):
+    """Convert an attribute value to a NetCDF type, element count, and big endian data."""
+    if isinstance(value, bytes):
+        return (NC_CHAR, len(value), value)
+    if isinstance(value, type(u'')):
+        data = value.encode('utf-8')
+        return (NC_CHAR, len(data), data)
+    values = numpy.atleast_1d(numpy.asarray(value))
+    if values.dtype.kind == 'f':
+        nctype = (NC_FLOAT if values.dtype.itemsize == 4 else NC_DOUBLE)
+    elif values.dtype.kind in 'iub':
+        nctype = {1:NC_BYTE, 2:NC_SHORT}.get(values.dtype.itemsize, NC_INT)
+    else:
+        raise ValueError('Unsupported attribute value: %r' % (value,))
+    return (nctype, len(values), values.astype(_dtypes[nctype]).tobytes())
+
+
+class NetCDFVariable(object):
+    """A variable in a NetCDF file.
+
+    Index a variable to read its data; the result is a numpy array in native byte order.  Assigning to a
+    variable writes data.  A variable whose first dimension is the record dimension can be written one record
+    (v[i] = ...) or a contiguous range of records (v[i:j] = ...) at a time, and writing past the last record
+    appends to the file.  Other variables are written all at once (v[:] = ...).  Attributes are stored in the
+    attributes dict, and can also be read and set as Python attributes of the variable (v.units = 'x').
+    """
+
+    def __init__(self, ncfile, name, nctype, dimensions, attributes=None):
+        self._ncfile = ncfile
+        self.name = name
+        self._nctype = nctype
+        self.dimensions = dimensions
+        self.attributes = OrderedDict(attributes or ())
+        self.dtype = numpy.dtype(_dtypes[nctype])
+        self._begin = 0
+
+    _members = frozenset(['name', 'dimensions', 'attributes', 'dtype'])
+
+    def __getattr__(self, name):
+        attributes = self.__dict__.get('attributes', {})
+        if name in attributes:
+            return attributes[name]
+        raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        if name.startswith('_') or name in self._members or hasattr(type(self), name):
+            object.__setattr__(self, name, value)
+        else:
+            self._ncfile._checkDefineMode()
+            self.attributes[name] = value
+
+    @property
+    def isrec(self):
+        """Whether the first dimension of this variable is the record dimension"""
+        return len(self.dimensions) > 0 and self._ncfile.dimensions[self.dimensions[0]] is None
+
+    @property
+    def shape(self):
+        """The shape of this variable, including the current number of records"""
+        if self.isrec:
+            return (self._ncfile._numRecords,)+self._recordShape()
+        return self._recordShape()
+
+    def typecode(self):
+        """Get the type code of this variable ('b', 'c', 'h', 'i', 'f', or 'd')."""
+        for code, nctype in _typecodes.items():
+            if nctype == self._nctype:
+                return code
+
+    def _recordShape(self):
+        dimensions = (self.dimensions[1:] if self.isrec else self.dimensions)
+        return tuple(self._ncfile.dimensions[dim] for dim in dimensions)
+
+    def _size(self):
+        size = self.dtype.itemsize
+        for length in self._recordShape():
+            size *= length
+        return size
+
+    def _paddedSize(self):
+        size = self._size()
+        return size+_padding(size)
+
+    def _array(self):
+        """Get a read-only view of the whole variable in the memory map."""
+        shape = self.shape
+        if 0 in shape:
+            return numpy.empty(shape, self.dtype)
+        buffer = self._ncfile._buffer()
+        if self.isrec:
+            strides = (self._ncfile._recordSize,)+numpy.empty(shape[1:], self.dtype).strides
+            return numpy.ndarray(shape, self.dtype, buffer, self._begin, strides)
+        return numpy.ndarray(shape, self.dtype, buffer, self._begin)
+
+    def __getitem__(self, index):
+        return numpy.array(self._array()[index], dtype=self.dtype.newbyteorder('='))
+
+    def __setitem__(self, index, value):
+        ncfile = self._ncfile
+        if ncfile.mode == 'r':
+            raise IOError('The file was opened for reading only')
+        if ncfile._defineMode:
+            ncfile._endDefine()
+        data = self._toArray(value)
+        recordShape = self._recordShape()
+        if not self.isrec:
+            if not (index == slice(None) or index is Ellipsis or index == ()):
+                raise IndexError('Only the whole of a non-record variable can be written')
+            ncfile._write(self._begin, numpy.broadcast_to(data, recordShape).astype(self.dtype).tobytes())
+            return
+        if isinstance(index, slice):
+            start = (0 if index.start is None else index.start)
+            if index.step not in (None, 1) or start < 0:
+                raise IndexError('Records must be written as a contiguous range')
+            data = data.reshape((-1,)+recordShape)
+            if index.stop is not None and index.stop-start != len(data):
+                raise ValueError('Expected %d records but got %d' % (index.stop-start, len(data)))
+        else:
+            start = int(index)
+            if start < 0:
+                raise IndexError('Record indices must be non-negative')
+            data = numpy.broadcast_to(data, recordShape).reshape((1,)+recordShape)
+        data = data.astype(self.dtype)
+        ncfile._setNumRecords(start+len(data))
+        for i in range(len(data)):
+            ncfile._write(self._begin+(start+i)*ncfile._recordSize, data[i:i+1].tobytes())
+
+    def _toArray(self, value):
+        if self._nctype == NC_CHAR:
+            if isinstance(value, type(u'')):
+                value = value.encode('utf-8')
+            if isinstance(value, bytes):
+                return numpy.frombuffer(value, 'S1')
+            value = numpy.asarray(value)
+            if value.dtype.kind in 'SU' and value.dtype.itemsize > 1:
+                # Split an array of strings into characters along a new last axis.
+                width = self._recordShape()[-1]
+                value = numpy.ascontiguousarray(value.astype('S%d' % width))
+                return value.view('S1').reshape(value.shape+(width,))
+        return numpy.asarray(value)
+
+    def getValue(self):
+        """Get the value of a scalar variable."""
+        return self._array().item()
+
+    def assignValue(self, value):
+        """Set the value of a scalar variable."""
+        self[()] = value
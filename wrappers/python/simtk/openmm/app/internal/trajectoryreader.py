@@ -0,0 +1,113 @@
+"""
+trajectoryreader.py: Base class for reading text trajectory files one frame at a time.
+
+This is part of the OpenMM molecular simulation toolkit originating from
+Simbios, the NIH National Center for Physics-Based Simulation of
+Biological Structures at Stanford, funded under the NIH Roadmap for
+Medical Research, grant U54 GM072970. See https://simtk.org.
+
+Portions copyright (c) 2016 Stanford University and the Authors.
+Authors: Peter Eastman
+Contributors:
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+from __future__ import absolute_import
+__author__ = "Peter Eastman"
+__version__ = "1.0"
+
+from simtk.unit import nanometers, Quantity
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TrajectoryReader(object):
+    """Base class for reading a multi-frame text file one frame at a time.
+
+    When the file is opened, it is scanned once to record the position at which each frame starts, without
+    parsing any coordinates.  A frame is only parsed when it is requested, so any frame can be read without
+    reading the ones before it, and iterating over the trajectory holds only one frame in memory at a time.
+
+    Subclasses must implement _scanFrame() and _readPositions().
+    """
+
+    def __init__(self, file):
+        if numpy is None:
+            raise ImportError('%s requires numpy' % type(self).__name__)
+        self._file = None
+        self._offsets = []
+        self._file = open(file, 'rb')
+        while True:
+            offset = self._file.tell()
+            if not self._scanFrame(self._file):
+                break
+            self._offsets.append(offset)
+        if len(self._offsets) == 0:
+            raise ValueError('No frames found in %s' % file)
+
+    def _scanFrame(self, file):
+        """Skip over the frame that starts at the current position of a file.
+
+        Return True if a frame was found, or False if the end of the file was reached.
+        """
+        raise NotImplementedError()
+
+    def _readPositions(self, file):
+        """Parse the frame that starts at the current position of a file.
+
+        Return the positions as an (N, 3) numpy array in nanometers.
+        """
+        raise NotImplementedError()
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def __iter__(self):
+        for frame in range(len(self._offsets)):
+            yield self.getPositions(frame)
+
+    def getNumFrames(self):
+        """Get the number of frames in the file."""
+        return len(self._offsets)
+
+    def getPositions(self, frame=0):
+        """Get the atomic positions in a frame.
+
+        Parameters
+        ----------
+        frame : int=0
+            the index of the frame to read
+
+        Returns
+        -------
+        an (N, 3) numpy array of positions, as a Quantity in nanometers
+        """
+        self._file.seek(self._offsets[frame])
+        return Quantity(self._readPositions(self._file), nanometers)
+
+    def close(self):
+        """Close the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __del__(self):
+        self.close()
@@ -39,14 +39,19 @@ from simtk.openmm.app.forcefield import HAngles, AllBonds, _createResidueSignatu
 from simtk.openmm.app.topology import Residue
 from simtk.openmm.vec3 import Vec3
 from simtk.openmm import System, Context, NonbondedForce, CustomNonbondedForce, HarmonicBondForce, HarmonicAngleForce, VerletIntegrator, LocalEnergyMinimizer
-from simtk.unit import nanometer, molar, elementary_charge, amu, gram, liter, degree, sqrt, acos, is_quantity, dot, norm
+from simtk.unit import nanometer, molar, elementary_charge, amu, gram, liter, degree, sqrt, acos, is_quantity, dot, norm, Quantity
 import simtk.unit as unit
+from simtk.openmm.app.internal.celllist import CellList
 from . import element as elem
 import os
 import random
 import xml.etree.ElementTree as etree
 from copy import deepcopy
-from math import ceil, floor
+from math import ceil, floor, cos, pi
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class Modeller(object):
     """Modeller provides tools for editing molecular models, such as adding water or missing hydrogens.
@@ -59,6 +64,7 @@ class Modeller(object):
 
     _residueHydrogens = {}
     _hasLoadedStandardHydrogens = False
+    _hydrogenSystemCache = None
 
     def __init__(self, topology, positions):
         """Create a new Modeller object
@@ -85,6 +91,10 @@ class Modeller(object):
         """Get the atomic positions."""
         return self.positions
 
+    def _positionsInNanometers(self):
+        """Get the atomic positions as a new list of Vec3 objects in nanometers, without units."""
+        return _vec3List(_positionValues(self.positions))
+
     def add(self, addTopology, addPositions):
         """Add chains, residues, atoms, and bonds to the model.
 
@@ -103,34 +113,15 @@ class Modeller(object):
 
         newTopology = Topology()
         newTopology.setPeriodicBoxVectors(self.topology.getPeriodicBoxVectors())
-        newAtoms = {}
-        newPositions = []*nanometer
-        for chain in self.topology.chains():
-            newChain = newTopology.addChain(chain.id)
-            for residue in chain.residues():
-                newResidue = newTopology.addResidue(residue.name, newChain, residue.id)
-                for atom in residue.atoms():
-                    newAtom = newTopology.addAtom(atom.name, atom.element, newResidue, atom.id)
-                    newAtoms[atom] = newAtom
-                    newPositions.append(deepcopy(self.positions[atom.index]))
-        for bond in self.topology.bonds():
-            newTopology.addBond(newAtoms[bond[0]], newAtoms[bond[1]])
+        newAtoms = _copyTopology(self.topology, newTopology)
+        _copyBonds(self.topology, newTopology, newAtoms)
 
         # Add the new model
 
-        newAtoms = {}
-        for chain in addTopology.chains():
-            newChain = newTopology.addChain(chain.id)
-            for residue in chain.residues():
-                newResidue = newTopology.addResidue(residue.name, newChain, residue.id)
-                for atom in residue.atoms():
-                    newAtom = newTopology.addAtom(atom.name, atom.element, newResidue, atom.id)
-                    newAtoms[atom] = newAtom
-                    newPositions.append(deepcopy(addPositions[atom.index]))
-        for bond in addTopology.bonds():
-            newTopology.addBond(newAtoms[bond[0]], newAtoms[bond[1]])
+        newAtoms = _copyTopology(addTopology, newTopology)
+        _copyBonds(addTopology, newTopology, newAtoms)
         self.topology = newTopology
-        self.positions = newPositions
+        self.positions = _concatenatePositions(self.positions, addPositions)
 
     def delete(self, toDelete):
         """Delete chains, residues, atoms, and bonds from the model.
@@ -150,34 +141,40 @@ class Modeller(object):
             a list of Atoms, Residues, Chains, and bonds (specified as tuples of
             Atoms) to delete
         """
+        # Record which atoms are kept, and the new Atom corresponding to each one indexed by its original index.
+
+        deleteSet = set(toDelete)
         newTopology = Topology()
         newTopology.setPeriodicBoxVectors(self.topology.getPeriodicBoxVectors())
-        newAtoms = {}
-        newPositions = []*nanometer
-        deleteSet = set(toDelete)
+        newAtoms = [None]*self.topology.getNumAtoms()
+        keptIndices = []
         for chain in self.topology.chains():
-            if chain not in deleteSet:
-                needNewChain = True;
-                for residue in chain.residues():
-                    if residue not in deleteSet:
-                        needNewResidue = True
-                        for atom in residue.atoms():
-                            if atom not in deleteSet:
-                                if needNewChain:
-                                    newChain = newTopology.addChain(chain.id)
-                                    needNewChain = False;
-                                if needNewResidue:
-                                    newResidue = newTopology.addResidue(residue.name, newChain, residue.id)
-                                    needNewResidue = False;
-                                newAtom = newTopology.addAtom(atom.name, atom.element, newResidue, atom.id)
-                                newAtoms[atom] = newAtom
-                                newPositions.append(deepcopy(self.positions[atom.index]))
-        for bond in self.topology.bonds():
-            if bond[0] in newAtoms and bond[1] in newAtoms:
-                if bond not in deleteSet and (bond[1], bond[0]) not in deleteSet:
-                    newTopology.addBond(newAtoms[bond[0]], newAtoms[bond[1]])
+            if chain in deleteSet:
+                continue
+            newChain = None
+            for residue in chain.residues():
+                if residue in deleteSet:
+                    continue
+                newResidue = None
+                for atom in residue.atoms():
+                    if atom not in deleteSet:
+                        if newChain is None:
+                            newChain = newTopology.addChain(chain.id)
+                        if newResidue is None:
+                            newResidue = newTopology.addResidue(residue.name, newChain, residue.id)
+                        newAtoms[atom.index] = newTopology.addAtom(atom.name, atom.element, newResidue, atom.id)
+                        keptIndices.append(atom.index)
+
+        # Copy over the bonds between kept atoms, except ones that were explicitly deleted.
+
+        deletedBonds = set()
+        for item in deleteSet:
+            if isinstance(item, tuple):
+                deletedBonds.add((item[0].index, item[1].index))
+                deletedBonds.add((item[1].index, item[0].index))
+        _copyBonds(self.topology, newTopology, newAtoms, deletedBonds)
         self.topology = newTopology
-        self.positions = newPositions
+        self.positions = _selectPositions(self.positions, keptIndices)
 
     def deleteWater(self):
         """Delete all water molecules from the model."""
@@ -203,10 +200,11 @@ class Modeller(object):
             sites = 5
         else:
             raise ValueError('Unknown water model: %s' % model)
+        positions = self._positionsInNanometers()
         newTopology = Topology()
         newTopology.setPeriodicBoxVectors(self.topology.getPeriodicBoxVectors())
-        newAtoms = {}
-        newPositions = []*nanometer
+        newAtoms = [None]*self.topology.getNumAtoms()
+        newPositions = []
         for chain in self.topology.chains():
             newChain = newTopology.addChain(chain.id)
             for residue in chain.residues():
@@ -217,15 +215,12 @@ class Modeller(object):
                     hatoms = [atom for atom in residue.atoms() if atom.element == elem.hydrogen]
                     if len(oatom) != 1 or len(hatoms) != 2:
                         raise ValueError('Illegal water molecule (residue %d): contains %d oxygen(s) and %d hydrogen(s)' % (residue.index, len(oatom), len(hatoms)))
-                    o = newTopology.addAtom(oatom[0].name, oatom[0].element, newResidue)
-                    h1 = newTopology.addAtom(hatoms[0].name, hatoms[0].element, newResidue)
-                    h2 = newTopology.addAtom(hatoms[1].name, hatoms[1].element, newResidue)
-                    newAtoms[oatom[0]] = o
-                    newAtoms[hatoms[0]] = h1
-                    newAtoms[hatoms[1]] = h2
-                    po = deepcopy(self.positions[oatom[0].index])
-                    ph1 = deepcopy(self.positions[hatoms[0].index])
-                    ph2 = deepcopy(self.positions[hatoms[1].index])
+                    newAtoms[oatom[0].index] = newTopology.addAtom(oatom[0].name, oatom[0].element, newResidue)
+                    newAtoms[hatoms[0].index] = newTopology.addAtom(hatoms[0].name, hatoms[0].element, newResidue)
+                    newAtoms[hatoms[1].index] = newTopology.addAtom(hatoms[1].name, hatoms[1].element, newResidue)
+                    po = positions[oatom[0].index]
+                    ph1 = positions[hatoms[0].index]
+                    ph2 = positions[hatoms[1].index]
                     newPositions.append(po)
                     newPositions.append(ph1)
                     newPositions.append(ph2)
@@ -238,22 +233,19 @@ class Modeller(object):
                     elif sites == 5:
                         newTopology.addAtom('M1', None, newResidue)
                         newTopology.addAtom('M2', None, newResidue)
-                        v1 = (ph1-po).value_in_unit(nanometer)
-                        v2 = (ph2-po).value_in_unit(nanometer)
+                        v1 = ph1-po
+                        v2 = ph2-po
                         cross = Vec3(v1[1]*v2[2]-v1[2]*v2[1], v1[2]*v2[0]-v1[0]*v2[2], v1[0]*v2[1]-v1[1]*v2[0])
-                        newPositions.append(po - (0.34490826*v1 - 0.34490826*v2 - 6.4437903*cross)*nanometer)
-                        newPositions.append(po - (0.34490826*v1 - 0.34490826*v2 + 6.4437903*cross)*nanometer)
+                        newPositions.append(po - (0.34490826*v1 - 0.34490826*v2 - 6.4437903*cross))
+                        newPositions.append(po - (0.34490826*v1 - 0.34490826*v2 + 6.4437903*cross))
                 else:
                     # Just copy the residue over.
                     for atom in residue.atoms():
-                        newAtom = newTopology.addAtom(atom.name, atom.element, newResidue, atom.id)
-                        newAtoms[atom] = newAtom
-                        newPositions.append(deepcopy(self.positions[atom.index]))
-        for bond in self.topology.bonds():
-            if bond[0] in newAtoms and bond[1] in newAtoms:
-                newTopology.addBond(newAtoms[bond[0]], newAtoms[bond[1]])
+                        newAtoms[atom.index] = newTopology.addAtom(atom.name, atom.element, newResidue, atom.id)
+                        newPositions.append(positions[atom.index])
+        _copyBonds(self.topology, newTopology, newAtoms)
         self.topology = newTopology
-        self.positions = newPositions
+        self.positions = newPositions*nanometer
 
     def addSolvent(self, forcefield, model='tip3p', boxSize=None, boxVectors=None, padding=None, numAdded=None, positiveIon='Na+', negativeIon='Cl-', ionicStrength=0*molar, neutralize=True):
         """Add solvent (both water and ions) to the model to fill a rectangular box.
@@ -387,18 +379,9 @@ class Modeller(object):
 
         newTopology = Topology()
         newTopology.setPeriodicBoxVectors(vectors*nanometer)
-        newAtoms = {}
-        newPositions = []*nanometer
-        for chain in self.topology.chains():
-            newChain = newTopology.addChain(chain.id)
-            for residue in chain.residues():
-                newResidue = newTopology.addResidue(residue.name, newChain, residue.id)
-                for atom in residue.atoms():
-                    newAtom = newTopology.addAtom(atom.name, atom.element, newResidue, atom.id)
-                    newAtoms[atom] = newAtom
-                    newPositions.append(deepcopy(self.positions[atom.index]))
-        for bond in self.topology.bonds():
-            newTopology.addBond(newAtoms[bond[0]], newAtoms[bond[1]])
+        newAtoms = _copyTopology(self.topology, newTopology)
+        _copyBonds(self.topology, newTopology, newAtoms)
+        newPositions = self._positionsInNanometers()*nanometer
 
         # Sort the solute atoms into cells for fast lookup.
 
@@ -406,28 +389,7 @@ class Modeller(object):
             positions = []
         else:
             positions = self.positions.value_in_unit(nanometer)
-        cells = {}
-        numCells = tuple((max(1, int(floor(box[i]/maxCutoff))) for i in range(3)))
-        cellSize = tuple((box[i]/numCells[i] for i in range(3)))
-        for i in range(len(positions)):
-            cell = tuple((int(floor(positions[i][j]/cellSize[j]))%numCells[j] for j in range(3)))
-            if cell in cells:
-                cells[cell].append(i)
-            else:
-                cells[cell] = [i]
-
-        # Create a generator that loops over atoms close to a position.
-
-        def neighbors(pos):
-            centralCell = tuple((int(floor(pos[i]/cellSize[i])) for i in range(3)))
-            offsets = (-1, 0, 1)
-            for i in offsets:
-                for j in offsets:
-                    for k in offsets:
-                        cell = ((centralCell[0]+i+numCells[0])%numCells[0], (centralCell[1]+j+numCells[1])%numCells[1], (centralCell[2]+k+numCells[2])%numCells[2])
-                        if cell in cells:
-                            for atom in cells[cell]:
-                                yield atom
+        cells = CellList(positions, maxCutoff, vectors)
 
         # Define a function to compute the distance between two points, taking periodic boundary conditions into account.
 
@@ -459,7 +421,7 @@ class Modeller(object):
                             # This molecule is inside the box, so see how close to it is to the solute.
 
                             atomPos += center-box/2
-                            for i in neighbors(atomPos):
+                            for i in cells.neighbors(atomPos):
                                 if periodicDistance(atomPos, positions[i]) < cutoff[i]:
                                     break
                             else:
@@ -488,19 +450,13 @@ class Modeller(object):
             lowerCutoff = center-box/2+Vec3(waterCutoff, waterCutoff, waterCutoff)
             lowerSkinPositions = [pos for index, pos in addedWaters if pos[0] < lowerCutoff[0] or pos[1] < lowerCutoff[1] or pos[2] < lowerCutoff[2]]
             filteredWaters = []
-            cells = {}
-            for i in range(len(lowerSkinPositions)):
-                cell = tuple((int(floor(lowerSkinPositions[i][j]/cellSize[j]))%numCells[j] for j in range(3)))
-                if cell in cells:
-                    cells[cell].append(i)
-                else:
-                    cells[cell] = [i]
+            cells = CellList(lowerSkinPositions, maxCutoff, vectors)
             for entry in addedWaters:
                 pos = entry[1]
                 if pos[0] < upperCutoff[0] and pos[1] < upperCutoff[1] and pos[2] < upperCutoff[2]:
                     filteredWaters.append(entry)
                 else:
-                    if not any((periodicDistance(lowerSkinPositions[i], pos) < waterCutoff and norm(lowerSkinPositions[i]-pos) > waterCutoff for i in neighbors(pos))):
+                    if not any((periodicDistance(lowerSkinPositions[i], pos) < waterCutoff and norm(lowerSkinPositions[i]-pos) > waterCutoff for i in cells.neighbors(pos))):
                         filteredWaters.append(entry)
             addedWaters = filteredWaters
 
@@ -548,6 +504,19 @@ class Modeller(object):
         self.topology = newTopology
         self.positions = newPositions
 
+    @staticmethod
+    def clearHydrogenSystemCache():
+        """Discard the System cached by addHydrogens(), so the next call will create a new one."""
+        Modeller._hydrogenSystemCache = None
+
+    @staticmethod
+    def _hydrogenSystemKey(topology):
+        """Create a hashable description of everything in a Topology that affects the System addHydrogens() builds
+        for minimizing it.  Two Topologies with the same key produce identical Systems."""
+        atoms = tuple((atom.name, atom.element, atom.residue.name, atom.residue.index) for atom in topology.atoms())
+        bonds = tuple((atom1.index, atom2.index) for atom1, atom2 in topology.bonds())
+        return (atoms, bonds)
+
     class _ResidueData:
         """Inner class used to encapsulate data about the hydrogens for a residue."""
         def __init__(self, name):
@@ -639,6 +608,11 @@ class Modeller(object):
         Definitions for standard amino acids and nucleotides are built in.  You can call loadHydrogenDefinitions() to load
         additional definitions for other residue types.
 
+        The System used to minimize the positions of the new hydrogens is cached.  If a later call produces a Topology
+        with the same atoms and bonds and uses the same ForceField (for example, when protonating many conformations of
+        the same structure), the cached System is reused instead of being created again.  If you modify the ForceField
+        between calls, call clearHydrogenSystemCache() first.
+
         Parameters
         ----------
         forcefield : ForceField=None
@@ -688,24 +662,49 @@ class Modeller(object):
             bonded[atom2].append(atom1)
 
         # Define a function that decides whether a set of atoms form a hydrogen bond, using fairly tolerant criteria.
+        # Positions are in nanometers.  The donor-acceptor distance is not checked here, since candidate acceptors
+        # are found with a cell list using that distance as the cutoff.  The angle test compares cosines to avoid
+        # calling acos().
 
+        maxHbondDistance = 0.35
+        minHbondCosine = cos(50*pi/180)
         def isHbond(d, h, a):
-            if norm(d-a) > 0.35*nanometer:
-                return False
             deltaDH = h-d
             deltaHA = a-h
-            deltaDH /= norm(deltaDH)
-            deltaHA /= norm(deltaHA)
-            return acos(dot(deltaDH, deltaHA)) < 50*degree
+            lengthDH = norm(deltaDH)
+            lengthHA = norm(deltaHA)
+            if lengthDH == 0 or lengthHA == 0:
+                return False
+            return dot(deltaDH, deltaHA)/(lengthDH*lengthHA) > minHbondCosine
+
+        # Define a function that estimates the position of a hydrogen bonded to an atom by pointing it away
+        # from the atom's other bonds.
+
+        def estimateHydrogenPosition(parent):
+            parentPos = positions[parent.index]
+            delta = Vec3(0, 0, 0)
+            for other in bonded[parent]:
+                delta += parentPos-positions[other.index]
+            return parentPos+delta*(0.1/norm(delta))
 
-        # Loop over residues.
+        # Look up the hydrogen bond acceptors near a donor through a cell list, which is only built if it is needed.
 
+        acceptors = [atom for atom in self.topology.atoms() if atom.element in (elem.oxygen, elem.nitrogen)]
+        acceptorCells = []
+        def nearbyAcceptors(donorPos):
+            if len(acceptorCells) == 0:
+                acceptorCells.append(CellList([positions[atom.index] for atom in acceptors], maxHbondDistance))
+            return [acceptors[i] for i in acceptorCells[0].neighbors(donorPos)]
+
+        # Loop over residues.  Positions are accumulated as plain Vec3s in nanometers, and converted to a Quantity
+        # only once at the end.
+
+        positions = self._positionsInNanometers()
         newTopology = Topology()
         newTopology.setPeriodicBoxVectors(self.topology.getPeriodicBoxVectors())
         newAtoms = {}
-        newPositions = []*nanometer
+        newPositions = []
         newIndices = []
-        acceptors = [atom for atom in self.topology.atoms() if atom.element in (elem.oxygen, elem.nitrogen)]
         for chain in self.topology.chains():
             newChain = newTopology.addChain(chain.id)
             for residue in chain.residues():
@@ -744,31 +743,18 @@ class Modeller(object):
                             else:
                                 # Estimate the hydrogen positions.
 
-                                nd1Pos = self.positions[nd1.index]
-                                ne2Pos = self.positions[ne2.index]
-                                hd1Delta = Vec3(0, 0, 0)*nanometer
-                                for other in bonded[nd1]:
-                                    hd1Delta += nd1Pos-self.positions[other.index]
-                                hd1Delta *= 0.1*nanometer/norm(hd1Delta)
-                                hd1Pos = nd1Pos+hd1Delta
-                                he2Delta = Vec3(0, 0, 0)*nanometer
-                                for other in bonded[ne2]:
-                                    he2Delta += ne2Pos-self.positions[other.index]
-                                he2Delta *= 0.1*nanometer/norm(he2Delta)
-                                he2Pos = ne2Pos+he2Delta
-
-                                # See whether either hydrogen would form a hydrogen bond.
-
-                                nd1IsBonded = False
-                                ne2IsBonded = False
-                                for acceptor in acceptors:
-                                    if acceptor.residue != residue:
-                                        acceptorPos = self.positions[acceptor.index]
-                                        if isHbond(nd1Pos, hd1Pos, acceptorPos):
-                                            nd1IsBonded = True
-                                            break
-                                        if isHbond(ne2Pos, he2Pos, acceptorPos):
-                                            ne2IsBonded = True
+                                nd1Pos = positions[nd1.index]
+                                ne2Pos = positions[ne2.index]
+                                hd1Pos = estimateHydrogenPosition(nd1)
+                                he2Pos = estimateHydrogenPosition(ne2)
+
+                                # See whether either hydrogen would form a hydrogen bond.  Only acceptors within the
+                                # maximum donor-acceptor distance need to be checked.
+
+                                nd1IsBonded = any(isHbond(nd1Pos, hd1Pos, positions[acceptor.index])
+                                                  for acceptor in nearbyAcceptors(nd1Pos) if acceptor.residue != residue)
+                                ne2IsBonded = any(isHbond(ne2Pos, he2Pos, positions[acceptor.index])
+                                                  for acceptor in nearbyAcceptors(ne2Pos) if acceptor.residue != residue)
                                 if ne2IsBonded and not nd1IsBonded:
                                     variant = 'HIE'
                                 else:
@@ -800,7 +786,7 @@ class Modeller(object):
 
                         newAtom = newTopology.addAtom(parent.name, parent.element, newResidue)
                         newAtoms[parent] = newAtom
-                        newPositions.append(deepcopy(self.positions[parent.index]))
+                        newPositions.append(positions[parent.index])
                         if parent in parents:
                             # Match expected hydrogens with existing ones and find which ones need to be added.
 
@@ -830,16 +816,17 @@ class Modeller(object):
                                 for h in expected:
                                     newH = newTopology.addAtom(h.name, elem.hydrogen, newResidue)
                                     newIndices.append(newH.index)
-                                    delta = Vec3(0, 0, 0)*nanometer
+                                    parentPos = positions[parent.index]
+                                    delta = Vec3(0, 0, 0)
                                     if len(bonded[parent]) > 0:
                                         for other in bonded[parent]:
-                                            delta += self.positions[parent.index]-self.positions[other.index]
+                                            delta += parentPos-positions[other.index]
                                     else:
-                                        delta = Vec3(random.random(), random.random(), random.random())*nanometer
-                                    delta *= 0.1*nanometer/norm(delta)
-                                    delta += 0.05*Vec3(random.random(), random.random(), random.random())*nanometer
-                                    delta *= 0.1*nanometer/norm(delta)
-                                    newPositions.append(self.positions[parent.index]+delta)
+                                        delta = Vec3(random.random(), random.random(), random.random())
+                                    delta *= 0.1/norm(delta)
+                                    delta += 0.05*Vec3(random.random(), random.random(), random.random())
+                                    delta *= 0.1/norm(delta)
+                                    newPositions.append(parentPos+delta)
                                     newTopology.addBond(newAtom, newH)
                 else:
                     # Just copy over the residue.
@@ -847,14 +834,20 @@ class Modeller(object):
                     for atom in residue.atoms():
                         newAtom = newTopology.addAtom(atom.name, atom.element, newResidue)
                         newAtoms[atom] = newAtom
-                        newPositions.append(deepcopy(self.positions[atom.index]))
+                        newPositions.append(positions[atom.index])
         for bond in self.topology.bonds():
             if bond[0] in newAtoms and bond[1] in newAtoms:
                 newTopology.addBond(newAtoms[bond[0]], newAtoms[bond[1]])
+        newPositions = newPositions*nanometer
 
         # The hydrogens were added at random positions.  Now perform an energy minimization to fix them up.
+        # Building the System is expensive, so if the previous call produced an identical Topology, reuse its System.
 
-        if forcefield is not None:
+        cacheKey = (forcefield, Modeller._hydrogenSystemKey(newTopology))
+        cached = Modeller._hydrogenSystemCache
+        if cached is not None and cached[0] == cacheKey:
+            system = cached[1]
+        elif forcefield is not None:
             # Use the ForceField the user specified.
 
             system = forcefield.createSystem(newTopology, rigidWater=False)
@@ -904,6 +897,7 @@ class Modeller(object):
                         if atom.element == elem.oxygen and len(bondedTo[index]) == 2 and elem.hydrogen in (a.element for a in bondedTo[index]):
                             angles.addAngle(bondedTo[index][0].index, index, bondedTo[index][1].index, 1.894, 460.24)
 
+        Modeller._hydrogenSystemCache = (cacheKey, system)
         if platform is None:
             context = Context(system, VerletIntegrator(0.0))
         else:
@@ -1139,3 +1133,63 @@ class Modeller(object):
 
         self.topology = newTopology
         self.positions = newPositions
+
+def _copyTopology(topology, newTopology):
+    """Copy all chains, residues, and atoms (but not bonds) from one Topology to the end of another.  Returns a list
+    containing the new Atom corresponding to each atom in the original Topology, indexed by the original atom index."""
+    newAtoms = [None]*topology.getNumAtoms()
+    for chain in topology.chains():
+        newChain = newTopology.addChain(chain.id)
+        for residue in chain.residues():
+            newResidue = newTopology.addResidue(residue.name, newChain, residue.id)
+            for atom in residue.atoms():
+                newAtoms[atom.index] = newTopology.addAtom(atom.name, atom.element, newResidue, atom.id)
+    return newAtoms
+
+def _copyBonds(topology, newTopology, newAtoms, excludedBonds=None):
+    """Copy bonds from one Topology to another.  newAtoms is a lookup table giving the new Atom corresponding to each
+    atom index in the original Topology, or None for atoms that were not copied.  Bonds involving atoms that were not
+    copied are omitted, as are any bonds whose pair of atom indices appears in excludedBonds."""
+    for atom1, atom2 in topology.bonds():
+        newAtom1 = newAtoms[atom1.index]
+        newAtom2 = newAtoms[atom2.index]
+        if newAtom1 is not None and newAtom2 is not None:
+            if excludedBonds is None or (atom1.index, atom2.index) not in excludedBonds:
+                newTopology.addBond(newAtom1, newAtom2)
+
+def _positionValues(positions):
+    """Get a set of positions in nanometers without units.  A numpy array is returned unchanged, and anything else is
+    returned as a list of Vec3 objects."""
+    if is_quantity(positions):
+        if positions.unit == nanometer:
+            # value_in_unit() makes a deep copy of every position, which is unnecessary since we never modify them.
+            positions = positions._value
+        else:
+            positions = positions.value_in_unit(nanometer)
+    else:
+        positions = [p.value_in_unit(nanometer) if is_quantity(p) else p for p in positions]
+    if numpy is not None and isinstance(positions, numpy.ndarray):
+        return positions
+    return [p if isinstance(p, Vec3) else Vec3(p[0], p[1], p[2]) for p in positions]
+
+def _vec3List(values):
+    """Convert the output of _positionValues() to a list of Vec3 objects."""
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return [Vec3(p[0], p[1], p[2]) for p in values.tolist()]
+    return values
+
+def _selectPositions(positions, indices):
+    """Select the positions of a subset of atoms.  Positions stored as a numpy array are sliced in a single
+    operation.  Vec3 objects are immutable, so positions stored as a list are shared rather than copied."""
+    values = _positionValues(positions)
+    if numpy is not None and isinstance(values, numpy.ndarray):
+        return Quantity(values[numpy.array(indices, dtype=int)], nanometer)
+    return Quantity([values[i] for i in indices], nanometer)
+
+def _concatenatePositions(positions1, positions2):
+    """Create a new list containing two sets of positions, one after the other."""
+    values1 = _positionValues(positions1)
+    values2 = _positionValues(positions2)
+    if numpy is not None and isinstance(values1, numpy.ndarray) and isinstance(values2, numpy.ndarray):
+        return Quantity(numpy.concatenate((values1.reshape(-1, 3), values2.reshape(-1, 3))), nanometer)
+    return Quantity(_vec3List(values1)+_vec3List(values2), nanometer)
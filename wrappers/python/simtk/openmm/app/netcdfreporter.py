@@ -0,0 +1,113 @@
+"""
+netcdfreporter.py: Outputs simulation trajectories in AMBER NetCDF format
+
+This is part of the OpenMM molecular simulation toolkit originating from
+Simbios, the NIH National Center for Physics-Based Simulation of
+Biological Structures at Stanford, funded under the NIH Roadmap for
+Medical Research, grant U54 GM072970. See https://simtk.org.
+
+Portions copyright (c) 2016 Stanford University and the Authors.
+Authors: Peter Eastman
+Contributors:
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+from __future__ import absolute_import
+__author__ = "Peter Eastman"
+__version__ = "1.0"
+
+from simtk.openmm.app.ambernetcdffile import AmberNetcdfFile
+
+class NetcdfReporter(object):
+    """NetcdfReporter outputs a series of frames from a Simulation to an AMBER NetCDF trajectory file.
+
+    Coordinates are stored in double precision, together with the simulation time and, for periodic systems,
+    the unit cell.  Velocities can optionally be stored as well.  Each frame is appended to the end of the
+    file, and the file can be reopened with AmberNetcdfFile to read any frame.
+
+    To use it, create a NetcdfReporter, then add it to the Simulation's list of reporters.
+    """
+
+    def __init__(self, file, reportInterval, velocities=False, append=False):
+        """Create a NetcdfReporter.
+
+        Parameters
+        ----------
+        file : string
+            The file to write to
+        reportInterval : int
+            The interval (in time steps) at which to write frames
+        velocities : bool=False
+            Whether to write velocities to the file
+        append : bool=False
+            If true, frames are appended to an existing file instead of
+            overwriting it.  The file must contain the same atoms and
+            variables that this reporter writes.
+        """
+        self._file = file
+        self._reportInterval = reportInterval
+        self._velocities = velocities
+        self._append = append
+        self._netcdf = None
+
+    def describeNextReport(self, simulation):
+        """Get information about the next report this object will generate.
+
+        Parameters
+        ----------
+        simulation : Simulation
+            The Simulation to generate a report for
+
+        Returns
+        -------
+        tuple
+            A five element tuple. The first element is the number of steps
+            until the next report. The remaining elements specify whether
+            that report will require positions, velocities, forces, and
+            energies respectively.
+        """
+        steps = self._reportInterval - simulation.currentStep%self._reportInterval
+        return (steps, True, self._velocities, False, False)
+
+    def report(self, simulation, state):
+        """Generate a report.
+
+        Parameters
+        ----------
+        simulation : Simulation
+            The Simulation to generate a report for
+        state : State
+            The current state of the simulation
+        """
+        if self._netcdf is None:
+            if self._append:
+                self._netcdf = AmberNetcdfFile(self._file, 'a', simulation.topology)
+                if self._velocities and not self._netcdf.hasVelocities():
+                    raise ValueError('Cannot append velocities to a file that does not contain them')
+            else:
+                periodic = simulation.system.usesPeriodicBoundaryConditions()
+                self._netcdf = AmberNetcdfFile(self._file, 'w', simulation.topology, self._velocities, periodic)
+        velocities = None
+        if self._netcdf.hasVelocities():
+            velocities = state.getVelocities(asNumpy=True)
+        self._netcdf.writeModel(state.getPositions(asNumpy=True), velocities, state.getPeriodicBoxVectors(), state.getTime())
+
+    def __del__(self):
+        if self._netcdf is not None:
+            self._netcdf.close()
@@ -40,14 +40,15 @@ from copy import copy
 from datetime import date
 from simtk.openmm import Vec3, Platform
 from simtk.openmm.app.internal.pdbstructure import PdbStructure
-from simtk.openmm.app.internal.unitcell import computeLengthsAndAngles
+from simtk.openmm.app.internal.unitcell import computeLengthsAndAngles, computePeriodicBoxVectors
+from simtk.openmm.app.internal.trajectoryreader import TrajectoryReader
 from simtk.openmm.app import Topology
 from simtk.unit import nanometers, angstroms, is_quantity, norm, Quantity, dot
 from . import element as elem
 try:
     import numpy
 except ImportError:
-    pass
+    numpy = None
 
 class PDBFile(object):
     """PDBFile parses a Protein Data Bank (PDB) file and constructs a Topology and a set of atom positions from it.
@@ -323,14 +324,21 @@ class PDBFile(object):
             String to write in the element column of the ATOM records for atoms whose element is None (extra particles)
         """
 
-        if len(list(topology.atoms())) != len(positions):
+        if topology.getNumAtoms() != len(positions):
             raise ValueError('The number of positions must match the number of atoms')
         if is_quantity(positions):
             positions = positions.value_in_unit(angstroms)
-        if any(math.isnan(norm(pos)) for pos in positions):
-            raise ValueError('Particle position is NaN')
-        if any(math.isinf(norm(pos)) for pos in positions):
-            raise ValueError('Particle position is infinite')
+        if numpy is not None and isinstance(positions, numpy.ndarray):
+            if numpy.isnan(positions).any():
+                raise ValueError('Particle position is NaN')
+            if numpy.isinf(positions).any():
+                raise ValueError('Particle position is infinite')
+            positions = positions.tolist()
+        else:
+            if any(math.isnan(norm(pos)) for pos in positions):
+                raise ValueError('Particle position is NaN')
+            if any(math.isinf(norm(pos)) for pos in positions):
+                raise ValueError('Particle position is infinite')
         atomIndex = 1
         posIndex = 0
         if modelIndex is not None:
@@ -439,6 +447,114 @@ class PDBFile(object):
         print("END", file=file)
 
 
+class PDBTrajectory(TrajectoryReader):
+    """PDBTrajectory reads a multi-model PDB file one model at a time.
+
+    Unlike PDBFile, which parses every model when the file is loaded, this class only records where each
+    model begins.  The Topology is built once from the first model (plus any CONECT records in the file),
+    and the positions of a model are parsed only when they are requested, either by index with getPositions()
+    or in order by iterating over the object.  This allows trajectories of any length to be processed in
+    constant memory.  Every model must contain the same atoms in the same order.  Positions are returned as
+    numpy arrays, so this class requires numpy.
+    """
+
+    def __init__(self, file, extraParticleIdentifier='EP'):
+        """Open a PDB file.
+
+        Parameters
+        ----------
+        file : string
+            the name of the file to load
+        extraParticleIdentifier : string='EP'
+            if this value appears in the element column for an ATOM record, the Atom's element will be set to None to mark it as an extra particle
+        """
+        self._cryst1 = None
+        self._boxLines = []
+        self._connectLines = []
+        TrajectoryReader.__init__(self, file)
+
+        # Build the Topology from the first model.  The END and ENDMDL records are left out so PdbStructure
+        # also reads the CONECT records, which usually come after the last model.
+
+        f = self._file
+        f.seek(self._offsets[0])
+        lines = []
+        numAtoms = 0
+        while True:
+            line = f.readline()
+            if len(line) == 0 or (line.startswith(b'END') and numAtoms > 0):
+                break
+            if line.startswith(b'ATOM  ') or line.startswith(b'HETATM'):
+                numAtoms += 1
+            if not line.startswith(b'END') and not line.startswith(b'CONECT'):
+                lines.append(line)
+        lines += self._connectLines
+        lines.append(b'END')
+        pdb = PDBFile(PdbStructure(lines, load_all_models=False, extraParticleIdentifier=extraParticleIdentifier))
+        ## The Topology read from the PDB file
+        self.topology = pdb.topology
+
+    def _scanFrame(self, file):
+        numAtoms = 0
+        connects = []
+        while True:
+            line = file.readline()
+            if len(line) == 0:
+                break
+            if line.startswith(b'ATOM  ') or line.startswith(b'HETATM'):
+                numAtoms += 1
+            elif line.startswith(b'CRYST1'):
+                self._cryst1 = line.decode('utf-8')
+            elif line.startswith(b'CONECT'):
+                connects.append(line)
+            elif line.startswith(b'END') and numAtoms > 0:
+                break
+        if len(connects) > 0:
+            self._connectLines = connects
+        if numAtoms == 0:
+            return False
+        self._boxLines.append(self._cryst1)
+        return True
+
+    def _readPositions(self, file):
+        positions = []
+        alternates = set()
+        while True:
+            line = file.readline()
+            if len(line) == 0 or (line.startswith(b'END') and len(positions) > 0):
+                break
+            if line.startswith(b'ATOM  ') or line.startswith(b'HETATM'):
+                if line[16:17] != b' ':
+                    # Only the first alternate location of an atom is used.
+                    key = line[12:16]+line[21:27]
+                    if key in alternates:
+                        continue
+                    alternates.add(key)
+                positions.append((float(line[30:38]), float(line[38:46]), float(line[46:54])))
+        if len(positions) != self.topology.getNumAtoms():
+            raise ValueError('A model in the PDB file contains %d atoms, but the first model contains %d' % (len(positions), self.topology.getNumAtoms()))
+        return numpy.array(positions)*0.1
+
+    def getTopology(self):
+        """Get the Topology of the model."""
+        return self.topology
+
+    def getPeriodicBoxVectors(self, frame=0):
+        """Get the vectors defining the periodic box of a frame, or None if the file does not specify a unit cell.
+
+        Parameters
+        ----------
+        frame : int=0
+            the index of the frame for which to get the box vectors
+        """
+        line = self._boxLines[frame]
+        if line is None:
+            return None
+        lengths = [float(line[i:i+9])*0.1 for i in (6, 15, 24)]
+        angles = [float(line[i:i+7])*math.pi/180.0 for i in (33, 40, 47)]
+        return computePeriodicBoxVectors(*(lengths+angles))
+
+
 def _format_83(f):
     """Format a single float into a string of width 8, with ideally 3 decimal
     places of precision. If the number is a little too large, we can
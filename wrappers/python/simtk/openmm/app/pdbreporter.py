@@ -34,6 +34,10 @@ __version__ = "1.0"
 
 import simtk.openmm as mm
 from simtk.openmm.app import PDBFile, PDBxFile
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 class PDBReporter(object):
     """PDBReporter outputs a series of frames from a Simulation to a PDB file.
@@ -89,7 +93,7 @@ class PDBReporter(object):
             PDBFile.writeHeader(simulation.topology, self._out)
             self._topology = simulation.topology
             self._nextModel += 1
-        PDBFile.writeModel(simulation.topology, state.getPositions(), self._out, self._nextModel)
+        PDBFile.writeModel(simulation.topology, state.getPositions(asNumpy=(numpy is not None)), self._out, self._nextModel)
         self._nextModel += 1
         if hasattr(self._out, 'flush') and callable(self._out.flush):
             self._out.flush()
@@ -118,7 +122,7 @@ class PDBxReporter(PDBReporter):
         if self._nextModel == 0:
             PDBxFile.writeHeader(simulation.topology, self._out)
             self._nextModel += 1
-        PDBxFile.writeModel(simulation.topology, state.getPositions(), self._out, self._nextModel)
+        PDBxFile.writeModel(simulation.topology, state.getPositions(asNumpy=(numpy is not None)), self._out, self._nextModel)
         self._nextModel += 1
         if hasattr(self._out, 'flush') and callable(self._out.flush):
             self._out.flush()
@@ -45,7 +45,7 @@ from . import element as elem
 try:
     import numpy
 except:
-    pass
+    numpy = None
 
 class PDBxFile(object):
     """PDBxFile parses a PDBx/mmCIF file and constructs a Topology and a set of atom positions from it."""
@@ -315,14 +315,21 @@ class PDBxFile(object):
             make sure these are valid IDs that satisfy the requirements of the
             PDBx/mmCIF format.  Otherwise, the output file will be invalid.
         """
-        if len(list(topology.atoms())) != len(positions):
+        if topology.getNumAtoms() != len(positions):
             raise ValueError('The number of positions must match the number of atoms')
         if is_quantity(positions):
             positions = positions.value_in_unit(angstroms)
-        if any(math.isnan(norm(pos)) for pos in positions):
-            raise ValueError('Particle position is NaN')
-        if any(math.isinf(norm(pos)) for pos in positions):
-            raise ValueError('Particle position is infinite')
+        if numpy is not None and isinstance(positions, numpy.ndarray):
+            if numpy.isnan(positions).any():
+                raise ValueError('Particle position is NaN')
+            if numpy.isinf(positions).any():
+                raise ValueError('Particle position is infinite')
+            positions = positions.tolist()
+        else:
+            if any(math.isnan(norm(pos)) for pos in positions):
+                raise ValueError('Particle position is NaN')
+            if any(math.isinf(norm(pos)) for pos in positions):
+                raise ValueError('Particle position is infinite')
         atomIndex = 1
         posIndex = 0
         for (chainIndex, chain) in enumerate(topology.chains()):
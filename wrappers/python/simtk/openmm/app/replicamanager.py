@@ -0,0 +1,285 @@
+"""
+replicamanager.py: Runs many copies of a simulation concurrently
+
+This is part of the OpenMM molecular simulation toolkit originating from
+Simbios, the NIH National Center for Physics-Based Simulation of
+Biological Structures at Stanford, funded under the NIH Roadmap for
+Medical Research, grant U54 GM072970. See https://simtk.org.
+
+Portions copyright (c) 2016 Stanford University and the Authors.
+Authors: Peter Eastman
+Contributors:
+
+Permission is hereby granted, free of charge, to any person obtaining a
+copy of this software and associated documentation files (the "Software"),
+to deal in the Software without restriction, including without limitation
+the rights to use, copy, modify, merge, publish, distribute, sublicense,
+and/or sell copies of the Software, and to permit persons to whom the
+Software is furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in
+all copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+THE AUTHORS, CONTRIBUTORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM,
+DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR
+OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE
+USE OR OTHER DEALINGS IN THE SOFTWARE.
+"""
+from __future__ import division
+from __future__ import absolute_import
+__author__ = "Peter Eastman"
+__version__ = "1.0"
+
+from .simulation import Simulation
+from multiprocessing.pool import ThreadPool
+from math import sqrt
+import time
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+class ReplicaManager(object):
+    """ReplicaManager runs many replicas of a simulation at once, such as for replica exchange or ensemble simulations.
+
+    Each replica is a separate Simulation with its own Context and Integrator.  The replicas are advanced
+    concurrently by a pool of threads.  OpenMM releases the Python global interpreter lock while integrating, so
+    the replicas really do run in parallel.  When using the CPU platform, you usually should limit each Context
+    to a single thread by specifying platformProperties={'CpuThreads': '1'}, and let the ReplicaManager run
+    one replica on each core.
+
+    Replicas can exchange configurations (positions, velocities, and periodic box vectors) or global parameters
+    with each other.  Exchanges are done by transferring the data directly between Contexts, without creating
+    new Simulations.  Deciding whether to accept an exchange is left to the caller.  For example, a simple
+    parallel tempering simulation might look like this:
+
+    >>> replicas = ReplicaManager(topology, system, [LangevinIntegrator(t, 1/picosecond, 0.002*picoseconds) for t in temperatures])
+    >>> replicas.setPositions(positions)
+    >>> for iteration in range(1000):
+    >>>     replicas.step(500)
+    >>>     energies = replicas.getPotentialEnergies()
+    >>>     (decide which pairs to exchange based on the energies)
+    >>>     replicas.exchangeConfigurations(i, j, rescaleVelocities=True)
+
+    Each replica's Simulation is available as replicas.simulations[i], so you can add reporters to it.
+    """
+
+    def __init__(self, topology, system, integrators, platform=None, platformProperties=None, numThreads=None):
+        """Create a ReplicaManager.
+
+        Parameters
+        ----------
+        topology : Topology
+            A Topology describing the the system to simulate
+        system : System or list
+            The OpenMM System to simulate.  This may be either a single System
+            that is used for every replica, or a list containing one System for
+            each replica.
+        integrators : list
+            The Integrators to use for the replicas.  The number of replicas is
+            equal to the length of this list.  Every element must be a separate
+            Integrator object.
+        platform : Platform=None
+            If not None, the OpenMM Platform to use
+        platformProperties : map=None
+            If not None, a set of platform-specific properties to pass to each
+            Context's constructor
+        numThreads : int=None
+            The number of threads to use for advancing replicas.  If this is
+            None, one thread is used for every replica.
+        """
+        self._pool = None
+        numReplicas = len(integrators)
+        if numReplicas == 0:
+            raise ValueError('At least one Integrator must be specified')
+        if len(set(id(i) for i in integrators)) != numReplicas:
+            raise ValueError('Every replica must have its own Integrator')
+        if isinstance(system, (list, tuple)):
+            if len(system) != numReplicas:
+                raise ValueError('The number of Systems does not match the number of Integrators')
+            systems = system
+        else:
+            systems = [system]*numReplicas
+        ## The Simulation for each replica
+        self.simulations = [Simulation(topology, s, i, platform, platformProperties) for s, i in zip(systems, integrators)]
+        if numThreads is None:
+            numThreads = numReplicas
+        self._pool = ThreadPool(min(numThreads, numReplicas))
+        self._steps = [0]*numReplicas
+        self._elapsedTime = [0.0]*numReplicas
+
+    def __len__(self):
+        return len(self.simulations)
+
+    def close(self):
+        """Stop the threads used for running replicas.  The ReplicaManager cannot be used after this is called."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __del__(self):
+        self.close()
+
+    def _map(self, function, replicas=None):
+        """Call a function for a set of replicas in parallel, and return a list of the results."""
+        if replicas is None:
+            replicas = range(len(self.simulations))
+        return self._pool.map(function, replicas, chunksize=1)
+
+    def step(self, steps, replicas=None):
+        """Advance replicas by integrating a specified number of time steps.
+
+        Parameters
+        ----------
+        steps : int
+            The number of time steps to take
+        replicas : list=None
+            The indices of the replicas to advance.  If this is None, all
+            replicas are advanced.
+        """
+        def stepReplica(index):
+            start = time.time()
+            self.simulations[index].step(steps)
+            self._elapsedTime[index] += time.time()-start
+            self._steps[index] += steps
+        self._map(stepReplica, replicas)
+
+    def setPositions(self, positions, replicas=None):
+        """Set the particle positions of replicas.
+
+        Parameters
+        ----------
+        positions : list
+            The positions to set.  This is used for every replica.
+        replicas : list=None
+            The indices of the replicas to modify.  If this is None, all
+            replicas are modified.
+        """
+        self._map(lambda i: self.simulations[i].context.setPositions(positions), replicas)
+
+    def setVelocitiesToTemperature(self, temperatures, replicas=None):
+        """Set the velocities of replicas to random values chosen from a Boltzmann distribution.
+
+        Parameters
+        ----------
+        temperatures : temperature or list
+            The temperature to use.  This may be either a single value for all
+            replicas, or a list containing one value for each replica.
+        replicas : list=None
+            The indices of the replicas to modify.  If this is None, all
+            replicas are modified.
+        """
+        if not isinstance(temperatures, (list, tuple)):
+            temperatures = [temperatures]*len(self.simulations)
+        self._map(lambda i: self.simulations[i].context.setVelocitiesToTemperature(temperatures[i]), replicas)
+
+    def getPotentialEnergies(self, replicas=None):
+        """Compute the potential energy of replicas.
+
+        Parameters
+        ----------
+        replicas : list=None
+            The indices of the replicas to compute the energy of.  If this is
+            None, all replicas are included.
+
+        Returns
+        -------
+        list
+            The potential energy of each replica, in the same order as replicas
+        """
+        return self._map(lambda i: self.simulations[i].context.getState(getEnergy=True).getPotentialEnergy(), replicas)
+
+    def getStates(self, replicas=None, **args):
+        """Get State objects for replicas.  The keyword arguments are passed on to Context.getState().
+
+        Parameters
+        ----------
+        replicas : list=None
+            The indices of the replicas to get States for.  If this is None,
+            all replicas are included.
+
+        Returns
+        -------
+        list
+            The State of each replica, in the same order as replicas
+        """
+        return self._map(lambda i: self.simulations[i].context.getState(**args), replicas)
+
+    def _getConfiguration(self, index):
+        """Get the positions, velocities, and box vectors of a replica."""
+        state = self.simulations[index].context.getState(getPositions=True, getVelocities=True)
+        asNumpy = (numpy is not None)
+        return (state.getPositions(asNumpy=asNumpy), state.getVelocities(asNumpy=asNumpy), state.getPeriodicBoxVectors())
+
+    def _setConfiguration(self, index, configuration, velocityScale):
+        """Set the positions, velocities, and box vectors of a replica."""
+        context = self.simulations[index].context
+        positions, velocities, box = configuration
+        context.setPeriodicBoxVectors(*box)
+        context.setPositions(positions)
+        if velocityScale != 1.0:
+            if numpy is None:
+                velocities = [v*velocityScale for v in velocities]
+            else:
+                velocities = velocities*velocityScale
+        context.setVelocities(velocities)
+
+    def exchangeConfigurations(self, replica1, replica2, rescaleVelocities=False):
+        """Swap the positions, velocities, and periodic box vectors of two replicas.
+
+        Parameters
+        ----------
+        replica1 : int
+            The index of the first replica
+        replica2 : int
+            The index of the second replica
+        rescaleVelocities : bool=False
+            If True, the velocities are scaled by sqrt(T_new/T_old), where the
+            temperatures are taken from the two replicas' Integrators.  This is
+            appropriate for parallel tempering.
+        """
+        scale = 1.0
+        if rescaleVelocities:
+            t1 = self.simulations[replica1].integrator.getTemperature()
+            t2 = self.simulations[replica2].integrator.getTemperature()
+            scale = sqrt(t2/t1)
+        config1, config2 = self._map(self._getConfiguration, [replica1, replica2])
+        self._setConfiguration(replica1, config2, 1.0/scale)
+        self._setConfiguration(replica2, config1, scale)
+
+    def exchangeParameters(self, replica1, replica2, names=None):
+        """Swap the values of global parameters between two replicas.
+
+        Parameters
+        ----------
+        replica1 : int
+            The index of the first replica
+        replica2 : int
+            The index of the second replica
+        names : list=None
+            The names of the parameters to swap.  If this is None, every
+            parameter defined by the Context is swapped.
+        """
+        context1 = self.simulations[replica1].context
+        context2 = self.simulations[replica2].context
+        if names is None:
+            names = context1.getState(getParameters=True).getParameters().keys()
+        for name in names:
+            value1 = context1.getParameter(name)
+            context1.setParameter(name, context2.getParameter(name))
+            context2.setParameter(name, value1)
+
+    def getThroughput(self):
+        """Get the speed at which each replica has been advanced by step().
+
+        Returns
+        -------
+        list
+            The average number of time steps per second that have been taken
+            by each replica.  This includes time spent in reporters.
+        """
+        return [s/t if t > 0 else 0.0 for s, t in zip(self._steps, self._elapsedTime)]
@@ -35,6 +35,7 @@ __version__ = "1.0"
 import simtk.openmm as mm
 import simtk.unit as unit
 import sys
+import time
 from datetime import datetime, timedelta
 try:
     string_types = (unicode, str)
@@ -54,6 +55,13 @@ class Simulation(object):
     it every 1000 time steps:
 
     simulation.reporters.append(PDBReporter('output.pdb', 1000))
+
+    Each reporter's describeNextReport() method returns a tuple describing its next report.  The first five
+    elements give the number of steps until the report, and whether it requires positions, velocities, forces, and
+    energies.  A reporter may add a sixth element specifying whether positions should be wrapped into a single
+    periodic box.  If this is omitted or None, positions are wrapped if the System uses periodic boundary
+    conditions.  All reporters that report on the same step share a single State, which is created with the union
+    of the information they require.
     """
 
     def __init__(self, topology, system, integrator, platform=None, platformProperties=None, state=None):
@@ -83,19 +91,33 @@ class Simulation(object):
         ## The System being simulated
         if isinstance(system, string_types):
             with open(system, 'r') as f:
-                self.system = mm.XmlSerializer.deserialize(f.read())
+                self.system = mm.XmlSerializer.deserialize(f)
         else:
             self.system = system
         ## The Integrator used to advance the simulation
         if isinstance(integrator, string_types):
             with open(integrator, 'r') as f:
-                self.integrator = mm.XmlSerializer.deserialize(f.read())
+                self.integrator = mm.XmlSerializer.deserialize(f)
         else:
             self.integrator = integrator
         ## The index of the current time step
         self.currentStep = 0
         ## A list of reporters to invoke during the simulation
         self.reporters = []
+        ## The maximum number of steps by which a report may be moved earlier so that it coincides with
+        ## another reporter's report, allowing both to share a single State.  The default of 0 means reports
+        ## are never moved.
+        self.reportTolerance = 0
+        ## The target clock time (in seconds) between returns to Python while integrating.  The number of steps
+        ## taken by each call to the Integrator is adjusted based on the measured speed of the simulation.  Shorter
+        ## intervals make the simulation more responsive to Ctrl-C and to time limits, at the cost of more overhead.
+        self.pollingInterval = 0.1
+        ## If not None, a function that is called after each block of time steps with three arguments: this
+        ## Simulation, the measured speed in steps per second, and the measured speed in ns/day.
+        self.profilingHook = None
+        self._earlyReports = {}
+        self._secondsPerStep = None
+        self._chunkSize = 10
         if platform is None:
             ## The Context containing the current state of the simulation
             self.context = mm.Context(self.system, self.integrator)
@@ -105,7 +127,7 @@ class Simulation(object):
             self.context = mm.Context(self.system, self.integrator, platform, platformProperties)
         if state is not None:
             with open(state, 'r') as f:
-                self.context.setState(mm.XmlSerializer.deserialize(f.read()))
+                self.context.setState(mm.XmlSerializer.deserialize(f))
         ## Determines whether or not we are using PBC. Try from the System first,
         ## fall back to Topology if that doesn't work
         try:
@@ -185,38 +207,92 @@ class Simulation(object):
             nextSteps = endStep-self.currentStep
             anyReport = False
             for i, reporter in enumerate(self.reporters):
+                # If this reporter's next report was already generated early, skip it until that step is reached.
+                early = self._earlyReports.get(id(reporter))
+                if early is not None:
+                    if early[0] <= self.currentStep < early[1]:
+                        nextReport[i] = None
+                        nextSteps = min(nextSteps, early[1]-self.currentStep)
+                        continue
+                    del self._earlyReports[id(reporter)]
                 nextReport[i] = reporter.describeNextReport(self)
                 if nextReport[i][0] > 0 and nextReport[i][0] <= nextSteps:
                     nextSteps = nextReport[i][0]
                     anyReport = True
             stepsToGo = nextSteps
-            while stepsToGo > 10:
-                self.integrator.step(10) # Only take 10 steps at a time, to give Python more chances to respond to a control-c.
-                stepsToGo -= 10
-                if endTime is not None and datetime.now() >= endTime:
+            while stepsToGo > 0:
+                # Integrate in blocks, to give Python chances to respond to a control-c and to check the end time.
+                steps = min(stepsToGo, self._nextChunkSize(endTime))
+                startTime = time.time()
+                self.integrator.step(steps)
+                self._recordSpeed(steps, time.time()-startTime)
+                self.currentStep += steps
+                stepsToGo -= steps
+                if stepsToGo > 0 and endTime is not None and datetime.now() >= endTime:
                     return
-            self.integrator.step(stepsToGo)
-            self.currentStep += nextSteps
             if anyReport:
-                getPositions = False
-                getVelocities = False
-                getForces = False
-                getEnergy = False
-                for reporter, next in zip(self.reporters, nextReport):
-                    if next[0] == nextSteps:
-                        if next[1]:
-                            getPositions = True
-                        if next[2]:
-                            getVelocities = True
-                        if next[3]:
-                            getForces = True
-                        if next[4]:
-                            getEnergy = True
-                state = self.context.getState(getPositions=getPositions, getVelocities=getVelocities, getForces=getForces,
-                                              getEnergy=getEnergy, getParameters=True, enforcePeriodicBox=self._usesPBC)
-                for reporter, next in zip(self.reporters, nextReport):
-                    if next[0] == nextSteps:
-                        reporter.report(self, state)
+                self._generateReports(nextReport, nextSteps)
+
+    def _nextChunkSize(self, endTime):
+        """Select how many steps to take in the next call to the Integrator."""
+        steps = self._chunkSize
+        if self._secondsPerStep is not None:
+            # Aim for the polling interval, but do not grow by more than a factor of 2 at a time.
+
+            steps = min(2*steps, int(self.pollingInterval/self._secondsPerStep))
+            if endTime is not None:
+                remaining = (endTime-datetime.now()).total_seconds()
+                steps = min(steps, int(remaining/self._secondsPerStep))
+        self._chunkSize = max(1, steps)
+        return self._chunkSize
+
+    def _recordSpeed(self, steps, seconds):
+        """Update the measured speed of the simulation after taking a block of time steps."""
+        if seconds <= 0:
+            return
+        if self._secondsPerStep is None:
+            self._secondsPerStep = seconds/steps
+        else:
+            self._secondsPerStep = 0.5*(self._secondsPerStep+seconds/steps)
+        if self.profilingHook is not None:
+            stepsPerSecond = 1.0/self._secondsPerStep
+            nsPerDay = stepsPerSecond*86400*self.integrator.getStepSize().value_in_unit(unit.nanoseconds)
+            self.profilingHook(self, stepsPerSecond, nsPerDay)
+
+    def _generateReports(self, nextReport, nextSteps):
+        """Invoke all reporters whose reports are due at the current step.
+
+        The reporters are grouped by whether they want positions wrapped into the periodic box, and a single State
+        is created for each group (usually there is only one) containing everything its reporters require.
+        """
+        startStep = self.currentStep-nextSteps
+        if not any(next is not None and next[0] == nextSteps for next in nextReport):
+            return
+        due = []
+        requests = {}
+        for reporter, next in zip(self.reporters, nextReport):
+            if next is None:
+                continue
+            if next[0] == nextSteps:
+                pass
+            elif nextSteps < next[0] <= nextSteps+self.reportTolerance:
+                # Generate this report early, and remember not to generate it again at its scheduled step.
+                self._earlyReports[id(reporter)] = (self.currentStep, startStep+next[0])
+            else:
+                continue
+            wrap = (next[5] if len(next) > 5 and next[5] is not None else self._usesPBC)
+            due.append((reporter, wrap))
+            request = requests.setdefault(wrap, [False]*4)
+            for i in range(4):
+                if next[i+1]:
+                    request[i] = True
+        states = {}
+        for reporter, wrap in due:
+            if wrap not in states:
+                getPositions, getVelocities, getForces, getEnergy = requests[wrap]
+                states[wrap] = self.context.getState(getPositions=getPositions, getVelocities=getVelocities, getForces=getForces,
+                                                     getEnergy=getEnergy, getParameters=True, enforcePeriodicBox=wrap)
+            reporter.report(self, states[wrap])
 
     def saveCheckpoint(self, file):
         """Save a checkpoint of the simulation to a file.
@@ -243,7 +319,8 @@ class Simulation(object):
             file.write(self.context.createCheckpoint())
 
     def loadCheckpoint(self, file):
-        """Load a checkpoint file that was created with saveCheckpoint().
+        """Load a checkpoint file that was created with saveCheckpoint() or
+        CheckpointReporter.  Compressed checkpoints are recognized automatically.
 
         Parameters
         ----------
@@ -253,9 +330,16 @@ class Simulation(object):
         """
         if isinstance(file, str):
             with open(file, 'rb') as f:
-                self.context.loadCheckpoint(f.read())
+                chk = f.read()
         else:
-            self.context.loadCheckpoint(file.read())
+            chk = file.read()
+        if chk[:2] == b'\x1f\x8b':
+            # The checkpoint was compressed by CheckpointReporter.
+
+            import gzip
+            import io
+            chk = gzip.GzipFile(fileobj=io.BytesIO(chk)).read()
+        self.context.loadCheckpoint(chk)
 
     def saveState(self, file):
         """Save the current state of the simulation to a file.
@@ -286,6 +370,9 @@ class Simulation(object):
     def loadState(self, file):
         """Load a State file that was created with saveState().
 
+        The file is processed incrementally, so the XML document is never held
+        in memory all at once.
+
         Parameters
         ----------
         file : string or file
@@ -294,7 +381,7 @@ class Simulation(object):
         """
         if isinstance(file, str):
             with open(file, 'r') as f:
-                xml = f.read()
+                state = mm.XmlSerializer.deserialize(f)
         else:
-            xml = file.read()
-        self.context.setState(mm.XmlSerializer.deserialize(xml))
+            state = mm.XmlSerializer.deserialize(file)
+        self.context.setState(state)
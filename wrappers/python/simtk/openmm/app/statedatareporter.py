@@ -45,7 +45,9 @@ except: have_gzip = False
 
 import simtk.openmm as mm
 import simtk.unit as unit
+import ast
 import math
+import struct
 import time
 
 class StateDataReporter(object):
@@ -54,10 +56,17 @@ class StateDataReporter(object):
     To use it, create a StateDataReporter, then add it to the Simulation's list of reporters.  The set of
     data to write is configurable using boolean flags passed to the constructor.  By default the data is
     written in comma-separated-value (CSV) format, but you can specify a different separator to use.
+
+    Alternatively, the data can be written in a compact binary format by specifying binary=True.  Each report
+    is then stored as a fixed width record of double precision values, one for each column.  The file is a
+    valid NumPy .npy file containing a structured array, and it can be loaded with StateDataReporter.loadBinary().
+    In this format, progress is stored as a percentage, speed in ns/day, and remainingTime in seconds.  Values
+    that cannot yet be estimated are stored as NaN.
     """
 
     def __init__(self, file, reportInterval, step=False, time=False, potentialEnergy=False, kineticEnergy=False, totalEnergy=False, temperature=False, volume=False, density=False,
-                 progress=False, remainingTime=False, speed=False, elapsedTime=False, separator=',', systemMass=None, totalSteps=None):
+                 progress=False, remainingTime=False, speed=False, elapsedTime=False, separator=',', systemMass=None, totalSteps=None, binary=False, flushInterval=1,
+                 energyGroups=False):
         """Create a StateDataReporter.
 
         Parameters
@@ -108,12 +117,32 @@ class StateDataReporter(object):
             The total number of steps that will be included in the simulation.
             This is required if either progress or remainingTime is set to True,
             and defines how many steps will indicate 100% completion.
+        binary : bool=False
+            If True, write the data in binary format instead of as text.  This
+            is much faster and more compact for frequent reports.  A file that
+            is specified by name cannot be compressed in this mode.
+        flushInterval : int=1
+            The number of reports to collect before writing them to the file.
+            Larger values reduce the overhead of writing frequent reports.
+        energyGroups : bool or set=False
+            Whether to write the potential energy of each force group to the
+            file, with one column per group.  If this is True, every group that
+            contains at least one force is written.  It may instead be a set of
+            group indices to write.  The energies of all groups are computed
+            together with Context.getEnergiesByGroup().
         """
         self._reportInterval = reportInterval
+        self._pending = []
         self._openedFile = isinstance(file, str)
         if (progress or remainingTime) and totalSteps is None:
             raise ValueError('Reporting progress or remaining time requires total steps to be specified')
-        if self._openedFile:
+        if flushInterval < 1:
+            raise ValueError('flushInterval must be at least 1')
+        if self._openedFile and binary:
+            if file.endswith('.gz') or file.endswith('.bz2'):
+                raise ValueError('Binary output cannot be written to a compressed file')
+            self._out = open(file, 'wb')
+        elif self._openedFile:
             # Detect the desired compression scheme from the filename extension
             # and open all files unbuffered
             if file.endswith('.gz'):
@@ -140,9 +169,14 @@ class StateDataReporter(object):
         self._remainingTime = remainingTime
         self._speed = speed
         self._elapsedTime = elapsedTime
+        self._energyGroups = energyGroups
+        self._groupList = []
         self._separator = separator
         self._totalMass = systemMass
         self._totalSteps = totalSteps
+        self._binary = binary
+        self._flushInterval = flushInterval
+        self._numRecords = 0
         self._hasInitialized = False
         self._needsPositions = False
         self._needsVelocities = False
@@ -180,14 +214,17 @@ class StateDataReporter(object):
         """
         if not self._hasInitialized:
             self._initializeConstants(simulation)
-            headers = self._constructHeaders()
-            print('#"%s"' % ('"'+self._separator+'"').join(headers), file=self._out)
+            if self._binary:
+                self._writeBinaryHeader()
+            else:
+                headers = self._constructHeaders()
+                print('#"%s"' % ('"'+self._separator+'"').join(headers), file=self._out)
             try:
                 self._out.flush()
             except AttributeError:
                 pass
             self._initialClockTime = time.time()
-            self._initialSimulationTime = state.getTime()
+            self._initialSimulationTime = state.getTime().value_in_unit(unit.picosecond)
             self._initialSteps = simulation.currentStep
             self._hasInitialized = True
 
@@ -195,16 +232,98 @@ class StateDataReporter(object):
         self._checkForErrors(simulation, state)
 
         # Query for the values
-        values = self._constructReportValues(simulation, state)
+        values = self._constructReportValues(simulation, state, numeric=self._binary)
+
+        # Write the values once enough reports have been collected.
+        if self._binary:
+            self._pending.append(self._recordFormat.pack(*values))
+        else:
+            self._pending.append(self._separator.join(str(v) for v in values))
+        if len(self._pending) >= self._flushInterval:
+            self._flush()
 
-        # Write the values.
-        print(self._separator.join(str(v) for v in values), file=self._out)
+    def _flush(self):
+        """Write all pending reports to the file."""
+        if len(self._pending) == 0:
+            return
+        if self._binary:
+            self._out.write(b''.join(self._pending))
+            self._numRecords += len(self._pending)
+        else:
+            print('\n'.join(self._pending), file=self._out)
+        self._pending = []
+        if self._binary:
+            self._updateBinaryHeader()
         try:
             self._out.flush()
         except AttributeError:
             pass
 
-    def _constructReportValues(self, simulation, state):
+    def _writeBinaryHeader(self):
+        """Write the header of a binary file.  This follows the NumPy .npy format, with space reserved
+        for updating the number of records as they are written.
+        """
+        fields = self._constructFieldNames()
+        self._recordFormat = struct.Struct('<%dd' % len(fields))
+        descr = '[%s]' % ''.join("('%s', '<f8'), " % f for f in fields)
+        header = "{'descr': %s, 'fortran_order': False, 'shape': (" % descr
+        shapeOffset = 10+len(header)
+        header += "%20d,), }" % 0
+        header += ' '*(63-(10+len(header))%64) + '\n'
+        try:
+            self._shapePosition = self._out.tell()+shapeOffset
+        except (AttributeError, IOError, ValueError):
+            self._shapePosition = None
+        self._out.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin-1'))
+
+    def _updateBinaryHeader(self):
+        """Record the number of records in the header of a binary file, if the file supports seeking."""
+        if self._shapePosition is None:
+            return
+        try:
+            end = self._out.tell()
+            self._out.seek(self._shapePosition)
+            self._out.write(('%20d' % self._numRecords).encode('latin-1'))
+            self._out.seek(end)
+        except (AttributeError, IOError, ValueError):
+            self._shapePosition = None
+
+    @staticmethod
+    def loadBinary(file):
+        """Load a file that was written by a StateDataReporter in binary format.
+
+        Parameters
+        ----------
+        file : string or file
+            The file to read, specified as a file name or file object
+
+        Returns
+        -------
+        numpy.ndarray
+            A structured array with one element for each report.  The field
+            names are the names of the corresponding constructor arguments,
+            such as 'step' or 'potentialEnergy'.  The energy of force group i
+            is stored in the field 'groupEnergy<i>'.  Values are in the same
+            units as the text format.
+        """
+        import numpy
+        if isinstance(file, str):
+            with open(file, 'rb') as f:
+                data = f.read()
+        else:
+            data = file.read()
+        if data[:8] != b'\x93NUMPY\x01\x00':
+            raise ValueError('The file was not written by a StateDataReporter in binary format')
+        headerLength = struct.unpack('<H', data[8:10])[0]
+        header = ast.literal_eval(data[10:10+headerLength].decode('latin-1'))
+        dtype = numpy.dtype([(str(name), format) for name, format in header['descr']])
+
+        # Ignore the count stored in the header, since the reporter may not have updated it.
+
+        count = (len(data)-10-headerLength)//dtype.itemsize
+        return numpy.frombuffer(data, dtype=dtype, count=count, offset=10+headerLength).copy()
+
+    def _constructReportValues(self, simulation, state, numeric=False):
         """Query the simulation for the current state of our observables of interest.
 
         Parameters
@@ -213,6 +332,9 @@ class StateDataReporter(object):
             The Simulation to generate a report for
         state : State
             The current state of the simulation
+        numeric : bool=False
+            If True, every value is returned as a number, rather than
+            formatting some of them as strings
 
         Returns
         -------
@@ -221,41 +343,53 @@ class StateDataReporter(object):
         corresponds to one of the columns in the resulting CSV file.
         """
         values = []
-        box = state.getPeriodicBoxVectors()
-        volume = box[0][0]*box[1][1]*box[2][2]
+        if self._volume or self._density:
+            volume = state.getPeriodicBoxVolume().value_in_unit(unit.nanometer**3)
         clockTime = time.time()
+        simTime = state.getTime().value_in_unit(unit.picosecond)
+        if self._needEnergy:
+            potentialEnergy = state.getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole)
+            kineticEnergy = state.getKineticEnergy().value_in_unit(unit.kilojoules_per_mole)
         if self._progress:
-            values.append('%.1f%%' % (100.0*simulation.currentStep/self._totalSteps))
+            progress = 100.0*simulation.currentStep/self._totalSteps
+            values.append(progress if numeric else '%.1f%%' % progress)
         if self._step:
             values.append(simulation.currentStep)
         if self._time:
-            values.append(state.getTime().value_in_unit(unit.picosecond))
+            values.append(simTime)
         if self._potentialEnergy:
-            values.append(state.getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole))
+            values.append(potentialEnergy)
         if self._kineticEnergy:
-            values.append(state.getKineticEnergy().value_in_unit(unit.kilojoules_per_mole))
+            values.append(kineticEnergy)
         if self._totalEnergy:
-            values.append((state.getKineticEnergy()+state.getPotentialEnergy()).value_in_unit(unit.kilojoules_per_mole))
+            values.append(kineticEnergy+potentialEnergy)
+        if len(self._groupList) > 0:
+            energies = simulation.context.getEnergiesByGroup(self._groupMask)
+            for group in self._groupList:
+                values.append(energies[group].value_in_unit(unit.kilojoules_per_mole))
         if self._temperature:
-            values.append((2*state.getKineticEnergy()/(self._dof*unit.MOLAR_GAS_CONSTANT_R)).value_in_unit(unit.kelvin))
+            values.append(kineticEnergy*self._temperatureScale)
         if self._volume:
-            values.append(volume.value_in_unit(unit.nanometer**3))
+            values.append(volume)
         if self._density:
-            values.append((self._totalMass/volume).value_in_unit(unit.gram/unit.item/unit.milliliter))
+            values.append(self._densityScale/volume)
         if self._speed:
             elapsedDays = (clockTime-self._initialClockTime)/86400.0
-            elapsedNs = (state.getTime()-self._initialSimulationTime).value_in_unit(unit.nanosecond)
+            elapsedNs = (simTime-self._initialSimulationTime)/1000.0
             if elapsedDays > 0.0:
-                values.append('%.3g' % (elapsedNs/elapsedDays))
+                values.append(elapsedNs/elapsedDays if numeric else '%.3g' % (elapsedNs/elapsedDays))
             else:
-                values.append('--')
+                values.append(float('nan') if numeric else '--')
         if self._elapsedTime:
             values.append(time.time() - self._initialClockTime)
         if self._remainingTime:
             elapsedSeconds = clockTime-self._initialClockTime
             elapsedSteps = simulation.currentStep-self._initialSteps
             if elapsedSteps == 0:
-                value = '--'
+                value = float('nan') if numeric else '--'
+            elif numeric:
+                estimatedTotalSeconds = (self._totalSteps-self._initialSteps)*elapsedSeconds/elapsedSteps
+                value = estimatedTotalSeconds-elapsedSeconds
             else:
                 estimatedTotalSeconds = (self._totalSteps-self._initialSteps)*elapsedSeconds/elapsedSteps
                 remainingSeconds = int(estimatedTotalSeconds-elapsedSeconds)
@@ -283,6 +417,17 @@ class StateDataReporter(object):
         - simulation (Simulation) The simulation to generate a report for
         """
         system = simulation.system
+        if self._energyGroups:
+            # Find which groups contain forces.
+            groups = set()
+            for force in system.getForces():
+                groups.add(force.getForceGroup())
+                if isinstance(force, mm.NonbondedForce) and force.getReciprocalSpaceForceGroup() >= 0:
+                    groups.add(force.getReciprocalSpaceForceGroup())
+            if self._energyGroups is not True:
+                groups.intersection_update(self._energyGroups)
+            self._groupList = sorted(groups)
+            self._groupMask = sum(1<<group for group in self._groupList)
         if self._temperature:
             # Compute the number of degrees of freedom.
             dof = 0
@@ -293,6 +438,9 @@ class StateDataReporter(object):
             if any(type(system.getForce(i)) == mm.CMMotionRemover for i in range(system.getNumForces())):
                 dof -= 3
             self._dof = dof
+
+            # Precompute the factor to convert kinetic energy (in kJ/mol) to temperature.
+            self._temperatureScale = (2*unit.kilojoules_per_mole/(dof*unit.MOLAR_GAS_CONSTANT_R)).value_in_unit(unit.kelvin)
         if self._density:
             if self._totalMass is None:
                 # Compute the total system mass.
@@ -302,6 +450,9 @@ class StateDataReporter(object):
             elif not unit.is_quantity(self._totalMass):
                 self._totalMass = self._totalMass*unit.dalton
 
+            # Precompute the factor to convert inverse volume (in nm^-3) to density.
+            self._densityScale = (self._totalMass/unit.nanometer**3).value_in_unit(unit.gram/unit.item/unit.milliliter)
+
     def _constructHeaders(self):
         """Construct the headers for the CSV output
 
@@ -320,6 +471,8 @@ class StateDataReporter(object):
             headers.append('Kinetic Energy (kJ/mole)')
         if self._totalEnergy:
             headers.append('Total Energy (kJ/mole)')
+        for group in self._groupList:
+            headers.append('Group %d Energy (kJ/mole)' % group)
         if self._temperature:
             headers.append('Temperature (K)')
         if self._volume:
@@ -334,6 +487,17 @@ class StateDataReporter(object):
             headers.append('Time Remaining')
         return headers
 
+    def _constructFieldNames(self):
+        """Construct the names of the fields for the binary output
+
+        Returns: a list of strings giving the name of each observable being reported on.
+        """
+        names = ['progress', 'step', 'time', 'potentialEnergy', 'kineticEnergy', 'totalEnergy']
+        names = [name for name in names if getattr(self, '_'+name)]
+        names += ['groupEnergy%d' % group for group in self._groupList]
+        names += [name for name in ['temperature', 'volume', 'density', 'speed', 'elapsedTime', 'remainingTime'] if getattr(self, '_'+name)]
+        return names
+
     def _checkForErrors(self, simulation, state):
         """Check for errors in the current state of the simulation
 
@@ -342,12 +506,14 @@ class StateDataReporter(object):
          - state (State) The current state of the simulation
         """
         if self._needEnergy:
-            energy = (state.getKineticEnergy()+state.getPotentialEnergy()).value_in_unit(unit.kilojoules_per_mole)
+            energy = state.getKineticEnergy().value_in_unit(unit.kilojoules_per_mole)+state.getPotentialEnergy().value_in_unit(unit.kilojoules_per_mole)
             if math.isnan(energy):
                 raise ValueError('Energy is NaN')
             if math.isinf(energy):
                 raise ValueError('Energy is infinite')
 
     def __del__(self):
+        if self._pending:
+            self._flush()
         if self._openedFile:
             self._out.close()
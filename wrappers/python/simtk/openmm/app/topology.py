@@ -36,6 +36,7 @@ import os
 import xml.etree.ElementTree as etree
 from simtk.openmm.vec3 import Vec3
 from simtk.unit import nanometers, sqrt, is_quantity
+from simtk.openmm.app.internal.celllist import CellList
 from copy import deepcopy
 
 class Topology(object):
@@ -303,24 +304,27 @@ class Topology(object):
         Parameters
         ----------
         positions : list
-            The list of atomic positions based on which to identify bonded atoms
+            The list of atomic positions based on which to identify bonded atoms.
+            This may be a list of Vec3 objects or an (N,3) numpy array.
         """
         def isCyx(res):
             names = [atom.name for atom in res._atoms]
             return 'SG' in names and 'HG' not in names
 
+        # Find the sulfur atoms and their positions, then use a cell list to find all pairs that are close
+        # enough to be bonded.
+
         cyx = [res for res in self.residues() if res.name == 'CYS' and isCyx(res)]
-        atomNames = [[atom.name for atom in res._atoms] for res in cyx]
-        for i in range(len(cyx)):
-            sg1 = cyx[i]._atoms[atomNames[i].index('SG')]
-            pos1 = positions[sg1.index]
-            for j in range(i):
-                sg2 = cyx[j]._atoms[atomNames[j].index('SG')]
-                pos2 = positions[sg2.index]
-                delta = [x-y for (x,y) in zip(pos1, pos2)]
-                distance = sqrt(delta[0]*delta[0] + delta[1]*delta[1] + delta[2]*delta[2])
-                if distance < 0.3*nanometers:
-                    self.addBond(sg1, sg2)
+        sulfurs = [[atom for atom in res._atoms if atom.name == 'SG'][0] for res in cyx]
+        sulfurPositions = []
+        for atom in sulfurs:
+            pos = positions[atom.index]
+            if is_quantity(pos):
+                pos = pos.value_in_unit(nanometers)
+            sulfurPositions.append(pos)
+        pairs = CellList(sulfurPositions, 0.3*nanometers).pairs()
+        for i, j in sorted(pairs, key=lambda pair: (pair[1], pair[0])):
+            self.addBond(sulfurs[j], sulfurs[i])
 
 class Chain(object):
     """A Chain object represents a chain within a Topology."""
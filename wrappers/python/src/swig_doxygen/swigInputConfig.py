@@ -89,6 +89,7 @@ SKIP_METHODS = [('State',),
                 ('WcaDispersionInfo',),
                 ('Context',  'getState'),
                 ('Context',  'setState'),
+                ('Context',  'getEnergiesByGroup'),
                 ('Context',  'createCheckpoint'),
                 ('Context',  'loadCheckpoint'),
                 ('CudaPlatform',),
@@ -108,6 +109,8 @@ SKIP_METHODS = [('State',),
                 ('IntegrateDrudeSCFStepKernel',),
                 ('XmlSerializer',  'serialize'),
                 ('XmlSerializer',  'deserialize'),
+                ('BinarySerializer',  'serialize'),
+                ('BinarySerializer',  'deserialize'),
 ]
 
 # The build script assumes method args that are non-const references are
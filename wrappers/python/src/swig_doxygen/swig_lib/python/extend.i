@@ -49,6 +49,20 @@
     return _convertStateToLists(state);
   }
 
+  std::vector<double> _getEnergiesByGroup(bitmask32t groups) {
+    std::vector<double> energies;
+    PyThreadState* _savePythonThreadState = PyEval_SaveThread();
+    try {
+        self->getEnergiesByGroup(energies, groups);
+    }
+    catch (...) {
+        PyEval_RestoreThread(_savePythonThreadState);
+        throw;
+    }
+    PyEval_RestoreThread(_savePythonThreadState);
+    return energies;
+  }
+
 
   %pythoncode %{
     def getState(self, getPositions=False, getVelocities=False,
@@ -123,13 +137,53 @@
         """
         self.setTime(state._simTime)
         self.setPeriodicBoxVectors(state._periodicBoxVectorsList[0], state._periodicBoxVectorsList[1], state._periodicBoxVectorsList[2])
+        asNumpy = (numpy is not None)
         if state._coordList is not None:
-             self.setPositions(state._coordList)
+             self.setPositions(state.getPositions(asNumpy=asNumpy))
         if state._velList is not None:
-             self.setVelocities(state._velList)
+             self.setVelocities(state.getVelocities(asNumpy=asNumpy))
         if state._paramMap is not None:
              for param in state._paramMap:
                  self.setParameter(param, state._paramMap[param])
+
+    def getEnergiesByGroup(self, groups=-1):
+        """Compute the potential energy of each force group.
+
+        This gives the same energies as calling getState() once for each group,
+        but on platforms that support it, the energies of all groups are
+        computed together in a single evaluation of the forces.
+
+        Parameters
+        ----------
+        groups : set={0,1,2,...,31}
+            a set of indices for which force groups to include. The default
+            value includes all groups. groups can also be passed as an unsigned
+            integer interpreted as a bitmask, in which case group i will be
+            included if (groups&(1<<i)) != 0.
+
+        Returns
+        -------
+        a dict mapping the index of each included group that contains at least
+        one force to its potential energy
+        """
+        try:
+            groups_mask = int(groups)
+        except TypeError:
+            if isinstance(groups, set):
+                groups_mask = functools.reduce(operator.or_,
+                        ((1<<x) & 0xffffffff for x in groups), 0)
+            else:
+                raise TypeError('%s is neither an int nor set' % groups)
+        groups_mask &= 0xffffffff
+        system = self.getSystem()
+        usedGroups = set()
+        for i in range(system.getNumForces()):
+            force = system.getForce(i)
+            usedGroups.add(force.getForceGroup())
+            if isinstance(force, NonbondedForce) and force.getReciprocalSpaceForceGroup() >= 0:
+                usedGroups.add(force.getReciprocalSpaceForceGroup())
+        energies = self._getEnergiesByGroup(groups_mask)
+        return dict((group, energies[group]*unit.kilojoules_per_mole) for group in sorted(usedGroups) if groups_mask & (1<<group) != 0)
   %}
 
   %feature("docstring") createCheckpoint "Create a checkpoint recording the current state of the Context.
@@ -326,6 +380,14 @@ Parameters:
       return OpenMM::XmlSerializer::deserialize<OpenMM::System>(ss);
   }
 
+  %newobject _deserializeSystemFromFile;
+  static OpenMM::System* _deserializeSystemFromFile(PyObject* file) {
+      OpenMM::PythonFileStreamBuf buffer(file);
+      std::istream stream(&buffer);
+      stream.exceptions(std::ios::badbit);
+      return OpenMM::XmlSerializer::deserialize<OpenMM::System>(stream);
+  }
+
   static std::string _serializeForce(const OpenMM::Force* object) {
       std::stringstream ss;
       OpenMM::XmlSerializer::serialize<OpenMM::Force>(object, "Force", ss);
@@ -339,6 +401,14 @@ Parameters:
       return OpenMM::XmlSerializer::deserialize<OpenMM::Force>(ss);
   }
 
+  %newobject _deserializeForceFromFile;
+  static OpenMM::Force* _deserializeForceFromFile(PyObject* file) {
+      OpenMM::PythonFileStreamBuf buffer(file);
+      std::istream stream(&buffer);
+      stream.exceptions(std::ios::badbit);
+      return OpenMM::XmlSerializer::deserialize<OpenMM::Force>(stream);
+  }
+
   static std::string _serializeIntegrator(const OpenMM::Integrator* object) {
       std::stringstream ss;
       OpenMM::XmlSerializer::serialize<OpenMM::Integrator>(object, "Integrator", ss);
@@ -352,6 +422,14 @@ Parameters:
       return OpenMM::XmlSerializer::deserialize<OpenMM::Integrator>(ss);
   }
 
+  %newobject _deserializeIntegratorFromFile;
+  static OpenMM::Integrator* _deserializeIntegratorFromFile(PyObject* file) {
+      OpenMM::PythonFileStreamBuf buffer(file);
+      std::istream stream(&buffer);
+      stream.exceptions(std::ios::badbit);
+      return OpenMM::XmlSerializer::deserialize<OpenMM::Integrator>(stream);
+  }
+
   static std::string _serializeStateAsLists(
                                 const std::vector<Vec3>& pos,
                                 const std::vector<Vec3>& vel,
@@ -379,7 +457,7 @@ Parameters:
 
   %pythoncode %{
     @staticmethod
-    def _serializeState(pythonState):
+    def _getStateLists(pythonState):
       positions = []
       velocities = []
       forces = []
@@ -387,18 +465,19 @@ Parameters:
       potentialEnergy = 0.0
       params = {}
       types = 0
+      asNumpy = (numpy is not None)
       try:
-        positions = pythonState.getPositions().value_in_unit(unit.nanometers)
+        positions = pythonState.getPositions(asNumpy=asNumpy).value_in_unit(unit.nanometers)
         types |= 1
       except:
         pass
       try:
-        velocities = pythonState.getVelocities().value_in_unit(unit.nanometers/unit.picoseconds)
+        velocities = pythonState.getVelocities(asNumpy=asNumpy).value_in_unit(unit.nanometers/unit.picoseconds)
         types |= 2
       except:
         pass
       try:
-        forces = pythonState.getForces().value_in_unit(unit.kilojoules_per_mole/unit.nanometers)
+        forces = pythonState.getForces(asNumpy=asNumpy).value_in_unit(unit.kilojoules_per_mole/unit.nanometers)
         types |= 4
       except:
         pass
@@ -415,14 +494,17 @@ Parameters:
         pass
       time = pythonState.getTime().value_in_unit(unit.picoseconds)
       boxVectors = pythonState.getPeriodicBoxVectors().value_in_unit(unit.nanometers)
-      string = XmlSerializer._serializeStateAsLists(positions, velocities, forces, kineticEnergy, potentialEnergy, time, boxVectors, params, types)
-      return string
+      return (positions, velocities, forces, kineticEnergy, potentialEnergy, time, boxVectors, params, types)
 
     @staticmethod
-    def _deserializeState(pythonString):
+    def _serializeState(pythonState):
+      string = XmlSerializer._serializeStateAsLists(*XmlSerializer._getStateLists(pythonState))
+      return string
 
+    @staticmethod
+    def _createStateFromLists(lists):
       (simTime, periodicBoxVectorsList, energy, coordList, velList,
-       forceList, paramMap) = XmlSerializer._deserializeStringIntoLists(pythonString)
+       forceList, paramMap) = lists
 
       state = State(simTime=simTime,
                     energy=energy,
@@ -433,6 +515,83 @@ Parameters:
                     paramMap=paramMap)
       return state
 
+    @staticmethod
+    def _deserializeState(pythonString):
+      return XmlSerializer._createStateFromLists(XmlSerializer._deserializeStringIntoLists(pythonString))
+
+    @staticmethod
+    def _deserializeStateFromFile(file):
+      import xml.etree.ElementTree as etree
+      simTime = None
+      energy = None
+      params = None
+      boxVectors = {}
+      vectors = {'Positions': None, 'Velocities': None, 'Forces': None}
+      vectorTags = {'Position': 'Positions', 'Velocity': 'Velocities', 'Force': 'Forces'}
+      parents = []
+      for event, element in etree.iterparse(file, events=('start', 'end')):
+        tag = element.tag
+        if event == 'start':
+          if tag in vectors:
+            vectors[tag] = []
+          parents.append(element)
+          continue
+        parents.pop()
+        if tag in vectorTags and parents[-1].tag == vectorTags[tag]:
+          vectors[vectorTags[tag]].append(Vec3(float(element.get('x')), float(element.get('y')), float(element.get('z'))))
+
+          # Discard each particle once it has been processed, so memory does not grow with the size of the document.
+
+          del parents[-1][:]
+        elif tag in ('A', 'B', 'C') and parents[-1].tag == 'PeriodicBoxVectors':
+          boxVectors[tag] = Vec3(float(element.get('x')), float(element.get('y')), float(element.get('z')))
+        elif tag == 'Energies':
+          energy = (float(element.get('KineticEnergy')), float(element.get('PotentialEnergy')))
+        elif tag == 'Parameters':
+          params = dict((name, float(value)) for name, value in element.items())
+        elif tag == 'State':
+          if int(element.get('version')) != 1:
+            raise ValueError("Unsupported version number")
+          simTime = float(element.get('time'))
+      sizes = set(len(v) for v in vectors.values() if v is not None)
+      if len(sizes) > 1:
+        raise ValueError("State Deserialization Particle Size Mismatch, check number of particles in Forces, Velocities, Positions!")
+      return State(simTime=simTime,
+                   energy=energy,
+                   coordList=vectors['Positions'],
+                   velList=vectors['Velocities'],
+                   forceList=vectors['Forces'],
+                   periodicBoxVectorsList=(boxVectors['A'], boxVectors['B'], boxVectors['C']),
+                   paramMap=params)
+
+    @staticmethod
+    def _deserializeFile(file):
+      import re
+
+      # Read enough of the file to identify the type of object, then process the rest of it incrementally.
+
+      head = file.read(4096)
+      while True:
+        text = (head.decode('utf-8', 'ignore') if isinstance(head, bytes) else head)
+        match = re.search("<([^?!][^\\s/>]*)", text)
+        if match is not None:
+          break
+        data = file.read(4096)
+        if len(data) == 0:
+          raise ValueError("Invalid input file")
+        head += data
+      type = match.groups()[0]
+      file = _PrefixedFile(head, file)
+      if type == "System":
+        return XmlSerializer._deserializeSystemFromFile(file)
+      if type == "Force":
+        return XmlSerializer._deserializeForceFromFile(file)
+      if type == "Integrator":
+        return XmlSerializer._deserializeIntegratorFromFile(file)
+      if type == "State":
+        return XmlSerializer._deserializeStateFromFile(file)
+      raise ValueError("Unsupported object type")
+
     @staticmethod
     def serialize(object):
       """Serialize an object as XML."""
@@ -448,7 +607,17 @@ Parameters:
 
     @staticmethod
     def deserialize(inputString):
-      """Reconstruct an object that has been serialized as XML."""
+      """Reconstruct an object that has been serialized as XML.
+
+      Parameters
+      ----------
+      inputString : string or file
+          the XML to deserialize, or a file-like object to read it from.  A
+          file is processed incrementally, without first reading the whole
+          document into memory.
+      """
+      if hasattr(inputString, 'read'):
+        return XmlSerializer._deserializeFile(inputString)
       import re
       match = re.search("<([^?]\S*)", inputString)
       if match is None:
@@ -466,6 +635,135 @@ Parameters:
   %}
 }
 
+%extend OpenMM::BinarySerializer {
+  static PyObject* _serializeSystem(const OpenMM::System* object, bool compress) {
+      std::stringstream ss;
+      OpenMM::BinarySerializer::serialize<OpenMM::System>(object, "System", ss, compress);
+      std::string data = ss.str();
+      return PyBytes_FromStringAndSize(data.c_str(), data.length());
+  }
+
+  %newobject _deserializeSystem;
+  static OpenMM::System* _deserializeSystem(std::string inputData) {
+      std::stringstream ss(inputData);
+      return OpenMM::BinarySerializer::deserialize<OpenMM::System>(ss);
+  }
+
+  static PyObject* _serializeForce(const OpenMM::Force* object, bool compress) {
+      std::stringstream ss;
+      OpenMM::BinarySerializer::serialize<OpenMM::Force>(object, "Force", ss, compress);
+      std::string data = ss.str();
+      return PyBytes_FromStringAndSize(data.c_str(), data.length());
+  }
+
+  %newobject _deserializeForce;
+  static OpenMM::Force* _deserializeForce(std::string inputData) {
+      std::stringstream ss(inputData);
+      return OpenMM::BinarySerializer::deserialize<OpenMM::Force>(ss);
+  }
+
+  static PyObject* _serializeIntegrator(const OpenMM::Integrator* object, bool compress) {
+      std::stringstream ss;
+      OpenMM::BinarySerializer::serialize<OpenMM::Integrator>(object, "Integrator", ss, compress);
+      std::string data = ss.str();
+      return PyBytes_FromStringAndSize(data.c_str(), data.length());
+  }
+
+  %newobject _deserializeIntegrator;
+  static OpenMM::Integrator* _deserializeIntegrator(std::string inputData) {
+      std::stringstream ss(inputData);
+      return OpenMM::BinarySerializer::deserialize<OpenMM::Integrator>(ss);
+  }
+
+  static PyObject* _serializeStateAsLists(
+                                const std::vector<Vec3>& pos,
+                                const std::vector<Vec3>& vel,
+                                const std::vector<Vec3>& forces,
+                                double kineticEnergy,
+                                double potentialEnergy,
+                                double time,
+                                const std::vector<Vec3>& boxVectors,
+                                const std::map<string, double>& params,
+                                int types,
+                                bool compress) {
+    OpenMM::State myState =  _convertListsToState(pos,vel,forces,kineticEnergy,potentialEnergy,time,boxVectors,params,types);
+    std::stringstream ss;
+    OpenMM::BinarySerializer::serialize<OpenMM::State>(&myState, "State", ss, compress);
+    std::string data = ss.str();
+    return PyBytes_FromStringAndSize(data.c_str(), data.length());
+  }
+
+  static PyObject* _deserializeStateIntoLists(std::string inputData) {
+    std::stringstream ss(inputData);
+    OpenMM::State* deserializedState = OpenMM::BinarySerializer::deserialize<OpenMM::State>(ss);
+    PyObject* obj = _convertStateToLists(*deserializedState);
+    delete deserializedState;
+    return obj;
+  }
+
+  %pythoncode %{
+    @staticmethod
+    def serialize(object, compress=False):
+      """Serialize an object in binary format.
+
+      Parameters
+      ----------
+      object : System, Force, Integrator, or State
+          the object to serialize
+      compress : bool=False
+          if True, compress the data.  This requires that OpenMM was built
+          with zlib support (see isCompressionSupported()).
+
+      Returns
+      -------
+      bytes
+          the serialized object
+      """
+      if isinstance(object, System):
+        return BinarySerializer._serializeSystem(object, compress)
+      elif isinstance(object, Force):
+        return BinarySerializer._serializeForce(object, compress)
+      elif isinstance(object, Integrator):
+        return BinarySerializer._serializeIntegrator(object, compress)
+      elif isinstance(object, State):
+        lists = XmlSerializer._getStateLists(object)
+        return BinarySerializer._serializeStateAsLists(*(lists+(compress,)))
+      raise ValueError("Unsupported object type")
+
+    @staticmethod
+    def deserialize(inputData):
+      """Reconstruct an object that has been serialized in binary format.
+
+      Parameters
+      ----------
+      inputData : bytes
+          the data created by serialize()
+      """
+      import struct
+      if len(inputData) < 14 or inputData[:4] != b'OMMB':
+        raise ValueError("Invalid input data")
+
+      # The name of the root node is the first thing in the data, so decode just enough to read it.
+
+      payload = inputData[14:]
+      if ord(inputData[5:6]) & 1:
+        # Compressed data is preceded by its length.
+        import zlib
+        payload = zlib.decompressobj().decompress(payload[8:], 64)
+      length = struct.unpack('<I', payload[:4])[0]
+      type = payload[4:4+length].decode('utf-8')
+      if type == "System":
+        return BinarySerializer._deserializeSystem(inputData)
+      if type == "Force":
+        return BinarySerializer._deserializeForce(inputData)
+      if type == "Integrator":
+        return BinarySerializer._deserializeIntegrator(inputData)
+      if type == "State":
+        return XmlSerializer._createStateFromLists(BinarySerializer._deserializeStateIntoLists(inputData))
+      raise ValueError("Unsupported object type")
+  %}
+}
+
 %extend OpenMM::CustomIntegrator {
     PyObject* getPerDofVariable(int index) const {
         std::vector<Vec3> values;
@@ -20,6 +20,25 @@ PyObject *copyVVec3ToList(std::vector<Vec3> vVec3) {
   return pyList;
 }
 
+/**
+ * Copy a vector of Vec3 into a bytearray of packed doubles.  On the Python side this can be wrapped in a
+ * numpy array without copying, and without creating a Python object for every element.
+ */
+PyObject *copyVVec3ToBuffer(const std::vector<Vec3>& vVec3) {
+  int n = vVec3.size();
+  PyObject* buffer = PyByteArray_FromStringAndSize(NULL, 3*n*sizeof(double));
+  if (buffer == NULL)
+    throw OpenMMException("Failed to allocate memory");
+  double* data = (double*) PyByteArray_AsString(buffer);
+  for (int i = 0; i < n; i++) {
+    const Vec3& v = vVec3[i];
+    data[3*i] = v[0];
+    data[3*i+1] = v[1];
+    data[3*i+2] = v[2];
+  }
+  return buffer;
+}
+
 State _convertListsToState( const std::vector<Vec3> &pos, 
                             const std::vector<Vec3> &vel, 
                             const std::vector<Vec3> &forces,
@@ -44,6 +63,39 @@ State _convertListsToState( const std::vector<Vec3> &pos,
     return sb.getState();
 }
 
+/**
+ * A streambuf that reads from a Python file-like object one block at a time, so C++ code can process
+ * a file without it first being read into memory.
+ */
+class PythonFileStreamBuf : public std::streambuf {
+public:
+    PythonFileStreamBuf(PyObject* file) : file(file) {
+    }
+protected:
+    int_type underflow() {
+        PyObject* data = PyObject_CallMethod(file, (char*) "read", (char*) "i", 65536);
+        if (data != NULL && PyUnicode_Check(data)) {
+            PyObject* bytes = PyUnicode_AsUTF8String(data);
+            Py_DECREF(data);
+            data = bytes;
+        }
+        if (data == NULL || !PyBytes_Check(data)) {
+            Py_XDECREF(data);
+            PyErr_Clear();
+            throw OpenMMException("Error reading from file");
+        }
+        buffer.assign(PyBytes_AsString(data), PyBytes_Size(data));
+        Py_DECREF(data);
+        if (buffer.size() == 0)
+            return traits_type::eof();
+        setg(&buffer[0], &buffer[0], &buffer[0]+buffer.size());
+        return traits_type::to_int_type(buffer[0]);
+    }
+private:
+    PyObject* file;
+    std::string buffer;
+};
+
 PyObject *_convertStateToLists(const State& state) {
     double simTime;
     PyObject *pPeriodicBoxVectorsList;
@@ -73,21 +125,21 @@ PyObject *_convertStateToLists(const State& state) {
     pPeriodicBoxVectorsList = Py_BuildValue("N,N,N", pyVec1, pyVec2, pyVec3);
 
     try {
-      pPositions = copyVVec3ToList(state.getPositions());
+      pPositions = copyVVec3ToBuffer(state.getPositions());
     }
     catch (std::exception& ex) {
       pPositions = Py_None;
       Py_INCREF(Py_None);
     }
     try {
-      pVelocities = copyVVec3ToList(state.getVelocities());
+      pVelocities = copyVVec3ToBuffer(state.getVelocities());
     }
     catch (std::exception& ex) {
       pVelocities = Py_None;
       Py_INCREF(Py_None);
     }
     try {
-      pForces = copyVVec3ToList(state.getForces());
+      pForces = copyVVec3ToBuffer(state.getForces());
     }
     catch (std::exception& ex) {
       pForces = Py_None;
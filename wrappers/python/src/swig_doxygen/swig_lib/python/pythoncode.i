@@ -5,6 +5,7 @@ try:
 except ImportError:
     numpy = None
 
+import array
 import copy
 import sys
 import math
@@ -20,6 +21,28 @@ else:
 import simtk.unit as unit
 from simtk.openmm.vec3 import Vec3
 
+def _vec3DataToArray(data):
+    """Convert per-particle vectors, either a list of Vec3 or a bytearray of packed doubles, to an (N, 3) numpy array.
+    A bytearray is wrapped without copying it.  The array is made read-only, since it shares memory with the State."""
+    if isinstance(data, bytearray):
+        if len(data) == 0:
+            return numpy.zeros((0, 3))
+        result = numpy.frombuffer(data, dtype=numpy.float64).reshape(-1, 3)
+        result.flags.writeable = False
+        return result
+    return numpy.array(data)
+
+def _vec3DataToList(data):
+    """Convert per-particle vectors, either a list of Vec3 or a bytearray of packed doubles, to a list of Vec3."""
+    if isinstance(data, bytearray):
+        values = array.array('d')
+        if sys.version_info[0] == 2:
+            values.fromstring(bytes(data))
+        else:
+            values.frombytes(data)
+        return [Vec3(values[i], values[i+1], values[i+2]) for i in range(0, len(values), 3)]
+    return data
+
 class State(_object):
     """
      A State object records a snapshot of the
@@ -55,6 +78,11 @@ class State(_object):
      do the following:
      myLengthQuantity.value_in_unit(unit.nanometer)
 
+     Positions, velocities, and forces are stored as packed arrays of
+     doubles.  Requesting them with asNumpy=True returns a numpy array that
+     shares this memory, so no Python object needs to be created for each
+     particle.  The array is read-only; copy it if you need to modify it.
+
 """
     def __init__(self,
                  simTime=None,
@@ -67,6 +95,7 @@ class State(_object):
         self._simTime=simTime
         self._periodicBoxVectorsList=periodicBoxVectorsList
         self._periodicBoxVectorsListNumpy=None
+        self._periodicBoxVolume=None
         if energy:
             self._eK0=energy[0]
             self._eP0=energy[1]
@@ -113,11 +142,13 @@ class State(_object):
 
     def getPeriodicBoxVolume(self):
         """Get the volume of the periodic box."""
-        a = self._periodicBoxVectorsList[0]
-        b = self._periodicBoxVectorsList[1]
-        c = self._periodicBoxVectorsList[2]
-        bcrossc = Vec3(b[1]*c[2]-b[2]*c[1], b[2]*c[0]-b[0]*c[2], b[0]*c[1]-b[1]*c[0])
-        return unit.Quantity(unit.dot(a, bcrossc), unit.nanometers*unit.nanometers*unit.nanometers)
+        if self._periodicBoxVolume is None:
+            a = self._periodicBoxVectorsList[0]
+            b = self._periodicBoxVectorsList[1]
+            c = self._periodicBoxVectorsList[2]
+            bcrossc = Vec3(b[1]*c[2]-b[2]*c[1], b[2]*c[0]-b[0]*c[2], b[0]*c[1]-b[1]*c[0])
+            self._periodicBoxVolume = unit.Quantity(unit.dot(a, bcrossc), unit.nanometers*unit.nanometers*unit.nanometers)
+        return self._periodicBoxVolume
 
     def getPositions(self, asNumpy=False):
         """Get the position of each particle with units.
@@ -134,9 +165,11 @@ class State(_object):
 
         if asNumpy:
             if self._coordListNumpy is None:
-                self._coordListNumpy=numpy.array(self._coordList)
+                self._coordListNumpy=_vec3DataToArray(self._coordList)
             returnValue=self._coordListNumpy
         else:
+            if not isinstance(self._coordList, list):
+                self._coordList=_vec3DataToList(self._coordList)
             returnValue=self._coordList
 
         returnValue = unit.Quantity(returnValue, unit.nanometers)
@@ -158,9 +191,11 @@ class State(_object):
 
         if asNumpy:
             if self._velListNumpy is None:
-                self._velListNumpy=numpy.array(self._velList)
+                self._velListNumpy=_vec3DataToArray(self._velList)
             returnValue=self._velListNumpy
         else:
+            if not isinstance(self._velList, list):
+                self._velList=_vec3DataToList(self._velList)
             returnValue=self._velList
 
         returnValue = unit.Quantity(returnValue, unit.nanometers/unit.picosecond)
@@ -183,9 +218,11 @@ class State(_object):
 
         if asNumpy:
             if self._forceListNumpy is None:
-                self._forceListNumpy=numpy.array(self._forceList)
+                self._forceListNumpy=_vec3DataToArray(self._forceList)
             returnValue=self._forceListNumpy
         else:
+            if not isinstance(self._forceList, list):
+                self._forceList=_vec3DataToList(self._forceList)
             returnValue=self._forceList
 
         returnValue = unit.Quantity(returnValue,
@@ -221,6 +258,26 @@ class State(_object):
             raise TypeError('Parameters were not requested in getState() call, so are not available.')
         return self._paramMap
 
+
+class _PrefixedFile(object):
+    """A file-like object that first returns data that has already been read from
+    a file, then continues reading from the file itself."""
+
+    def __init__(self, prefix, file):
+        self._prefix = prefix
+        self._file = file
+
+    def read(self, size=-1):
+        if len(self._prefix) == 0:
+            return self._file.read(size)
+        if size is None or size < 0:
+            data = self._prefix+self._file.read()
+            self._prefix = self._prefix[:0]
+        else:
+            data = self._prefix[:size]
+            self._prefix = self._prefix[size:]
+        return data
+
 %}
 
 %pythonappend OpenMM::Context::Context %{
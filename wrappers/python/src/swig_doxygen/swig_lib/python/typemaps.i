@@ -201,6 +201,32 @@ int Py_SequenceToVecVec3(PyObject* obj, std::vector<Vec3>& out) {
     PyObject* item1 = NULL;
     PyObject* iterator = NULL;
     stripped = Py_StripOpenMMUnits(obj);      // new reference
+    if (stripped == NULL)
+        return SWIG_ERROR;
+
+    // If the object is a contiguous (N, 3) array of doubles, such as a numpy array, copy the data
+    // directly without creating a Python object for each element.
+
+    if (PyObject_CheckBuffer(stripped)) {
+        Py_buffer view;
+        if (PyObject_GetBuffer(stripped, &view, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) == 0) {
+            bool isDouble = (view.itemsize == sizeof(double) && view.format != NULL &&
+                    (strcmp(view.format, "d") == 0 || strcmp(view.format, "@d") == 0 || strcmp(view.format, "=d") == 0));
+            if (isDouble && view.ndim == 2 && view.shape[1] == 3) {
+                const double* data = (const double*) view.buf;
+                Py_ssize_t n = view.shape[0];
+                out.reserve(out.size()+n);
+                for (Py_ssize_t i = 0; i < n; i++)
+                    out.push_back(OpenMM::Vec3(data[3*i], data[3*i+1], data[3*i+2]));
+                PyBuffer_Release(&view);
+                Py_DECREF(stripped);
+                return SWIG_OK;
+            }
+            PyBuffer_Release(&view);
+        }
+        else
+            PyErr_Clear();
+    }
     iterator = PyObject_GetIter(stripped);    // new reference
 
     if (iterator == NULL) {
@@ -5,10 +5,10 @@ from simtk.openmm import *
 from simtk.unit import *
 import simtk.openmm.app.element as elem
 try:
-    from scipy.io import netcdf
-    SCIPY_IMPORT_FAILED = False
+    import numpy
+    NUMPY_IMPORT_FAILED = False
 except:
-    SCIPY_IMPORT_FAILED = True
+    NUMPY_IMPORT_FAILED = True
 
 
 def compareByElement(array1, array2, cmp):
@@ -31,7 +31,7 @@ class TestAmberInpcrdFile(unittest.TestCase):
         compareByElement(inpcrd.boxVectors[0].value_in_unit(angstroms),
                          [30.2642725, 0.0, 0.0], cmp)
 
-    @unittest.skipIf(SCIPY_IMPORT_FAILED, "Scipy is not installed")
+    @unittest.skipIf(NUMPY_IMPORT_FAILED, "Numpy is not installed")
     def test_NetCDF(self):
         """ Test NetCDF restart file parsing """
         cmp = self.assertAlmostEqual
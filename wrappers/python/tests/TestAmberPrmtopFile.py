@@ -361,5 +361,29 @@ class TestAmberPrmtopFile(unittest.TestCase):
             # Make sure it says something about chamber
             self.assertTrue('chamber' in str(e).lower())
 
+    def testParserWithoutNumpy(self):
+        """Test that the vectorized and pure Python prmtop parsers agree."""
+        from simtk.openmm.app.internal import amber_file_parser
+        if amber_file_parser.np is None:
+            return
+        fast = amber_file_parser.PrmtopLoader('systems/tz2.truncoct.parm7')
+        amber_file_parser.np = None
+        try:
+            slow = amber_file_parser.PrmtopLoader('systems/tz2.truncoct.parm7')
+            slowTerms = [slow.getBondsWithH(), slow.getBondsNoH(), slow.getAngles(), slow.getDihedrals(),
+                         slow.get14Interactions(), slow.getExcludedAtoms(), slow.getNonbondTerms()]
+        finally:
+            import numpy
+            amber_file_parser.np = numpy
+        self.assertEqual(slow._raw_data['ATOM_NAME'], fast._raw_data['ATOM_NAME'])
+        self.assertEqual(slow._raw_data['POINTERS'], fast._raw_data['POINTERS'].tolist())
+        fastTerms = [fast.getBondsWithH(), fast.getBondsNoH(), fast.getAngles(), fast.getDihedrals(),
+                     fast.get14Interactions(), fast.getExcludedAtoms(), fast.getNonbondTerms()]
+        for slowList, fastList in zip(slowTerms, fastTerms):
+            self.assertEqual(len(slowList), len(fastList))
+            for slowTerm, fastTerm in zip(slowList, fastList):
+                for x, y in zip(slowTerm, fastTerm):
+                    self.assertAlmostEqual(x, y)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from simtk.openmm.app import *
+from simtk.openmm import *
+from simtk.unit import *
+
+class TestBinarySerializer(unittest.TestCase):
+    """Test serializing objects with BinarySerializer."""
+
+    def setUp(self):
+        pdb = PDBFile('systems/alanine-dipeptide-explicit.pdb')
+        forcefield = ForceField('amber99sb.xml', 'tip3p.xml')
+        self.system = forcefield.createSystem(pdb.topology, nonbondedMethod=PME)
+        self.integrator = LangevinIntegrator(300*kelvin, 1/picosecond, 2*femtosecond)
+        context = Context(self.system, VerletIntegrator(2*femtosecond), Platform.getPlatformByName('Reference'))
+        context.setPositions(pdb.positions)
+        self.state = context.getState(getPositions=True, getForces=True, getEnergy=True)
+
+    def check_round_trip(self, object, compress):
+        """Check that serializing and deserializing an object produces an identical copy."""
+        data = BinarySerializer.serialize(object, compress)
+        self.assertTrue(isinstance(data, bytes))
+        copy = BinarySerializer.deserialize(data)
+        self.assertEqual(object.__class__.__name__, copy.__class__.__name__)
+        self.assertEqual(XmlSerializer.serialize(object), XmlSerializer.serialize(copy))
+
+    def test_round_trip(self):
+        """Test that System, Force, Integrator, and State objects survive a round trip."""
+        for compress in (False, True):
+            if compress and not BinarySerializer.isCompressionSupported():
+                continue
+            self.check_round_trip(self.system, compress)
+            self.check_round_trip(self.integrator, compress)
+            self.check_round_trip(self.state, compress)
+            for force in self.system.getForces():
+                self.check_round_trip(force, compress)
+
+    def test_size(self):
+        """Test that the binary format is smaller than XML."""
+        data = BinarySerializer.serialize(self.system)
+        self.assertTrue(len(data) < len(XmlSerializer.serialize(self.system)))
+
+    def test_invalid_data(self):
+        """Test that deserializing data in the wrong format raises an exception."""
+        self.assertRaises(ValueError, lambda: BinarySerializer.deserialize(XmlSerializer.serialize(self.system).encode('utf-8')))
+        data = BinarySerializer.serialize(self.system)
+        self.assertRaises(Exception, lambda: BinarySerializer.deserialize(data[:len(data)//2]))
+
+if __name__ == '__main__':
+    unittest.main()
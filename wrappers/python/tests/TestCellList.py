@@ -0,0 +1,76 @@
+import unittest
+import random
+from simtk.openmm import Vec3
+from simtk.unit import *
+from simtk.openmm.app.internal.celllist import CellList
+from simtk.openmm.app.internal.unitcell import computePeriodicBoxVectors
+
+class TestCellList(unittest.TestCase):
+
+    """ Test the celllist.py module """
+
+    def findNeighbors(self, positions, position, cutoff, vectors):
+        """ Find neighbors by brute force, checking the nearby periodic images of every point. """
+        result = []
+        images = (-1, 0, 1)
+        for index, pos in enumerate(positions):
+            # Shift the point into the unit cell nearest the search position, then check all the images around it.
+            d = pos-position
+            c = round(d[2]/vectors[2][2])
+            d -= vectors[2]*c
+            b = round(d[1]/vectors[1][1])
+            d -= vectors[1]*b
+            a = round(d[0]/vectors[0][0])
+            d -= vectors[0]*a
+            for i in images:
+                for j in images:
+                    for k in images:
+                        image = d+vectors[0]*i+vectors[1]*j+vectors[2]*k
+                        if image[0]*image[0]+image[1]*image[1]+image[2]*image[2] < cutoff*cutoff:
+                            result.append(index)
+        return sorted(set(result))
+
+    def checkBox(self, vectors, cutoff):
+        random.seed(10)
+        box = Vec3(vectors[0][0], vectors[1][1], vectors[2][2])
+        def randomPosition():
+            # Include points outside the central box to check that they get wrapped correctly.
+            return Vec3(random.uniform(-1, 2)*box[0], random.uniform(-1, 2)*box[1], random.uniform(-1, 2)*box[2])
+        positions = [randomPosition() for i in range(300)]
+        cells = CellList(positions, cutoff, vectors)
+        for i in range(100):
+            position = randomPosition()
+            self.assertEqual(self.findNeighbors(positions, position, cutoff, vectors), cells.neighbors(position))
+
+    def testRectangularBox(self):
+        """ Test finding neighbors in a rectangular periodic box """
+        vectors = (Vec3(3.0, 0, 0), Vec3(0, 2.5, 0), Vec3(0, 0, 2.8))
+        self.checkBox(vectors, 0.6)
+
+    def testTriclinicBox(self):
+        """ Test finding neighbors in a triclinic periodic box """
+        vectors = computePeriodicBoxVectors(3.0, 3.2, 2.9, 70*degrees, 80*degrees, 110*degrees)
+        vectors = [v.value_in_unit(nanometers) for v in vectors]
+        self.checkBox(vectors, 0.6)
+
+    def testNonperiodic(self):
+        """ Test finding neighbors and pairs without periodic boundary conditions """
+        random.seed(5)
+        positions = [Vec3(random.uniform(-2, 2), random.uniform(-2, 2), random.uniform(-2, 2)) for i in range(300)]
+        cells = CellList(positions*nanometers, 0.5*nanometers)
+        expected = []
+        for i in range(len(positions)):
+            for j in range(i+1, len(positions)):
+                d = positions[i]-positions[j]
+                if d[0]*d[0]+d[1]*d[1]+d[2]*d[2] < 0.25:
+                    expected.append((i, j))
+        self.assertEqual(expected, cells.pairs())
+
+    def testCutoffIsExclusive(self):
+        """ Test that points exactly at the cutoff distance are not neighbors """
+        cells = CellList([Vec3(0, 0, 0), Vec3(0.5, 0, 0)], 0.5)
+        self.assertEqual([], cells.pairs())
+        self.assertEqual([0], cells.neighbors(Vec3(0, 0, 0)))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,7 +4,11 @@ from simtk.openmm.app import *
 from simtk.openmm import *
 from simtk.unit import *
 import simtk.openmm.app.element as elem
+from simtk.openmm.app.internal.charmm.exceptions import CharmmFileError
 import warnings
+import os
+import shutil
+import tempfile
 
 class TestCharmmFiles(unittest.TestCase):
 
@@ -115,6 +119,25 @@ class TestCharmmFiles(unittest.TestCase):
         ene = state.getPotentialEnergy().value_in_unit(kilocalories_per_mole)
         self.assertAlmostEqual(ene, 15490.0033559, delta=0.05)
 
+    def test_NBFIXTypes(self):
+        """Tests that atom types with NBFIX terms get their own Lennard-Jones type"""
+        from simtk.openmm.app.charmmpsffile import _condense_lj_types
+        warnings.filterwarnings('ignore', category=CharmmPSFWarning)
+        psf = CharmmPsfFile('systems/ala3_solv.psf')
+        params = CharmmParameterSet('systems/par_all36_prot.prm',
+                                    'systems/toppar_water_ions.str')
+        psf.loadParameters(params)
+        lj_idx_list, lj_type_list = _condense_lj_types(psf.atom_list)
+        # OC has the same radius and well depth as O, but it has an NBFIX
+        # term with SOD, so they cannot share a type.
+        types = dict((atom.type.name, lj_idx_list[atom.idx]) for atom in psf.atom_list)
+        self.assertNotEqual(types['O'], types['OC'])
+        for atom, index in zip(psf.atom_list, lj_idx_list):
+            typ = lj_type_list[index]
+            self.assertEqual((atom.type.rmin, atom.type.epsilon), (typ.rmin, typ.epsilon))
+            if atom.type.nbfix:
+                self.assertTrue(typ is atom.type)
+
     def test_InsCode(self):
         """ Test the parsing of PSF files that contain insertion codes in their residue numbers """
         psf = CharmmPsfFile('systems/4TVP-dmj_wat-ion.psf')
@@ -206,6 +229,72 @@ class TestCharmmFiles(unittest.TestCase):
         ene_permissive = state_permissive.getPotentialEnergy().value_in_unit(kilocalories_per_mole)
         self.assertAlmostEqual(ene_strict, ene_permissive, delta=0.00001)
 
+    def test_ParameterCache(self):
+        """Test saving a CharmmParameterSet to a cache and reloading it"""
+        from simtk.openmm.app.internal.charmm.topologyobjects import NoUreyBradley
+        warnings.filterwarnings('ignore', category=CharmmPSFWarning)
+        dirname = tempfile.mkdtemp()
+        try:
+            stream = os.path.join(dirname, 'toppar_water_ions.str')
+            shutil.copy('systems/toppar_water_ions.str', stream)
+            cache = os.path.join(dirname, 'params.cache')
+            self.assertTrue(CharmmParameterSet.loadCache(cache) is None)
+            params = CharmmParameterSet('systems/par_all36_prot.prm', stream).condense()
+            params.saveCache(cache)
+            cached = CharmmParameterSet.loadCache(cache)
+            self.assertEqual(sorted(params.dihedral_types.keys()), sorted(cached.dihedral_types.keys()))
+            self.assertEqual(sorted(params.nbfix_types.keys()), sorted(cached.nbfix_types.keys()))
+            for key in params.urey_bradley_types:
+                self.assertEqual(params.urey_bradley_types[key] is NoUreyBradley,
+                                 cached.urey_bradley_types[key] is NoUreyBradley)
+
+            # Both parameter sets should give the same energy.
+
+            psf = CharmmPsfFile('systems/ala3_solv.psf')
+            crd = CharmmCrdFile('systems/ala3_solv.crd')
+            energies = []
+            for p in (params, cached):
+                system = psf.createSystem(p)
+                context = Context(system, VerletIntegrator(1*femtoseconds), Platform.getPlatformByName('Reference'))
+                context.setPositions(crd.positions)
+                energies.append(context.getState(getEnergy=True).getPotentialEnergy().value_in_unit(kilojoules_per_mole))
+            self.assertAlmostEqual(energies[0], energies[1], delta=1e-6*abs(energies[0]))
+
+            # Modifying one of the source files invalidates the cache.
+
+            with open(stream, 'a') as f:
+                f.write('\n')
+            self.assertTrue(CharmmParameterSet.loadCache(cache) is None)
+        finally:
+            shutil.rmtree(dirname)
+
+    def test_CorruptParameterCache(self):
+        """Test that damaged or foreign cache files are never unpickled"""
+        dirname = tempfile.mkdtemp()
+        try:
+            cache = os.path.join(dirname, 'params.cache')
+            params = CharmmParameterSet('systems/toppar_water_ions.str')
+            params.saveCache(cache)
+            with open(cache, 'rb') as f:
+                contents = f.read()
+
+            # A truncated cache is a cache miss.
+
+            with open(cache, 'wb') as f:
+                f.write(contents[:len(contents)//2])
+            self.assertTrue(CharmmParameterSet.loadCache(cache) is None)
+            with open(cache, 'wb') as f:
+                f.write(contents[:len(CharmmParameterSet._CACHE_MAGIC)+4])
+            self.assertTrue(CharmmParameterSet.loadCache(cache) is None)
+
+            # A file that is not a cache at all is an error.
+
+            with open(cache, 'wb') as f:
+                f.write(contents[1:])
+            self.assertRaises(CharmmFileError, lambda: CharmmParameterSet.loadCache(cache))
+        finally:
+            shutil.rmtree(dirname)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -37,5 +37,112 @@ class TestCheckpointReporter(unittest.TestCase):
         newPositions = self.simulation.context.getState(getPositions=True).getPositions()
         self.assertSequenceEqual(positions, newPositions)
 
+    def testAtomicRotating(self):
+        """Test keeping multiple compressed checkpoints."""
+        dir = tempfile.mkdtemp()
+        filename = os.path.join(dir, 'test.chk')
+        reporter = app.CheckpointReporter(filename, 1, keep=3, compress=True)
+        self.simulation.reporters.append(reporter)
+        positions = []
+        for i in range(4):
+            self.simulation.step(1)
+            positions.append(self.simulation.context.getState(getPositions=True).getPositions())
+        self.assertEqual(['test.chk', 'test.chk.1', 'test.chk.2'], sorted(os.listdir(dir)))
+
+        # Each file should hold a successively older checkpoint.
+
+        for name, expected in zip(['test.chk', 'test.chk.1', 'test.chk.2'], positions[::-1]):
+            self.simulation.loadCheckpoint(os.path.join(dir, name))
+            newPositions = self.simulation.context.getState(getPositions=True).getPositions()
+            self.assertSequenceEqual(expected, newPositions)
+        for name in os.listdir(dir):
+            os.unlink(os.path.join(dir, name))
+        os.rmdir(dir)
+
+    def testBackground(self):
+        """Test writing checkpoints on a background thread."""
+        dir = tempfile.mkdtemp()
+        filename = os.path.join(dir, 'test.chk')
+        reporter = app.CheckpointReporter(filename, 2, atomic=True, writeInBackground=True)
+        self.simulation.reporters.append(reporter)
+        self.simulation.step(2)
+        positions = self.simulation.context.getState(getPositions=True).getPositions()
+        self.simulation.step(1)
+        reporter.wait()
+        self.assertEqual(['test.chk'], os.listdir(dir))
+        self.simulation.loadCheckpoint(filename)
+        newPositions = self.simulation.context.getState(getPositions=True).getPositions()
+        self.assertSequenceEqual(positions, newPositions)
+        os.unlink(filename)
+        os.rmdir(dir)
+
+    def testFailedRotation(self):
+        """Test that the current checkpoint survives if replacing it fails."""
+        from simtk.openmm.app import checkpointreporter
+        dir = tempfile.mkdtemp()
+        filename = os.path.join(dir, 'test.chk')
+        reporter = app.CheckpointReporter(filename, 1, keep=2)
+        self.simulation.reporters.append(reporter)
+        self.simulation.step(1)
+        with open(filename, 'rb') as f:
+            original = f.read()
+        def fail(source, dest):
+            raise IOError('simulated failure')
+        replace = checkpointreporter.replaceFile
+        checkpointreporter.replaceFile = fail
+        try:
+            self.assertRaises(IOError, lambda: self.simulation.step(1))
+        finally:
+            checkpointreporter.replaceFile = replace
+        with open(filename, 'rb') as f:
+            self.assertEqual(original, f.read())
+        self.assertEqual(['test.chk'], os.listdir(dir))
+        os.unlink(filename)
+        os.rmdir(dir)
+
+    def testFailedBackgroundWrite(self):
+        """Test that a failed background write is reported without losing the next checkpoint."""
+        from simtk.openmm.app import checkpointreporter
+        dir = tempfile.mkdtemp()
+        filename = os.path.join(dir, 'test.chk')
+        reporter = app.CheckpointReporter(filename, 1, atomic=True, writeInBackground=True)
+        self.simulation.reporters.append(reporter)
+        def fail(source, dest):
+            raise IOError('simulated failure')
+        replace = checkpointreporter.replaceFile
+        checkpointreporter.replaceFile = fail
+        try:
+            self.simulation.step(1)
+            reporter._thread.join()
+        finally:
+            checkpointreporter.replaceFile = replace
+
+        # The next report should raise the error, but still write its checkpoint.
+
+        self.assertRaises(IOError, lambda: self.simulation.step(1))
+        positions = self.simulation.context.getState(getPositions=True).getPositions()
+        reporter.wait()
+        self.assertEqual(['test.chk'], os.listdir(dir))
+        self.simulation.loadCheckpoint(filename)
+        newPositions = self.simulation.context.getState(getPositions=True).getPositions()
+        self.assertSequenceEqual(positions, newPositions)
+        os.unlink(filename)
+        os.rmdir(dir)
+
+    def testFailedWrite(self):
+        """Test that a failed write does not leave a temporary file behind."""
+        dir = tempfile.mkdtemp()
+        filename = os.path.join(dir, 'test.chk')
+        reporter = app.CheckpointReporter(filename, 1, atomic=True)
+        self.assertRaises(TypeError, lambda: reporter._write(object()))
+        self.assertEqual([], os.listdir(dir))
+        os.rmdir(dir)
+
+    def testRequiresFilename(self):
+        """Test that atomic writing is rejected for an open file."""
+        with tempfile.TemporaryFile() as file:
+            self.assertRaises(ValueError, lambda: app.CheckpointReporter(file, 1, atomic=True))
+            self.assertRaises(ValueError, lambda: app.CheckpointReporter(file, 1, keep=2))
+
 if __name__ == '__main__':
     unittest.main()
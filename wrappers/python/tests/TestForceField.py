@@ -158,6 +158,56 @@ class TestForceField(unittest.TestCase):
                 numDifferences += 1
         self.assertTrue(numDifferences < system.getNumParticles()/20) # Tolerate occasional differences from numerical error
 
+    def test_IdenticalResidues(self):
+        """Test that template matches reused between identical residues still respect atom order."""
+
+        topology = Topology()
+        chain = topology.addChain()
+        for names in [('O', 'H1', 'H2'), ('H1', 'O', 'H2'), ('O', 'H1', 'H2')]:
+            residue = topology.addResidue('HOH', chain)
+            atoms = dict((name, topology.addAtom(name, elem.oxygen if name == 'O' else elem.hydrogen, residue)) for name in names)
+            topology.addBond(atoms['O'], atoms['H1'])
+            topology.addBond(atoms['O'], atoms['H2'])
+        system = self.forcefield1.createSystem(topology)
+        nonbonded = [f for f in system.getForces() if isinstance(f, NonbondedForce)][0]
+        for atom in topology.atoms():
+            charge = nonbonded.getParticleParameters(atom.index)[0].value_in_unit(elementary_charge)
+            self.assertAlmostEqual(-0.834 if atom.name == 'O' else 0.417, charge)
+
+    def test_FindAnglesAndTorsions(self):
+        """Test enumerating angles and torsions, with and without numpy."""
+
+        # Methylcyclopropane: a three membered ring (0, 1, 2) with a methyl group (3) and hydrogens.
+
+        bonds = [(0, 1), (1, 2), (2, 0), (0, 3), (0, 4), (1, 5), (1, 6), (2, 7), (2, 8), (3, 9), (3, 10), (3, 11)]
+        bondedToAtom = [set() for i in range(12)]
+        for (i, j) in bonds:
+            bondedToAtom[i].add(j)
+            bondedToAtom[j].add(i)
+        results = []
+        savedNumpy = forcefield.numpy
+        try:
+            for numpyModule in set([savedNumpy, None]):
+                forcefield.numpy = numpyModule
+                angles = forcefield._findAngles(bondedToAtom)
+                results.append((angles, forcefield._findPropers(bondedToAtom, angles), forcefield._findImpropers(bondedToAtom)))
+        finally:
+            forcefield.numpy = savedNumpy
+        for (angles, propers, impropers) in results:
+            self.assertEqual(results[0], (angles, propers, impropers))
+            self.assertEqual(24, len(angles))
+            self.assertEqual(angles, sorted(set(angles)))
+            for angle in angles:
+                self.assertTrue(angle[0] < angle[2])
+                self.assertTrue(angle[0] in bondedToAtom[angle[1]] and angle[2] in bondedToAtom[angle[1]])
+            self.assertEqual(propers, sorted(set(propers)))
+            for torsion in propers:
+                self.assertTrue(torsion[0] <= torsion[3])
+                for k in range(3):
+                    self.assertTrue(torsion[k+1] in bondedToAtom[torsion[k]])
+            self.assertEqual(4+4+4+4, len(impropers))
+            self.assertEqual(sorted(impropers), sorted(set(impropers)))
+
     def test_ProgrammaticForceField(self):
         """Test building a ForceField programmatically."""
 
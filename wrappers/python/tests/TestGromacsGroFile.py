@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from simtk.openmm.app import *
 from simtk.openmm import *
@@ -38,5 +40,37 @@ class TestGromacsGroFile(unittest.TestCase):
             self.assertEqual('Na', gro.atomNames[i])
             self.assertEqual('Na', gro.residueNames[i])
 
+    def test_Trajectory(self):
+        """Test reading a multi-frame file one frame at a time."""
+        lines = open('systems/triclinic.gro').readlines()
+        fd, filename = tempfile.mkstemp(suffix='.gro')
+        os.close(fd)
+        try:
+            with open(filename, 'w') as output:
+                for i in range(3):
+                    for line in lines:
+                        if len(line.split()) == 6:
+                            coords = [float(line[20+8*j:28+8*j])+i for j in range(3)]
+                            line = line[:20]+'%8.3f%8.3f%8.3f\n' % tuple(coords)
+                        output.write(line)
+            expected = GromacsGroFile(filename)
+            trajectory = GromacsGroTrajectory(filename)
+            self.assertEqual(3, len(trajectory))
+            self.assertEqual(expected.atomNames, trajectory.atomNames)
+            self.assertEqual(expected.residueNames, trajectory.residueNames)
+            self.assertEqual(expected.elements, trajectory.elements)
+            frames = 0
+            for i, positions in enumerate(trajectory):
+                self.assertEqual((8, 3), positions.value_in_unit(nanometers).shape)
+                for p1, p2 in zip(expected.getPositions(frame=i), positions):
+                    self.assertEqual(p1, Vec3(*p2.value_in_unit(nanometers))*nanometers)
+                self.assertEqual(expected.getPeriodicBoxVectors(i), trajectory.getPeriodicBoxVectors(i))
+                frames += 1
+            self.assertEqual(3, frames)
+            self.assertEqual(Vec3(1.933, 2.862, 4.490)*nanometers, Vec3(*trajectory.getPositions(1)[7].value_in_unit(nanometers))*nanometers)
+            trajectory.close()
+        finally:
+            os.remove(filename)
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,4 +1,9 @@
 import unittest
+import os
+import math
+import shutil
+import tempfile
+from collections import OrderedDict
 from validateConstraints import *
 from simtk.openmm.app import *
 from simtk.openmm import *
@@ -137,6 +142,265 @@ class TestGromacsTopFile(unittest.TestCase):
         totalMass2 = sum([system2.getParticleMass(i) for i in range(system2.getNumParticles())]).value_in_unit(amu)
         self.assertAlmostEqual(totalMass1, totalMass2)
 
+
+class TestGromacsIncludeCache(unittest.TestCase):
+
+    """Test caching of parsed #include files."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cacheDir = os.path.join(self.dir, 'cache')
+        with open(os.path.join(self.dir, 'ff.itp'), 'w') as f:
+            f.write("""[ defaults ]
+1 2 yes 0.5 0.8333
+#define BOND_K 284512.0
+[ atomtypes ]
+C 6 12.01 0.0 A 3.39967e-01 3.59824e-01
+H 1 1.008 0.0 A 1.06908e-01 6.56888e-02
+[ bondtypes ]
+#ifdef STIFF
+C H 1 0.1090 500000.0
+#else
+C H 1 0.1090 BOND_K
+#endif
+""")
+        with open(os.path.join(self.dir, 'ch.top'), 'w') as f:
+            f.write("""#include "ff.itp"
+[ moleculetype ]
+CH 3
+[ atoms ]
+1 C 1 CH C 1 0.1
+2 H 1 CH H 1 -0.1
+[ bonds ]
+1 2 1
+[ system ]
+CH
+[ molecules ]
+CH 2
+""")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def loadBondK(self, **args):
+        top = GromacsTopFile(os.path.join(self.dir, 'ch.top'), includeDir=self.dir, **args)
+        system = top.createSystem()
+        bonds = [f for f in system.getForces() if isinstance(f, HarmonicBondForce)][0]
+        self.assertEqual(2, bonds.getNumBonds())
+        self.assertEqual([2, 3], bonds.getBondParameters(1)[:2])
+        return bonds.getBondParameters(0)[3].value_in_unit(kilojoules_per_mole/nanometer**2)
+
+    def test_Cache(self):
+        """Test that cached include files give the same results as parsing them."""
+        from simtk.openmm.app import gromacstopfile
+        self.assertEqual(284512.0, self.loadBondK(cacheDir=self.cacheDir))
+        self.assertTrue(len(os.listdir(self.cacheDir)) > 0)
+        self.assertEqual(284512.0, self.loadBondK())
+        gromacstopfile._includeCache.clear()
+        self.assertEqual(284512.0, self.loadBondK(cacheDir=self.cacheDir))
+
+        # Different defines must not reuse the cached result.
+
+        self.assertEqual(500000.0, self.loadBondK(defines={'STIFF': '1'}))
+        self.assertEqual(284512.0, self.loadBondK())
+
+    def test_FailedCacheWrite(self):
+        """Test that failing to write the cache does not leave a temporary file behind."""
+        from simtk.openmm.app import gromacstopfile
+        def fail(*args):
+            raise ValueError('simulated failure')
+        dump = gromacstopfile.pickle.dump
+        gromacstopfile._includeCache.clear()
+        gromacstopfile.pickle.dump = fail
+        try:
+            self.assertEqual(284512.0, self.loadBondK(cacheDir=self.cacheDir))
+        finally:
+            gromacstopfile.pickle.dump = dump
+        self.assertEqual([], os.listdir(self.cacheDir))
+
+    def test_ForeignCacheFile(self):
+        """Test that files in the cache directory without the expected header are not unpickled."""
+        from simtk.openmm.app import gromacstopfile
+        self.assertEqual(284512.0, self.loadBondK(cacheDir=self.cacheDir))
+        for name in os.listdir(self.cacheDir):
+            filename = os.path.join(self.cacheDir, name)
+            with open(filename, 'rb') as f:
+                contents = f.read()
+            with open(filename, 'wb') as f:
+                f.write(contents[len(gromacstopfile._cacheMagic):])
+        loaded = []
+        def load(f):
+            loaded.append(f)
+            return load.original(f)
+        load.original = gromacstopfile.pickle.load
+        gromacstopfile._includeCache.clear()
+        gromacstopfile.pickle.load = load
+        try:
+            self.assertEqual(284512.0, self.loadBondK(cacheDir=self.cacheDir))
+        finally:
+            gromacstopfile.pickle.load = load.original
+        self.assertEqual([], loaded)
+
+    def test_DefineRegexLimit(self):
+        """Test that the number of cached regular expressions for defines is limited."""
+        from simtk.openmm.app import gromacstopfile
+        for i in range(gromacstopfile._maxDefineRegexes+10):
+            gromacstopfile._define_regex(('NAME%d' % i,))
+        self.assertEqual(gromacstopfile._maxDefineRegexes, len(gromacstopfile._defineRegexes))
+        self.assertTrue(('NAME0',) not in gromacstopfile._defineRegexes)
+        defines = OrderedDict([('NAME0', 'VALUE')])
+        self.assertEqual('x VALUE y', gromacstopfile._replace_defines('x NAME0 y', defines))
+
+
+class TestGromacsMultipleMolecules(unittest.TestCase):
+
+    """Test creating Systems with several instances of several molecule types."""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'mixture.top')
+        with open(self.filename, 'w') as f:
+            f.write("""[ defaults ]
+1 2 yes 0.5 0.8333
+[ atomtypes ]
+C 6 12.01 0.0 A 0.34 0.36
+H 1 1.008 0.0 A 0.26 0.07
+OW 8 15.9994 0.0 A 0.315 0.636
+HW 1 1.008 0.0 A 0.0 0.0
+[ bondtypes ]
+C C 1 0.153 224262.4
+C H 1 0.109 284512.0
+[ angletypes ]
+C C C 1 109.5 400.0
+[ dihedraltypes ]
+C C C H 9 0.0 0.6276 3
+C C C H 9 180.0 1.0 2
+[ moleculetype ]
+MOL 3
+[ atoms ]
+1 C 1 MOL C1 1 -0.2
+2 C 1 MOL C2 1 0.1
+3 C 1 MOL C3 1 -0.1
+4 H 1 MOL H4 1 0.1
+5 H 1 MOL H5 1 0.1
+[ bonds ]
+1 2 1
+2 3 1
+3 4 1
+1 5 1
+[ pairs ]
+1 4 1
+5 3 1 0.3 0.5
+[ angles ]
+1 2 3 1
+2 3 4 1 110.0 300.0
+[ dihedrals ]
+1 2 3 4 9
+5 1 2 3 1 0.0 2.5 3
+[ moleculetype ]
+SOL 2
+[ atoms ]
+1 OW 1 HOH OW 1 -0.8
+2 HW 1 HOH HW1 1 0.4
+3 HW 1 HOH HW2 1 0.4
+[ bonds ]
+1 2 1 0.09572 502416.0
+1 3 1 0.09572 502416.0
+[ angles ]
+2 1 3 1 104.52 628.02
+[ system ]
+Mixture
+[ molecules ]
+MOL 2
+SOL 3
+MOL 2
+""")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_LaterInstances(self):
+        """Test that every instance of a molecule gets the right atom indices and parameters."""
+        top = GromacsTopFile(self.filename, includeDir=self.dir)
+        system = top.createSystem(constraints=HBonds, rigidWater=True)
+        self.assertEqual(29, system.getNumParticles())
+        forces = dict((f.__class__.__name__, f) for f in system.getForces())
+        bonds = forces['HarmonicBondForce']
+        angles = forces['HarmonicAngleForce']
+        torsions = forces['PeriodicTorsionForce']
+        nonbonded = forces['NonbondedForce']
+
+        # The last MOL starts at atom 24, and the last water at atom 16.
+
+        base = 24
+        water = 16
+        self.assertAlmostEqual(1.008, system.getParticleMass(base+4).value_in_unit(amu))
+        self.assertAlmostEqual(15.9994, system.getParticleMass(water).value_in_unit(amu))
+        q, sigma, epsilon = nonbonded.getParticleParameters(base+2)
+        self.assertAlmostEqual(-0.1, q.value_in_unit(elementary_charge))
+        self.assertAlmostEqual(0.34, sigma.value_in_unit(nanometer))
+        self.assertAlmostEqual(0.36, epsilon.value_in_unit(kilojoules_per_mole))
+        q, sigma, epsilon = nonbonded.getParticleParameters(water+1)
+        self.assertAlmostEqual(0.4, q.value_in_unit(elementary_charge))
+
+        # Bonds to hydrogen and all bonds in water should be constraints.
+
+        self.assertEqual(8, bonds.getNumBonds())
+        p1, p2, length, k = bonds.getBondParameters(7)
+        self.assertEqual([base+1, base+2], [p1, p2])
+        self.assertAlmostEqual(0.153, length.value_in_unit(nanometer))
+        self.assertAlmostEqual(224262.4, k.value_in_unit(kilojoules_per_mole/nanometer**2))
+        self.assertEqual(17, system.getNumConstraints())
+        constraints = dict((tuple(system.getConstraintParameters(i)[:2]), system.getConstraintParameters(i)[2].value_in_unit(nanometer)) for i in range(system.getNumConstraints()))
+        self.assertAlmostEqual(0.109, constraints[(base+2, base+3)])
+        self.assertAlmostEqual(0.109, constraints[(base, base+4)])
+        self.assertAlmostEqual(0.09572, constraints[(water, water+1)])
+        self.assertAlmostEqual(0.09572, constraints[(water, water+2)])
+        self.assertAlmostEqual(2*0.09572*math.sin(0.5*104.52*math.pi/180), constraints[(water+1, water+2)])
+
+        # Angles in water should be constraints.
+
+        self.assertEqual(8, angles.getNumAngles())
+        p1, p2, p3, theta, k = angles.getAngleParameters(6)
+        self.assertEqual([base, base+1, base+2], [p1, p2, p3])
+        self.assertAlmostEqual(109.5*math.pi/180, theta.value_in_unit(radian))
+        self.assertAlmostEqual(400.0, k.value_in_unit(kilojoules_per_mole/radian**2))
+        p1, p2, p3, theta, k = angles.getAngleParameters(7)
+        self.assertEqual([base+1, base+2, base+3], [p1, p2, p3])
+        self.assertAlmostEqual(110.0*math.pi/180, theta.value_in_unit(radian))
+        self.assertAlmostEqual(300.0, k.value_in_unit(kilojoules_per_mole/radian**2))
+
+        # Each MOL has two terms from the multiple dihedral type and one specified explicitly.
+
+        self.assertEqual(12, torsions.getNumTorsions())
+        expected = [([base, base+1, base+2, base+3], 3, 0.0, 0.6276),
+                    ([base, base+1, base+2, base+3], 2, 180.0, 1.0),
+                    ([base+4, base, base+1, base+2], 3, 0.0, 2.5)]
+        for i, (atoms, periodicity, phase, k) in enumerate(expected):
+            params = torsions.getTorsionParameters(9+i)
+            self.assertEqual(atoms, params[:4])
+            self.assertEqual(periodicity, params[4])
+            self.assertAlmostEqual(phase*math.pi/180, params[5].value_in_unit(radian))
+            self.assertAlmostEqual(k, params[6].value_in_unit(kilojoules_per_mole))
+
+        # Check the generated and explicitly specified 1-4 pairs.
+
+        exceptions = {}
+        for i in range(nonbonded.getNumExceptions()):
+            p1, p2, chargeProd, sigma, epsilon = nonbonded.getExceptionParameters(i)
+            exceptions[(min(p1, p2), max(p1, p2))] = (chargeProd.value_in_unit(elementary_charge**2),
+                                                      sigma.value_in_unit(nanometer), epsilon.value_in_unit(kilojoules_per_mole))
+        chargeProd, sigma, epsilon = exceptions[(base, base+3)]
+        self.assertAlmostEqual(-0.2*0.1*0.8333, chargeProd)
+        self.assertAlmostEqual(0.5*(0.34+0.26), sigma)
+        self.assertAlmostEqual(0.5*math.sqrt(0.36*0.07), epsilon)
+        chargeProd, sigma, epsilon = exceptions[(base+2, base+4)]
+        self.assertAlmostEqual(-0.1*0.1*0.8333, chargeProd)
+        self.assertAlmostEqual(0.3, sigma)
+        self.assertAlmostEqual(0.5, epsilon)
+        self.assertEqual(0.0, exceptions[(water+1, water+2)][0])
+        self.assertTrue((base-1, base) not in exceptions)
+
 if __name__ == '__main__':
     unittest.main()
 
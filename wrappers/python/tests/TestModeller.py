@@ -126,6 +126,22 @@ class TestModeller(unittest.TestCase):
 
         validate_deltas(self, topology_before, topology_after, chain_delta, residue_delta, atom_delta)
 
+    def test_deletePositionsAndBonds(self):
+        """ Test that delete() keeps the correct positions and bonds, for both lists and numpy arrays. """
+
+        import numpy
+        for positions in (self.positions, Quantity(numpy.array(self.positions.value_in_unit(nanometers)), nanometers)):
+            modeller = Modeller(self.topology_start, positions)
+            residues = list(self.topology_start.residues())
+            bonds = list(self.topology_start.bonds())
+            modeller.delete(residues[3:10]+[bonds[0]])
+            kept = [atom for atom in self.topology_start.atoms() if atom.residue not in residues[3:10]]
+            self.assertEqual(len(kept), len(modeller.positions))
+            for atom, pos in zip(kept, modeller.positions):
+                self.assertVecAlmostEqual(positions[atom.index].value_in_unit(nanometers), pos.value_in_unit(nanometers))
+            self.assertEqual(len(bonds)-1-2*7, len(list(modeller.topology.bonds())))
+            self.assertEqual(numpy.ndarray if positions is not self.positions else list, type(modeller.positions._value))
+
     def test_add(self):
         """ Test the add() method. """
 
@@ -592,6 +608,32 @@ class TestModeller(unittest.TestCase):
 
         validate_equivalence(self, topology_start, topology_after)
 
+    def test_addHydrogensSystemCache(self):
+        """ Test that addHydrogens() reuses its System when called again on an identical structure. """
+
+        topology_start = self.topology_start3
+        toDelete = [atom for atom in topology_start.atoms() if atom.element==Element.getBySymbol('H')]
+        Modeller.clearHydrogenSystemCache()
+        modeller1 = Modeller(topology_start, self.positions3)
+        modeller1.delete(toDelete)
+        modeller1.addHydrogens(self.forcefield)
+        system1 = Modeller._hydrogenSystemCache[1]
+
+        # Protonating the same structure again should reuse the System.
+
+        modeller2 = Modeller(topology_start, self.positions3)
+        modeller2.delete(toDelete)
+        modeller2.addHydrogens(self.forcefield)
+        self.assertTrue(Modeller._hydrogenSystemCache[1] is system1)
+        validate_equivalence(self, modeller1.getTopology(), modeller2.getTopology())
+
+        # A different force field should create a new one.
+
+        modeller3 = Modeller(topology_start, self.positions3)
+        modeller3.delete(toDelete)
+        modeller3.addHydrogens()
+        self.assertFalse(Modeller._hydrogenSystemCache[1] is system1)
+
     def test_addHydrogensASH(self):
         """ Test of addHydrogens() in which we force ASH to be a variant using the variants parameter. """
 
@@ -0,0 +1,107 @@
+import os
+import unittest
+import tempfile
+from simtk.openmm import app
+import simtk.openmm as mm
+from simtk import unit
+try:
+    import numpy
+    NUMPY_IMPORT_FAILED = False
+except ImportError:
+    NUMPY_IMPORT_FAILED = True
+
+
+@unittest.skipIf(NUMPY_IMPORT_FAILED, "Numpy is not installed")
+class TestNetcdfReporter(unittest.TestCase):
+    def setUp(self):
+        prmtop = app.AmberPrmtopFile('systems/alanine-dipeptide-explicit.prmtop')
+        inpcrd = app.AmberInpcrdFile('systems/alanine-dipeptide-explicit.inpcrd')
+        system = prmtop.createSystem(nonbondedMethod=app.PME, nonbondedCutoff=1.0*unit.nanometers, constraints=app.HBonds)
+        integrator = mm.VerletIntegrator(0.001*unit.picoseconds)
+        self.simulation = app.Simulation(prmtop.topology, system, integrator, mm.Platform.getPlatformByName('Reference'))
+        self.simulation.context.setPositions(inpcrd.positions)
+        self.simulation.context.setPeriodicBoxVectors(*inpcrd.boxVectors)
+        self.simulation.context.setVelocitiesToTemperature(300*unit.kelvin)
+        fd, self.filename = tempfile.mkstemp(suffix='.nc')
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def testWriteAndRead(self):
+        """Test that the frames written by the reporter can be read back."""
+        reporter = app.NetcdfReporter(self.filename, 2, velocities=True)
+        self.simulation.reporters.append(reporter)
+        self.simulation.step(6)
+        del self.simulation.reporters[:]
+        del reporter
+        state = self.simulation.context.getState(getPositions=True, getVelocities=True)
+        trajectory = app.AmberNetcdfFile(self.filename)
+        self.assertEqual(3, len(trajectory))
+        self.assertTrue(trajectory.hasVelocities())
+        positions = trajectory.getPositions(-1, asNumpy=True).value_in_unit(unit.nanometers)
+        velocities = trajectory.getVelocities(-1, asNumpy=True).value_in_unit(unit.nanometers/unit.picoseconds)
+        self.assertTrue(numpy.allclose(state.getPositions(asNumpy=True).value_in_unit(unit.nanometers), positions, rtol=0, atol=1e-12))
+        self.assertTrue(numpy.allclose(state.getVelocities(asNumpy=True).value_in_unit(unit.nanometers/unit.picoseconds), velocities, rtol=0, atol=1e-12))
+        self.assertAlmostEqual(0.006, trajectory.getTime(2).value_in_unit(unit.picoseconds))
+        box = trajectory.getPeriodicBoxVectors(0)
+        for v1, v2 in zip(box, state.getPeriodicBoxVectors()):
+            for x, y in zip(v1, v2):
+                self.assertAlmostEqual(x.value_in_unit(unit.nanometers), y.value_in_unit(unit.nanometers))
+        trajectory.close()
+
+    def testAppend(self):
+        """Test appending frames to an existing file."""
+        reporter = app.NetcdfReporter(self.filename, 2)
+        self.simulation.reporters.append(reporter)
+        self.simulation.step(4)
+        del self.simulation.reporters[:]
+        del reporter
+        reporter = app.NetcdfReporter(self.filename, 2, append=True)
+        self.simulation.reporters.append(reporter)
+        self.simulation.step(4)
+        del self.simulation.reporters[:]
+        del reporter
+        trajectory = app.AmberNetcdfFile(self.filename)
+        self.assertEqual(4, len(trajectory))
+        self.assertFalse(trajectory.hasVelocities())
+        times = [trajectory.getTime(i).value_in_unit(unit.picoseconds) for i in range(4)]
+        for expected, time in zip([0.002, 0.004, 0.006, 0.008], times):
+            self.assertAlmostEqual(expected, time)
+        trajectory.close()
+
+    def testReadRestart(self):
+        """Test reading a NetCDF restart file written by sander."""
+        restart = app.AmberNetcdfFile('systems/amber.ncrst')
+        self.assertEqual(1, len(restart))
+        self.assertEqual(2101, restart.getNumAtoms())
+        position = restart.getPositions()[0].value_in_unit(unit.angstroms)
+        for x, y in zip(position, [6.82122492718229, 6.6276250662042, -8.51668999892245]):
+            self.assertAlmostEqual(x, y)
+        velocity = restart.getVelocities()[-1].value_in_unit(unit.angstroms/unit.picoseconds)
+        for x, y in zip(velocity, [0.349702202733541*20.455, 0.391525333168534*20.455, 0.417941679767662*20.455]):
+            self.assertAlmostEqual(x, y, places=4)
+        restart.close()
+
+    def testAttributes(self):
+        """Test that attributes set as Python attributes are written to the file."""
+        from simtk.openmm.app.internal.netcdf import NetCDFFile
+        nc = NetCDFFile(self.filename, 'w')
+        nc.title = 'test'
+        nc.createDimension('atom', 2)
+        var = nc.createVariable('charge', 'd', ('atom',))
+        var.units = 'elementary charge'
+        var[:] = [1.0, -1.0]
+        self.assertRaises(RuntimeError, lambda: setattr(nc, 'program', 'OpenMM'))
+        nc.close()
+        nc = NetCDFFile(self.filename)
+        self.assertEqual('test', nc.attributes['title'])
+        self.assertEqual('test', nc.title)
+        self.assertEqual('elementary charge', nc.variables['charge'].units)
+        self.assertEqual(['title'], list(nc.attributes))
+        self.assertEqual(['units'], list(nc.variables['charge'].attributes))
+        nc.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
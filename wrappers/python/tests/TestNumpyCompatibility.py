@@ -60,6 +60,46 @@ class TestNumpyCompatibility(unittest.TestCase):
                                              output.value_in_unit(unit.angstroms / unit.femtoseconds))
 
 
+    def test_stateArrays(self):
+        n_particles = self.simulation.context.getSystem().getNumParticles()
+        input = np.random.randn(n_particles, 3)
+        self.simulation.context.setPositions(input)
+        self.simulation.context.setVelocities(2*input)
+        state = self.simulation.context.getState(getPositions=True, getVelocities=True, getForces=True)
+        positions = state.getPositions(asNumpy=True).value_in_unit(unit.nanometers)
+        self.assertEqual((n_particles, 3), positions.shape)
+        self.assertEqual(np.float64, positions.dtype)
+        self.assertTrue(positions.flags['C_CONTIGUOUS'])
+        np.testing.assert_array_almost_equal(input, positions)
+        np.testing.assert_array_almost_equal(2*input, state.getVelocities(asNumpy=True).value_in_unit(unit.nanometers/unit.picosecond))
+        forces = state.getForces()
+        self.assertEqual(n_particles, len(forces))
+        self.assertTrue(isinstance(forces[0].value_in_unit(unit.kilojoules_per_mole/unit.nanometer), mm.Vec3))
+        np.testing.assert_array_almost_equal(np.array(forces.value_in_unit(unit.kilojoules_per_mole/unit.nanometer)),
+                                             state.getForces(asNumpy=True).value_in_unit(unit.kilojoules_per_mole/unit.nanometer))
+
+        # The arrays share memory with the State, so modifying them must not be possible.
+
+        array = state.getPositions(asNumpy=True)._value
+        def modify():
+            array[0, 0] += 1.0
+        self.assertRaises(ValueError, modify)
+        np.testing.assert_array_almost_equal(input, state.getPositions(asNumpy=True).value_in_unit(unit.nanometers))
+        np.testing.assert_array_almost_equal(input, np.array(state.getPositions().value_in_unit(unit.nanometers)))
+
+        # Arrays that are not contiguous (N, 3) arrays of doubles should still be accepted.
+
+        self.simulation.context.setPositions(np.asfortranarray(input))
+        np.testing.assert_array_almost_equal(input, self.simulation.context.getState(getPositions=True).getPositions(asNumpy=True))
+        self.simulation.context.setPositions(input.astype(np.float32))
+        np.testing.assert_array_almost_equal(input, self.simulation.context.getState(getPositions=True).getPositions(asNumpy=True), decimal=5)
+
+        # Setting the State should restore the positions.
+
+        self.simulation.context.setPositions(np.zeros((n_particles, 3)))
+        self.simulation.context.setState(state)
+        np.testing.assert_array_almost_equal(input, self.simulation.context.getState(getPositions=True).getPositions(asNumpy=True))
+
     def test_tabulatedFunction(self):
         f = mm.CustomNonbondedForce('g(r)')
 
@@ -1,4 +1,6 @@
+import os
 import sys
+import tempfile
 import unittest
 from simtk.openmm.app import *
 from simtk.openmm import *
@@ -84,6 +86,37 @@ class TestPdbFile(unittest.TestCase):
             if atom.index > 2:
                 self.assertEqual(None, atom.element)
 
+    def test_Trajectory(self):
+        """Test reading a multi-model file one model at a time."""
+        pdb = PDBFile('systems/alanine-dipeptide-explicit.pdb')
+        fd, filename = tempfile.mkstemp(suffix='.pdb')
+        os.close(fd)
+        try:
+            with open(filename, 'w') as output:
+                PDBFile.writeHeader(pdb.topology, output)
+                for i in range(3):
+                    positions = [p+Vec3(0.1*i, 0, 0) for p in pdb.positions.value_in_unit(nanometers)]*nanometers
+                    PDBFile.writeModel(pdb.topology, positions, output, modelIndex=i+1)
+                PDBFile.writeFooter(pdb.topology, output)
+            expected = PDBFile(filename)
+            trajectory = PDBTrajectory(filename)
+            self.assertEqual(3, len(trajectory))
+            self.assertEqual(pdb.topology.getNumAtoms(), trajectory.topology.getNumAtoms())
+            self.assertEqual(len(list(expected.topology.bonds())), len(list(trajectory.topology.bonds())))
+            frames = 0
+            for i, positions in enumerate(trajectory):
+                self.assertEqual((pdb.topology.getNumAtoms(), 3), positions.value_in_unit(nanometers).shape)
+                for p1, p2 in zip(expected.getPositions(frame=i), positions):
+                    self.assertVecAlmostEqual(p1, Vec3(*p2.value_in_unit(nanometers))*nanometers)
+                frames += 1
+            self.assertEqual(3, frames)
+            for p1, p2 in zip(expected.getPositions(frame=1), trajectory.getPositions(1)):
+                self.assertVecAlmostEqual(p1, Vec3(*p2.value_in_unit(nanometers))*nanometers)
+            for v1, v2 in zip(expected.topology.getPeriodicBoxVectors(), trajectory.getPeriodicBoxVectors(2)):
+                self.assertVecAlmostEqual(v1, v2)
+            trajectory.close()
+        finally:
+            os.remove(filename)
 
     def assertVecAlmostEqual(self, p1, p2, tol=1e-7):
         unit = p1.unit
@@ -0,0 +1,73 @@
+import unittest
+from simtk.openmm import app
+import simtk.openmm as mm
+from simtk import unit
+
+
+class TestReplicaManager(unittest.TestCase):
+    def setUp(self):
+        pdb = app.PDBFile('systems/alanine-dipeptide-implicit.pdb')
+        forcefield = app.ForceField('amber99sbildn.xml')
+        self.system = forcefield.createSystem(pdb.topology, nonbondedMethod=app.NoCutoff, constraints=app.HBonds)
+        self.topology = pdb.topology
+        self.positions = pdb.positions
+        self.temperatures = [300, 350, 400]
+        integrators = [mm.LangevinIntegrator(t*unit.kelvin, 1/unit.picosecond, 0.002*unit.picoseconds) for t in self.temperatures]
+        platform = mm.Platform.getPlatformByName('Reference')
+        self.replicas = app.ReplicaManager(self.topology, self.system, integrators, platform)
+        self.replicas.setPositions(self.positions)
+
+    def tearDown(self):
+        self.replicas.close()
+
+    def testStep(self):
+        """Test that every replica is advanced independently."""
+        self.replicas.step(5)
+        self.replicas.step(5, replicas=[1])
+        self.assertEqual([5, 10, 5], [s.currentStep for s in self.replicas.simulations])
+        energies = self.replicas.getPotentialEnergies()
+        self.assertEqual(3, len(energies))
+        self.assertNotEqual(energies[0], energies[1])
+        self.assertEqual(3, len(self.replicas.getThroughput()))
+        self.assertTrue(all(t > 0 for t in self.replicas.getThroughput()))
+
+    def testExchangeConfigurations(self):
+        """Test swapping positions and velocities between replicas."""
+        self.replicas.step(5)
+        states = self.replicas.getStates(getPositions=True, getVelocities=True)
+        self.replicas.exchangeConfigurations(0, 2, rescaleVelocities=True)
+        newStates = self.replicas.getStates(getPositions=True, getVelocities=True)
+        scale = (self.temperatures[0]/float(self.temperatures[2]))**0.5
+        for p1, p2 in zip(states[0].getPositions(), newStates[2].getPositions()):
+            self.assertEqual(p1, p2)
+        for p1, p2 in zip(states[2].getPositions(), newStates[0].getPositions()):
+            self.assertEqual(p1, p2)
+        for v1, v2 in zip(states[2].getVelocities(), newStates[0].getVelocities()):
+            for i in range(3):
+                self.assertAlmostEqual(v1[i].value_in_unit(unit.nanometers/unit.picosecond)*scale, v2[i].value_in_unit(unit.nanometers/unit.picosecond))
+        for p1, p2 in zip(states[1].getPositions(), newStates[1].getPositions()):
+            self.assertEqual(p1, p2)
+
+    def testExchangeParameters(self):
+        """Test swapping global parameters between replicas."""
+        system = mm.System()
+        system.addParticle(1.0)
+        force = mm.CustomExternalForce('k*x^2')
+        force.addGlobalParameter('k', 1.0)
+        force.addParticle(0, [])
+        system.addForce(force)
+        integrators = [mm.VerletIntegrator(0.001) for i in range(2)]
+        replicas = app.ReplicaManager(app.Topology(), system, integrators, mm.Platform.getPlatformByName('Reference'))
+        replicas.simulations[1].context.setParameter('k', 2.0)
+        replicas.exchangeParameters(0, 1)
+        self.assertEqual(2.0, replicas.simulations[0].context.getParameter('k'))
+        self.assertEqual(1.0, replicas.simulations[1].context.getParameter('k'))
+        replicas.close()
+
+    def testSharedIntegrator(self):
+        """Test that replicas cannot share an Integrator."""
+        integrator = mm.VerletIntegrator(0.001)
+        self.assertRaises(ValueError, lambda: app.ReplicaManager(self.topology, self.system, [integrator, integrator]))
+
+if __name__ == '__main__':
+    unittest.main()
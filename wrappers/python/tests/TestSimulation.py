@@ -98,6 +98,34 @@ class TestSimulation(unittest.TestCase):
         self.assertEqual(initialState.getPositions(), state.getPositions())
         self.assertEqual(initialState.getVelocities(), state.getVelocities())
 
+        # It should also work when loading from an open file.
+
+        simulation.step(2)
+        with open(filename, 'r') as f:
+            simulation.loadState(f)
+        state = simulation.context.getState(getPositions=True, getVelocities=True)
+        self.assertEqual(initialState.getPositions(), state.getPositions())
+        self.assertEqual(initialState.getVelocities(), state.getVelocities())
+
+    def testDeserializeFromFile(self):
+        """Test that objects can be deserialized directly from files."""
+        pdb = PDBFile('systems/alanine-dipeptide-implicit.pdb')
+        ff = ForceField('amber99sb.xml', 'tip3p.xml')
+        system = ff.createSystem(pdb.topology)
+        integrator = VerletIntegrator(0.001*picoseconds)
+        context = Context(system, integrator, Platform.getPlatformByName('Reference'))
+        context.setPositions(pdb.positions)
+        state = context.getState(getPositions=True, getForces=True, getEnergy=True, getParameters=True)
+        for obj in [system, integrator, state, system.getForce(0)]:
+            filename = tempfile.mktemp()
+            xml = XmlSerializer.serialize(obj)
+            with open(filename, 'w') as f:
+                f.write(xml)
+            with open(filename, 'r') as f:
+                copy = XmlSerializer.deserialize(f)
+            self.assertEqual(obj.__class__.__name__, copy.__class__.__name__)
+            self.assertEqual(xml, XmlSerializer.serialize(copy))
+
     def testStep(self):
         """Test the step() method."""
         pdb = PDBFile('systems/alanine-dipeptide-implicit.pdb')
@@ -119,6 +147,69 @@ class TestSimulation(unittest.TestCase):
         self.assertEqual(23, simulation.currentStep)
         self.assertAlmostEqual(0.023, simulation.context.getState().getTime().value_in_unit(picoseconds))
 
+    def testSharedReports(self):
+        """Test that reporters share States, and that reports can be aligned."""
+        class RecordingReporter(object):
+            def __init__(self, interval, positions, energy, wrap=None):
+                self.interval = interval
+                self.positions = positions
+                self.energy = energy
+                self.wrap = wrap
+                self.reports = []
+            def describeNextReport(self, simulation):
+                steps = self.interval - simulation.currentStep%self.interval
+                return (steps, self.positions, False, False, self.energy, self.wrap)
+            def report(self, simulation, state):
+                self.reports.append((simulation.currentStep, state))
+
+        pdb = PDBFile('systems/alanine-dipeptide-implicit.pdb')
+        ff = ForceField('amber99sb.xml')
+        system = ff.createSystem(pdb.topology)
+        simulation = Simulation(pdb.topology, system, VerletIntegrator(0.001*picoseconds), Platform.getPlatformByName('Reference'))
+        simulation.context.setPositions(pdb.positions)
+        r1 = RecordingReporter(10, True, False)
+        r2 = RecordingReporter(5, False, True)
+        r3 = RecordingReporter(9, True, False, False)
+        simulation.reporters += [r1, r2, r3]
+        simulation.step(20)
+        self.assertEqual([10, 20], [step for step, state in r1.reports])
+        self.assertEqual([5, 10, 15, 20], [step for step, state in r2.reports])
+        self.assertEqual([9, 18], [step for step, state in r3.reports])
+
+        # Reporters on the same step should share a State with everything they need.
+
+        self.assertTrue(r1.reports[0][1] is r2.reports[1][1])
+        state = r1.reports[0][1]
+        state.getPositions()
+        state.getPotentialEnergy()
+
+        # With a tolerance, r3's report at step 36 should be moved to coincide with r2's report.
+
+        for r in simulation.reporters:
+            r.reports = []
+        simulation.reportTolerance = 1
+        simulation.step(20)
+        self.assertEqual([30, 40], [step for step, state in r1.reports])
+        self.assertEqual([25, 30, 35, 40], [step for step, state in r2.reports])
+        self.assertEqual([27, 35], [step for step, state in r3.reports])
+        self.assertTrue(r3.reports[1][1] is r2.reports[2][1])
+
+    def testProfilingHook(self):
+        """Test that the profiling hook reports the speed of the simulation."""
+        pdb = PDBFile('systems/alanine-dipeptide-implicit.pdb')
+        ff = ForceField('amber99sb.xml')
+        system = ff.createSystem(pdb.topology)
+        simulation = Simulation(pdb.topology, system, VerletIntegrator(0.001*picoseconds), Platform.getPlatformByName('Reference'))
+        simulation.context.setPositions(pdb.positions)
+        speeds = []
+        simulation.profilingHook = lambda sim, stepsPerSecond, nsPerDay: speeds.append((stepsPerSecond, nsPerDay))
+        simulation.step(200)
+        self.assertEqual(200, simulation.currentStep)
+        self.assertTrue(len(speeds) > 0)
+        for stepsPerSecond, nsPerDay in speeds:
+            self.assertTrue(stepsPerSecond > 0)
+            self.assertAlmostEqual(stepsPerSecond*86400*1e-6, nsPerDay)
+
     def testRunForClockTime(self):
         """Test the runForClockTime() method."""
         pdb = PDBFile('systems/alanine-dipeptide-implicit.pdb')
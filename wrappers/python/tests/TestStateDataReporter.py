@@ -0,0 +1,81 @@
+import os
+import unittest
+import tempfile
+from simtk.openmm import app
+import simtk.openmm as mm
+from simtk import unit
+try:
+    from cStringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+class TestStateDataReporter(unittest.TestCase):
+    def setUp(self):
+        with open('systems/alanine-dipeptide-implicit.pdb') as f:
+            pdb = app.PDBFile(f)
+        forcefield = app.ForceField('amber99sbildn.xml')
+        system = forcefield.createSystem(pdb.topology,
+            nonbondedMethod=app.CutoffNonPeriodic, nonbondedCutoff=1.0*unit.nanometers,
+            constraints=app.HBonds)
+        self.simulation = app.Simulation(pdb.topology, system, mm.VerletIntegrator(0.002*unit.picoseconds))
+        self.simulation.context.setPositions(pdb.positions)
+
+    def testFlushInterval(self):
+        """Test that reports are collected until the flush interval is reached."""
+        output = StringIO()
+        self.simulation.reporters.append(app.StateDataReporter(output, 1, step=True, flushInterval=3))
+        self.simulation.step(2)
+        self.assertEqual(1, len(output.getvalue().splitlines()))
+        self.simulation.step(1)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(4, len(lines))
+        self.assertEqual(['1', '2', '3'], lines[1:])
+
+    def testBinary(self):
+        """Test writing and loading binary output."""
+        text = StringIO()
+        fd, filename = tempfile.mkstemp(suffix='.npy')
+        os.close(fd)
+        args = dict(step=True, time=True, potentialEnergy=True, temperature=True, density=True, volume=True)
+        binaryReporter = app.StateDataReporter(filename, 2, binary=True, flushInterval=2, **args)
+        self.simulation.reporters.append(app.StateDataReporter(text, 2, **args))
+        self.simulation.reporters.append(binaryReporter)
+        self.simulation.step(10)
+        del self.simulation.reporters[1]
+        del binaryReporter
+        data = app.StateDataReporter.loadBinary(filename)
+        os.unlink(filename)
+        self.assertEqual(('step', 'time', 'potentialEnergy', 'temperature', 'volume', 'density'), data.dtype.names)
+        lines = text.getvalue().splitlines()[1:]
+        self.assertEqual(5, len(data))
+        self.assertEqual(len(lines), len(data))
+        for line, record in zip(lines, data):
+            values = [float(v) for v in line.split(',')]
+            for value, recordValue in zip(values, record):
+                self.assertAlmostEqual(value, recordValue)
+    def testEnergyGroups(self):
+        """Test reporting the energy of each force group."""
+        system = self.simulation.system
+        for i, force in enumerate(system.getForces()):
+            force.setForceGroup(i)
+        positions = self.simulation.context.getState(getPositions=True).getPositions()
+        self.simulation.context.reinitialize()
+        self.simulation.context.setPositions(positions)
+        output = StringIO()
+        self.simulation.reporters.append(app.StateDataReporter(output, 1, potentialEnergy=True, energyGroups=True))
+        self.simulation.step(1)
+        lines = output.getvalue().splitlines()
+        numForces = system.getNumForces()
+        self.assertEqual(['Group %d Energy (kJ/mole)' % i for i in range(numForces)], lines[0].strip('#"').split('","')[1:])
+        values = [float(v) for v in lines[1].split(',')]
+        self.assertAlmostEqual(values[0], sum(values[1:]), places=4)
+        for i in range(numForces):
+            energy = self.simulation.context.getState(getEnergy=True, groups={i}).getPotentialEnergy()
+            self.assertAlmostEqual(energy.value_in_unit(unit.kilojoules_per_mole), values[i+1], places=4)
+        energies = self.simulation.context.getEnergiesByGroup({0, 2})
+        self.assertEqual([0, 2], sorted(energies.keys()))
+        self.assertAlmostEqual(values[3], energies[2].value_in_unit(unit.kilojoules_per_mole), places=4)
+
+if __name__ == '__main__':
+    unittest.main()
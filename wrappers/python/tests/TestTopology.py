@@ -50,5 +50,19 @@ class TestTopology(unittest.TestCase):
         self.assertEqual(internal_bonds, [ (atom_B1, atom_B2) ])
         self.assertEqual(external_bonds, [ (atom_A1, atom_B1), (atom_B2, atom_C1) ])
 
+    def test_disulfide_bonds(self):
+        """Test that createDisulfideBonds() finds the right pairs of cysteines."""
+        import numpy
+        positions = [Vec3(0, 0, 0), Vec3(0.2, 0, 0), Vec3(5, 5, 5), Vec3(5.31, 5, 5), Vec3(10, 0, 0), Vec3(10, 0.25, 0)]
+        for pos in (positions*nanometers, Quantity(numpy.array(positions)*10, angstroms)):
+            topology = Topology()
+            chain = topology.addChain()
+            sulfurs = []
+            for i in range(len(positions)):
+                residue = topology.addResidue('CYS', chain)
+                sulfurs.append(topology.addAtom('SG', element.sulfur, residue))
+            topology.createDisulfideBonds(pos)
+            self.assertEqual(list(topology.bonds()), [(sulfurs[1], sulfurs[0]), (sulfurs[5], sulfurs[4])])
+
 if __name__ == '__main__':
     unittest.main()